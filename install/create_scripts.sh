@@ -50,6 +50,11 @@ if [ "$RAPD_HOME" != "" ]; then
   echo "$SAFE_PREFIX\/bin\/rapd.python $SAFE_PREFIX\/src\/plugins\/pdbquery\/commandline.py \"\$@\"" >>$RAPD_HOME/bin/rapd.pdbquery
   chmod +x $RAPD_HOME/bin/rapd.pdbquery
 
+  # Build or update the local PDB unit cell index
+  echo "#! /bin/bash" > $RAPD_HOME/bin/rapd.cell_index
+  echo "$SAFE_PREFIX\/bin\/rapd.python $SAFE_PREFIX\/src\/utils\/cell_index.py \"\$@\"" >>$RAPD_HOME/bin/rapd.cell_index
+  chmod +x $RAPD_HOME/bin/rapd.cell_index
+
   # Fetch a PDB from PDBQ
   echo "#! /bin/bash" > $RAPD_HOME/bin/rapd.get_pdb
   echo "$SAFE_PREFIX\/bin\/rapd.python $SAFE_PREFIX\/src\/plugins\/get_cif\/commandline.py --pdb \"\$@\"" >>$RAPD_HOME/bin/rapd.get_pdb
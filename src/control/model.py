@@ -42,13 +42,21 @@ import types
 
 # RAPD imports
 from control.control_server import LaunchAction, ControllerServer
+from control.result_writer import ResultWriter, WRITER_THREADS
+from control.run_registry import RunRegistry
+import utils.frame_progress as frame_progress
 from utils.modules import load_module
+from utils.job_lanes import JobLanes
+import utils.result_patch as result_patch
 from utils.site import get_ip_address
 from utils.text import json
 from bson.objectid import ObjectId
 # from rapd_console import ConsoleFeeder
 # from rapd_site import TransferToUI, TransferToBeamline, CopyToUser
 
+# Running plugin results tracked for patch sequence gaps
+MAX_TRACKED_RESULTS = 1000
+
 #####################################################################
 # The main Model Class                                              #
 #####################################################################
@@ -69,10 +77,17 @@ class Model(object):
     indexing_active = collections.deque()
 
     # Managing runs and images without going to the db
-    recent_runs = collections.OrderedDict()
+    recent_runs = None
 
     data_root_dir = None
     database = None
+    result_writer = None
+
+    # Last patch sequence number received for each plugin result
+    result_sequences = None
+
+    # Priority lanes for RAPD_JOBS
+    job_lanes = None
 
     server = None
     # return_address = None
@@ -119,6 +134,9 @@ class Model(object):
         # Start connection to the core database
         self.connect_to_database()
 
+        # Start the threads saving plugin results
+        self.start_result_writer()
+
         # Start the server for receiving communications
         self.start_server()
 
@@ -164,6 +182,12 @@ class Model(object):
                 self.site_ids.append(site_id)
                 self.pairs[site_id] = collections.deque([("", 0), ("", 0)], 2)
 
+        # Runs held in memory, kept as long as the database look back window
+        self.recent_runs = RunRegistry(max_age=self.site.RUN_WINDOW * 60)
+
+        # Lanes jobs are queued in by priority
+        self.job_lanes = JobLanes(self.site.LAUNCHER_SETTINGS.get("JOB_LANES"))
+
     def connect_to_redis(self):
         """Connect to the redis instance"""
         redis_database = importlib.import_module('database.redis_adapter')
@@ -198,6 +222,51 @@ class Model(object):
                                               password=site.CONTROL_DATABASE_SETTINGS['DATABASE_PASSWORD'])
         #self.database = database.Database(string=site.CONTROL_DATABASE_SETTINGS['DATABASE_STRING'])
 
+        # Make sure the indexes the queries rely on exist
+        if hasattr(self.database, "create_indexes"):
+            try:
+                self.database.create_indexes()
+            except Exception:
+                self.logger.exception("Unable to create database indexes")
+
+    def start_result_writer(self):
+        """Start the pool of threads saving plugin results"""
+
+        self.result_sequences = collections.OrderedDict()
+
+        self.result_writer = ResultWriter(
+            save=self.save_plugin_message,
+            threads=getattr(self.site, "RESULT_WRITER_THREADS", WRITER_THREADS),
+            merge=result_patch.combine_messages,
+            logger=self.logger)
+
+    def stop_result_writer(self):
+        """Write any plugin results still waiting and stop the writers"""
+
+        if self.result_writer:
+            self.logger.debug("Stopping result writer")
+            self.result_writer.stop(timeout=30)
+
+    def save_plugin_message(self, message):
+        """Write a plugin result snapshot or patch to the database"""
+
+        message.pop("sequence", None)
+
+        if "patch" in message:
+            # Nothing to patch - ask the plugin for everything
+            if not self.database.update_plugin_result(message):
+                self.request_result_snapshot(message["process"].get("result_id"))
+        else:
+            self.database.save_plugin_result(message)
+
+    def request_result_snapshot(self, result_id):
+        """Have the plugin for result_id send its full results next time"""
+
+        self.logger.debug("Requesting a result snapshot for %s", result_id)
+        self.redis.setex(result_patch.resync_key(result_id),
+                         result_patch.RESYNC_EXPIRE,
+                         1)
+
     def start_server(self):
         """Start up the listening process for core"""
 
@@ -387,7 +456,11 @@ class Model(object):
         print "send_command"
         pprint(command)
 
-        self.redis.lpush(channel, json.dumps(command))
+        if channel == "RAPD_JOBS":
+            lane = self.job_lanes.push(self.redis, channel, command)
+            self.logger.debug("%s queued in %s lane", command.get("command"), lane)
+        else:
+            self.redis.lpush(channel, json.dumps(command))
         print "Command sent"
 
     def stop(self):
@@ -396,6 +469,7 @@ class Model(object):
 
         self.stop_redis()
         self.stop_server()
+        self.stop_result_writer()
         self.stop_launcher_manager()
         self.stop_image_monitor()
         self.stop_run_monitor()
@@ -445,7 +519,8 @@ class Model(object):
         if isinstance(place_in_run, int):
             # Save the current place_in_run in Redis so integration has reliable signal of whether an image exists.
             # This is a problem on some filesystems (ie. NFS) caching the file attributes.
-            self.redis.set('place_in_run:%s'%site_tag, str(place_in_run))
+            # Also published for the run so integration waiting on it wakes up.
+            frame_progress.publish_place_in_run(self.redis, site_tag, run_id, place_in_run)
 
             # Save some typing
             current_run = self.recent_runs[str(run_id)]
@@ -599,12 +674,12 @@ class Model(object):
         """
 
         # Look in local store of information
-        for run_id, run in self.recent_runs.iteritems():
-            if run_data.get("run_id", 0) == run_id:
-                if boolean:
-                    return True
-                else:
-                    return run
+        run_id, run = self.recent_runs.find_run(run_data)
+        if run:
+            if boolean:
+                return True
+            else:
+                return run
 
         # Look in the database since the local attempt has failed
         return self.database.get_run(run_data=run_data,
@@ -626,7 +701,8 @@ class Model(object):
 
         If the run is found in the local store, only the most recent match will
         be returned if running in boolean=False mode. If found in the database,
-        all matching runs in the last minutes minutes will be returned
+        all matching runs in the last minutes minutes will be returned and
+        added to the local store
 
         Keyword arguments
         site_tag -- string describing site (default None)
@@ -638,53 +714,44 @@ class Model(object):
         boolean -- return just True if there is a or False
         """
 
-        # Query local runs in reverse chronological order
-        for run_id, run in self.recent_runs.iteritems():
-            # print 'run_id:%s'%run_id
-            # print 'run: %s'%run
-            #self.logger.debug('run_id:%s'%run_id)
-            #self.logger.debug('run:%s'%run)
-
-            #self.logger.debug("_id:%s run:%s" % (run_id, str(run)))
-
-            if run.get("site_tag", None) == site_tag and \
-               run.get("directory", None) == directory and \
-               run.get("image_prefix", None) == image_prefix and \
-               run.get("run_number", None) == run_number:
-
-                # Check image number
-                run_start = run.get("start_image_number")
-                run_end = run.get("number_images") + run_start - 1
-                if image_number >= run_start and image_number <= run_end:
-                    if return_type == "boolean":
-                        return True
-                    else:
-                        return [run]
+        # Query local runs
+        run_id, run = self.recent_runs.find(site_tag,
+                                            directory,
+                                            image_prefix,
+                                            run_number,
+                                            image_number)
+        if run:
+            if return_type == "boolean":
+                return True
+            elif return_type == "id":
+                return [run_id]
+            else:
+                return [run]
 
-        # If no run has been identified in local store, then search database
+        # If no run has been identified in local store, then search database,
+        # getting the full runs so they can be stored locally
         identified_runs = self.database.query_in_run(site_tag=site_tag,
                                                      directory=directory,
                                                      image_prefix=image_prefix,
                                                      run_number=run_number,
                                                      image_number=image_number,
                                                      minutes=minutes,
-                                                     return_type=return_type)
+                                                     return_type="dict")
 
         self.logger.debug('identified_runs:%s'%identified_runs)
-        # If boolean, just return
+        if identified_runs == False:
+            return False
+
+        # Update the local store, oldest first so the newest match wins
+        for run in reversed(identified_runs):
+            self.recent_runs[str(run["_id"])] = run
+
         if return_type == "boolean":
-            return identified_runs
+            return True
+        elif return_type == "id":
+            return [str(run["_id"]) for run in identified_runs]
         else:
-            if identified_runs == False:
-                return False
-            elif return_type == "id":
-                return identified_runs
-            elif return_type == "dict":
-                # Update the local store
-                for run in identified_runs:
-                    self.recent_runs[str(run["_id"])] = run
-                # Return runs
-                return identified_runs
+            return identified_runs
 
     def add_run(self, run_dict):
         """
@@ -1103,10 +1170,29 @@ class Model(object):
         """
 
         # Save the results for the plugin
-        if "results" in message:
-
-            # Save the result
-            __ = self.database.save_plugin_result(message)
+        if "results" in message or "patch" in message:
+
+            result_id = str(message["process"].get("result_id"))
+            sequence = message.get("sequence")
+            last_sequence = self.result_sequences.pop(result_id, None)
+
+            # A patch only applies on top of the message before it
+            if "patch" in message and \
+               (last_sequence is None or sequence != last_sequence + 1):
+                self.logger.debug("Result %s patch %s follows %s - dropped",
+                                  result_id, sequence, last_sequence)
+                self.request_result_snapshot(result_id)
+                return
+
+            # Keep tracking running results, most recently heard from last
+            if sequence is not None and not result_patch.is_finished(message):
+                self.result_sequences[result_id] = sequence
+                while len(self.result_sequences) > MAX_TRACKED_RESULTS:
+                    self.result_sequences.popitem(last=False)
+
+            # Save the result in the background, superseding any update for
+            # this result still waiting to be written
+            self.result_writer.submit(message)
 
         else:
 
@@ -1138,7 +1224,7 @@ class Model(object):
         Keyword arguments
         message -- information to be preocessed, a dict
 
-        Types currently handled: NEWIMAGE, NEWRUN
+        Types currently handled: NEWIMAGE, NEWIMAGES, NEWRUN
         """
 
         # self.logger.debug("Received: %s", message)
@@ -1154,6 +1240,13 @@ class Model(object):
         elif message.get("message_type", None) == "NEWIMAGE":
             self.add_image(message)
 
+        # NEWIMAGES - a batch drained from the image monitor, oldest first
+        elif message.get("message_type", None) == "NEWIMAGES":
+            site_tag = message.get("site_tag", None)
+            for fullname in message.get("fullnames", []):
+                self.add_image({"fullname":fullname,
+                                "site_tag":site_tag})
+
         # NEWRUN
         elif message.get("message_type", None) == "NEWRUN":
             self.add_run(message)
@@ -0,0 +1,194 @@
+"""
+Writes plugin results to the database in the background so the control
+thread can go straight back to images and runs
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2009-2018, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import collections
+import logging
+import threading
+import time
+
+# Defaults
+WRITER_THREADS = 4      # Results written at once
+MAX_PENDING = 1000      # Distinct results waiting before submit blocks
+
+class ResultWriter(object):
+    """
+    Bounded pool of threads saving plugin results
+
+    Updates for a result_id waiting to be written are combined with newer
+    ones, so only the latest state of each result is written. Writes for one
+    result_id never overlap and happen in the order the updates arrived.
+    """
+
+    def __init__(self,
+                 save,
+                 threads=WRITER_THREADS,
+                 max_pending=MAX_PENDING,
+                 merge=None,
+                 logger=None):
+        """
+        Start the writer threads
+
+        Keyword arguments
+        save -- function called with each plugin result to write
+        threads -- number of writer threads (default = WRITER_THREADS)
+        max_pending -- distinct results waiting before submit blocks (default = MAX_PENDING)
+        merge -- function combining a waiting update with a newer one, None to
+                 keep just the newer one (default = None)
+        logger -- logger instance (default = None)
+        """
+
+        if logger:
+            self.logger = logger
+        else:
+            self.logger = logging.getLogger("RAPDLogger")
+
+        self.save = save
+        self.merge = merge
+        self.max_pending = max_pending
+
+        # result_id -> newest message not yet written
+        self.pending = {}
+        # result_ids with a pending message, oldest first
+        self.order = collections.deque()
+        # result_ids being written right now
+        self.writing = set()
+
+        # Counts for monitoring
+        self.submitted = 0
+        self.written = 0
+        self.coalesced = 0
+
+        self.condition = threading.Condition()
+        self.running = True
+
+        self.threads = []
+        for index in range(threads):
+            thread = threading.Thread(target=self.work, name="result_writer_%d" % index)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, message):
+        """
+        Queue a plugin result to be written
+
+        Keyword arguments
+        message -- plugin result dict with process.result_id
+        """
+
+        result_id = str(message.get("process", {}).get("result_id"))
+
+        with self.condition:
+            self.submitted += 1
+
+            # Replace an update that has not been written yet
+            if result_id in self.pending:
+                if self.merge:
+                    message = self.merge(self.pending[result_id], message)
+                self.pending[result_id] = message
+                self.coalesced += 1
+                return
+
+            # Back off if the writers are far behind
+            while len(self.pending) >= self.max_pending and self.running:
+                self.condition.wait(1)
+
+            self.pending[result_id] = message
+            # A result being written is queued again when its write finishes
+            if result_id not in self.writing:
+                self.order.append(result_id)
+            self.condition.notify_all()
+
+    def take(self):
+        """Return the next (result_id, message) to write, or None when stopped"""
+
+        with self.condition:
+            while not self.order:
+                if not self.running:
+                    return None
+                self.condition.wait(1)
+            result_id = self.order.popleft()
+            self.writing.add(result_id)
+            message = self.pending.pop(result_id)
+            self.condition.notify_all()
+            return result_id, message
+
+    def done(self, result_id):
+        """Mark a write finished, queuing any update that arrived during it"""
+
+        with self.condition:
+            self.writing.discard(result_id)
+            self.written += 1
+            if result_id in self.pending:
+                self.order.append(result_id)
+            self.condition.notify_all()
+
+    def work(self):
+        """Writer thread loop"""
+
+        while True:
+            job = self.take()
+            if job is None:
+                break
+
+            result_id, message = job
+            try:
+                self.save(message)
+            except Exception:
+                self.logger.exception("Error saving result %s", result_id)
+            finally:
+                self.done(result_id)
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted is written, returning True if it was"""
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        with self.condition:
+            while self.pending or self.writing:
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self.condition.wait(min(remaining, 1))
+                else:
+                    self.condition.wait(1)
+        return True
+
+    def stop(self, timeout=None):
+        """Write what is pending and stop the threads"""
+
+        self.flush(timeout)
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
@@ -0,0 +1,192 @@
+"""
+Keeps recently seen runs in memory so images can be matched to their run
+without going to the database
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2009-2018, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import bisect
+import collections
+import time
+
+# Defaults
+MAX_RUNS = 1000     # Runs held before the least recently used is dropped
+MAX_AGE = 86400     # Seconds a run is held after it was last used, 0 for no limit
+
+def run_key(run):
+    """Return the registry key for a run dict"""
+    return (run.get("site_tag"),
+            run.get("directory"),
+            run.get("image_prefix"),
+            run.get("run_number"))
+
+class RunRegistry(object):
+    """
+    Runs indexed by (site_tag, directory, image_prefix, run_number) and by the
+    image numbers they cover
+
+    Behaves as a dict of run_id -> run, as Model.recent_runs always has. Lookups
+    by image are a dict access and a bisect over the few runs that share a key.
+    Runs are dropped least recently used first once there are more than
+    max_runs or they have not been used for max_age seconds.
+    """
+
+    def __init__(self, max_runs=MAX_RUNS, max_age=MAX_AGE):
+        """
+        Keyword arguments
+        max_runs -- runs held before the least recently used is dropped (default = MAX_RUNS)
+        max_age -- seconds a run is held after last use, 0 for no limit (default = MAX_AGE)
+        """
+
+        self.max_runs = max_runs
+        self.max_age = max_age
+
+        # run_id -> (run, last used), least recently used first
+        self.runs = collections.OrderedDict()
+        # run_id -> order added
+        self.added = {}
+        self.added_count = 0
+        # key -> [(start_image_number, run_id), ...] sorted
+        self.index = {}
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __contains__(self, run_id):
+        return str(run_id) in self.runs
+
+    def __getitem__(self, run_id):
+        return self.runs[str(run_id)][0]
+
+    def __setitem__(self, run_id, run):
+        self.add(run_id, run)
+
+    def get(self, run_id, default=None):
+        """Return the run for run_id, or default"""
+        if str(run_id) in self.runs:
+            return self.runs[str(run_id)][0]
+        return default
+
+    def iteritems(self):
+        """Iterate over (run_id, run), least recently used first"""
+        for run_id, (run, __) in self.runs.iteritems():
+            yield run_id, run
+
+    def add(self, run_id, run):
+        """
+        Add or replace a run
+
+        Keyword arguments
+        run_id -- database _id of the run
+        run -- dict describing the run
+        """
+
+        run_id = str(run_id)
+        if run_id in self.runs:
+            self.remove(run_id)
+
+        self.runs[run_id] = (run, time.time())
+        self.added_count += 1
+        self.added[run_id] = self.added_count
+        bisect.insort(self.index.setdefault(run_key(run), []),
+                      (run.get("start_image_number", 1), run_id))
+
+        self.expire()
+
+    def remove(self, run_id):
+        """Drop a run"""
+
+        run, __ = self.runs.pop(run_id)
+        del self.added[run_id]
+        key = run_key(run)
+        entries = self.index[key]
+        entries.remove((run.get("start_image_number", 1), run_id))
+        if not entries:
+            del self.index[key]
+
+    def touch(self, run_id):
+        """Mark a run as just used"""
+        run, __ = self.runs.pop(run_id)
+        self.runs[run_id] = (run, time.time())
+
+    def expire(self):
+        """Drop runs over the size and age limits"""
+
+        now = time.time()
+        while self.runs:
+            run_id, (__, last_used) = next(self.runs.iteritems())
+            if len(self.runs) > self.max_runs or \
+               (self.max_age and now - last_used > self.max_age):
+                self.remove(run_id)
+            else:
+                break
+
+    def find(self, site_tag, directory, image_prefix, run_number, image_number):
+        """
+        Return (run_id, run) for the most recently added run containing the
+        image, or (None, None)
+        """
+
+        self.expire()
+
+        entries = self.index.get((site_tag, directory, image_prefix, run_number))
+        if not entries:
+            return None, None
+
+        # Runs starting at or before this image, latest start first
+        position = bisect.bisect_right(entries, (image_number, chr(255)))
+        matches = []
+        for start, run_id in reversed(entries[:position]):
+            run = self.runs[run_id][0]
+            if image_number <= start + run.get("number_images", 0) - 1:
+                matches.append(run_id)
+
+        if not matches:
+            return None, None
+
+        # Most recently added wins, as with the newest first database query
+        run_id = max(matches, key=lambda run_id: self.added[run_id])
+        self.touch(run_id)
+        return run_id, self.runs[run_id][0]
+
+    def find_run(self, run_data):
+        """
+        Return (run_id, run) for a stored run with the same key, starting
+        image and number of images as run_data, or (None, None)
+        """
+
+        run_id = run_data.get("run_id")
+        if run_id and str(run_id) in self.runs:
+            self.touch(str(run_id))
+            return str(run_id), self.runs[str(run_id)][0]
+
+        for start, run_id in self.index.get(run_key(run_data), []):
+            run = self.runs[run_id][0]
+            if start == run_data.get("start_image_number") and \
+               run.get("number_images") == run_data.get("number_images"):
+                self.touch(run_id)
+                return run_id, run
+
+        return None, None
@@ -32,7 +32,6 @@ sudo docker run --name mongodb -p 27017:27017 -d mongo:3.4
 """
 
 # Standard imports
-import base64
 import bson.errors
 from bson.objectid import ObjectId
 import copy
@@ -46,13 +45,74 @@ import threading
 import pymongo
 import gridfs
 
+import utils.archive as archive
 from utils.text import json
 
 CONNECTION_ATTEMPTS = 30
 
+# Indexes for the queries made by this adapter - (collection, keys, name)
+# Equality fields come first, then the sort field
+INDEXES = (
+    ("runs",
+     [("site_tag", pymongo.ASCENDING),
+      ("directory", pymongo.ASCENDING),
+      ("image_prefix", pymongo.ASCENDING),
+      ("run_number", pymongo.ASCENDING),
+      ("file_ctime", pymongo.DESCENDING)],
+     "runs_lookup"),
+    ("results",
+     [("result_id", pymongo.ASCENDING)],
+     "results_result_id"),
+    ("sessions",
+     [("data_root_dir", pymongo.ASCENDING)],
+     "sessions_data_root_dir"),
+    ("fs.files",
+     [("metadata.hash", pymongo.ASCENDING)],
+     "files_hash"),
+    ("fs.files",
+     [("metadata.content_hash", pymongo.ASCENDING),
+      ("metadata.encoding", pymongo.ASCENDING)],
+     "files_content_hash"),
+    ("fs.files",
+     [("metadata.result_id", pymongo.ASCENDING),
+      ("metadata.file_type", pymongo.ASCENDING),
+      ("metadata.description", pymongo.ASCENDING)],
+     "files_result_id"),
+)
+
+# Index for each plugin result collection, named {data_type}_{type}_results
+PLUGIN_RESULTS_INDEX = ([("process.result_id", pymongo.ASCENDING)], "process_result_id")
+
 #
 # Utility functions
 #
+def create_indexes(db, logger=None):
+    """
+    Create the indexes the RAPD queries need, returning the names of the
+    indexes created or confirmed. Indexes already present are left alone,
+    so this is safe to run on every start.
+
+    Keyword arguments
+    db -- pymongo Database instance
+    logger -- logger instance (default = None)
+    """
+
+    indexes = list(INDEXES)
+
+    # Plugin result collections are created as plugins first report
+    for collection_name in db.list_collection_names():
+        if collection_name.endswith("_results") and collection_name != "results":
+            indexes.append((collection_name,) + PLUGIN_RESULTS_INDEX)
+
+    created = []
+    for collection_name, keys, name in indexes:
+        created.append("%s.%s" % (collection_name,
+                                  db[collection_name].create_index(keys, name=name)))
+        if logger:
+            logger.debug("Index %s on %s", name, collection_name)
+
+    return created
+
 def get_object_id(value):
     """Attempts to wrap ObjectIds to something reasonable"""
     return_val = None
@@ -152,6 +212,9 @@ class Database(object):
         # A lock for troublesome fast-acting data entry
         self.LOCK = threading.Lock()
 
+        # Plugin result collections known to have their index
+        self.indexed_collections = set()
+
     ############################################################################
     # Functions for connecting to the database                                 #
     ############################################################################
@@ -186,6 +249,14 @@ class Database(object):
 
         return db
 
+    def create_indexes(self):
+        """Make sure the indexes the queries need exist"""
+
+        db = self.get_db_connection()
+        created = create_indexes(db, self.logger)
+        self.indexed_collections.update(name.rsplit(".", 1)[0] for name in created)
+        return created
+
     ############################################################################
     # Functions for groups                                                     #
     ############################################################################
@@ -414,74 +485,50 @@ class Database(object):
                         self.logger.debug("Removing file with _id:%s", file_to_remove["_id"])
                         grid_bucket.delete(file_in_database["_id"])
 
-        def add_raw_file_to_db(path, metadata=None, replace=False):
-            """Add files to MongoDB"""
+        def add_file_to_db(path, metadata, encoding):
+            """
+            Add a file to MongoDB, streaming it a chunk at a time
 
-            self.logger.debug("add_raw_file_to_db path:%s metadata:%s", path, metadata)
+            The file is hashed first and not uploaded at all when the same
+            content is already stored with the same encoding
+            """
 
-            # See if we already have this file
-            file_in_database = db.fs.files.find_one({"metadata.hash":metadata["hash"]})
+            self.logger.debug("add_file_to_db path:%s metadata:%s encoding:%s", path, metadata, encoding)
 
-            # File already saved
-            if file_in_database:
-                # Overwrite
-                if replace:
-                    self.logger.debug("Overwriting file")
-                    # Open the path
-                    with open(path, "r") as input_object:
-                        file_id = grid_bucket.upload_from_stream(filename=os.path.basename(path),
-                                                                 source=input_object,
-                                                                 metadata=metadata)
-                # Do not overwrite
-                else:
-                    self.logger.debug("Not overwriting file")
-                    file_id = file_in_database["_id"]
-            # New file
-            else:
-                self.logger.debug("Writing new file")
-                # Open the path
-                with open(path, "r") as input_object:
-                    file_id = grid_bucket.upload_from_stream(filename=os.path.basename(path),
-                                                             source=input_object,
-                                                             metadata=metadata)
-            
-            return file_id
+            # Hash what is on disk - the plugin hash may be of something else
+            content_hash = archive.get_hash(path)
+            metadata = dict(metadata, content_hash=content_hash, encoding=encoding)
+            if not metadata.get("hash"):
+                metadata["hash"] = content_hash
 
-        def add_archive_file_to_db(path, metadata=None, replace=False):
-            """Add archive files to MongoDB - for use with client download"""
-            
-            self.logger.debug("add_archive_file_to_db path:%s metadata:%s", path, metadata)
-            
             # See if we already have this file
-            file_in_database = db.fs.files.find_one({"metadata.hash":metadata["hash"]})
-
-            # File already saved
+            file_in_database = db.fs.files.find_one({"metadata.content_hash":content_hash,
+                                                     "metadata.encoding":encoding},
+                                                    {"_id":1})
             if file_in_database:
-                # Overwrite
-                if replace:
-                    self.logger.debug("Overwriting file")
-                    # Encode file in base64
-                    b64_encoded = base64.b64encode(open(path, "r").read())
-                    # Save to MongoDB
-                    file_id = grid_bucket.upload_from_stream(filename=os.path.basename(path),
-                                                             source=b64_encoded,
-                                                             metadata=metadata)
-                # Do not overwrite
+                self.logger.debug("Already have %s as %s", path, file_in_database["_id"])
+                return file_in_database["_id"]
+
+            self.logger.debug("Writing new file")
+            with open(path, "rb") as input_object:
+                if encoding == "base64":
+                    source = archive.Base64Reader(input_object)
                 else:
-                    self.logger.debug("Not overwriting file")
-                    file_id = file_in_database["_id"]
-            # New file
-            else:
-                self.logger.debug("Writing new file")
-                # Encode file in base64
-                b64_encoded = base64.b64encode(open(path, "r").read())
-                # Save to MongoDB
+                    source = input_object
                 file_id = grid_bucket.upload_from_stream(filename=os.path.basename(path),
-                                                         source=b64_encoded,
+                                                         source=source,
                                                          metadata=metadata)
 
             return file_id
 
+        def add_raw_file_to_db(path, metadata=None):
+            """Add files to MongoDB"""
+            return add_file_to_db(path, metadata or {}, "raw")
+
+        def add_archive_file_to_db(path, metadata=None):
+            """Add archive files to MongoDB - for use with client download"""
+            return add_file_to_db(path, metadata or {}, "base64")
+
         add_funcs = {
             "archive_files":add_archive_file_to_db,
             "data_produced":add_raw_file_to_db,
@@ -549,6 +596,12 @@ class Database(object):
                           collection_name,
                           _result_id)
 
+        # New plugin types get their index the first time they report
+        if collection_name not in self.indexed_collections:
+            db[collection_name].create_index(PLUGIN_RESULTS_INDEX[0],
+                                             name=PLUGIN_RESULTS_INDEX[1])
+            self.indexed_collections.add(collection_name)
+
         # Debugging call to query db
         # debug_result = db[collection_name].find_one({"process.result_id":_result_id})
         # self.logger.debug("Found previous plugin result %s" % debug_result._id)
@@ -633,6 +686,56 @@ class Database(object):
     #     except:
     #         return(0, 0, 0, 0)
 
+    def update_plugin_result(self, plugin_patch):
+        """
+        Apply a patch from a plugin to its stored result. Returns False if
+        there is no stored result to patch.
+
+        Keyword argument
+        plugin_patch -- dict with plugin, process and patch keys, as made by
+                        utils.result_patch.ResultPatcher
+        """
+
+        self.logger.debug("update_plugin_result %s:%s", plugin_patch["plugin"]["type"], plugin_patch["process"])
+
+        # Connect to the database
+        db = self.get_db_connection()
+
+        now = datetime.datetime.utcnow()
+
+        _result_id = get_object_id(plugin_patch["process"].get("result_id"))
+
+        collection_name = ("%s_%s_results" % (plugin_patch["plugin"]["data_type"],
+                                              plugin_patch["plugin"]["type"])).lower()
+
+        # Targeted update of just what changed
+        to_set = {"timestamp":now}
+        for path, value in plugin_patch["patch"].get("set", {}).iteritems():
+            # Keep the ObjectIds in the process dict
+            if path.startswith("process.") and "_id" in path:
+                value = get_object_id(value)
+            to_set[path] = value
+        update = {"$set":to_set}
+        if plugin_patch["patch"].get("unset"):
+            update["$unset"] = dict((path, "") for path in plugin_patch["patch"]["unset"])
+
+        result = db[collection_name].update_one({"process.result_id":_result_id}, update)
+        if result.matched_count == 0:
+            self.logger.debug("No %s result %s to patch", collection_name, _result_id)
+            return False
+
+        # Keep the summary in results current
+        db.results.update_one(
+            {"_id":_result_id},
+            {"$set":{
+                "repr":plugin_patch["process"].get("repr", "Unknown"),
+                "status":plugin_patch["process"].get("status", 0),
+                "timestamp":now,
+                }
+            })
+
+        return True
+
     def updateParentProcess(self, plugin_result):
         """
         Update a parent process with the result now passed in
@@ -748,10 +851,10 @@ class Database(object):
                  "start_image_number":run_data.get("start_image_number", None),
                  "number_images":run_data.get("number_images", None)}
 
-        # Limit to a time window
+        # Limit to runs added in the last minutes
         if minutes != 0:
-            time_limit = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
-            query.update({"timestamp":{"$lt":time_limit}})
+            time_limit = datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes)
+            query.update({"timestamp":{"$gte":time_limit}})
 
         # self.logger.debug(query)
         # self.logger.debug(projection)
@@ -816,10 +919,10 @@ class Database(object):
                  "run_number":run_number,
                  "start_image_number":{"$lte":image_number}}
 
-        # Limit to a time window
+        # Limit to runs added in the last minutes
         if minutes != 0:
-            time_limit = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
-            query.update({"timestamp":{"$lt":time_limit}})
+            time_limit = datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes)
+            query.update({"timestamp":{"$gte":time_limit}})
 
         # Projection determined by return_type
         if return_type in ("boolean", "id"):
@@ -34,6 +34,7 @@ import sys
 import time
 
 # RAPD imports
+from database.mongodb_adapter import create_indexes
 import utils.text as text
 
 # Constants
@@ -252,6 +253,23 @@ def insert_group(mongouri, new_group):
 #                             username=username,
 #                             password=password)
 
+def ensure_indexes(mongouri):
+    """
+    Create any missing indexes the RAPD queries need
+
+    Keyword arguments
+    mongouri -- the MongoDB connection string in URI format
+    """
+
+    print "Checking the RAPD database indexes"
+
+    client = pymongo.MongoClient(mongouri)
+
+    db = client.rapd
+
+    for index in create_indexes(db):
+        print text.green+"  %s" % index + text.stop
+
 def get_commandline():
     """Get the commandline variables and handle them"""
 
@@ -275,6 +293,12 @@ def get_commandline():
                         dest="add_group",
                         help="Add group to database")
 
+    # Create indexes
+    parser.add_argument("-i", "--indexes",
+                        action="store_true",
+                        dest="indexes",
+                        help="Create any missing indexes")
+
     # Directory or files
     parser.add_argument(action="store",
                         dest="mongouri",
@@ -319,6 +343,9 @@ def main():
         # For Development
         # perform_naive_install(hostname, port, username, password)
 
+    if args.indexes:
+        ensure_indexes(mongouri=MONGO_URI)
+
     if args.add_group:
         print "Adding a group..."
         groupname = raw_input("  Name: ")
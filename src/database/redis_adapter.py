@@ -582,6 +582,15 @@ class Database:
         value = self.redis.brpop(keys, timeout)
         return value
 
+    @connectionErrorWrapper
+    def brpoplpush(self, list1, list2, timeout=0):
+        """
+        BRPOPLPUSH block until a value can be popped off list1 and pushed
+        onto list2, returning the value or None on timeout
+        """
+        value = self.redis.brpoplpush(list1, list2, timeout)
+        return value
+
     @connectionErrorWrapper
     def llen(self, key):
         """
@@ -605,6 +614,14 @@ class Database:
         """
         self.redis.lpush(key, value)
 
+    @connectionErrorWrapper
+    def lrem(self, key, count, value):
+        """
+        LREM remove count occurrences of value from a given list
+        """
+        # Sent raw as redis.Redis and redis.StrictRedis disagree on argument order
+        return self.redis.execute_command("LREM", key, count, value)
+
     @connectionErrorWrapper
     def rpop(self, key):
         """
@@ -613,17 +630,108 @@ class Database:
         value = self.redis.rpop(key)
         return value
     
+    @connectionErrorWrapper
+    def rpop_batch(self, key, count):
+        """
+        RPOP up to count values off a given list in one round trip
+
+        Values are returned oldest first, which is the order repeated rpop
+        calls would have returned them. The LRANGE and LTRIM are run in a
+        MULTI/EXEC pipeline so concurrent LPUSHes are not lost.
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lrange(key, -count, -1)
+        pipe.ltrim(key, 0, -count-1)
+        values, __ = pipe.execute()
+        values.reverse()
+        return values
+
     @connectionErrorWrapper
     def rpoplpush(self, list1, list2):
         """
         RPOPLPUSH pop a value off a given list and push on another list
         """
         value = self.redis.rpoplpush(list1, list2)
-        #return value
-               
+        return value
+
+    @connectionErrorWrapper
+    def rpush(self, key, value):
+        """
+        RPUSH a value onto the tail of a given list, so it is next to be RPOPed
+        """
+        self.redis.rpush(key, value)
+
+    @connectionErrorWrapper
+    def track_in_flight(self, list_key, hash_key, field, value):
+        """
+        Move value from a list into field of a hash in one transaction
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(hash_key, field, value)
+        pipe.execute_command("LREM", list_key, 1, value)
+        pipe.execute()
+
+    @connectionErrorWrapper
+    def lpush_notify(self, key, value, signal_key, signal_length=1000):
+        """
+        LPUSH a value onto a list and a token onto signal_key in one
+        transaction, so a consumer blocked on signal_key wakes up
+
+        The signal list is trimmed to signal_length tokens in case nothing
+        is consuming it.
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lpush(key, value)
+        pipe.lpush(signal_key, 1)
+        pipe.ltrim(signal_key, 0, signal_length-1)
+        pipe.execute()
+
+    @connectionErrorWrapper
+    def rpush_notify(self, key, value, signal_key, signal_length=1000):
+        """
+        RPUSH a value onto the tail of a list, so it is next to be RPOPed,
+        and a token onto signal_key in one transaction
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.rpush(key, value)
+        pipe.lpush(signal_key, 1)
+        pipe.ltrim(signal_key, 0, signal_length-1)
+        pipe.execute()
+
+    @connectionErrorWrapper
+    def notify(self, signal_key, count=1, signal_length=1000):
+        """
+        LPUSH count tokens onto signal_key, waking as many blocked consumers
+        """
+        if count < 1:
+            return
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lpush(signal_key, *([1] * count))
+        pipe.ltrim(signal_key, 0, signal_length-1)
+        pipe.execute()
+
+    @connectionErrorWrapper
+    def record_wait(self, key, name, wait):
+        """
+        Add a wait time in seconds to the count, total and last fields for
+        name in the hash stored at key
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(key, name+":count", 1)
+        pipe.hincrbyfloat(key, name+":wait_total", wait)
+        pipe.hset(key, name+":wait_last", wait)
+        pipe.execute()
+
     ##############
     # HASH Methods
     ##############
+    @connectionErrorWrapper
+    def hdel(self, key, field):
+        """
+        HDEL field from a key
+        """
+        return self.redis.hdel(key, field)
+
     @connectionErrorWrapper
     def hget(self, key, field):
         """
@@ -664,6 +772,23 @@ class Database:
         # print "publish {} {}".format(key, value)
         self.redis.publish(key, value)
 
+    @connectionErrorWrapper
+    def set_publish(self, keys, value, channel, expire_time=None):
+        """
+        Set value at each of keys and publish it on channel in one round trip
+
+        expire_time is a dict of key:seconds for keys to expire
+        """
+        expire_time = expire_time or {}
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            if key in expire_time:
+                pipe.setex(key, expire_time[key], value)
+            else:
+                pipe.set(key, value)
+        pipe.publish(channel, value)
+        pipe.execute()
+
     ####################
     # EXPIRATION Methods
     ####################
@@ -698,12 +823,12 @@ class Database:
     #         self._raise_ConnectionError(error)
 
     @connectionErrorWrapper
-    def get_message(self, id):
+    def get_message(self, id, timeout=0):
         """
-        Get message on pubsub connection
+        Get message on pubsub connection, waiting up to timeout seconds for one
         """
 
-        message = self.pubsubs[id].get_message()
+        message = self.pubsubs[id].get_message(timeout=timeout)
 
         return message
 
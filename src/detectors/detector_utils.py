@@ -41,68 +41,12 @@ import h5py
 from iotbx.detectors import ImageFactory
 
 # RAPD imports
+import detectors.hdf5_header as hdf5_header
 import utils.convert_hdf5_cbf as convert_hdf5_cbf
 import utils.text as text
 import detector_list
 
 
-parameters_to_get = (
-    "beam_center_x",
-    "beam_center_y",
-    ####
-    "chi",
-    "chi_end",
-    "chi_increment",
-    "chi_range_average",
-    "chi_range_total",
-    "chi_start",
-    "data_collection_date",
-    "kappa",
-    "kappa_end",
-    "kappa_increment",
-    "kappa_range_average",
-    "kappa_range_total",
-    "kappa_start",
-    "omega",
-    "omega_end",
-    "omega_increment",
-    "omega_range_average",
-    "omega_range_total",
-    "omega_start",
-    "phi",
-    "phi_end",
-    "phi_increment",
-    "phi_range_average",
-    "phi_range_total",
-    "phi_start",
-    ####
-    "incident_wavelength",
-    ####
-    "bit_depth_image",
-    "bit_depth_readout",
-    "count_time",
-    "detector_distance",
-    "detector_number",
-    "detector_readout_time",
-    "frame_count_time",
-    "frame_period",
-    "frame_time",
-    "number_of_excluded_pixels",
-    # "pixel_mask",
-    "sensor_thickness",
-    "threshold_energy",
-    "two_theta",
-    "two_theta_end",
-    "two_theta_increment",
-    "two_theta_range_average",
-    "two_theta_range_total",
-    "two_theta_start",
-    "x_pixel_size",
-    "x_pixels_in_detector",
-    "y_pixel_size",
-    "y_pixels_in_detector",
-)
-
 def print_detector_info(image):
     """
     Print out information on the detector given an image
@@ -431,33 +375,14 @@ def print_hdf5_header_info(file_name):
         print "%20s::%s" % (key, header[key])
     print ""
 
-def read_hdf5_header(file_name) :
-    """Searched the HDF5 file header for information and returns a dict"""
-    h5_file = h5py.File(file_name, 'r') # open read-only
-    # item = h5_file #["/Configure:0000/Run:0000"]
-    header = {}
-    interrogate_hdf5_item_structure("root", h5_file, header)
-    h5_file.close()
-    return header
-
-def interrogate_hdf5_item_structure(key, g, header) :
-    """Prints the input file/group/dataset (g) name and begin iterations on its content"""
-
-
-    if isinstance(g, h5py.Dataset):
-        # print "dataset"
-        if key in parameters_to_get:
-            header[key] = g.value
-
-    if isinstance(g, h5py.File) or isinstance(g, h5py.Group):
-        # print "file"
-        for new_key, val in dict(g).iteritems():
-            # print new_key, val
-            subg = val
-            #print offset, key, #,"   ", subg.name #, val, subg.len(), type(subg),
-            interrogate_hdf5_item_structure(new_key, subg, header)
+def read_hdf5_header(file_name):
+    """
+    Reads the header information from an HDF5 master file and returns a dict
 
-    return header
+    Only the NeXus paths holding header values are read, so the data files
+    linked from the master file are not opened
+    """
+    return hdf5_header.read_header(file_name)
 
 def get_resolution_at_edge(xdsinp):
     # Calculate the detector distance or a resolution
@@ -0,0 +1,248 @@
+"""
+Header reading for Dectris HDF5 master files
+
+Header values are read from their NeXus paths directly instead of walking
+the file, so the external links to the data files are never opened.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import os
+import threading
+
+import h5py
+
+# NeXus groups in a Dectris master file
+DETECTOR = "/entry/instrument/detector"
+DETECTOR_SPECIFIC = DETECTOR + "/detectorSpecific"
+DETECTOR_GONIOMETER = DETECTOR + "/goniometer"
+BEAM = "/entry/instrument/beam"
+GONIOMETER = "/entry/sample/goniometer"
+
+# The dataset holding the detector model, used to cache resolved paths
+MODEL_PATH = DETECTOR + "/description"
+# The group linking to the data files
+DATA = "/entry/data"
+
+# Header values from the detector. countrate_correction_count_cutoff,
+# nimages and ntrigger were not read by the old walk of the file, and are
+# used to write CBF headers and count the images of a run.
+DETECTOR_KEYS = (
+    "beam_center_x",
+    "beam_center_y",
+    "bit_depth_image",
+    "bit_depth_readout",
+    "count_time",
+    "countrate_correction_count_cutoff",
+    "data_collection_date",
+    "detector_distance",
+    "detector_number",
+    "detector_readout_time",
+    "frame_count_time",
+    "frame_period",
+    "frame_time",
+    "nimages",
+    "ntrigger",
+    "number_of_excluded_pixels",
+    "sensor_thickness",
+    "threshold_energy",
+    "x_pixel_size",
+    "x_pixels_in_detector",
+    "y_pixel_size",
+    "y_pixels_in_detector",
+)
+
+# Header values from the sample goniometer
+GONIOMETER_KEYS = tuple("%s%s" % (axis, suffix)
+                        for axis in ("chi", "kappa", "omega", "phi")
+                        for suffix in ("", "_end", "_increment", "_range_average",
+                                       "_range_total", "_start"))
+
+# Header values from the detector goniometer
+TWO_THETA_KEYS = ("two_theta",
+                  "two_theta_end",
+                  "two_theta_increment",
+                  "two_theta_range_average",
+                  "two_theta_range_total",
+                  "two_theta_start")
+
+# Header key -> NeXus paths to look in, in order
+HEADER_PATHS = {"incident_wavelength":(BEAM + "/incident_wavelength",)}
+for _key in DETECTOR_KEYS:
+    HEADER_PATHS[_key] = (DETECTOR + "/" + _key, DETECTOR_SPECIFIC + "/" + _key)
+for _key in GONIOMETER_KEYS:
+    HEADER_PATHS[_key] = (GONIOMETER + "/" + _key,)
+for _key in TWO_THETA_KEYS:
+    HEADER_PATHS[_key] = (DETECTOR_GONIOMETER + "/" + _key, GONIOMETER + "/" + _key)
+
+# Detector model -> {header key:path found in files from that model}
+_resolved_paths = {}
+_resolved_lock = threading.Lock()
+
+def get_dataset(h5_file, path):
+    """
+    Return the dataset at path, or None if there is none
+
+    Each link on the way is checked without following it, so a path through
+    an external link returns None rather than opening another file.
+    """
+
+    node = h5_file
+    for name in path.strip("/").split("/"):
+        if not isinstance(node, h5py.Group):
+            return None
+        if not node.id.links.exists(name):
+            return None
+        if node.id.links.get_info(name).type == h5py.h5l.TYPE_EXTERNAL:
+            return None
+        node = node[name]
+
+    if isinstance(node, h5py.Dataset):
+        return node
+    return None
+
+def get_model(h5_file):
+    """Return the detector model of a master file, or None"""
+
+    dataset = get_dataset(h5_file, MODEL_PATH)
+    if dataset is None:
+        return None
+    return str(dataset[()]).strip()
+
+def resolve_path(h5_file, key):
+    """Return the first path for key present in the file, or None"""
+
+    for path in HEADER_PATHS[key]:
+        if get_dataset(h5_file, path) is not None:
+            return path
+    return None
+
+def read_header(file_name):
+    """
+    Return a dict of header values from an HDF5 master file
+
+    Keys are the dataset names in HEADER_PATHS. Values missing from the
+    file are left out.
+    """
+
+    header = {}
+
+    with h5py.File(file_name, "r") as h5_file:
+
+        model = get_model(h5_file)
+        with _resolved_lock:
+            paths = dict(_resolved_paths.get(model, {}))
+
+        changed = False
+        for key in HEADER_PATHS:
+            path = paths.get(key, False)
+            dataset = None
+            if path:
+                dataset = get_dataset(h5_file, path)
+            # Not looked for yet, or not where this model had it before
+            if dataset is None and (path is False or path):
+                path = resolve_path(h5_file, key)
+                paths[key] = path
+                changed = True
+                if path:
+                    dataset = get_dataset(h5_file, path)
+            if dataset is not None:
+                header[key] = dataset[()]
+
+        if changed and model:
+            with _resolved_lock:
+                _resolved_paths[model] = paths
+
+    return header
+
+def get_data_links(h5_file):
+    """
+    Return [(file name, dataset path), ...] for the frame data of an open
+    master file, in image number order
+
+    Data in external files is returned by the link target, without opening
+    the data file. Relative file names are taken from the master file
+    directory.
+    """
+
+    directory = os.path.dirname(os.path.abspath(h5_file.filename))
+    data_links = []
+
+    data_group = h5_file[DATA]
+    for name in sorted(data_group.keys()):
+        if not name.startswith("data_"):
+            continue
+        link = data_group.get(name, getlink=True)
+        if isinstance(link, h5py.ExternalLink):
+            data_links.append((os.path.join(directory, link.filename), link.path))
+        else:
+            data_links.append((os.path.abspath(h5_file.filename), DATA + "/" + name))
+
+    return data_links
+
+def get_image_numbers(file_name, dataset_path, first=1):
+    """
+    Return (first, last) image numbers held by a data file
+
+    The image_nr_low and image_nr_high attributes Dectris writes are used,
+    falling back to the length of the dataset counted from first.
+    """
+
+    with h5py.File(file_name, "r") as h5_file:
+        dataset = h5_file[dataset_path]
+        first = int(dataset.attrs.get("image_nr_low", first))
+        last = int(dataset.attrs.get("image_nr_high", first + dataset.shape[0] - 1))
+
+    return first, last
+
+def get_frame_range(master_file):
+    """
+    Return (first, last) image numbers of the frames on disk for a master
+    file, or (0, 0) if there are none
+
+    Data files are counted in order up to the first one missing or not yet
+    readable, so the range never has gaps.
+    """
+
+    try:
+        with h5py.File(master_file, "r") as h5_file:
+            data_links = get_data_links(h5_file)
+    except (IOError, KeyError):
+        return 0, 0
+
+    first, last = 0, 0
+    for file_name, dataset_path in data_links:
+        if not os.path.exists(file_name):
+            break
+        try:
+            low, high = get_image_numbers(file_name, dataset_path, last + 1)
+        except (IOError, KeyError):
+            break
+        if not first:
+            first = low
+        last = high
+
+    return first, last
@@ -0,0 +1,196 @@
+"""
+Header reading for the miniCBF files written by Dectris Pilatus and Eiger
+detectors
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import re
+import time
+
+# The last line of the header before the binary data
+HEADER_END = "X-Binary-Size-Padding"
+# Bytes read at a time looking for the end of the header
+READ_SIZE = 4096
+# Most bytes read before giving up on finding the end of the header
+MAX_HEADER_SIZE = 65536
+
+# The key of a header line - "# Wavelength 0.97918 A" -> Wavelength
+LINE_KEY = re.compile(r"(?:#\s)?([A-Za-z][\w\-]*)")
+# The key of a header item pattern - "^# Wavelength\s*([\d\.]+) A" -> Wavelength
+# Only patterns anchored to the start of a line, with the key ending in
+# whitespace, a colon or an equals sign, are looked up by key
+PATTERN_KEY = re.compile(r"\^(?:#(?: |\\s))?([A-Za-z][\w\-]*)(?:[ :]|\\[s:=(])")
+
+def mmorm(x):
+    """Return a detector distance in mm from a header value in m or mm"""
+    d = float(x)
+    if d < 2:
+        return d*1000
+    else:
+        return d
+
+# Header label:(pattern, transform) for the items of a Dectris miniCBF
+# header. Detector modules take them through header_items.
+HEADER_ITEMS = {
+    "beam_x": ("^# Beam_xy\s*\(([\d\.]+)\,\s[\d\.]+\) pixels", lambda x: float(x)),
+    "beam_y": ("^# Beam_xy\s*\([\d\.]+\,\s([\d\.]+)\) pixels", lambda x: float(x)),
+    "count_cutoff": ("^# Count_cutoff\s*(\d+) counts", lambda x: int(x)),
+    "detector_sn": ("S\/N ([\w\d\-]*)\s*", lambda x: str(x)),
+    "date": ("^# ([\d\-]+T[\d\.\:]+)\s*", lambda x: str(x)),
+    "distance": ("^# Detector_distance\s*([\d\.]+) m", mmorm),
+    "excluded_pixels": ("^# Excluded_pixels\:\s*([\w\.]+)", lambda x: str(x)),
+    "flat_field": ("^# Flat_field\:\s*([\(\)\w\.]+)", lambda x: str(x)),
+    "gain": ("^# Gain_setting\:\s*([\s\(\)\w\.\-\=]+)", lambda x: str(x).rstrip()),
+    "n_excluded_pixels": ("^# N_excluded_pixels\s\=\s*(\d+)", lambda x: int(x)),
+    "osc_range": ("^# Angle_increment\s*([\d\.]*)\s*deg", lambda x: float(x)),
+    "osc_start": ("^# Start_angle\s*([\d\.]+)\s*deg", lambda x: float(x)),
+    "period": ("^# Exposure_period\s*([\d\.]+) s", lambda x: float(x)),
+    "pixel_size": ("^# Pixel_size\s*(\d+)e-6 m.*", lambda x: int(x)/1000),
+    "sensor_thickness": ("^#\sSilicon\ssensor\,\sthickness\s*([\d\.]+)\sm", lambda x: float(x)*1000),
+    "tau": ("^#\sTau\s\=\s*([\d\.]+e\-09) s", lambda x: float(x)),
+    "threshold": ("^#\sThreshold_setting\:\s*(\d+)\seV", lambda x: int(x)),
+    "time": ("^# Exposure_time\s*([\d\.]+) s", lambda x: float(x)),
+    "transmission": ("^# Filter_transmission\s*([\d\.]+)", lambda x: float(x)),
+    "trim_file": ("^#\sTrim_file\:\s*([\w\.]+)", lambda x:str(x).rstrip()),
+    "twotheta": ("^# Detector_2theta\s*([\d\.]*)\s*deg", lambda x: float(x)),
+    "wavelength": ("^# Wavelength\s*([\d\.]+) A", lambda x: float(x)),
+    "size1": ("X-Binary-Size-Fastest-Dimension:\s*([\d\.]+)", lambda x: int(x)),
+    "size2": ("X-Binary-Size-Second-Dimension:\s*([\d\.]+)", lambda x: int(x)),
+    }
+
+def header_items(labels=None, exclude=(), overrides=None):
+    """
+    Return the header items of a detector, taken from HEADER_ITEMS
+
+    Keyword arguments
+    labels -- labels of HEADER_ITEMS to take, all if None (default = None)
+    exclude -- labels of HEADER_ITEMS to leave out (default = ())
+    overrides -- dict of label:(pattern, transform) replacing or adding to
+                 the items taken (default = None)
+    """
+
+    if labels is None:
+        labels = HEADER_ITEMS.keys()
+    items = dict((label, HEADER_ITEMS[label]) for label in labels if label not in exclude)
+    items.update(overrides or {})
+    return items
+
+def read_header_block(image, logger=False, attempts=10, delay=0.1):
+    """
+    Return the text header of a miniCBF file, reading only as far as the
+    end of the header
+
+    Keyword arguments
+    image -- full path name of the image file
+    logger -- logger instance (default = False)
+    attempts -- times to try opening the file (default = 10)
+    delay -- seconds between attempts (default = 0.1)
+    """
+
+    count = 0
+    while True:
+        try:
+            with open(image, "rb") as raw:
+                header = ""
+                position = -1
+                while len(header) < MAX_HEADER_SIZE:
+                    chunk = raw.read(READ_SIZE)
+                    if not chunk:
+                        break
+                    # The marker may span two chunks
+                    start = max(0, len(header) - len(HEADER_END))
+                    header += chunk
+                    if position < 0:
+                        position = header.find(HEADER_END, start)
+                    if position >= 0:
+                        end = header.find("\n", position)
+                        if end >= 0:
+                            return header[:end+1]
+                return header
+        except IOError:
+            count += 1
+            if logger:
+                logger.exception("Error opening %s" % image)
+            if count >= attempts:
+                raise
+            time.sleep(delay)
+
+class HeaderParser(object):
+    """
+    Header item patterns compiled once and matched in a single pass over the
+    lines of a header
+
+    Each item is label:(pattern, transform), as in the detector modules. The
+    value for a label is transform applied to the last match of pattern, or
+    None if there is no match.
+    """
+
+    def __init__(self, header_items):
+        """
+        Keyword arguments
+        header_items -- dict of label:(pattern, transform)
+        """
+
+        self.labels = header_items.keys()
+
+        # key of the line -> items that can only match on that line
+        self.keyed_items = {}
+        # Items that could match anywhere
+        self.other_items = []
+
+        for label, (pattern, transform) in header_items.iteritems():
+            item = (label, re.compile(pattern, re.MULTILINE), transform)
+            key = PATTERN_KEY.match(pattern)
+            if key:
+                self.keyed_items.setdefault(key.group(1), []).append(item)
+            else:
+                self.other_items.append(item)
+
+    def parse(self, header):
+        """Return a dict of label:value for a header"""
+
+        found = {}
+
+        for line in header.splitlines(True):
+            key = LINE_KEY.match(line)
+            if not key:
+                continue
+            for label, pattern, transform in self.keyed_items.get(key.group(1), ()):
+                matches = pattern.findall(line)
+                if matches:
+                    found[label] = (transform, matches[-1])
+
+        for label, pattern, transform in self.other_items:
+            matches = pattern.findall(header)
+            if matches:
+                found[label] = (transform, matches[-1])
+
+        parameters = dict.fromkeys(self.labels)
+        for label, (transform, match) in found.iteritems():
+            parameters[label] = transform(match)
+
+        return parameters
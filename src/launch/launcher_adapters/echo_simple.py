@@ -117,6 +117,9 @@ class LauncherAdapter(object):
     def process(self):
         """The main action of the adapter"""
 
+        # Nothing more to start, so acknowledge to the launcher
+        launch_tools.acknowledge_command(self.message, self.redis)
+
         # Set status on message to done
         self.message["process"]["status"] = 100
 
@@ -0,0 +1,108 @@
+"""
+Provides a launcher adapter that runs jobs in a pool of warm plugin workers
+on the current machine
+"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+import logging
+
+# RAPD imports
+from launch.worker_pool import PluginWorkerPool, POOL_SIZE, MAX_JOBS_PER_WORKER
+from utils.modules import load_module
+
+# One pool per launcher process
+POOL = None
+
+def get_pool(site, settings):
+    """
+    Return the worker pool, starting it on first use
+
+    Keys read from the launcher specification (settings):
+    pool_size -- number of concurrent jobs (default = POOL_SIZE)
+    max_jobs_per_worker -- jobs before a worker is recycled (default = MAX_JOBS_PER_WORKER)
+    preload -- commands whose plugins are imported up front (default = all)
+    """
+    global POOL
+
+    if POOL is None:
+        POOL = PluginWorkerPool(site=site,
+                                size=int(settings.get("pool_size", POOL_SIZE)),
+                                max_jobs=int(settings.get("max_jobs_per_worker",
+                                                          MAX_JOBS_PER_WORKER)),
+                                preload=settings.get("preload", None))
+    return POOL
+
+def has_capacity():
+    """Return True if a worker is free for another job"""
+
+    if POOL is None:
+        return True
+    return POOL.available() > 0
+
+def stop_pool():
+    """Shut down the worker pool, letting running jobs finish"""
+    global POOL
+
+    if POOL is not None:
+        POOL.stop()
+        POOL = None
+
+class LauncherAdapter(object):
+    """
+    An adapter for launcher process.
+
+    Will hand the requested job to a warm plugin worker on the current machine
+    """
+
+    def __init__(self, site, message, settings):
+        """
+        Initialize the adapter
+        """
+
+        # Get the logger Instance
+        self.logger = logging.getLogger("RAPDLogger")
+        self.logger.debug("__init__")
+
+        self.site = site
+        self.message = message
+        self.settings = settings
+
+        self.run()
+
+    def run(self):
+        """
+        Orchestrate the adapter's actions
+        """
+        # Check if command is ECHO
+        if self.message['command'] == 'ECHO':
+            # Load the simple_echo module
+            echo = load_module(seek_module='launch.launcher_adapters.echo_simple')
+            # send message to simple_echo
+            echo.LauncherAdapter(self.site, self.message, self.settings)
+        else:
+            # The worker adjusts the working directory and runs the plugin
+            self.logger.debug("Submitting %s to worker pool", self.message["command"])
+            get_pool(self.site, self.settings).submit(self.message)
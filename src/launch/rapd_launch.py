@@ -33,6 +33,7 @@ import sys
 
 # RAPD imports
 import utils.commandline
+import utils.launch_tools as launch_tools
 import utils.log
 from utils.modules import load_module
 import utils.site
@@ -83,6 +84,19 @@ class Launch(object):
 
         plugin.start()
 
+        # Let the launcher know the job is under way
+        self.acknowledge()
+
+    def acknowledge(self):
+        """
+        Acknowledge the command to the launcher that dispatched it
+        """
+
+        if self.command.get("process", {}).get("launcher_ack"):
+            redis_database = importlib.import_module('database.redis_adapter')
+            redis = redis_database.Database(settings=self.site.CONTROL_DATABASE_SETTINGS)
+            launch_tools.acknowledge_command(self.command, redis)
+
     def load_command(self):
         """
         Load and parse the command file
@@ -38,6 +38,8 @@ import time
 
 # RAPD imports
 from utils.commandline import base_parser
+from utils.job_lanes import JobLanes
+import utils.launch_tools as launch_tools
 from utils.lock import lock_file, close_lock_file
 import utils.log
 from utils.modules import load_module
@@ -53,6 +55,8 @@ import multiprocessing
 from multiprocessing.util import Finalize
 
 BUFFER_SIZE = 8192
+JOB_WAIT_TIMEOUT = 1    # Seconds to block waiting for a job before checking in
+CAPACITY_WAIT = 0.1     # Seconds between checks on a full adapter
 
 class Launcher(object):
     """
@@ -61,6 +65,7 @@ class Launcher(object):
     """
 
     adapter = None
+    adapter_module = None
     ip_address = None
     launcher = None
     tag = None
@@ -112,34 +117,47 @@ class Launcher(object):
             self.ow_registrar.register({"site_id":json.dumps(self.launcher.get('site_tag')),
                                         "job_list":self.job_list})
 
+        # Jobs left un-acknowledged by a previous run of this launcher
+        requeued = launch_tools.requeue_in_flight(self.redis,
+                                                  self.job_list,
+                                                  self.job_list,
+                                                  self.job_lanes)
+        if requeued and self.logger:
+            self.logger.info("Requeued %d in-flight jobs onto %s", requeued, self.job_list)
+
         try:
-            timer = 0
+            ow_last_update = 0
             # This is the server portion of the code
             while self.running:
                 # Have Registrar update status every second
-                if round(timer%1,1) in (0.0,1.0):
+                if time.time() - ow_last_update >= 1:
                     if self.overwatch_id:
                         #self.ow_registrar.update({"site_id":self.site.ID,
                         self.ow_registrar.update({"site_id":json.dumps(self.launcher.get('site_tag')),
                                                   "job_list":self.job_list})
                         #self.ow_registrar.update({"job_list":self.job_list})
+                    ow_last_update = time.time()
+
+                # Leave jobs in their lanes until the adapter can start one,
+                # so a later high priority job is not stuck behind them
+                if not self.has_capacity():
+                    time.sleep(CAPACITY_WAIT)
+                    continue
 
-                # Look for a new command
+                # Block for a new command, holding it in the in-flight list
+                # until the plugin acknowledges it has started
                 # This will throw a redis.exceptions.ConnectionError if redis is unreachable
-                #command = self.redis.brpop(["RAPD_JOBS",], 5)
                 try:
-                    while self.redis.llen(self.job_list) != 0:
-                        command = self.redis.rpop(self.job_list)
-                        # Handle the message
-                        if command:
-                            self.handle_command(json.loads(command))
-
-                            # Only run 1 command
-                            # self.running = False
-                            # break
-                    # sleep a little when jobs aren't coming in.
-                    time.sleep(0.2)
-                    timer += 0.2
+                    raw_command, lane = self.job_lanes.pop(self.redis,
+                                                           self.job_list,
+                                                           self.in_flight_list,
+                                                           JOB_WAIT_TIMEOUT)
+                    # Handle the message
+                    if raw_command:
+                        command = json.loads(raw_command)
+                        self.job_lanes.record(self.redis, self.job_list, lane, command)
+                        self.track_command(command, raw_command)
+                        self.handle_command(command)
                 except redis.exceptions.ConnectionError:
                     if self.logger:
                         self.logger.exception("Remote Redis is not up. Waiting for Sentinal to switch to new host")
@@ -157,6 +175,9 @@ class Launcher(object):
         if self.pool:
             self.pool.close()
             self.pool.join()
+        # Let adapters with their own workers finish up
+        if hasattr(self.adapter_module, "stop_pool"):
+            self.adapter_module.stop_pool()
         # Tell overwatch it is closing
         if self.overwatch_id:
             self.ow_registrar.stop()
@@ -168,6 +189,34 @@ class Launcher(object):
         self.redis = redis_database.Database(settings=self.site.CONTROL_DATABASE_SETTINGS, 
                                              logger=self.logger)
 
+    def has_capacity(self):
+        """Return True if the adapter can start another job now"""
+
+        if hasattr(self.adapter_module, "has_capacity"):
+            return self.adapter_module.has_capacity()
+        return True
+
+    def track_command(self, command, raw_command):
+        """
+        Move a newly popped command into the in-flight hash and tag it so the
+        plugin can acknowledge it
+
+        Keyword arguments:
+        command -- decoded command, modified in place
+        raw_command -- command as popped from redis
+        """
+        job_id = str(ObjectId())
+
+        self.redis.track_in_flight(self.in_flight_list,
+                                   self.in_flight_jobs,
+                                   job_id,
+                                   raw_command)
+
+        if not command.get("process"):
+            command["process"] = {}
+        command["process"]["launcher_ack"] = {"key":self.in_flight_jobs,
+                                              "id":job_id}
+
     def handle_command(self, command):
         """
         Handle an incoming command
@@ -239,11 +288,15 @@ s IP address (%s), but not for the input tag (%s)" % (self.ip_address, self.tag)
         else:
             # Get the job_list to watch for this launcher
             self.job_list = self.launcher.get('job_list')
+            self.in_flight_list, self.in_flight_jobs = launch_tools.in_flight_keys(self.job_list)
+            # Priority lanes of the job_list
+            self.job_lanes = JobLanes(self.site.LAUNCHER_SETTINGS.get("JOB_LANES"))
 
     def check_settings(self):
         """Check if additional params in self.launcher need setup."""
         # Check if a multiprocessing.Pool needs to be setup for launcher adapter.
-        if self.tag == 'shell':
+        # The shell_pool adapter runs its own pool of plugin workers.
+        if self.tag == 'shell' and self.launcher.get('adapter') != 'shell_pool':
             if self.launcher.get('pool_size', False):
                 size = self.launcher.get('pool_size')
             else:
@@ -256,9 +309,14 @@ s IP address (%s), but not for the input tag (%s)" % (self.ip_address, self.tag)
 
         # Import the database adapter as database module
         
-        self.adapter = load_module(
+        self.adapter_module = load_module(
             seek_module=self.launcher["adapter"],
-            directories=self.site.LAUNCHER_SETTINGS["RAPD_LAUNCHER_ADAPTER_DIRECTORIES"]).LauncherAdapter
+            directories=self.site.LAUNCHER_SETTINGS["RAPD_LAUNCHER_ADAPTER_DIRECTORIES"])
+        self.adapter = self.adapter_module.LauncherAdapter
+
+        # Start long-lived workers now so they are warm for the first job
+        if hasattr(self.adapter_module, "get_pool"):
+            self.adapter_module.get_pool(self.site, self.launcher)
 
         if self.logger:
             self.logger.debug(self.adapter)
@@ -39,6 +39,7 @@ from threading import Thread
 # RAPD imports
 import utils.launch_tools as launch_tools
 from utils.commandline import base_parser
+from utils.job_lanes import JobLanes
 #from utils.lock import file_lock
 import utils.site
 import utils.log
@@ -49,11 +50,18 @@ from utils.text import json
 
 # Timer (s) for checking which launchers are alive.
 TIMER = 5
+# Seconds to block waiting for a job before checking on the launchers
+JOB_WAIT_TIMEOUT = 1
+# Where jobs sit between RAPD_JOBS and a launcher job list
+DISPATCH_LIST = "RAPD_JOBS_DISPATCHING"
 
 class Launcher_Manager(Thread):
     """
     Listens to the 'RAPD_JOBS'list and sends jobs to proper
     launcher.
+
+    Jobs are taken from the priority lanes of RAPD_JOBS and pushed onto the
+    same lane of the launcher job list.
     """
     def __init__(self, site, logger=False, overwatch_id=False):
         """
@@ -80,8 +88,8 @@ class Launcher_Manager(Thread):
         self.overwatch_id = overwatch_id
 
         self.running = True
-        self.timer = 0
         self.job_list = []
+        self.job_lanes = JobLanes(self.site.LAUNCHER_SETTINGS.get("JOB_LANES"))
 
         self.connect_to_redis()
 
@@ -100,16 +108,24 @@ class Launcher_Manager(Thread):
         # Get the initial possible jobs lists
         full_job_list = [x.get('job_list') for x in self.site.LAUNCHER_SETTINGS["LAUNCHER_SPECIFICATIONS"]]
 
+        # Jobs the manager took but did not finish dispatching last time
+        self.job_lanes.requeue_list(self.redis, DISPATCH_LIST, "RAPD_JOBS")
+
         try:
+            last_check = 0
             # This is the server portion of the code
             while self.running:
                 # Get updated job list by checking which launchers are running
                 # Reassign jobs if launcher(s) status changes
-                if round(self.timer%TIMER,1) == 1.0:
+                if time.time() - last_check >= TIMER:
+                    last_check = time.time()
                     try:
-                        # Have Registrar update status
+                        # Have Registrar update status, with the lane depths and waits
+                        lane_stats = self.job_lanes.stats(self.redis, "RAPD_JOBS")
+                        if self.logger:
+                            self.logger.debug("RAPD_JOBS lanes %s", lane_stats)
                         if self.overwatch_id:
-                            self.ow_registrar.update()
+                            self.ow_registrar.update({"job_lanes":json.dumps(lane_stats)})
 
                         # Check which launchers are running
                         temp = [l for l in full_job_list if self.redis.get("OW:"+l)]
@@ -119,15 +135,20 @@ class Launcher_Manager(Thread):
                         if len(offline) > 0:
                             # Pop waiting jobs off their job_lists and push back in RAPD_JOBS for reassignment.
                             for _l in offline:
-                                while self.redis.llen(_l) != 0:
-                                    self.redis.rpoplpush(_l, 'RAPD_JOBS')
+                                self.job_lanes.move(self.redis, _l, 'RAPD_JOBS')
+                                # Jobs the launcher took but never started
+                                requeued = launch_tools.requeue_in_flight(self.redis,
+                                                                          _l,
+                                                                          "RAPD_JOBS",
+                                                                          self.job_lanes)
+                                if requeued and self.logger:
+                                    self.logger.info("Requeued %d in-flight jobs from offline launcher %s", requeued, _l)
 
                         # Determine which launcher(s) came online (Also runs at startup!)
                         online = [line for line in temp if self.job_list.count(line) == False]
                         if len(online) > 0:
                             # Pop jobs off RAPD_JOBS_WAITING and push back onto RAPD_JOBS for reassignment.
-                            while self.redis.llen('RAPD_JOBS_WAITING') != 0:
-                                self.redis.rpoplpush('RAPD_JOBS_WAITING', 'RAPD_JOBS')
+                            self.job_lanes.move(self.redis, 'RAPD_JOBS_WAITING', 'RAPD_JOBS')
 
                         # Update the self.job_list
                         self.job_list = temp
@@ -137,21 +158,20 @@ class Launcher_Manager(Thread):
                             self.logger.exception("Remote Redis is not up. Waiting for Sentinal to switch to new host")
                         time.sleep(1)
 
-                # Look for a new command
+                # Block for a new command, keeping it in DISPATCH_LIST until
+                # it is on a launcher job list
                 # This will throw a redis.exceptions.ConnectionError if redis is unreachable
-                #command = self.redis.brpop(["RAPD_JOBS",], 5)
                 try:
-                    while self.redis.llen("RAPD_JOBS") != 0:
-                        command = self.redis.rpop("RAPD_JOBS")
-                        # Handle the message
-                        if command:
-                            self.push_command(json.loads(command))
-                            # Only run 1 command
-                            # self.running = False
-                            # break
-                    # sleep a little when jobs aren't coming in.
-                    time.sleep(0.2)
-                    self.timer += 0.2
+                    raw_command, lane = self.job_lanes.pop(self.redis,
+                                                           "RAPD_JOBS",
+                                                           DISPATCH_LIST,
+                                                           JOB_WAIT_TIMEOUT)
+                    # Handle the message
+                    if raw_command:
+                        command = json.loads(raw_command)
+                        self.job_lanes.record(self.redis, "RAPD_JOBS", lane, command)
+                        self.push_command(command)
+                        self.redis.lrem(DISPATCH_LIST, 1, raw_command)
                 except redis.exceptions.ConnectionError:
                     if self.logger:
                         self.logger.exception("Remote Redis is not up. Waiting for Sentinal to switch to new host")
@@ -227,12 +247,12 @@ class Launcher_Manager(Thread):
                 message["directories"] = {}
             message["directories"]["launch_dir"] = launch_dir
 
-            # Push the job on the correct launcher job list
-            self.redis.lpush(launcher, json.dumps(message))
+            # Push the job on the correct lane of the launcher job list
+            self.job_lanes.push(self.redis, launcher, message)
             if self.logger:
                 self.logger.debug("Command sent channel:%s  message: %s", launcher, message)
         else:
-            self.redis.lpush('RAPD_JOBS_WAITING', json.dumps(message))
+            self.job_lanes.push(self.redis, 'RAPD_JOBS_WAITING', message)
             if self.logger:
                 self.logger.debug("Could not find a running launcher for this job. Putting job on RAPD_JOBS_WAITING list")
 
@@ -0,0 +1,350 @@
+"""
+A pool of long-lived, pre-forked plugin workers for the launcher
+
+Each worker imports the RAPD plugins once at startup and then runs the
+RapdPlugin for commands handed to it directly, instead of paying for a new
+rapd.launch interpreter (site file, cctbx, numpy, plugin imports) per job.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2009-2018, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import importlib
+import logging
+import multiprocessing
+import os
+import Queue
+from threading import Thread
+import traceback
+
+# RAPD imports
+import utils.launch_tools as launch_tools
+import utils.log
+from utils.modules import load_module
+
+# Defaults
+POOL_SIZE = 4           # Number of plugin workers
+MAX_JOBS_PER_WORKER = 20 # Jobs a worker runs before it is replaced
+MONITOR_INTERVAL = 1    # Seconds between checks on worker health
+
+# Redis connection for acknowledging jobs, one per worker process
+REDIS = None
+
+def acknowledge(site, command):
+    """Acknowledge the command to the launcher that dispatched it"""
+    global REDIS
+
+    if command.get("process", {}).get("launcher_ack"):
+        if REDIS is None:
+            redis_database = importlib.import_module('database.redis_adapter')
+            REDIS = redis_database.Database(settings=site.CONTROL_DATABASE_SETTINGS)
+        launch_tools.acknowledge_command(command, REDIS)
+
+def discover_plugins(site):
+    """Return the commands that have a plugin in site.RAPD_PLUGIN_DIRECTORIES"""
+
+    commands = set()
+    for directory in site.RAPD_PLUGIN_DIRECTORIES:
+        try:
+            package = importlib.import_module(directory)
+        except ImportError:
+            continue
+        package_dir = os.path.dirname(package.__file__)
+        for entry in os.listdir(package_dir):
+            if os.path.exists(os.path.join(package_dir, entry, "plugin.py")):
+                commands.add(entry.upper())
+    return sorted(commands)
+
+def preload_plugins(site, commands=None, logger=None):
+    """
+    Import the plugin modules and return them in a dict keyed by command
+
+    Keyword arguments
+    site -- imported site definition module
+    commands -- iterable of commands to import (default = all discoverable)
+    logger -- logger instance (default = None)
+    """
+
+    if not commands:
+        commands = discover_plugins(site)
+
+    plugins = {}
+    for command in commands:
+        directories = [directory+".%s" % command.lower() for directory in site.RAPD_PLUGIN_DIRECTORIES]
+        try:
+            plugins[command.upper()] = load_module(seek_module="plugin",
+                                                   directories=directories)
+        except Exception:
+            if logger:
+                logger.exception("Unable to preload plugin for %s", command)
+
+    return plugins
+
+def run_plugin(site, command, plugins):
+    """
+    Run the plugin for a command in this process, as rapd.launch would
+
+    Keyword arguments
+    site -- imported site definition module
+    command -- dict describing the job
+    plugins -- dict of preloaded plugin modules keyed by command
+    """
+
+    # Adjust the working directory for this launch computer
+    command = launch_tools.fix_command(command)
+
+    # A plugin that was not preloaded is imported now
+    command_type = command["command"].upper()
+    if command_type not in plugins:
+        plugins.update(preload_plugins(site, (command_type,)))
+    plugin_module = plugins[command_type]
+
+    # Thread-based plugins chdir in this process, so put it back afterwards
+    start_dir = os.getcwd()
+
+    # Per-job log file, removed from the shared logger afterwards
+    logger = logging.getLogger("RAPDLogger")
+    handlers = list(logger.handlers)
+    job_logger = utils.log.get_logger(
+        logfile_dir=site.LOGFILE_DIR,
+        logfile_id="%s_%s" % (command_type, command.get("process", {}).get("result_id", "")))
+
+    try:
+        plugin = plugin_module.RapdPlugin(site=site,
+                                          command=command,
+                                          tprint=False,
+                                          logger=job_logger)
+        plugin.start()
+        acknowledge(site, command)
+        # Wait so the worker only runs one job at a time
+        plugin.join()
+    finally:
+        os.chdir(start_dir)
+        for handler in logger.handlers[:]:
+            if handler not in handlers:
+                logger.removeHandler(handler)
+                handler.close()
+
+def plugin_worker(worker_id, site, job_queue, event_queue, max_jobs, preload):
+    """
+    Process target for a plugin worker
+
+    Keyword arguments
+    worker_id -- integer identifying the worker to the pool
+    site -- imported site definition module
+    job_queue -- multiprocessing.Queue of commands, None to stop
+    event_queue -- multiprocessing.Queue for reporting back to the pool
+    max_jobs -- number of jobs to run before retiring, 0 for no limit
+    preload -- commands to preload plugins for, None for all
+    """
+
+    logger = logging.getLogger("RAPDLogger")
+
+    # The expensive part, done once per worker
+    plugins = preload_plugins(site, preload, logger)
+    event_queue.put(("ready", worker_id, sorted(plugins.keys())))
+
+    jobs_run = 0
+    while not max_jobs or jobs_run < max_jobs:
+
+        command = job_queue.get()
+        if command is None:
+            break
+
+        jobs_run += 1
+        event_queue.put(("started", worker_id, command))
+        try:
+            run_plugin(site, command, plugins)
+            event_queue.put(("finished", worker_id, None))
+        except Exception:
+            event_queue.put(("failed", worker_id, traceback.format_exc()))
+
+    event_queue.put(("retired", worker_id, jobs_run))
+
+class PluginWorkerPool(object):
+    """
+    Pool of long-lived plugin worker processes
+
+    Jobs are handed to whichever worker is free, so at most size jobs run at
+    once. A worker that dies takes only its own job with it and is replaced,
+    and workers are recycled after max_jobs jobs to keep memory in check.
+    """
+
+    def __init__(self,
+                 site,
+                 size=POOL_SIZE,
+                 max_jobs=MAX_JOBS_PER_WORKER,
+                 preload=None,
+                 logger=None):
+        """
+        Start the workers
+
+        Keyword arguments
+        site -- imported site definition module
+        size -- number of workers (default = POOL_SIZE)
+        max_jobs -- jobs before a worker is recycled, 0 for never (default = MAX_JOBS_PER_WORKER)
+        preload -- commands to preload plugins for (default = all discoverable)
+        logger -- logger instance (default = None)
+        """
+
+        if logger:
+            self.logger = logger
+        else:
+            self.logger = logging.getLogger("RAPDLogger")
+
+        self.site = site
+        self.size = size
+        self.max_jobs = max_jobs
+        self.preload = preload
+
+        self.job_queue = multiprocessing.Queue()
+        self.event_queue = multiprocessing.Queue()
+
+        # worker_id -> Process
+        self.workers = {}
+        # worker_id -> command currently running
+        self.in_flight = {}
+        self.next_worker_id = 0
+        self.running = True
+
+        for __ in range(self.size):
+            self.start_worker()
+
+        self.monitor_thread = Thread(target=self.monitor)
+        self.monitor_thread.daemon = True
+        self.monitor_thread.start()
+
+    def start_worker(self):
+        """Fork a new worker"""
+
+        worker_id = self.next_worker_id
+        self.next_worker_id += 1
+
+        worker = multiprocessing.Process(target=plugin_worker,
+                                         name="rapd_worker_%d" % worker_id,
+                                         args=(worker_id,
+                                               self.site,
+                                               self.job_queue,
+                                               self.event_queue,
+                                               self.max_jobs,
+                                               self.preload))
+        worker.start()
+        self.workers[worker_id] = worker
+        self.logger.debug("Started plugin worker %d pid %d", worker_id, worker.pid)
+
+    def submit(self, command):
+        """Queue a command for the next free worker"""
+
+        self.job_queue.put(command)
+
+    def available(self):
+        """Return the number of workers free for another job"""
+
+        try:
+            queued = self.job_queue.qsize()
+        except NotImplementedError:
+            # No qsize on this platform, so the pool cannot say
+            return self.size
+        return self.size - len(self.in_flight) - queued
+
+    def handle_event(self, event):
+        """Bookkeeping for a report from a worker"""
+
+        kind, worker_id, payload = event
+
+        if kind == "ready":
+            self.logger.debug("Worker %d preloaded %s", worker_id, payload)
+
+        elif kind == "started":
+            if worker_id in self.workers:
+                self.in_flight[worker_id] = payload
+            self.logger.debug("Worker %d started %s %s",
+                              worker_id,
+                              payload.get("command"),
+                              payload.get("process", {}).get("result_id"))
+
+        elif kind == "finished":
+            self.in_flight.pop(worker_id, None)
+
+        elif kind == "failed":
+            command = self.in_flight.pop(worker_id, {})
+            self.logger.error("Worker %d failed running %s\n%s",
+                              worker_id,
+                              command.get("command"),
+                              payload)
+
+        elif kind == "retired":
+            self.logger.debug("Worker %d retired after %d jobs", worker_id, payload)
+            # check_workers may have replaced it already
+            worker = self.workers.pop(worker_id, None)
+            if worker:
+                worker.join()
+                if self.running:
+                    self.start_worker()
+
+    def check_workers(self):
+        """Replace workers that have died without retiring"""
+
+        for worker_id, worker in self.workers.items():
+            if not worker.is_alive():
+                self.workers.pop(worker_id)
+                command = self.in_flight.pop(worker_id, None)
+                if command:
+                    self.logger.error("Worker %d died (exitcode %s) running %s %s",
+                                      worker_id,
+                                      worker.exitcode,
+                                      command.get("command"),
+                                      command.get("process", {}).get("result_id"))
+                elif worker.exitcode:
+                    self.logger.error("Worker %d died (exitcode %s)",
+                                      worker_id,
+                                      worker.exitcode)
+                if self.running:
+                    self.start_worker()
+
+    def monitor(self):
+        """Watch the workers and keep the pool at full strength"""
+
+        while self.running:
+            try:
+                event = self.event_queue.get(timeout=MONITOR_INTERVAL)
+                self.handle_event(event)
+                # Drain anything else reported
+                while True:
+                    self.handle_event(self.event_queue.get_nowait())
+            except Queue.Empty:
+                pass
+            except Exception:
+                self.logger.exception("Error handling worker event")
+
+            self.check_workers()
+
+    def stop(self, timeout=None):
+        """Let running jobs finish and shut the workers down"""
+
+        self.running = False
+        for __ in self.workers.keys():
+            self.job_queue.put(None)
+        for worker in self.workers.values():
+            worker.join(timeout)
@@ -41,6 +41,9 @@ import database.redis_adapter as redis_database
 # Constants
 #POLLING_REST = 0.1      # Time to rest between checks for new image
 POLLING_REST = 0.01      # Time to rest between checks for new image
+BLOCKING_TIMEOUT = 1     # Seconds to block on the image lists before checking for stop
+BATCH_SIZE = 100         # Maximum images drained from one list per round trip
+OVERWATCH_INTERVAL = 5   # Seconds between overwatch updates
 
 class Monitor(Thread):
     """Monitor for new data collection images to be submitted to a redis instance"""
@@ -99,8 +102,7 @@ class Monitor(Thread):
 
         # Tuple or list
         elif isinstance(self.site.ID, tuple) or isinstance(self.site.ID, list):
-            for site_id in self.site.ID:
-                self.tags.append(site_id.upper())
+            self.tags = [site_id.upper() for site_id in self.site.ID]
 
     def stop(self):
         """Stop the process of polling the redis instance"""
@@ -133,14 +135,75 @@ class Monitor(Thread):
             # Register
             self.ow_registrar.register()
 
-        # Determine interval for overwatch update
-        ow_round_interval = 50 # int((5 * len(self.image_lists)) / POLLING_REST)
-
         # If we are starting clean
         if self.clean_start:
             for tag in self.tags:
                 self.redis.delete("images_collected:%s" % tag)
 
+        # Blocking intake is the default, polling kept for old setups
+        if self.site.IMAGE_MONITOR_SETTINGS.get("INTAKE_MODE", "blocking") == "polling":
+            self.run_polling()
+        else:
+            self.run_blocking()
+
+        self.logger.debug("Exit image monitor loop")
+
+    def run_blocking(self):
+        """
+        Block on all the image lists at once, then drain any backlog in
+        pipelined batches and hand each batch to notify
+        """
+
+        keys = ["images_collected:%s" % tag for tag in self.tags]
+        batch_size = self.site.IMAGE_MONITOR_SETTINGS.get("BATCH_SIZE", BATCH_SIZE)
+
+        ow_last_update = time.time()
+
+        while self.running:
+
+            # Wait for the first image on any list
+            popped = self.redis.brpop(keys, BLOCKING_TIMEOUT)
+
+            if popped:
+                key, new_image = popped
+                tag = key.split(":", 1)[1]
+                batches = {tag: [new_image]}
+
+                # Drain whatever else has piled up behind it
+                for tag in self.tags:
+                    backlog = self.redis.rpop_batch("images_collected:%s" % tag, batch_size)
+                    if backlog:
+                        batches.setdefault(tag, []).extend(backlog)
+
+                for tag, fullnames in batches.iteritems():
+                    self.notify_batch(tag, fullnames)
+
+            # Have Registrar update status
+            if self.overwatch_id and time.time() - ow_last_update > OVERWATCH_INTERVAL:
+                self.ow_registrar.update()
+                ow_last_update = time.time()
+
+    def notify_batch(self, tag, fullnames):
+        """Notify core thread that images have been collected"""
+
+        # self.logger.debug("New images %s - %d", tag, len(fullnames))
+
+        # Single images go through the original message
+        if len(fullnames) == 1:
+            self.notify({"message_type":"NEWIMAGE",
+                         "fullname":fullnames[0],
+                         "site_tag":tag})
+        else:
+            self.notify({"message_type":"NEWIMAGES",
+                         "fullnames":fullnames,
+                         "site_tag":tag})
+
+    def run_polling(self):
+        """Poll the image lists one rpop at a time"""
+
+        # Determine interval for overwatch update
+        ow_round_interval = 50 # int((5 * len(self.image_lists)) / POLLING_REST)
+
         while self.running:
 
             # ~5 seconds between overwatch updates
@@ -187,5 +250,3 @@ class Monitor(Thread):
             # Have Registrar update status
             if self.overwatch_id:
                 self.ow_registrar.update()
-
-        self.logger.debug("Exit image monitor loop")
@@ -63,6 +63,7 @@ from plugins.subcontractors.rapd_phaser import run_phaser_module
 
 import utils.credits as rcredits
 import utils.exceptions as exceptions
+import utils.result_patch as result_patch
 from utils.text import json
 from bson.objectid import ObjectId
 import utils.xutils as xutils
@@ -125,6 +126,7 @@ class RapdPlugin(Process):
     #phaser_results = None
     
     redis = False
+    result_patcher = None
 
     jobs = {}
 
@@ -342,16 +344,12 @@ calculation",
             #    if results['results'].get('data_produced', False):
             #        pprint(results['results'].get('data_produced'))
 
-            # Transcribe results
-            json_results = json.dumps(self.results)
-
             # Get redis instance
             if not self.redis:
                 self.connect_to_redis()
 
-            # Send results back
-            self.redis.lpush("RAPD_RESULTS", json_results)
-            self.redis.publish("RAPD_RESULTS", json_results)
+            # Send results back, as a patch on the last send where possible
+            self.result_patcher = result_patch.send_results(self.redis, self.result_patcher, self.results)
 
     
     def update_status(self):
@@ -472,7 +472,7 @@ class RCSBRepository():
         else:
             try:
                 # PDBe is more reliable
-                wget = ['wget', 'ftp://ftp.ebi.ac.uk/pub/databases/rcsb/pdb/data/structures/divided/mmCIF/%s/%s.cif.gz'%(pdb_code.lower()[1:-1], pdb_code.lower())]
+                wget = ['wget', '-O', '%s.gz'%fname, 'ftp://ftp.ebi.ac.uk/pub/databases/rcsb/pdb/data/structures/divided/mmCIF/%s/%s.cif.gz'%(pdb_code.lower()[1:-1], pdb_code.lower())]
                 local_subprocess(command = wget)
                 local_subprocess(command = ['gunzip', '%s.gz'%fname])
                 return fname
@@ -563,7 +563,7 @@ class PDBERepository():
             return fname
         else:
             try:
-                wget = ['wget', 'ftp://ftp.ebi.ac.uk/pub/databases/rcsb/pdb/data/structures/divided/mmCIF/%s/%s.cif.gz'%(pdb_code.lower()[1:-1], pdb_code.lower())]
+                wget = ['wget', '-O', '%s.gz'%fname, 'ftp://ftp.ebi.ac.uk/pub/databases/rcsb/pdb/data/structures/divided/mmCIF/%s/%s.cif.gz'%(pdb_code.lower()[1:-1], pdb_code.lower())]
                 local_subprocess(command = wget)
                 local_subprocess(command = ['gunzip', '%s.gz'%fname])
                 return fname
@@ -45,7 +45,7 @@ import functools
 import logging
 from multiprocessing import Process, Event, Pool
 from multiprocessing import Queue as mp_Queue
-from Queue import Queue
+from Queue import Empty, Queue
 from threading import Thread
 import numpy
 import os
@@ -75,6 +75,7 @@ import utils.exceptions as exceptions
 import utils.global_vars as global_vars
 #from utils.processes import local_subprocess, LocalSubprocess
 from utils.processes import local_subprocess
+import utils.result_patch as result_patch
 from utils.text import json
 from bson.objectid import ObjectId
 import utils.xutils as xutils
@@ -114,6 +115,7 @@ class RapdPlugin(Process):
 
     # Connection to redis
     redis = None
+    result_patcher = None
 
     # For testing individual modules (Will not run in Test mode on cluster!! Can be set at end of
     # __init__.)
@@ -129,6 +131,8 @@ class RapdPlugin(Process):
     # Will not use RAM if self.cluster_use=True since runs would be on separate nodes. Slower
     # (>10%).
     cluster_use = False
+    # Cluster adapter taking the strategy runs, if it can submit without waiting
+    cluster_adapter = False
 
     # Switch for verbose
     verbose = True
@@ -195,6 +199,8 @@ class RapdPlugin(Process):
     iso_B = False
     # Dicts for running the Queues
     jobs = {}
+    # Runs launched by the strategy job of this process
+    strategy_runs = []
 
     # The results of the plugin
     results = {"_id":str(ObjectId())}
@@ -275,6 +281,10 @@ class RapdPlugin(Process):
             # Based on the command, pick a batch queue on the cluster. Added to input kwargs
             self.batch_queue = {'batch_queue': cluster_launcher.check_queue(self.command["command"])}
             self.kill_job = cluster_launcher.kill_job
+            # Adapters that can submit without waiting take the strategy
+            # runs of each strategy job through one cluster session
+            if hasattr(cluster_launcher, "submit"):
+                self.cluster_adapter = cluster_launcher
         else:
             self.launcher = local_subprocess
             self.batch_queue = {}
@@ -458,9 +468,8 @@ class RapdPlugin(Process):
     def send_results(self):
         """Let everyone know we are working on this"""
         self.logger.debug("Sending back on redis")
-        json_results = json.dumps(self.results)
-        self.redis.lpush("RAPD_RESULTS", json_results)
-        self.redis.publish("RAPD_RESULTS", json_results)
+        # Send results back, as a patch on the last send where possible
+        self.result_patcher = result_patch.send_results(self.redis, self.result_patcher, self.results)
 
     def preprocess(self):
         """
@@ -588,30 +597,33 @@ class RapdPlugin(Process):
         l = [self.image1]
         if self.image2:
             l.append(self.image2)
-        
-        for i in range(len(l)):
-            if not self.test:
-                if self.distl_server:
-                    # Send job to a DISTL server (Apache or Python) for fast results
-                    # Job is not saved because it takes less tha 1s to complete
-                    distl.process_distl_server(IP = self.distl_server[0],
-                                               port = self.distl_server[1],
-                                               image = l[i].get("fast_fullname", l[i].get("fullname")),
-                                               res_inner = self.preferences.get("distl_res_inner", 50.0),
-                                               res_outer = self.preferences.get("distl_res_outer", 3.0),
-                                               queue = self.distl_queue,
-                                               logfile = os.path.join(os.getcwd(),"distl%s.log" % i),
-                                               logger = self.logger)
-                else:
+        images = [image.get("fast_fullname", image.get("fullname")) for image in l]
+
+        if not self.test:
+            if self.distl_server:
+                # Send both images to a DISTL server (Apache or Python) at once for fast results
+                # Jobs are not saved because they take less than 1s to complete
+                distl.process_distl_server_images(IP = self.distl_server[0],
+                                                  port = self.distl_server[1],
+                                                  images = images,
+                                                  res_inner = self.preferences.get("distl_res_inner", 50.0),
+                                                  res_outer = self.preferences.get("distl_res_outer", 3.0),
+                                                  queue = self.distl_queue,
+                                                  logfiles = [os.path.join(os.getcwd(),"distl%s.log" % i)
+                                                              for i in range(len(images))],
+                                                  logger = self.logger)
+            else:
+                for i in range(len(images)):
                     # Launch the job locally from commandline
-                    job = distl.process_distl_local(image = l[i].get("fast_fullname", l[i].get("fullname")),
+                    job = distl.process_distl_local(image = images[i],
                                                     res_inner = self.preferences.get("distl_res_inner", 50.0),
                                                     res_outer = self.preferences.get("distl_res_outer", 3.0),
                                                     queue = self.distl_queue,
                                                     logfile = os.path.join(os.getcwd(),"distl%s.log" % i),
                                                     logger = self.logger)
-                    # Save job so postprocess_distl will wait for it.
-                    self.distl_output.append(job)
+                    # Save job so postprocess_distl will wait for it. Cached results have no job.
+                    if job:
+                        self.distl_output.append(job)
 
     def preprocess_raddose(self):
         """
@@ -1101,28 +1113,17 @@ class RapdPlugin(Process):
                 inp_kwargs.update(self.batch_queue)
 
                 # Launch the job
-                # jobs[str(i)] = Thread(target=self.launcher,
-                #                       kwargs=inp_kwargs)
-                # jobs[str(i)].start()
-                jobs[str(i)] = Process(target=self.launcher,
-                                       kwargs=inp_kwargs)
-                jobs[str(i)].start()
-                # jobs[str(i)] = self.Pool.apply_async(self.launcher, (inp_kwargs,))
+                jobs[self.launch_strategy_run(inp_kwargs)] = i
 
         # Check if Best should rerun since original Best strategy is too long for Pilatus using
         # correct start and end from plots. (Way around bug in BEST.)
         if best_version > "3.4" and self.test == False:
             if runbefore == False:
-                counter = 2
-                while counter > 0:
-                    for job in jobs.keys():
-                        if jobs[job].is_alive() == False:
-                            del jobs[job]
-                            start, ran = self.find_best_strat(d['log'+l[int(job)][1]].replace('log', 'plt'))
-                            if start != False:
-                                self.process_best(iteration=iteration, runbefore=(start, ran, int(job), int(job)+1))
-                            counter -= 1
-                    time.sleep(0.1)
+                for job in self.strategy_runs_completed(jobs.keys()):
+                    i = jobs[job]
+                    start, ran = self.find_best_strat(d['log'+l[i][1]].replace('log', 'plt'))
+                    if start != False:
+                        self.process_best(iteration=iteration, runbefore=(start, ran, i, i+1))
 
     def process_mosflm(self):
         """
@@ -1216,8 +1217,59 @@ class RapdPlugin(Process):
                 inp_kwargs.update(self.batch_queue)
 
                 # Launch the job
-                Process(target=self.launcher,
-                        kwargs=inp_kwargs).start()
+                self.launch_strategy_run(inp_kwargs)
+
+    def launch_strategy_run(self, inp_kwargs):
+        """
+        Launch a BEST or Mosflm run of a strategy job and return it. Through
+        a cluster adapter that can submit, the runs of the job share its
+        cluster session, otherwise each has a process of its own.
+        """
+
+        if self.cluster_adapter:
+            job = self.cluster_adapter.submit(mp_event=self.running, **inp_kwargs)
+        else:
+            job = Process(target=self.launcher, kwargs=inp_kwargs)
+            job.start()
+        self.strategy_runs.append(job)
+        return job
+
+    def strategy_runs_completed(self, jobs):
+        """Yield strategy runs from launch_strategy_run as they end"""
+
+        if self.cluster_adapter:
+            for job in self.cluster_adapter.as_completed(jobs):
+                yield job
+            return
+        jobs = list(jobs)
+        while jobs:
+            for job in jobs[:]:
+                if job.is_alive() == False:
+                    jobs.remove(job)
+                    yield job
+            time.sleep(0.1)
+
+    def run_strategy_job(self, target, *args):
+        """
+        Run a strategy job, the target of a process of its own, and wait for
+        the runs it launches. Cluster runs still going when the process is
+        terminated are cancelled, and its cluster session is exited.
+        """
+
+        self.strategy_runs = []
+        if self.cluster_adapter:
+            # Terminating the process leaves through the finally below
+            sigterm = signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+        try:
+            target(*args)
+            for job in self.strategy_runs_completed(self.strategy_runs):
+                pass
+        finally:
+            if self.cluster_adapter:
+                for job in self.strategy_runs:
+                    job.cancel()
+                self.cluster_adapter.shutdown()
+                signal.signal(signal.SIGTERM, sigterm)
 
     def process_strategy(self, iteration=False):
         """
@@ -1259,11 +1311,15 @@ class RapdPlugin(Process):
             # Run Mosflm for strategy
             if i == 4:
                 self.tprint(arg="  Starting Mosflm runs", level=98, color="white")
-                job = Process(target=self.process_mosflm, name="mosflm%s" % i)
+                job = Process(target=self.run_strategy_job,
+                              name="mosflm%s" % i,
+                              args=(self.process_mosflm,))
             # Run BEST
             else:
                 # Reduces resolution and reruns Mosflm to calc new files, then runs Best.
-                job = Process(target=self.check_best, name="best%s" % i, args=(i, best_version))
+                job = Process(target=self.run_strategy_job,
+                              name="best%s" % i,
+                              args=(self.check_best, i, best_version))
             job.start()
             self.jobs[str(i)] = job
 
@@ -1544,9 +1600,26 @@ Distance | % Transmission", level=98, color="white")
         else:
             eval("%s_results" % l[1]).update({l[2]:data})
 
+    def watch_strategy_job(self, iteration):
+        """Put the iteration on self.strategy_done once its job ends"""
+
+        def watch(job):
+            job.join()
+            self.strategy_done.put(iteration)
+
+        self.strategy_started[iteration] = time.time()
+        watcher = Thread(target=watch, args=(self.jobs[str(iteration)],))
+        watcher.daemon = True
+        watcher.start()
+
     def run_queue(self):
         """
         run_queue for strategy.
+
+        Strategy jobs are handled as they end. For the normal and anomalous
+        strategies each, the first iteration in order 0-3 with a BEST result
+        is taken, then Mosflm if BEST failed. Once both are settled the jobs
+        left are cancelled.
         """
 
         self.logger.debug("AutoindexingStrategy::run_queue")
@@ -1564,77 +1637,87 @@ Distance | % Transmission", level=98, color="white")
                     self.best_anom_results = {"best_results_anom":"FAILED"}
                     self.best_anom_failed = True
 
+        st = 0
+        if self.strategy == "mosflm":
+            st = 4
+
+        # Regular(0) and anomalous(1) strategies
+        l = ["", "_anom"]
+        mosflm_results = [self.mosflm_strat_results, self.mosflm_strat_anom_results]
+        mosflm_keys = ["mosflm_results_norm", "mosflm_results_anom"]
+        # The iteration to look at next for each, None once settled
+        next_iteration = [st, st]
+        # Iterations whose job has ended or been killed
+        ended = set()
+        timed_out = set()
+
+        self.strategy_done = Queue()
+        self.strategy_started = {}
+        for i in range(st, 5):
+            if str(i) in self.jobs:
+                self.watch_strategy_job(i)
+
+        first_print = False
         try:
-            st = 0
-            if self.strategy == "mosflm":
-                st = 4
-            # dict = {}
-            # Run twice for regular(0) and anomalous(1) strategies
-            l = ["", "_anom"]
-            first_print = False
-            for x in range(0, 2):
-                for i in range(st, 5):
-                    timed_out = False
-                    timer = 0
-                    job = self.jobs[str(i)]
-                    while 1:
-                        # print i, ">>>", job
-
-                        if job.is_alive() == False:
-                            if i == 4:
-                                log = os.path.join(self.labelit_dir, "mosflm_strat%s.out" % l[x])
+            while next_iteration != [None, None]:
+
+                # Take the results there are, in order
+                for x in (0, 1):
+                    while next_iteration[x] is not None and next_iteration[x] in ended:
+                        i = next_iteration[x]
+                        if i == 4:
+                            if i in timed_out:
+                                # Killed before it may have written its log
+                                mosflm_results[x].update({mosflm_keys[x]:"FAILED"})
                             else:
-                                log = os.path.join(self.labelit_dir, str(i))+"/best%s.log" % l[x]
+                                self.postprocess_mosflm(
+                                    os.path.join(self.labelit_dir, "mosflm_strat%s.out" % l[x]))
+                            next_iteration[x] = None
+                            break
+                        if i in timed_out:
+                            job1 = "FAILED"
+                        else:
+                            job1 = self.postprocess_best(
+                                os.path.join(self.labelit_dir, str(i))+"/best%s.log" % l[x])
+                        if job1 == "OK":
+                            next_iteration[x] = None
                             break
-                        time.sleep(1)
-                        timer += 1
-                        if self.verbose and self.logger:
-                            number = round(timer % 1, 1)
-                            if number in (0.0, 1.0):
-                                if first_print:
-                                    self.tprint(arg=".",
-                                                level=10,
-                                                color="white",
-                                                newline=False)
-                                else:
-                                    first_print = True
-                                    self.tprint(arg="    Waiting for strategy to finish",
-                                                level=10,
-                                                color="white",
-                                                newline=False)
-                        if global_vars.STRATEGY_TIMEOUT:
-                            if timer >= global_vars.STRATEGY_TIMEOUT:
-                                timed_out = True
-                                # print "Timed out"
-                                job.terminate()
-                                break
-                    if timed_out:
-                        self.tprint(arg="  Strategy calculation timed out", level=30, color="red")
                         set_best_results(i, x)
-                        if i < 4:
-                            if self.multiproc == False:
-                                self.process_strategy(i+1)
+                        next_iteration[x] = i + 1
+                        # Start the next iteration if running one at a time
+                        if str(i + 1) not in self.jobs:
+                            self.process_strategy(i + 1)
+                            self.watch_strategy_job(i + 1)
+
+                if next_iteration == [None, None]:
+                    break
+
+                # Wait for the next job to end
+                try:
+                    ended.add(self.strategy_done.get(timeout=1))
+                except Empty:
+                    if first_print:
+                        self.tprint(arg=".", level=10, color="white", newline=False)
                     else:
-                        if i == 4:
-                            self.postprocess_mosflm(log)
-                        else:
-                            self.jobs[str(i)].join()
-                            # print "Looking at %s" % log
-                            job1 = self.postprocess_best(log)
-                            # print "  job=%s" % job1
-                            if job1 == "OK":
-                                # print "  OK"
-                                break
-                            # If Best failed...
-                            else:
-                                print "  failed"
-                                if self.multiproc == False:
-                                    self.process_strategy(i+1)
-                                set_best_results(i, x)
+                        first_print = True
+                        self.tprint(arg="    Waiting for strategy to finish",
+                                    level=10,
+                                    color="white",
+                                    newline=False)
+
+                # Kill the job holding things up once it has run too long
+                if global_vars.STRATEGY_TIMEOUT:
+                    for i in set(next_iteration) - set([None]) - ended:
+                        if time.time() - self.strategy_started[i] >= global_vars.STRATEGY_TIMEOUT:
+                            self.tprint(arg="  Strategy calculation timed out", level=30, color="red")
+                            self.jobs[str(i)].terminate()
+                            timed_out.add(i)
+                            ended.add(i)
 
         except KeyboardInterrupt:
             pass
 
+        # Cancel the strategy jobs still running
         if self.test == False:
             if self.multiproc:
                 if self.cluster_use:
@@ -1642,16 +1725,12 @@ Distance | % Transmission", level=98, color="white")
                     # turn off multiprocessing.event so any jobs still running on cluster are terminated.
                     self.running.clear()
                 else:
-                    #pass
                     # kill all the remaining running jobs
-                    # self.Pool.terminate()
                     for i in range(st, 5):
                         if self.jobs[str(i)].is_alive():
                             if self.verbose and self.logger:
                                 self.logger.debug("terminating job: %s" % self.jobs[str(i)])
-                            # print "Terminating %d" % i
                             self.jobs[str(i)].terminate()
-                            #xutils.kill_children(self.jobs[str(i)].pid, self.logger)
 
     def labelit_cell_sym(self):
       """
@@ -105,6 +105,20 @@ def get_commandline():
                         default=False,
                         help="Run pdbquery")
 
+    # Convert HDF5 to CBF before integrating
+    parser.add_argument("--convert",
+                        action="store_true",
+                        dest="convert_hdf5",
+                        default=False,
+                        help="Convert HDF5 data to CBF instead of integrating it directly")
+
+    # XDS plugin library for reading HDF5
+    parser.add_argument("--xdslib",
+                        action="store",
+                        dest="xds_hdf5_lib",
+                        default=False,
+                        help="XDS plugin library for reading HDF5 data (LIB=)")
+
     # Directory or files
     parser.add_argument(action="store",
                         dest="template",
@@ -253,6 +267,7 @@ def construct_command(image_0_data, run_data, commandline_args, detector_module)
         "run_mode": commandline_args.run_mode,
         "show_plots": commandline_args.show_plots,
         "xdsinp": detector_module.XDSINP,
+        "xds_hdf5_lib": commandline_args.xds_hdf5_lib,
         "spacegroup_decider": commandline_args.spacegroup_decider,
         "rounds_polishing": commandline_args.rounds_polishing
     }
@@ -344,7 +359,8 @@ def main():
         commandline_args.template,
         mode="integrate",
         start_image=commandline_args.start_image,
-        end_image=commandline_args.end_image)
+        end_image=commandline_args.end_image,
+        convert_all=commandline_args.convert_hdf5)
 
     # Change hdf5 to cbf
     if "hdf5_files" in data_files:
@@ -453,6 +469,10 @@ def main():
     # Get the run data
     run_data = get_run_data(detector_module, image_0_data, image_n_data, commandline_args)
 
+    # Integrate from the HDF5 files - only the first and last frames were converted
+    if "hdf5_files" in data_files and not commandline_args.convert_hdf5:
+        run_data["hdf5_master"] = data_files["hdf5_files"][0]
+
     logger.debug("Run data: %s", run_data)
     tprint(arg="\nRun data", level=10, color="blue")
     keys = run_data.keys()
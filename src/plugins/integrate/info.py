@@ -10,5 +10,6 @@ DEFAULT_PREFERENCES = {'multiprocessing': False, # Should be False for non-qsub
                        "progress": False, # progress bar for command line
                        "spacegroup_decider": 'auto', # choices=["auto", "pointless", "xds"],
                        "computer_cluster": True,
+                       "streaming": True, # integrate wedge by wedge during collection
                        #"rounds_polishing": 1, # not used yet...
                        }
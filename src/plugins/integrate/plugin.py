@@ -64,13 +64,17 @@ import numpy
 from plugins.subcontractors.xdsme.xds2mos import Xds2Mosflm
 from plugins.subcontractors.aimless import parse_aimless
 from plugins.subcontractors.xds import get_avg_mosaicity_from_integratelp, get_isa_from_correctlp
+import plugins.subcontractors.xds as xds
 import utils.archive as archive
 from utils.communicate import rapd_send
+import utils.convert_hdf5_cbf as convert_hdf5_cbf
 import utils.credits as rcredits
 import utils.exceptions as exceptions
+import utils.frame_progress as frame_progress
 # from utils.r_numbers import try_int, try_float
 from utils.processes import local_subprocess
 import utils.text as text
+import utils.result_patch as result_patch
 from utils.text import json
 import utils.xutils as Utils
 import utils.spacegroup as spacegroup
@@ -82,6 +86,11 @@ import plugins.pdbquery.commandline
 import plugins.pdbquery.plugin
 import utils.xutils as xutils
 from detectors.detector_utils import get_resolution_at_edge
+# Integrating straight from HDF5 needs h5py
+try:
+    import detectors.hdf5_header as hdf5_header
+except ImportError:
+    hdf5_header = None
 
 import info
 
@@ -116,6 +125,20 @@ VERSIONS = {
         ),
 }
 
+def same_lattice(sg_num_a, sg_num_b):
+    """
+    Return True if two spacegroups share a Bravais lattice, so data integrated
+    in one can be scaled in the other without integrating again
+    """
+
+    lattices_a = set(spacegroup.intl_to_xds_bravais_type.get(sg_num_a, ()))
+    lattices_b = set(spacegroup.intl_to_xds_bravais_type.get(sg_num_b, ()))
+    return bool(lattices_a & lattices_b)
+
+def get_hdf5_name_template(master_file):
+    """Return the XDS NAME_TEMPLATE_OF_DATA_FRAMES for an HDF5 master file"""
+    return master_file.replace("_master.h5", "_??????.h5")
+
 class RapdPlugin(Process):
     """
     classdocs
@@ -140,6 +163,7 @@ class RapdPlugin(Process):
 
     # Connection to redis database
     redis = None
+    result_patcher = None
 
     # Dict for holding results
     results = {"_id": str(ObjectId())}
@@ -156,6 +180,15 @@ class RapdPlugin(Process):
     # pdbquery process
     pdbq_process = False
 
+    # HDF5 master file XDS reads the frames from, and the XDS plugin library
+    # for reading them. False to integrate CBF files.
+    hdf5_master = False
+    xds_hdf5_lib = False
+
+    # Following the frames of the run, from control or on disk
+    frame_waiter = None
+    frame_scanner = None
+
     def __init__(self, site, command, tprint=False, logger=False):
         """
         Initialize the plugin
@@ -219,6 +252,13 @@ class RapdPlugin(Process):
 
         self.image_data['image_template'] = self.run_data["image_template"]
 
+        # Integrate straight from the HDF5 files if XDS has a library to read them
+        if self.run_data.get("hdf5_master"):
+            self.xds_hdf5_lib = self.preferences.get("xds_hdf5_lib") or \
+                                getattr(site, "XDS_HDF5_LIB", False)
+            if self.xds_hdf5_lib and hdf5_header:
+                self.hdf5_master = self.run_data["hdf5_master"]
+
         # Check for 2theta tilt:
         if 'twotheta' in self.run_data:
             self.image_data['twotheta'] = self.run_data['twotheta']
@@ -329,6 +369,10 @@ class RapdPlugin(Process):
             os.makedirs(self.dirs['work'])
         os.chdir(self.dirs['work'])
 
+        # No way to read HDF5 in XDS - convert to CBF
+        if self.run_data.get("hdf5_master") and not self.hdf5_master:
+            self.convert_hdf5()
+
         self.xds_default = self.create_xds_input(self.preferences['xdsinp'])
 
         self.check_dependencies()
@@ -432,7 +476,10 @@ class RapdPlugin(Process):
 
             # If current last > 10 deg wedge, run it
             current_sweep = (last - first) *  self.image_data["osc_range"]
-            if current_sweep > 10:
+            # Integrate each wedge as it is collected
+            if self.preferences.get("streaming", False):
+                full_integration_results = self.xds_streaming(xds_input)
+            elif current_sweep > 10:
                 last = int(10.0/self.image_data["osc_range"])
                 self.tprint("  Have more than threshold degrees of data, running prliminary integration for frames to %d" % last, level=10, color="white")
                 partial_integration_results = self.xds_partial(xdsinput=xds_input,
@@ -504,44 +551,57 @@ class RapdPlugin(Process):
         #self.send_results(self.results)
         os.chdir(self.dirs['work'])
 
+    def convert_hdf5(self):
+        """Convert the HDF5 frames to the CBF files in image_template"""
+
+        self.tprint("  Converting HDF5 frames to CBF", level=10, color="white")
+
+        converter = convert_hdf5_cbf.hdf5_to_cbf_converter(
+            master_file=self.run_data["hdf5_master"],
+            output_dir=self.run_data["directory"],
+            prefix=self.run_data["image_template"].split("_?")[0],
+            image_range="%d-%d" % (self.image_data["start"], self.image_data["end"]),
+            overwrite=False,
+            verbose=False)
+        converter.run()
+
     def get_current_images(self):
         """
         Look for images that match the input
         """
         # self.tprint('get_current_images')
 
-        glob_pattern = os.path.join(self.run_data["directory"], self.run_data["image_template"]).replace("?", "*")
-        # self.tprint(glob_pattern)
-        files = glob.glob(glob_pattern)
-        files.sort()
-        # self.tprint(files)
-        pattern = ".*"+re.sub(r"\?+", "([0-9]+)", self.run_data["image_template"])
-        # self.tprint(pattern)
-
-        # Find first & last frame numbers
-        fm = re.match(pattern, files[0])
-        if fm:
-            first_frame = int(fm.group(1))
-        else:
-            first_frame = 0
-        fm = re.match(pattern, files[-1])
-        if fm:
-            last_frame = int(fm.group(1))
-        else:
-            last_frame = 0
-        # self.tprint((first_frame, last_frame))
+        # Frames in the HDF5 data files present
+        if self.hdf5_master:
+            return hdf5_header.get_frame_range(self.hdf5_master)
+
+        # Only frames past the last one seen are looked for after the first call
+        if not self.frame_scanner:
+            self.frame_scanner = frame_progress.FrameScanner(self.run_data["directory"],
+                                                             self.run_data["image_template"])
+
+        return self.frame_scanner.scan()
 
-        return first_frame, last_frame
+    def get_frame_waiter(self):
+        """
+        Return the frame_progress.FrameWaiter following place_in_run for this run
+        """
+        if not self.frame_waiter:
+            # Get redis instance
+            if not self.redis:
+                self.connect_to_redis()
+            self.frame_waiter = frame_progress.FrameWaiter(
+                self.redis,
+                self.image_data.get('site_tag', self.run_data.get("site_tag")),
+                self.command.get("process", {}).get("run_id") or self.run_data.get("_id"))
+
+        return self.frame_waiter
 
     def get_place_in_run(self):
         """
         Get the current image number (place_in_run) detected by rapd.model.add_image
         """
-        # Get redis instance
-        if not self.redis:
-            self.connect_to_redis()
-        
-        return int(self.redis.get('place_in_run:%s'%self.image_data.get('site_tag',self.run_data.get("site_tag"))))
+        return self.get_frame_waiter().current()
 
     def wait_for_image_redis(self, image_number):
         """
@@ -564,15 +624,14 @@ class RapdPlugin(Process):
         max_time = (image_number - last) * (self.image_data["time"]) * 4
         self.logger.debug('max_time: %s'%str(max_time))
         
-        # Look for images in cycle
-        start_time = time.time()
+        # Wait for control to publish the image
         self.tprint("  Watching for image number %s " % image_number, level=10, color="white", newline=False)
-        while (time.time() - start_time) < max_time:
-            self.tprint(".", level=10, color="white", newline=False)
-            if self.get_place_in_run() >= image_number:
-                self.tprint(".", level=10, color="white")
-                return True
-            time.sleep(1)
+        if self.get_frame_waiter().wait(
+                image_number,
+                max_time,
+                tick=lambda: self.tprint(".", level=10, color="white", newline=False)):
+            self.tprint(".", level=10, color="white")
+            return True
 
         self.tprint(".", level=10, color="white")
         self.logger.debug('Timed out waiting for image to appear')
@@ -589,10 +648,12 @@ class RapdPlugin(Process):
             return self.wait_for_image_redis(image_number)
         else:
             # Determine image to look for
-            target_image = re.sub(r"\?+", "%s0%dd", os.path.join(self.run_data["directory"], self.run_data["image_template"])) % ("%", self.run_data["image_template"].count("?")) % image_number
-    
             # Get a bead on where we are now
             first, last = self.get_current_images()
+            if self.hdf5_master:
+                target_image = "%s frame %d" % (self.hdf5_master, image_number)
+            else:
+                target_image = self.frame_scanner.get_image_path(image_number)
             self.logger.debug('first: %s last: %s'%(first, last))
     
             if image_number <= last:
@@ -609,7 +670,7 @@ class RapdPlugin(Process):
             while (time.time() - start_time) < max_time:
                 self.tprint(".", level=10, color="white", newline=False)
                 #if os.path.exists(target_image):
-                if os.path.isfile(target_image):
+                if self.get_current_images()[1] >= image_number:
                     self.tprint(".", level=10, color="white")
                     return True
                 time.sleep(1)
@@ -675,16 +736,12 @@ class RapdPlugin(Process):
             #    if results['results'].get('data_produced', False):
             #        pprint(results['results'].get('data_produced'))
 
-            # Transcribe results
-            json_results = json.dumps(results)
-
             # Get redis instance
             if not self.redis:
                 self.connect_to_redis()
 
-            # Send results back
-            self.redis.lpush("RAPD_RESULTS", json_results)
-            self.redis.publish("RAPD_RESULTS", json_results)
+            # Send results back, as a patch on the last send where possible
+            self.result_patcher = result_patch.send_results(self.redis, self.result_patcher, results)
 
     def postprocess(self):
         """After it's all done"""
@@ -1124,6 +1181,9 @@ class RapdPlugin(Process):
                 self.tprint(" Using the XDS spacegroup %s" % sg_let_xds, 99, "red")
             spacegoup_agree = False
 
+        # Reindexing in the lattice already integrated only needs CORRECT
+        reintegrate = False
+        reindex = False
         if self.preferences["spacegroup_decider"] in ("auto", "pointless"):
             newinp = self.change_xds_inp(
                 newinp,
@@ -1132,6 +1192,9 @@ class RapdPlugin(Process):
             newinp = self.change_xds_inp(
                 newinp,
                 "SPACE_GROUP_NUMBER=%d\n" % sg_num_pointless)
+            if not spacegoup_agree:
+                reindex = True
+                reintegrate = not same_lattice(sg_num_xds, sg_num_pointless)
 
         # Already have hi res cutoff
         #if self.hi_res:
@@ -1142,22 +1205,32 @@ class RapdPlugin(Process):
             # Returns False if no new cutoff, otherwise returns the value of
             # the high resolution cutoff as a float value.
             new_rescut = self.find_correct_res(xdsdir, 1.0)
-            # sys.exit()
-            newinp = self.change_xds_inp(newinp, "JOB= INTEGRATE CORRECT \n\n")
-            # newinp[-2] = 'JOB= INTEGRATE CORRECT \n\n'
             if new_rescut != False:
                 os.rename('%s/CORRECT.LP' %xdsdir, '%s/CORRECT.LP.nocutoff' %xdsdir)
                 os.rename('%s/XDS.LOG' %xdsdir, '%s/XDS.LOG.nocutoff' %xdsdir)
-                newinp = self.change_xds_inp(
+                cutoffinp = self.change_xds_inp(
                     newinp,
-                    "%sINCLUDE_RESOLUTION_RANGE=%.2f %.2f\n" % (newinp[-2], self.low_res, new_rescut))
-                # newinp[-2] = '%sINCLUDE_RESOLUTION_RANGE=200.0 %.2f\n' % (newinp[-2], new_rescut)
-                self.write_file(xdsfile, newinp)
-                self.tprint(arg="  Reintegrating with new resolution cutoff",
-                            level=99,
-                            color="white",
-                            newline=False)
-                self.xds_run(xdsdir)
+                    "INCLUDE_RESOLUTION_RANGE=%.2f %.2f\n" % (self.low_res, new_rescut))
+                if reintegrate:
+                    newinp = self.change_xds_inp(cutoffinp, "JOB=INTEGRATE CORRECT\n")
+                    self.write_file(xdsfile, newinp)
+                    self.tprint(arg="  Reintegrating with new resolution cutoff",
+                                level=99,
+                                color="white",
+                                newline=False)
+                    self.xds_run(xdsdir)
+                else:
+                    # The statistics without cutoff are wanted in the new spacegroup too
+                    if reindex:
+                        nocutoffinp = newinp
+                    else:
+                        nocutoffinp = False
+                    newinp = cutoffinp
+                    self.tprint(arg="  Rescaling with new resolution cutoff",
+                                level=99,
+                                color="white",
+                                newline=False)
+                    self.xds_correct(xdsdir, newinp, nocutoffinp)
 
                 # Prepare the display of results.
                 prelim_results_2 = self.run_results(xdsdir)
@@ -1178,6 +1251,7 @@ class RapdPlugin(Process):
                 os.rename('%s/GXPARM.XDS' % xdsdir, '%s/XPARM.XDS' % xdsdir)
             os.rename('%s/CORRECT.LP' % xdsdir, '%s/CORRECT.LP.old' % xdsdir)
             os.rename('%s/XDS.LOG' % xdsdir, '%s/XDS.LOG.old' % xdsdir)
+            newinp = self.change_xds_inp(newinp, "JOB=INTEGRATE CORRECT\n")
             self.write_file(xdsfile, newinp)
             self.tprint(arg="  Polishing",
                         level=99,
@@ -1191,10 +1265,11 @@ class RapdPlugin(Process):
             if new_rescut != False:
                 os.rename('%s/CORRECT.LP' %xdsdir, '%s/CORRECT.LP.oldcutoff' %xdsdir)
                 os.rename('%s/XDS.LOG' %xdsdir, '%s/XDS.LOG.oldcutoff' %xdsdir)
-                newinp[-2] = '%sINCLUDE_RESOLUTION_RANGE=200.0 %.2f\n' % (newinp[-2], new_rescut)
-                self.write_file(xdsfile, newinp)
+                newinp = self.change_xds_inp(
+                    newinp,
+                    "INCLUDE_RESOLUTION_RANGE=%.2f %.2f\n" % (self.low_res, new_rescut))
                 self.tprint(arg="  New resolution cutoff", level=99, color="white", newline=False)
-                self.xds_run(xdsdir)
+                self.xds_correct(xdsdir, newinp)
         polishing_rounds += 1
         final_results = self.run_results(xdsdir)
 
@@ -1207,6 +1282,40 @@ class RapdPlugin(Process):
         # final_results['status'] = 'ANALYSIS'
         return final_results
 
+    def xds_correct(self, xdsdir, xdsinp, nocutoffinp=False):
+        """
+        Rescale the integrated data in xdsdir with CORRECT alone
+
+        CORRECT is run in a subdirectory with the integration files linked,
+        so INTEGRATE.HKL is kept as it is, and the output copied back to
+        xdsdir. If nocutoffinp is given, CORRECT is run with it at the same
+        time in another subdirectory and its log kept as CORRECT.LP.nocutoff
+        """
+        self.logger.debug('FastIntegration::xds_correct')
+
+        runs = [("cutoff", xdsinp)]
+        if nocutoffinp:
+            runs.append(("nocutoff", nocutoffinp))
+
+        directories = []
+        for name, inp in runs:
+            directory = os.path.join(xdsdir, "correct_%s" % name)
+            if os.path.isdir(directory) == False:
+                os.mkdir(directory)
+            xds.link_correct_files(xdsdir, directory)
+            self.write_file(os.path.join(directory, "XDS.INP"),
+                            self.change_xds_inp(inp, "JOB=CORRECT\n"))
+            directories.append(directory)
+        self.xds_run_all(directories)
+
+        xds.collect_correct_files(directories[0], xdsdir)
+        self.write_file(os.path.join(xdsdir, "XDS.INP"), xdsinp)
+        if nocutoffinp:
+            for file_name in ("CORRECT.LP", "XDS.LOG"):
+                if os.path.exists(os.path.join(directories[1], file_name)):
+                    shutil.copy(os.path.join(directories[1], file_name),
+                                os.path.join(xdsdir, "%s.nocutoff" % file_name))
+
     def xds_partial(self, xdsinput, end):
         """
         Executes a partial XDS processing on the
@@ -1504,6 +1613,228 @@ class RapdPlugin(Process):
             results = self.run_results(xdsdir)
         return results
 
+    def xds_streaming(self, xdsinput):
+        """
+        Integrate the run wedge by wedge while the frames are collected
+
+        The first wedge is indexed and integrated. Each wedge after is
+        integrated with the geometry of the first as soon as its frames are
+        present. Once the run is done, only CORRECT is run, on the
+        INTEGRATE.HKL of all the wedges.
+        """
+        self.logger.debug('FastIntegration::xds_streaming')
+
+        first = int(self.image_data['start'])
+        final_image = int(self.image_data['end'])
+        try:
+            wedge_size = max(1, int(10 // float(self.image_data['osc_range'])))
+        except (TypeError, ValueError, ZeroDivisionError):
+            self.logger.debug('xds_streaming:: dynamic wedge size allocation failed!')
+            wedge_size = 10
+        wedges = xds.get_wedges(first, final_image, wedge_size)
+
+        # Index and integrate the first wedge
+        self.tprint("  Integrating in wedges of %d frames" % wedge_size, level=10, color="white")
+        if not self.wait_for_image(wedges[0][1]):
+            self.tprint("\n  Seems that data collection has stalled. Integrating what data there is", level=10, color="white")
+            return self.xds_total(xdsinput, last=self.get_current_images()[1])
+        geometry_dir = os.path.join(self.dirs['work'], 'wedge_%d_%d' % wedges[0])
+        prelim_results = self.xds_index_wedge(geometry_dir, wedges[0][1], xdsinput)
+
+        # No geometry to reuse - integrate the run when it is done
+        if not isinstance(prelim_results, dict):
+            self.tprint("\n  First wedge failed, waiting for the whole run", level=30, color="red")
+            if self.wait_for_image(final_image):
+                return self.xds_total(xdsinput)
+            return self.xds_total(xdsinput, last=self.get_current_images()[1])
+
+        self.results["results"].update(prelim_results)
+        self.send_results(self.results)
+        self.tprint("\nPreliminary results summary", 99, "blue")
+        self.print_results(prelim_results)
+        self.tprint(20, "progress")
+
+        # Integrate the rest as the frames come in
+        hkl_files = [os.path.join(geometry_dir, 'INTEGRATE.HKL')]
+        last = wedges[0][1]
+        for index, (wedge_first, wedge_last) in enumerate(wedges[1:], 2):
+            stalled = not self.wait_for_image(wedge_last)
+            if stalled:
+                wedge_last = min(wedge_last, self.get_current_images()[1])
+                if wedge_last < wedge_first:
+                    break
+                self.tprint("\n  Seems that data collection has stalled. Integrating data to frame %d" % wedge_last, level=10, color="white")
+            hkl_file = self.xds_integrate_wedge(geometry_dir, wedge_first, wedge_last, xdsinput)
+            if not hkl_file:
+                self.tprint("\n  Integration of frames %d-%d failed, integrating the whole run" %
+                            (wedge_first, wedge_last), level=30, color="red")
+                if stalled or self.wait_for_image(final_image):
+                    return self.xds_total(xdsinput, last=max(wedge_last, last))
+                return self.xds_total(xdsinput, last=self.get_current_images()[1])
+            hkl_files.append(hkl_file)
+            last = wedge_last
+            self.tprint(20 + (60 * index / len(wedges)), "progress")
+            if stalled:
+                break
+
+        final_results = self.xds_correct_wedges(geometry_dir, hkl_files, last, xdsinput)
+        if not isinstance(final_results, dict):
+            self.tprint("\n  Scaling the wedges failed, integrating the whole run", level=30, color="red")
+            return self.xds_total(xdsinput, last=last)
+        return final_results
+
+    def xds_index_wedge(self, xdsdir, last, xdsinput):
+        """
+        Index and integrate the first wedge of the run in xdsdir, without the
+        resolution cutoff, so its INTEGRATE.HKL can be scaled with the rest
+        """
+        self.logger.debug('FastIntegration::xds_index_wedge')
+        self.tprint(arg="\nXDS processing", level=99, color="blue")
+
+        if os.path.isdir(xdsdir) == False:
+            os.mkdir(xdsdir)
+
+        xdsinp = xdsinput[:]
+        xdsinp = self.change_xds_inp(xdsinp, "MAXIMUM_NUMBER_OF_PROCESSORS=%s\n" % self.procs)
+        xdsinp = self.change_xds_inp(xdsinp, "MAXIMUM_NUMBER_OF_JOBS=%s\n" % self.jobs)
+        xdsinp = self.change_xds_inp(xdsinp, "JOB=XYCORR INIT COLSPOT IDXREF\n")
+        xdsinp = self.change_xds_inp(xdsinp, "DATA_RANGE=%s %s\n" % (self.image_data['start'], last))
+        xdsfile = os.path.join(xdsdir, 'XDS.INP')
+        self.write_file(xdsfile, xdsinp)
+        self.tprint(arg="  Indexing first wedge", level=99, color="white", newline=False)
+        self.xds_run(xdsdir)
+
+        # Override spacegroup?
+        if self.spacegroup != False:
+            xdsinp = self.find_xds_symm(xdsdir, xdsinp)
+        else:
+            xdsinp = self.change_xds_inp(xdsinp, "JOB=DEFPIX INTEGRATE CORRECT\n")
+        self.write_file(xdsfile, xdsinp)
+        self.tprint(arg="  Integrating", level=99, color="white", newline=False)
+        self.xds_run(xdsdir)
+
+        # If known xds_errors occur, catch them and take corrective action
+        newinp = 'check_again'
+        while newinp == 'check_again':
+            newinp = self.check_for_xds_errors(xdsdir, xdsinp)
+        if newinp == False:
+            self.logger.debug('  Unknown xds error occurred for %s.', xdsdir)
+            return False
+
+        return self.run_results(xdsdir)
+
+    def xds_integrate_wedge(self, geometry_dir, first, last, xdsinput):
+        """
+        Integrate frames first to last with the geometry from geometry_dir.
+        Returns the INTEGRATE.HKL written, or False.
+        """
+        self.logger.debug('FastIntegration::xds_integrate_wedge %d-%d', first, last)
+
+        xdsdir = os.path.join(self.dirs['work'], 'integrate_%d_%d' % (first, last))
+        if os.path.isdir(xdsdir) == False:
+            os.mkdir(xdsdir)
+        try:
+            xds.copy_integrate_files(geometry_dir, xdsdir)
+        except IOError:
+            self.logger.exception('Could not copy the geometry from %s', geometry_dir)
+            return False
+
+        xdsinp = xdsinput[:]
+        xdsinp = self.change_xds_inp(xdsinp, "MAXIMUM_NUMBER_OF_PROCESSORS=%s\n" % self.procs)
+        xdsinp = self.change_xds_inp(xdsinp, "MAXIMUM_NUMBER_OF_JOBS=%s\n" % self.jobs)
+        xdsinp = self.change_xds_inp(xdsinp, "JOB=INTEGRATE\n")
+        xdsinp = self.change_xds_inp(xdsinp, "DATA_RANGE=%s %s\n" % (first, last))
+        self.write_file(os.path.join(xdsdir, 'XDS.INP'), xdsinp)
+        self.tprint(arg="  Integrating frames %d-%d" % (first, last),
+                    level=99,
+                    color="white",
+                    newline=False)
+        self.xds_run(xdsdir)
+
+        hkl_file = os.path.join(xdsdir, 'INTEGRATE.HKL')
+        if os.path.exists(hkl_file):
+            return hkl_file
+        return False
+
+    def xds_correct_wedges(self, geometry_dir, hkl_files, last, xdsinput):
+        """
+        Scale the INTEGRATE.HKL of the wedges with one CORRECT run, then again
+        with the resolution cutoff. Returns the final results.
+        """
+        self.logger.debug('FastIntegration::xds_correct_wedges')
+        self.tprint(arg="\nScaling all wedges", level=99, color="blue")
+
+        # A directory of its own, as the first wedge's has the same range
+        # when it is the only one
+        first = int(self.image_data['start'])
+        xdsdir = os.path.join(self.dirs['work'], 'correct_%d_%d' % (first, last))
+        if os.path.isdir(xdsdir) == False:
+            os.mkdir(xdsdir)
+
+        xds.merge_integrate_hkl(hkl_files, os.path.join(xdsdir, 'INTEGRATE.HKL'), (first, last))
+        # The logs run_results reads - the last INTEGRATE.LP has the latest mosaicity
+        shutil.copy(os.path.join(geometry_dir, 'IDXREF.LP'), xdsdir)
+        shutil.copy(os.path.join(os.path.dirname(hkl_files[-1]), 'INTEGRATE.LP'), xdsdir)
+
+        if not self.low_res:
+            self.low_res = 200.0
+        if not self.hi_res:
+            self.hi_res = 0.9
+        xdsinp = xdsinput[:]
+        xdsinp = self.change_xds_inp(xdsinp, "INCLUDE_RESOLUTION_RANGE=%.2f %.2f\n" %
+                                     (self.low_res, self.hi_res))
+        xdsinp = self.change_xds_inp(xdsinp, "MAXIMUM_NUMBER_OF_PROCESSORS=%s\n" % self.procs)
+        xdsinp = self.change_xds_inp(xdsinp, "JOB=CORRECT\n")
+        xdsinp = self.change_xds_inp(xdsinp, "DATA_RANGE=%s %s\n" % (first, last))
+        xdsfile = os.path.join(xdsdir, 'XDS.INP')
+        self.write_file(xdsfile, xdsinp)
+        self.tprint(arg="  Scaling", level=99, color="white", newline=False)
+        self.xds_run(xdsdir)
+
+        results = self.run_results(xdsdir)
+        if not isinstance(results, dict):
+            return results
+
+        # Pointless decides the spacegroup
+        sg_let_pointless = results["summary"]["scaling_spacegroup"]
+        sg_num_pointless = spacegroup.ccp4_to_number[sg_let_pointless]
+        rerun = False
+        if self.preferences["spacegroup_decider"] in ("auto", "pointless") and \
+           sg_num_pointless != results["xparm"]["sg_num"]:
+            self.tprint("Pointless and XDS disagree on spacegroup, using the pointless spacegroup %s" %
+                        sg_let_pointless, 99, "red")
+            xdsinp = self.change_xds_inp(
+                xdsinp,
+                "UNIT_CELL_CONSTANTS=%.2f %.2f %.2f %.2f %.2f %.2f\n" %
+                tuple(results["summary"]["scaling_unit_cell"]))
+            xdsinp = self.change_xds_inp(xdsinp, "SPACE_GROUP_NUMBER=%d\n" % sg_num_pointless)
+            rerun = True
+
+        # Find a suitable cutoff for resolution
+        if not self.preferences.get("hi_res", False):
+            new_rescut = self.find_correct_res(xdsdir, 1.0)
+            if new_rescut != False:
+                os.rename('%s/CORRECT.LP' % xdsdir, '%s/CORRECT.LP.nocutoff' % xdsdir)
+                os.rename('%s/XDS.LOG' % xdsdir, '%s/XDS.LOG.nocutoff' % xdsdir)
+                xdsinp = self.change_xds_inp(xdsinp, "INCLUDE_RESOLUTION_RANGE=%.2f %.2f\n" %
+                                             (self.low_res, new_rescut))
+                rerun = True
+
+        if rerun:
+            self.write_file(xdsfile, xdsinp)
+            self.tprint(arg="  Rescaling", level=99, color="white", newline=False)
+            self.xds_run(xdsdir)
+            results = self.run_results(xdsdir)
+            if not isinstance(results, dict):
+                return results
+
+        self.tprint("\nFinal results summary", 99, "blue")
+        self.print_results(results)
+        self.print_plots(results)
+        self.tprint(90, "progress")
+
+        return results
+
     def create_xds_input(self, inp):
         """
     	This function takes the dict holding XDS keywords and values
@@ -1536,15 +1867,20 @@ class RapdPlugin(Process):
         else:
             raise RuntimeError, '"image_template" not defined in input data.'
 
-        file_template = os.path.join(self.image_data['directory'], self.image_template)
-    	# Count the number of '?' that need to be padded in a image filename.
-        pad = file_template.count('?')
-    	# Replace the first instance of '?' with the padded out image number
-    	# of the last frame
-        #self.last_image = file_template.replace('?', '%d'.zfill(pad) % last_frame, 1)
-        self.last_image = file_template.replace('?', '%d'.zfill(pad) % self.image_data['end'], 1)
-    	# Remove the remaining '?'
-        self.last_image = self.last_image.replace('?', '')
+        if self.hdf5_master:
+            # XDS puts "master" in place of the '?'
+            file_template = get_hdf5_name_template(self.hdf5_master)
+            self.last_image = self.hdf5_master
+        else:
+            file_template = os.path.join(self.image_data['directory'], self.image_template)
+        	# Count the number of '?' that need to be padded in a image filename.
+            pad = file_template.count('?')
+        	# Replace the first instance of '?' with the padded out image number
+        	# of the last frame
+            #self.last_image = file_template.replace('?', '%d'.zfill(pad) % last_frame, 1)
+            self.last_image = file_template.replace('?', '%d'.zfill(pad) % self.image_data['end'], 1)
+        	# Remove the remaining '?'
+            self.last_image = self.last_image.replace('?', '')
     	# Repeat the last two steps for the first image's filename.
         #self.first_image = file_template.replace('?', str(self.image_data["start"]).zfill(pad), 1)
         #self.first_image = self.first_image.replace('?', '')
@@ -1562,6 +1898,10 @@ class RapdPlugin(Process):
                      'BACKGROUND_RANGE=%s\n\n' % background_range,
                      '!===== DETECTOR_PARAMETERS =====\n']
 
+        # The plugin XDS reads HDF5 frames with
+        if self.hdf5_master:
+            xds_input.insert(6, 'LIB=%s\n' % self.xds_hdf5_lib)
+
         # Regions that are excluded are defined with
         # various keyword containing the word UNTRUSTED.
         # Since different detectors may have different
@@ -1657,14 +1997,33 @@ class RapdPlugin(Process):
         self.logger.debug("directory = %s", directory)
         self.logger.debug("detector = %s", self.image_data["detector"])
 
-        xds_command = "xds_par"
+        self.xds_run_all((directory,))
 
-        os.chdir(directory)
-        # TODO skip processing for now
+    def xds_run_all(self, directories):
+        """
+        Launches xds in each of the directories at once, and waits for all of
+        them to finish
+        """
+        self.logger.debug("directories = %s", directories)
 
-        xds_proc = Process(target=self.launcher,
-                           kwargs={"command": xds_command,
-                                   "logfile": "XDS.LOG"})
+        xds_command = "xds_par"
+
+        launcher_kwargs = {"command": xds_command,
+                           "logfile": "XDS.LOG"}
+        # Reserve the processors xds_par will use
+        if self.batch_queue:
+            launcher_kwargs.update(self.batch_queue)
+            launcher_kwargs["nproc"] = self.procs
+
+        # Each process starts in the directory current when it is forked
+        xds_procs = []
+        for directory in directories:
+            os.chdir(directory)
+            xds_proc = Process(target=self.launcher,
+                               kwargs=launcher_kwargs)
+            xds_proc.start()
+            xds_procs.append(xds_proc)
+        os.chdir(self.dirs['work'])
 
         """
         if self.cluster_use == True:
@@ -1676,12 +2035,10 @@ class RapdPlugin(Process):
                                                        "logfile": "XDS.LOG",
                                                       })
         """
-        xds_proc.start()
-        while xds_proc.is_alive():
+        while [xds_proc for xds_proc in xds_procs if xds_proc.is_alive()]:
             time.sleep(1)
             self.tprint(arg=".", level=99, color="white", newline=False)
         self.tprint(arg=" done", level=99, color="white")
-        os.chdir(self.dirs['work'])
 
         return
 
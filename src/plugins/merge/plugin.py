@@ -84,6 +84,7 @@ import utils.commandline_utils as commandline_utils
 # import detectors.detector_utils as detector_utils
 # import utils
 import utils.credits as credits
+import utils.result_patch as result_patch
 import utils.text as rtext
 import info
 
@@ -279,6 +280,7 @@ class RapdPlugin(multiprocessing.Process):
     """
 
     results = {}
+    result_patcher = None
 
     def __init__(self, site, command, tprint=False, logger=False):
         """Initialize the merging processing using agglomerative hierachical clustering process"""
@@ -1467,16 +1469,12 @@ class RapdPlugin(multiprocessing.Process):
 
             self.logger.debug("Sending back on redis")
 
-            # Transcribe results
-            json_results = json.dumps(results)
-
             # Get redis instance
             if not self.redis:
                 self.connect_to_redis()
 
-            # Send results back
-            self.redis.lpush("RAPD_RESULTS", json_results)
-            self.redis.publish("RAPD_RESULTS", json_results)
+            # Send results back, as a patch on the last send where possible
+            self.result_patcher = result_patch.send_results(self.redis, self.result_patcher, results)
 
     def print_credits(self):
         """Print credits for programs utilized by this plugin"""
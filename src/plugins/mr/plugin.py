@@ -47,17 +47,18 @@ from pprint import pprint
 import shutil
 import time
 import importlib
-import random
 
 # RAPD 
 from bson.objectid import ObjectId
-from plugins.subcontractors.rapd_phaser import run_phaser
+from plugins.subcontractors.rapd_phaser import PREPARED_LABELS, prepare_data, run_phaser
 from plugins.subcontractors.rapd_cctbx import get_pdb_info, get_mtz_info, get_res
 from plugins.get_cif.plugin import check_pdbq
 from utils import archive
 import utils.credits as rcredits
 import utils.exceptions as exceptions
 import utils.global_vars as rglobals
+from utils.model_cache import fetch_model
+import utils.result_patch as result_patch
 from utils.text import json
 import utils.xutils as xutils
 from utils.processes import local_subprocess, mp_pool, mp_manager
@@ -116,10 +117,16 @@ class RapdPlugin(Thread):
     status_incr = 1
 
     redis = False
+    result_patcher = None
     pool = False
     batch_queue = False
+    # The cluster adapter can submit without waiting
+    cluster_submit = False
     manager = False
 
+    # Data corrected for anisotropy once for all the Phaser runs
+    prepared_data = False
+
     # Timers for processes
     phaser_timer = rglobals.PHASER_TIMEOUT
 
@@ -179,6 +186,8 @@ class RapdPlugin(Thread):
         if self.computer_cluster:
             self.launcher = self.computer_cluster.process_cluster
             self.batch_queue = self.computer_cluster.check_queue(self.command.get('command'))
+            # Phaser runs then go through the one cluster session of this process
+            self.cluster_submit = hasattr(self.computer_cluster, "submit")
         else:
             # if NOT using a computer cluster setup a multiprocessing.pool and manager for queues. 
             self.launcher = local_subprocess
@@ -273,7 +282,7 @@ class RapdPlugin(Thread):
         elif len(self.struct_file) == 4:
             # Download file from PDB code and get PDB info
             repository = check_pdbq(self.tprint, self.logger)
-            self.struct_file = repository.download_cif(self.struct_file, os.path.join(os.getcwd(),self.struct_file.lower()+'.cif'))
+            self.struct_file = fetch_model(repository, self.struct_file, os.path.join(os.getcwd(),self.struct_file.lower()+'.cif'))
             self.pdb_info = get_pdb_info(self.struct_file, self.data_file, self.dres)
         else:
             self.postprocess_invalid_input_file()
@@ -399,25 +408,47 @@ class RapdPlugin(Thread):
 
             self.logger.debug("Sending back on redis")
 
-            #pprint(self.results)
-            # Transcribe results
-            json_results = json.dumps(self.results)
-
             # Get redis instance
             if not self.redis:
                 self.connect_to_redis()
 
-            # Send results back
-            self.redis.lpush("RAPD_RESULTS", json_results)
-            self.redis.publish("RAPD_RESULTS", json_results)
+            # Send results back, as a patch on the last send where possible
+            self.result_patcher = result_patch.send_results(self.redis, self.result_patcher, self.results)
 
     def process(self):
         """Run plugin action"""
 
+        self.prepare_phaser_data()
+
         self.process_phaser()
 
         self.jobs_monitor()
 
+    def prepare_phaser_data(self):
+        """
+        Correct the data for anisotropy once, so the Phaser run for each
+        spacegroup does not do it again. The prepared data are kept in the
+        working directory and used again while newer than the data file.
+        """
+
+        self.logger.debug("prepare_phaser_data")
+
+        work_dir = os.path.abspath(os.path.join(self.working_dir, "Phaser_data"))
+        xutils.create_folder(work_dir, move_to=False)
+
+        prepared_file = os.path.join(work_dir, "prepared.mtz")
+        if os.path.exists(prepared_file) and \
+           os.path.getmtime(prepared_file) >= os.path.getmtime(self.data_file):
+            self.prepared_data = {"data_file": prepared_file,
+                                  "labels": PREPARED_LABELS}
+        else:
+            self.tprint("  Correcting data for anisotropy", level=10, color="white")
+            self.prepared_data = prepare_data(self.data_file, work_dir)
+
+        # Each run corrects the data itself if this failed
+        if not self.prepared_data:
+            self.logger.debug("Could not prepare %s for Phaser" % self.data_file)
+
     def process_phaser(self, full=False):
         """Start Phaser for input pdb"""
 
@@ -429,10 +460,9 @@ class RapdPlugin(Thread):
         def launch_job(inp):
             """Launch the Phaser job"""
             #self.logger.debug("process_phaser Launching %s"%inp['name'])
-            tag = 'Phaser_%d' % random.randint(0, 10000)
             if self.computer_cluster:
-                # Create a unique identifier for Phaser results
-                inp['tag'] = tag
+                if self.cluster_submit:
+                    inp['submit'] = self.computer_cluster.submit
                 # Send Redis settings so results can be sent thru redis
                 inp['db_settings'] = self.site.CONTROL_DATABASE_SETTINGS
                 # Don't need result queue since results will be sent via Redis
@@ -443,8 +473,8 @@ class RapdPlugin(Thread):
                 queue = self.manager.Queue()
                 inp['result_queue'] = queue
 
-            # Launch the job
-            job, pid = run_phaser(**inp)
+            # Launch the job. The tag is the Redis key of the results
+            job, pid, tag = run_phaser(**inp)
             self.jobs[job] = {'name': inp['name'],
                               'pid' : pid,
                               'tag' : tag,
@@ -459,6 +489,13 @@ class RapdPlugin(Thread):
             for key in self.pdb_info.keys():
                 if key != 'all':
                     del self.pdb_info[key]
+        # Share the machine between the runs, each Phaser run using more
+        # threads when there are fewer of them
+        threads = False
+        if not self.computer_cluster:
+            runs = len(run_sg) * len([chain for chain in self.pdb_info.keys()
+                                      if self.pdb_info[chain]['SC'] > 0.2])
+            threads = max(1, self.preferences.get("nproc", cpu_count()-1) // max(1, runs))
         # Only launch is greater than 20% solvent content
         for chain in self.pdb_info.keys():
             if self.pdb_info[chain]['SC'] > 0.2:
@@ -483,6 +520,8 @@ class RapdPlugin(Thread):
                         "adf": self.adf,
                         #"test": self.preferences.get("test", False),
                         "resolution": res,
+                        "prepared_data": self.prepared_data,
+                        "threads": threads,
                         "launcher": self.launcher,
                         "tag": False,
                         "batch_queue": self.batch_queue,
@@ -586,6 +625,7 @@ class RapdPlugin(Thread):
 
         timed_out = False
         timer = 0
+        start = time.time()
         if full:
             jobs = [job for job in self.jobs.keys() if self.jobs[job]['name'][-1] == '1']
         else:
@@ -597,10 +637,18 @@ class RapdPlugin(Thread):
                 if self.pool:
                     if job.ready():
                         finish_job(job)
+                elif self.cluster_submit:
+                    if job.done():
+                        finish_job(job)
                 elif job.is_alive() == False:
                     finish_job(job)
-            time.sleep(1)
-            timer += 1
+            if self.cluster_submit and len(jobs):
+                # Woken as soon as a job ends
+                self.computer_cluster.wait_any(jobs, 1)
+            else:
+                time.sleep(1)
+            # Seconds, as a wait may end early
+            timer = time.time() - start
             """
             if self.verbose:
               if round(timer%1,1) in (0.0,1.0):
@@ -615,7 +663,9 @@ class RapdPlugin(Thread):
                 self.logger.debug('MR timed out.')
                 print 'MR timed out.'
             for job in self.jobs.keys():
-                if self.computer_cluster:
+                if self.cluster_submit:
+                    job.cancel()
+                elif self.computer_cluster:
                     # Kill job on cluster:
                     self.computer_cluster.kill_job(self.jobs[job].get('pid'))
                 else:
@@ -795,6 +845,10 @@ class RapdPlugin(Thread):
 
         self.tprint(arg=90, level="progress")
 
+        # Exit the cluster session the Phaser runs went through
+        if self.cluster_submit:
+            self.computer_cluster.shutdown()
+
         # Cleanup my mess.
         self.clean_up()
 
@@ -28,6 +28,11 @@ __status__ = "Development"
 # Get the default preferences setup
 DEFAULT_PREFERENCES = {"pdb_limit": 5, #DEFAULT:40
                        "cell_limit": 25,
+                       # Cancel the rest of the screen once a Phaser solution
+                       # reaches both of these
+                       "stop_on_solution": True,
+                       "solution_tfz": 8.0,
+                       "solution_llg": 120.0,
                        
   }
 
@@ -45,12 +45,11 @@ from multiprocessing import cpu_count
 from threading import Thread
 import os
 from pprint import pprint
-import random
 import shutil
+import signal
 import sys
 import time
 import importlib
-import random
 
 # RAPD 
 from bson.objectid import ObjectId
@@ -62,6 +61,10 @@ from utils import archive
 import utils.credits as rcredits
 import utils.exceptions as exceptions
 import utils.global_vars as rglobals
+from utils.cell_index import get_cell_index
+from utils.model_cache import fetch_model
+from utils.phaser_schedule import PhaserSchedule, is_confident, phaser_cost
+import utils.result_patch as result_patch
 from utils.text import json
 import utils.xutils as xutils
 from utils.processes import local_subprocess, mp_pool, mp_manager
@@ -136,8 +139,19 @@ class RapdPlugin(Thread):
     status = 1
     
     redis = False
+    result_patcher = None
     pool = False
     batch_queue = False
+    # The cluster adapter can submit without waiting
+    cluster_submit = False
+
+    # Phaser jobs waiting for a slot, and the most run at once
+    schedule = None
+    phaser_slots = 0
+    # Timed out pool runs, holding their slot until they end
+    abandoned = None
+    # Name of the job with a confident solution
+    solved = False
 
     # Timers for processes
     phaser_timer = rglobals.PHASER_TIMEOUT
@@ -202,10 +216,17 @@ class RapdPlugin(Thread):
         if self.computer_cluster:
             self.launcher = self.computer_cluster.process_cluster
             self.batch_queue = self.computer_cluster.check_queue(self.command.get('command'))
+            self.phaser_slots = self.preferences.get("phaser_jobs", rglobals.PHASER_CLUSTER_JOBS)
+            # Phaser runs then go through the one cluster session of this process
+            self.cluster_submit = hasattr(self.computer_cluster, "submit")
         else:
             self.launcher = local_subprocess
             self.pool = mp_pool(self.preferences.get("nproc", cpu_count()-1))
             self.manager = mp_manager()
+            self.phaser_slots = self.preferences.get("phaser_jobs",
+                                                     self.preferences.get("nproc", cpu_count()-1))
+        self.schedule = PhaserSchedule()
+        self.abandoned = []
 
         # Setup a multiprocessing pool if not using a computer cluster.
         #if not self.computer_cluster:
@@ -377,17 +398,12 @@ class RapdPlugin(Thread):
 
             self.logger.debug("Sending back on redis")
 
-            #pprint(self.results)
-            # Transcribe results
-            json_results = json.dumps(self.results)
-
             # Get redis instance
             if not self.redis:
                 self.connect_to_redis()
 
-            # Send results back
-            self.redis.lpush("RAPD_RESULTS", json_results)
-            self.redis.publish("RAPD_RESULTS", json_results)
+            # Send results back, as a patch on the last send where possible
+            self.result_patcher = result_patch.send_results(self.redis, self.result_patcher, self.results)
 
     def process(self):
         """Run plugin action"""
@@ -493,11 +509,17 @@ class RapdPlugin(Thread):
             #limit = 8
             limit = self.preferences.get("pdb_limit", 20)
 
-        # Limit the unit cell difference to 25%. Also stops it if errors are received.
         pdbq_results = {}
         counter = 0
+
+        # Search the local cell index in one go, if there is one
+        cell_index = get_cell_index()
+        if cell_index:
+            pdbq_results = self.search_cell_index(cell_index, limit, no_limit)
+
+        # Limit the unit cell difference to 25%. Also stops it if errors are received.
         #while counter < 25:
-        while counter < self.preferences.get("cell_limit", 25):
+        while not cell_index and counter < self.preferences.get("cell_limit", 25):
             self.tprint("  Querying server at %s" % PDBQ_SERVER,
                         level=20,
                         color="white")
@@ -552,6 +574,45 @@ class RapdPlugin(Thread):
                         level=50,
                         color="red")
 
+    def search_cell_index(self, cell_index, limit, no_limit):
+        """
+        Return the PDB entries with cells like the data from the local cell
+        index, as query_pdbq would get from the PDBQ server
+        """
+
+        self.logger.debug("search_cell_index")
+        self.tprint("  Searching the local unit cell index",
+                    level=20,
+                    color="white")
+
+        # As far as the PDBQ queries would widen the search
+        tolerance = (self.percent + 0.01 * (self.preferences.get("cell_limit", 25) - 1)) / 2
+        hits = cell_index.search(self.cell, limit=limit, tolerance=tolerance)
+
+        # Do not limit number of results if many models come out really close in cell
+        # dimensions.
+        if no_limit:
+            close = cell_index.search(self.cell, tolerance=(self.percent + 0.01) / 2)
+            if len(close) > len(hits):
+                hits = close
+
+        pdb_codes = [pdb_code for pdb_code, deviation in hits if len(pdb_code) <= 4]
+        if not pdb_codes:
+            return {}
+
+        # Get the molecular descriptions in one query
+        if self.repository:
+            descriptions = self.repository.check_for_pdbs(pdb_codes)
+        else:
+            descriptions = dict((pdb_code, {"description": "Unknown"}) for pdb_code in pdb_codes)
+
+        # Keep how far each cell is from the data for ordering the Phaser runs
+        deviations = dict(hits)
+        for pdb_code, description in descriptions.iteritems():
+            if pdb_code in deviations:
+                description["cell_deviation"] = deviations[pdb_code]
+        return descriptions
+
     def add_contaminants(self):
         """
         Add common PDB contaminants to the search list.
@@ -596,44 +657,12 @@ class RapdPlugin(Thread):
 
         self.tprint("  Assembling Phaser runs", level=10, color="white")
 
-        def launch_job(inp):
-            """Launch the Phaser job"""
-            #self.logger.debug("process_phaser Launching %s"%inp['name'])
-            tag = 'Phaser_%d' % random.randint(0, 10000)
-            if self.computer_cluster:
-                # Create a unique identifier for Phaser results
-                inp['tag'] = tag
-                # Send Redis settings so results can be sent thru redis
-                #inp['db_settings'] = self.site.CONTROL_DATABASE_SETTINGS
-                # Don't need result queue since results will be sent via Redis
-                queue = False
-            else:
-                inp['pool'] = self.pool
-                # Add result queue
-                queue = self.manager.Queue()
-                inp['result_queue'] = queue
-            
-            #if self.pool:
-            #    inp['pool'] = self.pool
-            #else:
-            #    inp['tag'] = tag
-            #job, pid, tag = run_phaser(**inp)
-            job, pid = run_phaser(**inp)
-            self.jobs[job] = {'name': inp['name'],
-                              'pid' : pid,
-                              'tag' : tag,
-                              'result_queue': queue,
-                              'spacegroup': inp['spacegroup'] # Need for jobs that timeout.
-                              }
-
-        # Run through the pdbs
+        # Work out how each structure is to be prepared
+        preparations = []
         for pdb_code in self.cell_output.keys():
 
             self.tprint("    %s" % pdb_code, level=30, color="white")
 
-            l = False
-            copy = 1
-
             # Create directory for MR
             xutils.create_folders(self.working_dir, "Phaser_%s" % pdb_code)
             cif_file = pdb_code.lower() + ".cif"
@@ -642,103 +671,218 @@ class RapdPlugin(Thread):
             if self.test and os.path.exists(cif_file):
                 cif_path = os.path.join(os.getcwd(), cif_file)
             else:
-                cif_path = self.repository.download_cif(pdb_code, os.path.join(os.getcwd(), cif_file))
+                cif_path = fetch_model(self.repository, pdb_code, os.path.join(os.getcwd(), cif_file))
             
             if not cif_path:
                 self.postprocess_invalid_code(pdb_code)
+                continue
+
+            # If mmCIF, checks if file exists or if it is super structure with
+            # multiple PDB codes, and returns False, otherwise sends back SG.
+            spacegroup_pdb = xutils.fix_spacegroup(get_spacegroup_info(cif_path))
+            if not spacegroup_pdb:
+                del self.cell_output[pdb_code]
+                continue
+
+            # Now check all SG's
+            spacegroup_num = xutils.convert_spacegroup(spacegroup_pdb)
+            lg_pdb = xutils.get_sub_groups(spacegroup_num, "laue")
+            self.tprint("      %s spacegroup: %s (%s)" % (cif_path, spacegroup_pdb, spacegroup_num),
+                        level=10,
+                        color="white")
+            self.tprint("      subgroups: %s" % str(lg_pdb), level=10, color="white")
+
+            # Fewer mols in AU or in common_contaminents.
+            if pdb_code in self.common_contaminants or float(self.laue) > float(lg_pdb):
+                # if SM is lower sym, which will cause problems, since PDB is too big.
+                mols = "fewer"
+                matthews, chains = True, True
+            # More mols in AU
+            elif float(self.laue) < float(lg_pdb):
+                mols = "more"
+                matthews, chains = True, False
+            # Same number of mols in AU.
             else:
-                # If mmCIF, checks if file exists or if it is super structure with
-                # multiple PDB codes, and returns False, otherwise sends back SG.
-                spacegroup_pdb = xutils.fix_spacegroup(get_spacegroup_info(cif_path))
-                if not spacegroup_pdb:
-                    del self.cell_output[pdb_code]
-                    continue
-
-                # Now check all SG's
-                spacegroup_num = xutils.convert_spacegroup(spacegroup_pdb)
-                lg_pdb = xutils.get_sub_groups(spacegroup_num, "laue")
-                self.tprint("      %s spacegroup: %s (%s)" % (cif_path, spacegroup_pdb, spacegroup_num),
-                            level=10,
-                            color="white")
-                self.tprint("      subgroups: %s" % str(lg_pdb), level=10, color="white")
-    
-                # SG from data
-                data_spacegroup = xutils.convert_spacegroup(self.laue, True)
-                # self.tprint("      Data spacegroup: %s" % data_spacegroup, level=10, color="white")
-    
-                # Fewer mols in AU or in common_contaminents.
-                if pdb_code in self.common_contaminants or float(self.laue) > float(lg_pdb):
-                    # if SM is lower sym, which will cause problems, since PDB is too big.
-                    pdb_info = get_pdb_info(struct_file=cif_path,
-                                            data_file=self.data_file,
-                                            dres=self.dres,
-                                            matthews=True,
-                                            chains=True)
-                    # Prune if only one chain present, b/c "all" and "A" will be the same.
-                    if len(pdb_info.keys()) == 2:
-                        for key in pdb_info.keys():
-                            if key != "all":
-                                del pdb_info[key]
-                    copy = pdb_info["all"]["NMol"]
-                    if copy == 0:
-                        copy = 1
-                    # If pdb_info["all"]["res"] == 0.0:
-                    if pdb_info["all"]["SC"] < 0.2:
-                        # Only run on chains that will fit in the AU.
-                        l = [chain for chain in pdb_info.keys() if pdb_info[chain]["res"] != 0.0]
-    
-                # More mols in AU
-                elif float(self.laue) < float(lg_pdb):
-                    pdb_info = get_pdb_info(struct_file=cif_path,
-                                            data_file=self.data_file,
-                                            dres=self.dres,
-                                            matthews=True,
-                                            chains=False)
-                    copy = pdb_info["all"]["NMol"]
-    
-                # Same number of mols in AU.
-                else:
-                    pdb_info = get_pdb_info(struct_file=cif_path,
-                                            data_file=self.data_file,
-                                            dres=self.dres,
-                                            matthews=False,
-                                            chains=False)
-    
-                job_description = {
-                    "work_dir": os.path.abspath(os.path.join(self.working_dir, "Phaser_%s" % pdb_code)), #
-                    "data_file": self.data_file,
-                    "struct_file": cif_path,
-                    "name": pdb_code, #
-                    "spacegroup": data_spacegroup,
-                    "ncopy": copy,  #
-                    #"test": self.test,
-                    "cell_analysis": True,  #
-                    #"large_cell": self.large_cell,
-                    "resolution": xutils.set_phaser_res(pdb_info["all"]["res"],
-                                                 self.large_cell,
-                                                 self.dres),
-                    "launcher": self.launcher,  #
-                    "db_settings": self.db_settings,  #
-                    "tag": False,  #
-                    "batch_queue": self.batch_queue, #
-                    "rapd_python": self.rapd_python}
-    
-                if not l:
-                    launch_job(job_description)
-                else:
-                    for chain in l:
-                        new_code = "%s_%s" % (pdb_code, chain)
-                        xutils.folders(self, "Phaser_%s" % new_code)
-                        job_description.update({
-                            "work_dir": os.path.abspath(os.path.join(self.working_dir, "Phaser_%s" % \
-                                new_code)),
-                            "struct_file": pdb_info[chain]["file"],
-                            "name":new_code,
-                            "ncopy":pdb_info[chain]["NMol"],
-                            "resolution":xutils.set_phaser_res(pdb_info[chain]["res"],
-                                                        self.large_cell,
-                                                        self.dres)})
-                        launch_job(job_description)
+                mols = "same"
+                matthews, chains = False, False
+
+            preparations.append((pdb_code, cif_path, mols, {"struct_file": cif_path,
+                                                            "data_file": self.data_file,
+                                                            "dres": self.dres,
+                                                            "matthews": matthews,
+                                                            "chains": chains}))
+
+        # Prepare the structures together
+        self.tprint("  Preparing %d structures" % len(preparations), level=10, color="white")
+        pdb_infos = self.prepare_models([kwargs for _, _, _, kwargs in preparations])
+
+        # SG from data
+        data_spacegroup = xutils.convert_spacegroup(self.laue, True)
+        # self.tprint("      Data spacegroup: %s" % data_spacegroup, level=10, color="white")
+
+        # Launch Phaser for each
+        for (pdb_code, cif_path, mols, _), pdb_info in zip(preparations, pdb_infos):
+
+            l = False
+            copy = 1
+
+            if mols == "fewer":
+                # Prune if only one chain present, b/c "all" and "A" will be the same.
+                if len(pdb_info.keys()) == 2:
+                    for key in pdb_info.keys():
+                        if key != "all":
+                            del pdb_info[key]
+                copy = pdb_info["all"]["NMol"]
+                if copy == 0:
+                    copy = 1
+                # If pdb_info["all"]["res"] == 0.0:
+                if pdb_info["all"]["SC"] < 0.2:
+                    # Only run on chains that will fit in the AU.
+                    l = [chain for chain in pdb_info.keys() if pdb_info[chain]["res"] != 0.0]
+
+            elif mols == "more":
+                copy = pdb_info["all"]["NMol"]
+
+            job_description = {
+                "work_dir": os.path.abspath(os.path.join(self.working_dir, "Phaser_%s" % pdb_code)), #
+                "data_file": self.data_file,
+                "struct_file": cif_path,
+                "name": pdb_code, #
+                "spacegroup": data_spacegroup,
+                "ncopy": copy,  #
+                #"test": self.test,
+                "cell_analysis": True,  #
+                #"large_cell": self.large_cell,
+                "resolution": xutils.set_phaser_res(pdb_info["all"]["res"],
+                                             self.large_cell,
+                                             self.dres),
+                "launcher": self.launcher,  #
+                "db_settings": self.db_settings,  #
+                "tag": False,  #
+                "batch_queue": self.batch_queue, #
+                "rapd_python": self.rapd_python}
+
+            # Cheapest and likeliest first, structures asked for before the rest
+            group = 0 if pdb_code in self.custom_structures else 1
+            cell_deviation = self.cell_output[pdb_code].get("cell_deviation", 0.0)
+
+            if not l:
+                self.schedule.add(job_description,
+                                  (group, phaser_cost(pdb_info["all"]["NRes"],
+                                                      copy,
+                                                      job_description["resolution"],
+                                                      cell_deviation)))
+            else:
+                for chain in l:
+                    new_code = "%s_%s" % (pdb_code, chain)
+                    xutils.folders(self, "Phaser_%s" % new_code)
+                    job_description.update({
+                        "work_dir": os.path.abspath(os.path.join(self.working_dir, "Phaser_%s" % \
+                            new_code)),
+                        "struct_file": pdb_info[chain]["file"],
+                        "name":new_code,
+                        "ncopy":pdb_info[chain]["NMol"],
+                        "resolution":xutils.set_phaser_res(pdb_info[chain]["res"],
+                                                    self.large_cell,
+                                                    self.dres)})
+                    self.schedule.add(job_description.copy(),
+                                      (group, phaser_cost(pdb_info[chain]["NRes"],
+                                                          pdb_info[chain]["NMol"],
+                                                          job_description["resolution"],
+                                                          cell_deviation)))
+
+        self.tprint("  %d Phaser runs, %d at once" % (len(self.schedule), self.phaser_slots),
+                    level=10,
+                    color="white")
+        self.launch_scheduled()
+
+    def launch_job(self, inp):
+        """Launch the Phaser job"""
+        #self.logger.debug("process_phaser Launching %s"%inp['name'])
+        if self.computer_cluster:
+            if self.cluster_submit:
+                inp['submit'] = self.computer_cluster.submit
+            # Send Redis settings so results can be sent thru redis
+            #inp['db_settings'] = self.site.CONTROL_DATABASE_SETTINGS
+            # Don't need result queue since results will be sent via Redis
+            queue = False
+            pid_queue = False
+        else:
+            inp['pool'] = self.pool
+            # Add result queue
+            queue = self.manager.Queue()
+            inp['result_queue'] = queue
+            # The PID of the Phaser process, sent once the pool starts it
+            pid_queue = self.manager.Queue()
+            inp['pid_queue'] = pid_queue
+        
+        #if self.pool:
+        #    inp['pool'] = self.pool
+        #else:
+        #    inp['tag'] = tag
+        # The tag is the Redis key of the results
+        job, pid, tag = run_phaser(**inp)
+        self.jobs[job] = {'name': inp['name'],
+                          'pid' : pid,
+                          'tag' : tag,
+                          'result_queue': queue,
+                          'pid_queue': pid_queue,
+                          'spacegroup': inp['spacegroup'], # Need for jobs that timeout.
+                          'start': time.time()
+                          }
+
+    def kill_pool_run(self, pid_queue):
+        """
+        Kill the Phaser process of a pool run, which terminating the pool
+        would leave running. Returns False if the run has not started yet.
+        """
+        if not pid_queue:
+            return True
+        try:
+            pid = pid_queue.get_nowait()
+        except Exception:
+            return False
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            # Finished already
+            pass
+        return True
+
+    def launch_scheduled(self):
+        """Launch scheduled Phaser jobs while there are free slots"""
+
+        while len(self.schedule) and (not self.phaser_slots or \
+                                      len(self.jobs) + len(self.abandoned) < self.phaser_slots):
+            self.launch_job(self.schedule.pop())
+
+    def prepare_models(self, preparations):
+        """
+        Return the get_pdb_info results for a list of its keyword arguments
+
+        The Matthews, eLLG and CCA calculations of the structures run at once
+        in the plugin's pool, or a pool of their own when jobs go to a
+        cluster. Structures prepared before come straight from the model
+        cache.
+        """
+
+        self.logger.debug("prepare_models")
+
+        if len(preparations) < 2:
+            return [get_pdb_info(**kwargs) for kwargs in preparations]
+
+        pool = getattr(self, "pool", False)
+        own_pool = not pool
+        if own_pool:
+            pool = mp_pool(min(len(preparations),
+                               self.preferences.get("nproc", cpu_count()-1)))
+        try:
+            results = [pool.apply_async(get_pdb_info, kwds=kwargs) for kwargs in preparations]
+            return [result.get() for result in results]
+        finally:
+            if own_pool:
+                pool.close()
+                pool.join()
 
     def postprocess_phaser(self, job_name, results):
         """fix Phaser results and pass back"""
@@ -937,6 +1081,7 @@ class RapdPlugin(Thread):
         def finish_job(job):
             """Finish the jobs and send to postprocess_phaser"""
             info = self.jobs.pop(job)
+            results = False
             self.tprint('    Finished Phaser on %s with id: %s'%(info['name'], info['tag']), level=30, color="white")
             self.logger.debug('Finished Phaser on %s'%info['name'])
             if self.computer_cluster:
@@ -969,61 +1114,98 @@ class RapdPlugin(Thread):
                 # pprint(json.loads(results.get('stdout'," ")))
                 # if results["stderr"]:
                 #     print results["stderr"]
-                self.postprocess_phaser(info['name'], json.loads(results.get('stdout', " ")))
-            jobs.remove(job)
-
-        # Signal to the pool that no more processes will be added
-        if self.pool:
-            self.pool.close()
+                results = json.loads(results.get('stdout', " "))
+                self.postprocess_phaser(info['name'], results)
+
+            # Note the first confident solution
+            if not self.solved and is_confident(results,
+                                                self.preferences.get("solution_tfz"),
+                                                self.preferences.get("solution_llg")):
+                self.solved = info['name']
+                self.tprint('    Solution found with %s' % info['name'], level=30, color="green")
+
+        def stop_job(job, message):
+            """Stop a running job and send its result to postprocess_phaser"""
+            if self.cluster_submit:
+                job.cancel()
+            elif self.computer_cluster:
+                # Kill job on cluster:
+                self.computer_cluster.kill_job(self.jobs[job].get('pid'))
+            elif not self.pool:
+                # terminate the job
+                job.terminate()
+            else:
+                # The pool worker waits on the Phaser process, so its slot
+                # is held until the process is killed, once it has started
+                self.abandoned.append((job, self.jobs[job]['pid_queue']))
+            # Get the job info
+            info = self.jobs.pop(job)
+            self.logger.debug('%s Phaser on %s' % (message, info['name']))
+            # Send result to postprocess
+            self.postprocess_phaser(info['name'], {"ID": info['name'],
+                                                   "solution": False,
+                                                   "spacegroup": info['spacegroup'],
+                                                   "message": message})
+            # Delete the Redis key
+            if self.computer_cluster:
+                self.redis.delete(info['tag'])
 
-        timed_out = False
-        timer = 0
-        jobs = self.jobs.keys()
+        # Pool jobs cannot be stopped one at a time, so the pool is
+        # terminated if any are
+        stopped = False
 
-        # Run loop to see when jobs finish
-        while len(jobs):
-            for job in jobs:
-                if self.pool:
-                    if job.ready():
-                        finish_job(job)
-                elif job.is_alive() == False:
-                    finish_job(job)
-            time.sleep(1)
-            timer += 1
-            """
-            if self.verbose:
-              if round(timer%1,1) in (0.0,1.0):
-                  print 'Waiting for AutoStat jobs to finish '+str(timer)+' seconds'
-            """
-            if self.phaser_timer:
-                if timer >= self.phaser_timer:
-                    timed_out = True
-                    break
-        if timed_out:
-            if self.verbose:
-                self.logger.debug('PDBQuery timed out.')
+        # Run loop to see when jobs finish, launching the next as slots free up
+        while len(self.jobs) or len(self.schedule):
             for job in self.jobs.keys():
-                if self.computer_cluster:
-                    # Kill job on cluster:
-                    self.computer_cluster.kill_job(self.jobs[job].get('pid'))
+                if self.pool:
+                    done = job.ready()
+                elif self.cluster_submit:
+                    done = job.done()
                 else:
-                    # terminate the job
-                    job.terminate()
-                # Get the job info
-                info = self.jobs.pop(job)
-                self.logger.debug('Timeout Phaser on %s'%info['name'])
-                # Send timeout result to postprocess
-                self.postprocess_phaser(info['name'], {"ID": info['name'],
-                                                       "solution": False,
-                                                       "spacegroup": info['spacegroup'],
-                                                       "message": "Timed out"})
-                # Delete the Redis key
-                self.redis.delete(info['tag'])
-
-        # Join the self.pool if used
+                    done = job.is_alive() == False
+                if done:
+                    finish_job(job)
+                elif self.phaser_timer and \
+                     time.time() - self.jobs[job]['start'] >= self.phaser_timer:
+                    stop_job(job, "Timed out")
+                    stopped = True
+
+            # Cancel the rest of the screen once solved
+            if self.solved and self.preferences.get("stop_on_solution"):
+                message = "Cancelled, solution found with %s" % self.solved
+                for job in self.jobs.keys():
+                    stop_job(job, message)
+                    stopped = True
+                for inp in self.schedule.drain():
+                    self.postprocess_phaser(inp['name'], {"ID": inp['name'],
+                                                          "solution": False,
+                                                          "spacegroup": inp['spacegroup'],
+                                                          "message": message})
+
+            self.abandoned = [(job, pid_queue) for job, pid_queue in self.abandoned
+                              if not job.ready() and not self.kill_pool_run(pid_queue)]
+            self.launch_scheduled()
+            if self.cluster_submit and len(self.jobs):
+                # Woken as soon as a job ends
+                self.computer_cluster.wait_any(self.jobs.keys(), 1)
+            elif len(self.jobs) or len(self.schedule):
+                time.sleep(1)
+
+        # Finish with the self.pool if used
         if self.pool:
+            if stopped:
+                for job, pid_queue in self.abandoned:
+                    self.kill_pool_run(pid_queue)
+                self.abandoned = []
+                self.pool.terminate()
+            else:
+                self.pool.close()
             self.pool.join()
 
+        # Exit the cluster session the Phaser runs went through
+        if self.cluster_submit:
+            self.computer_cluster.shutdown()
+
         if self.verbose and self.logger:
             self.logger.debug('PDBQuery.jobs_monitor finished.')
 
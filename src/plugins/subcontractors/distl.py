@@ -24,11 +24,268 @@ __maintainer__ = "Jon Schuermann"
 __email__ = "schuerjpy@anl.gov"
 __status__ = "Development"
 
-import urllib2
-
+import errno
+import fcntl
+import hashlib
+import httplib
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib
 from multiprocessing import Process
+from Queue import Queue
+
+import utils.global_vars as global_vars
 from utils.processes import local_subprocess
 
+# Idle connections kept open to each DISTL server
+MAX_IDLE_CONNECTIONS = 4
+
+# Bytes of DISTL output the cache may hold before the least recently used is dropped
+CACHE_MAX_BYTES = 256 * 1024 ** 2
+
+# Seconds since last use before DISTL output is dropped whatever the size of the cache
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Seconds between checks of the size of the cache
+CACHE_EVICT_INTERVAL = 600
+
+def distl_cache_key(image, res_inner=50.0, res_outer=3.0):
+    """
+    Return the cache key for the spot statistics of an image, or False if
+    the image cannot be found. A rewritten image gets a new key.
+    """
+    try:
+        stat = os.stat(image)
+    except OSError:
+        return False
+    key = "%s:%r:%d:%.1f:%.1f" % (os.path.abspath(image),
+                                  stat.st_mtime,
+                                  stat.st_size,
+                                  res_inner,
+                                  res_outer)
+    return hashlib.sha1(key).hexdigest()
+
+class DistlCache(object):
+    """
+    DISTL output kept on disk so images run again, as in a reindex, do not
+    need to be spotfound again
+    """
+
+    def __init__(self, directory=None, max_bytes=None, max_age=None):
+        """
+        Keyword arguments
+        directory -- where to keep the output, global_vars.DISTL_CACHE if not given
+        max_bytes -- size the cache is kept to, CACHE_MAX_BYTES if not given
+        max_age -- seconds since last use before output is dropped, CACHE_MAX_AGE if not given
+        """
+        self.directory = directory or global_vars.DISTL_CACHE
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_age = CACHE_MAX_AGE if max_age is None else max_age
+
+    def get_path(self, key):
+        """Return the file for a cache key"""
+        return os.path.join(self.directory, key[:2], "%s.log" % key)
+
+    def get(self, key):
+        """Return the DISTL output saved for key, or None"""
+        if not key:
+            return None
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as cache_file:
+                raw = cache_file.read()
+        except IOError:
+            return None
+        # Mark it used so it is dropped last
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return raw
+
+    def put(self, key, raw):
+        """Save DISTL output for key"""
+        if not key:
+            return
+        path = self.get_path(key)
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+        except OSError:
+            # Made by another process in the meantime
+            if not os.path.isdir(os.path.dirname(path)):
+                return
+        # Write beside and rename so a reader never sees part of the output
+        try:
+            temp_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                                    suffix=".tmp",
+                                                    delete=False)
+            with temp_file:
+                temp_file.write(raw)
+            os.rename(temp_file.name, path)
+        except (IOError, OSError):
+            return
+        self.evict()
+
+    def evict(self, force=False):
+        """
+        Drop output not used for max_age, then the output used longest ago
+        until the cache fits max_bytes. Unless forced, this is done at most
+        once every CACHE_EVICT_INTERVAL by any process sharing the cache.
+        """
+        stamp = os.path.join(self.directory, "evict.lock")
+        now = time.time()
+        try:
+            if not force and now - os.path.getmtime(stamp) < CACHE_EVICT_INTERVAL:
+                return
+        except OSError:
+            pass
+        try:
+            lock_file = open(stamp, "a")
+        except IOError:
+            return
+        with lock_file:
+            # Another process is evicting already
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as error:
+                if error.errno in (errno.EAGAIN, errno.EACCES):
+                    return
+                raise
+            try:
+                os.utime(stamp, None)
+                entries = []
+                total = 0
+                for root, _, files in os.walk(self.directory):
+                    for name in files:
+                        path = os.path.join(root, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        if name.endswith(".log"):
+                            entries.append((stat.st_mtime, stat.st_size, path))
+                            total += stat.st_size
+                        # Left by processes that died while writing
+                        elif name.endswith(".tmp") and now - stat.st_mtime > CACHE_EVICT_INTERVAL:
+                            entries.append((0, stat.st_size, path))
+                for used, size, path in sorted(entries):
+                    if used and total <= self.max_bytes and now - used <= self.max_age:
+                        break
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        continue
+                    if used:
+                        total -= size
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_cache(cache):
+    """Return the DistlCache for a cache argument - True for the default, False for none"""
+    if cache is True:
+        return DistlCache()
+    return cache
+
+def get_cached(cache, image, res_inner=50.0, res_outer=3.0):
+    """Return the cache key for an image and the output saved for it, or None"""
+    if not cache:
+        return False, None
+    key = distl_cache_key(image, res_inner, res_outer)
+    return key, cache.get(key)
+
+class DistlClient(object):
+    """
+    Requests to one DISTL server over keep-alive connections, shared
+    between threads so the images of a pair can be sent at once
+    """
+
+    def __init__(self, IP, port, timeout=global_vars.DISTL_TIMEOUT, max_idle=MAX_IDLE_CONNECTIONS):
+        self.IP = IP
+        self.port = port
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get_path(self, image, res_inner=50.0, res_outer=3.0):
+        """Return the request path for an image"""
+        return "/spotfinder/distl.signal_strength?%s" % \
+            urllib.urlencode((("distl.image", image),
+                              ("distl.bins.verbose", "False"),
+                              ("distl.res.outer", "%.1f" % res_outer),
+                              ("distl.res.inner", "%.1f" % res_inner)))
+
+    def get_connection(self):
+        """Return an idle connection and True, or a new one and False"""
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return httplib.HTTPConnection(self.IP, self.port, timeout=self.timeout), False
+
+    def put_connection(self, connection):
+        """Keep a connection for the next request"""
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+    def signal_strength(self, image, res_inner=50.0, res_outer=3.0):
+        """Return the distl.signal_strength output for an image"""
+
+        path = self.get_path(image, res_inner, res_outer)
+        while True:
+            connection, reused = self.get_connection()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                raw = response.read()
+            except (httplib.HTTPException, socket.error):
+                connection.close()
+                # The server may have closed an idle connection, so try a new one
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.put_connection(connection)
+            if response.status != 200:
+                raise httplib.HTTPException("DISTL server error %d for %s" % (response.status, image))
+            return raw
+
+    def close(self):
+        """Close the idle connections"""
+        with self.lock:
+            for connection in self.idle:
+                connection.close()
+            del self.idle[:]
+
+# Clients by process id and server, so a forked process never uses its
+# parent's connections
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(IP, port):
+    """Return the DistlClient for a server in this process"""
+    key = (os.getpid(), IP, port)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = DistlClient(IP, port)
+        return _clients[key]
+
+def save_result(raw, queue=False, logfile=False):
+    """Write out DISTL output and pass it back mimicking local_subprocess results"""
+    if logfile:
+        with open(logfile, 'w') as out_file:
+            out_file.write(raw)
+    if queue:
+        queue.put({'stdout': raw})
+
 def process_distl_server(IP,
                          port,
                          image,
@@ -36,56 +293,117 @@ def process_distl_server(IP,
                          res_outer=3.0,
                          queue=False,
                          logfile=False,
-                         logger=False):
+                         logger=False,
+                         cache=True):
     """
     Setup Distl for running on Distl server, if enabled. Results should come out in less than 1s.
+    Output already in the cache (True for the default DistlCache) is used instead.
     """
     if logger:
         logger.debug("process_distl_server")
-    # Setup the URL for the DISTL server
-    url = "http://%s:%d/spotfinder/distl.signal_strength?distl.image=%s&distl.bins.verbose=False&distl.res.outer=%.1f&distl.res.inner=%.1f" \
-        %(IP, port, image, res_outer, res_inner)
-    # Pass "+" signs correctly
-    url = url.replace("+", "%2b")
-    # Run URL and get response
-    response = urllib2.urlopen(url)
-    raw = response.read()
-    response.close()
-    # Save out as logfile
-    if logfile:
-        with open(logfile, 'w') as out_file:
-            out_file.write(raw)
+    cache = get_cache(cache)
+    key, raw = get_cached(cache, image, res_inner, res_outer)
+    if raw is None:
+        # Run request and get response
+        raw = get_client(IP, port).signal_strength(image, res_inner, res_outer)
+        if cache:
+            cache.put(key, raw)
+    elif logger:
+        logger.debug("DISTL results for %s from cache" % image)
     # Pass results back to queue mimicking local_subprocess results
-    if queue:
-        queue.put({'stdout': raw})
-    else:
+    if queue or logfile:
+        save_result(raw, queue, logfile)
+    if not queue:
         return raw
 
+def process_distl_server_images(IP,
+                                port,
+                                images,
+                                res_inner=50.0,
+                                res_outer=3.0,
+                                queue=False,
+                                logfiles=False,
+                                logger=False,
+                                cache=True):
+    """
+    Send images to the Distl server at once, returning the outputs in the
+    order of the images. They are put on the queue in that order too.
+    """
+    if logger:
+        logger.debug("process_distl_server_images")
+    cache = get_cache(cache)
+    results = [None] * len(images)
+    errors = []
+
+    def run(index):
+        try:
+            results[index] = process_distl_server(IP,
+                                                  port,
+                                                  images[index],
+                                                  res_inner=res_inner,
+                                                  res_outer=res_outer,
+                                                  logger=logger,
+                                                  cache=cache)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(1, len(images))]
+    for thread in threads:
+        thread.start()
+    # The first image in this thread
+    if images:
+        run(0)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    for index, raw in enumerate(results):
+        save_result(raw, queue, logfiles and logfiles[index])
+    return results
+
+def run_distl_local(command, key=False, cache=False, queue=False, logfile=False):
+    """Run distl.signal_strength, saving the output in the cache if it worked"""
+    result_queue = Queue()
+    local_subprocess(command=command, logfile=logfile, result_queue=result_queue)
+    result = result_queue.get()
+    if cache and result["returncode"] == 0:
+        cache.put(key, result["stdout"])
+    if queue:
+        queue.put(result)
+
 def process_distl_local(image,
                         res_inner=50.0,
                         res_outer=3.0,
                         queue=False,
                         logfile=False,
-                        logger=False):
+                        logger=False,
+                        cache=True):
     """
     Run distl from command line on local machine. This takes several seconds to run so results should be put on queue or logfile.
+    Output already in the cache is put on the queue straight away and no job is returned.
     """
     if logger:
         logger.debug('process_distl_local')
 
+    cache = get_cache(cache)
+    key, raw = get_cached(cache, image, res_inner, res_outer)
+    if raw is not None:
+        if logger:
+            logger.debug("DISTL results for %s from cache" % image)
+        save_result(raw, queue, logfile)
+        return None
+
     # Setup the command
     command = "distl.signal_strength %s distl.res.outer=%.1f distl.res.inner=%.1f distl.bins.verbose=False" \
         %(image, res_outer, res_inner)
-    # Setup keywords
-    kw = {"command": command}
-    if queue:
-        kw.update({"result_queue": queue})
-    if logfile:
-        kw.update({"logfile": logfile})
     # Launch the job
-    job = Process(target=local_subprocess,
-                  kwargs=kw)
+    job = Process(target=run_distl_local,
+                  kwargs={"command": command,
+                          "key": key,
+                          "cache": cache,
+                          "queue": queue,
+                          "logfile": logfile})
     job.start()
     # send back job so main knows when it completes.
     return job
-  
@@ -0,0 +1,138 @@
+"""
+Local stand-in for a DISTL server
+
+Answers distl.signal_strength requests as the spotfinder server does, with
+made-up spot statistics, over keep-alive connections. It counts requests
+and connections so clients can be tried out and tested without a server.
+
+Run from the command line to serve on a port:
+    python fake_distl_server.py 8125
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import sys
+import threading
+import time
+import urlparse
+
+# Output in the form of distl.signal_strength
+OUTPUT = """
+ File : %(image)s
+ Spot Total :  %(spots)d
+ Remove Ice :  %(spots)d
+ In-Resolution Total :  %(spots)d
+ Good Bragg Candidates :  %(good)d
+ Ice Rings :      0
+ Method 1 Resolution :  %(res_outer).2f
+ Method 2 Resolution :  %(res_outer).2f
+ Maximum unit cell :  120.5
+ <Spot model eccentricity> :  0.45
+ %%Saturation, Top 50 Peaks :  1.20
+ In-Resolution Ovrld Spots :  0
+ Bragg spots: Total integrated signal, pixel-ADC units above local background (just the good Bragg candidates) 123456
+ Signals range from 12.3 to 456.7 with mean integrated signal 78.9
+ Saturations range from 0.0%% to 1.5%% with mean saturation 0.3%%
+"""
+
+class DistlHandler(BaseHTTPRequestHandler):
+    """Answers spotfinder requests"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        if url.path != "/spotfinder/distl.signal_strength" or "distl.image" not in query:
+            self.send_error(404)
+            return
+
+        with self.server.lock:
+            self.server.requests.append(query)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        spots = 100 + len(self.server.requests)
+        body = OUTPUT % {"image":query["distl.image"],
+                         "spots":spots,
+                         "good":spots // 2,
+                         "res_outer":float(query.get("distl.res.outer", 3.0))}
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeDistlServer(ThreadingMixIn, HTTPServer):
+    """
+    A DISTL server on this machine
+
+    requests holds the query of each request, and connections the number
+    of connections opened. Each request takes delay seconds.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, delay=0):
+        HTTPServer.__init__(self, ("127.0.0.1", port), DistlHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = []
+        self.connections = 0
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve from a thread"""
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop serving"""
+        self.shutdown()
+        self.server_close()
+        if self.thread:
+            self.thread.join()
+
+if __name__ == "__main__":
+
+    server = FakeDistlServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    print "Fake DISTL server on port %d" % server.port
+    server.serve_forever()
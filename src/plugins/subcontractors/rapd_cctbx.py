@@ -34,9 +34,10 @@ import os
 
 #from utils.text import json
 #from bson.objectid import ObjectId
+from utils.model_cache import get_model_cache, link
 from utils.xutils import convert_unicode, fix_R3_sg
 
-from plugins.subcontractors.rapd_phaser import run_phaser, run_phaser_module
+from plugins.subcontractors.rapd_phaser import run_phaser, run_phaser_analysis
 #import plugins.subcontractors.rapd_phaser as rapd_phaser
 
 
@@ -70,6 +71,18 @@ def get_mtz_info(data_file):
 
     return (sg, cell, vol)
 
+# get_mtz_info results by data file and modification time
+_mtz_info = {}
+
+def get_mtz_info_cached(data_file):
+    """Return get_mtz_info for a data file, only reading it again once changed"""
+
+    data_file = convert_unicode(data_file)
+    key = (os.path.abspath(data_file), os.path.getmtime(data_file))
+    if key not in _mtz_info:
+        _mtz_info[key] = get_mtz_info(data_file)
+    return _mtz_info[key]
+
 def get_res(data_file):
     """Return resolution limit of dataset"""
 
@@ -107,12 +120,46 @@ def get_spacegroup_info(struct_file):
     else:
         return str(iotbx_pdb.input(struct_file).crystal_symmetry().space_group_info()).upper().replace(" ", "")
 
+def get_chain_file(struct_file, chain_id):
+    """Return the file a chain of a structure is written to"""
+
+    # Long was of making sure that user does not have directory named '.pdb' or
+    # '.cif'
+    #n = os.path.join(os.path.dirname(struct_file), "%s_%s.pdb" % \
+    return os.path.join(os.path.dirname(struct_file), "%s_%s.cif" % \
+        (os.path.basename(struct_file)[:os.path.basename(struct_file).find('.')], \
+        chain_id))
+
+def restore_pdb_info(model_cache, prep_key, struct_file):
+    """
+    Return get_pdb_info results kept in the model cache for a structure,
+    linking in its chain files, or None if they are not all kept
+    """
+
+    d = model_cache.get_prep(prep_key)
+    if not d:
+        return None
+
+    chain_files = dict((chain_id, get_chain_file(struct_file, chain_id))
+                       for chain_id in d if chain_id != "all")
+    if len(model_cache.link_chains(struct_file, chain_files)) != len(chain_files):
+        return None
+
+    for chain_id in d:
+        d[chain_id]["file"] = chain_files.get(chain_id, struct_file)
+    return d
+
 def get_pdb_info(struct_file,
                  data_file,
                  dres,
                  matthews=True,
                  chains=True):
-    """Get info from PDB or mmCIF file"""
+    """
+    Get info from PDB or mmCIF file
+
+    Results for a model already prepared for data with the same spacegroup,
+    cell and resolution bin are taken from the model cache.
+    """
 
     # Get rid of ligands and water so Phenix won't error.
     np = 0
@@ -124,8 +171,30 @@ def get_pdb_info(struct_file,
     d = {}
     l = []
 
-    # Read in the file
     struct_file = convert_unicode(struct_file)
+
+    # Results and chains of a model prepared before are taken from the
+    # model cache instead of worked out again
+    model_cache = get_model_cache()
+    prep_key = False
+    cached_chains = {}
+    written_chains = {}
+    if model_cache:
+        spacegroup, cell, volume = get_mtz_info_cached(data_file)
+        prep_key = model_cache.prep_key(struct_file,
+                                        spacegroup,
+                                        cell,
+                                        dres,
+                                        matthews=matthews,
+                                        chains=chains)
+        d = restore_pdb_info(model_cache, prep_key, struct_file)
+        if d:
+            return d
+        d = {}
+        if chains:
+            cached_chains = model_cache.get_chains(struct_file)
+
+    # Read in the file
     if struct_file[-3:].lower() == 'cif':
         root = iotbx_mmcif.cif_input(file_name=struct_file).construct_hierarchy()
     else:
@@ -164,18 +233,16 @@ def get_pdb_info(struct_file,
                 # Save info for each chain.
                 if np1 or na1:
 
-                    # Write new pdb files for each chain.
-                    temp = iotbx_pdb.hierarchy.new_hierarchy_from_chain(chain)
-
-                    # Long was of making sure that user does not have directory named '.pdb' or
-                    # '.cif'
-                    #n = os.path.join(os.path.dirname(struct_file), "%s_%s.pdb" % \
-                    n = os.path.join(os.path.dirname(struct_file), "%s_%s.cif" % \
-                        (os.path.basename(struct_file)[:os.path.basename(struct_file).find('.')], \
-                        chain.id))
-                    #temp.write_pdb_file(file_name=n)
-                    # Write chain as mmCIF file.
-                    temp.write_mmcif_file(file_name=n)
+                    n = get_chain_file(struct_file, chain.id)
+                    if chain.id in cached_chains:
+                        link(cached_chains[chain.id], n, model_cache.shared)
+                    else:
+                        # Write new pdb files for each chain.
+                        temp = iotbx_pdb.hierarchy.new_hierarchy_from_chain(chain)
+                        #temp.write_pdb_file(file_name=n)
+                        # Write chain as mmCIF file.
+                        temp.write_mmcif_file(file_name=n)
+                        written_chains[chain.id] = n
                     
                     d[chain.id] = {'file': n,
                                    'NRes': np1+na1,
@@ -186,21 +253,21 @@ def get_pdb_info(struct_file,
                         # Run Matthews Calc. on chain
                         #phaser_return = run_phaser_module((np1, na1, dres, n, data_file))
                         #phaser_return = run_phaser_module(data_file, (np1, na1, dres, n))
-                        phaser_return = run_phaser_module(data_file=data_file,
-                                                          ellg=True,
-                                                          cca=True,
-                                                          struct_file=n,
-                                                          dres=dres,
-                                                          np=np1,
-                                                          na=na1)
+                        phaser_return = run_phaser_analysis(data_file=data_file,
+                                                            ellg=True,
+                                                            cca=True,
+                                                            mmcif=n,
+                                                            dres=dres,
+                                                            np=np1,
+                                                            na=na1)
                         d[chain.id].update({'NMol': phaser_return.get("z", nmol),
                                             'SC': phaser_return.get("solvent_content", sc),
                                             'res': phaser_return.get("target_resolution", res1)})
                     else:
                         #res1 = run_phaser_module(n)
-                        phaser_return = run_phaser_module(data_file=data_file,
-                                                          ellg=True, 
-                                                          struct_file=n)
+                        phaser_return = run_phaser_analysis(data_file=data_file,
+                                                            ellg=True, 
+                                                            mmcif=n)
                         d[chain.id].update({'res': phaser_return.get("target_resolution", res1)})
                     """
                     d[chain.id] = {'file': n,
@@ -216,6 +283,10 @@ def get_pdb_info(struct_file,
         np += np1
         na += na1
 
+    # Keep the chains for the next job to use this structure
+    if model_cache and written_chains and not cached_chains:
+        model_cache.put_chains(struct_file, written_chains)
+
     d['all'] = {'file': struct_file,
                 'NRes': np+na,
                 'MWna': na*330,
@@ -225,13 +296,13 @@ def get_pdb_info(struct_file,
     if matthews:
         #phaser_return = run_phaser_module((np, na, dres, struct_file, data_file))
         #phaser_return = run_phaser_module(data_file, (np, na, dres, struct_file))
-        phaser_return = run_phaser_module(data_file=data_file,
-                                          ellg=True,
-                                          cca=True,
-                                          struct_file=struct_file,
-                                          dres=dres,
-                                          np=np,
-                                          na=na)
+        phaser_return = run_phaser_analysis(data_file=data_file,
+                                            ellg=True,
+                                            cca=True,
+                                            mmcif=struct_file,
+                                            dres=dres,
+                                            np=np,
+                                            na=na)
         d['all'].update({'NMol': phaser_return.get("z", nmol),
                          'SC': phaser_return.get("solvent_content", sc),
                          'res': phaser_return.get("target_resolution", res1)})
@@ -241,9 +312,9 @@ def get_pdb_info(struct_file,
         # phaser_return = run_phaser_module(data_file=data_file,
         #                                   ellg=True, 
         #                                   struct_file=struct_file)
-        phaser_return = run_phaser_module(data_file=data_file,
-                                          ellg=True, 
-                                          struct_file=struct_file)
+        phaser_return = run_phaser_analysis(data_file=data_file,
+                                            ellg=True, 
+                                            mmcif=struct_file)
         d['all'].update({'res': phaser_return.get("target_resolution", res1)})
     """
     d['all'] = {'file': struct_file,
@@ -255,4 +326,9 @@ def get_pdb_info(struct_file,
                 'SC': phaser_return.get("solvent_content", sc),
                 'res': phaser_return.get("target_resolution", res1)}
     """
+
+    # Remember the results for the next job preparing this model
+    if prep_key:
+        model_cache.put_prep(prep_key, d)
+
     return d
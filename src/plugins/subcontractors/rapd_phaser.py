@@ -349,6 +349,9 @@ def mp_job(func):
        'script' - signal to say the script has been written
        'computer_cluster' - signal to launch on computer cluster
        'pool' - The multiprocessing.Pool if launched on local machine
+       'pid_queue', 'result_queue' - queues passed to the launcher of a Pool run
+       'submit' - submit function of the cluster adapter, to submit through
+                  the cluster session of this process instead of a launcher
        'test' - run in test mode (used for debugging)
     """
 
@@ -370,6 +373,7 @@ def mp_job(func):
             launcher = kwargs.pop('launcher', None)
             # Pop out the batch_queue
             batch_queue = kwargs.pop('batch_queue', None)
+            submit = kwargs.pop('submit', None)
             # Create a unique identifier for Phaser results
             kwargs['output_id'] = 'Phaser_%d' % random.randint(0, 10000)
             # Signal to launch run
@@ -377,12 +381,25 @@ def mp_job(func):
             if kwargs.get('pool', False):
                 # If running on local machine
                 pool = kwargs.pop('pool')
+                # Queues go to the launcher, not into the script
+                pid_queue = kwargs.pop('pid_queue', False)
+                result_queue = kwargs.pop('result_queue', False)
                 f = write_script(kwargs)
                 new_kwargs = {"command": "rapd2.python %s" % f,
                               "logfile": os.path.join(convert_unicode(kwargs.get('work_dir')), 'rapd_phaser.log'),
+                              "pid_queue": pid_queue,
+                              "result_queue": result_queue,
                               }
                 proc = pool.apply_async(launcher, kwds=new_kwargs,)
                 return (proc, 'junk', kwargs['output_id'])
+            elif submit:
+                # Returns a job of the cluster session without waiting
+                f = write_script(kwargs)
+                job = submit(command="rapd2.python %s" % f,
+                             work_dir=kwargs.get('work_dir'),
+                             logfile=os.path.join(kwargs.get('work_dir'), 'rapd_phaser.log'),
+                             batch_queue=batch_queue)
+                return (job, job.job_id, kwargs['output_id'])
             else:
                 # If running on computer cluster
                 f = write_script(kwargs)
@@ -645,6 +662,8 @@ def run_phaser_module(data_file,
                resolution=False,
                large_cell=False,
                run_before=False,
+               prepared_data=False,
+               threads=False,
                ):
     """
     Run Phaser and passes results back to RAPD Redis DB
@@ -663,6 +682,8 @@ def run_phaser_module(data_file,
     resolution - high res limit to run MR (float)
     large_cell - optimizes parameters to speed up MR with large unit cell.
     run_before - signal to run more comprehensive MR
+    prepared_data - data from prepare_data used in place of data_file
+    threads - number of threads Phaser runs on
     """
 
     if phaser:
@@ -682,10 +703,14 @@ def run_phaser_module(data_file,
     # Connect to Redis
     redis = connect_to_redis(db_settings)
 
-    # Read the dataset
+    # Read the dataset, already corrected for anisotropy if prepared
     i = phaser.InputMR_DAT()
-    i.setHKLI(convert_unicode(data_file))
-    i.setLABI_F_SIGF('F', 'SIGF')
+    if prepared_data:
+        i.setHKLI(convert_unicode(prepared_data["data_file"]))
+        i.setLABI_F_SIGF(*prepared_data["labels"])
+    else:
+        i.setHKLI(convert_unicode(data_file))
+        i.setLABI_F_SIGF('F', 'SIGF')
     i.setMUTE(True)
     r = phaser.runMR_DAT(i)
     if r.Success():
@@ -709,6 +734,11 @@ def run_phaser_module(data_file,
             i.setJOBS(1)
         else:
             i.setSGAL_SELE("NONE")
+            if threads:
+                i.setJOBS(int(threads))
+        if prepared_data:
+            # No need to refine the anisotropy again
+            i.setMACA_PROT("OFF")
         if run_before:
             # Picks own resolution
             # Round 2, pick best solution as long as less that 10% clashes
@@ -870,7 +900,9 @@ def run_phaser_shell(data_file,
                      cell_analysis=False,
                      resolution=False,
                      large_cell=False,
-                     run_before=False):
+                     run_before=False,
+                     prepared_data=False,
+                     threads=False):
     """
     Run Phaser and passes results back to RAPD Redis DB
     **Requires Phaser src code!**
@@ -888,6 +920,8 @@ def run_phaser_shell(data_file,
     resolution - high res limit to run MR (float)
     large_cell - optimizes parameters to speed up MR with large unit cell.
     run_before - signal to run more comprehensive MR
+    prepared_data - data from prepare_data used in place of data_file
+    threads - number of threads Phaser runs on
     """
 
     # print "run_phaser_shell"
@@ -916,12 +950,20 @@ def run_phaser_shell(data_file,
     # TODO
     # redis = connect_to_redis(db_settings)
 
+    # Data already corrected for anisotropy if prepared
+    if prepared_data:
+        hklin = prepared_data["data_file"]
+        labin = "F=%s SIGF=%s" % tuple(prepared_data["labels"])
+    else:
+        hklin = data_file
+        labin = column_labels[file_type]
+
     # Assemble the command file
     commands = [
         "phaser << EOF",
         "MODE MR_AUTO",
-        "HKLIn %s" % data_file,
-        "LABIn %s" % column_labels[file_type],
+        "HKLIn %s" % hklin,
+        "LABIn %s" % labin,
         "ENSEMBLE test PDB %s ID 70" % cif,
         "SEARCH ENSEMBLE test NUM %d" % ncopy,
         "SPACEGROUP %s" % spacegroup
@@ -933,6 +975,12 @@ def run_phaser_shell(data_file,
         commands.append("JOBS 1")
     else:
         commands.append("SGALTERNATIVE SELECT NONE")
+        if threads:
+            commands.append("JOBS %d" % int(threads))
+
+    # No need to refine the anisotropy again
+    if prepared_data:
+        commands.append("MACANO PROTOCOL OFF")
 
     # This is a repeat run
     if run_before:
@@ -1050,24 +1098,28 @@ def run_phaser(data_file,
                cell_analysis=False,
                resolution=False,
                large_cell=False,
-               run_before=False):
+               run_before=False,
+               prepared_data=False,
+               threads=False):
     """
     Runs phaser
     """
 
 
-def run_phaser_module_ORIG(data_file,
-                      result_queue=False,
-                      cca=False,
-                      tncs=False,
-                      ellg=False,
-                      mmcif=False,
-                      dres=False,
-                      np=0,
-                      na=0,):
+def run_phaser_analysis(data_file,
+                        result_queue=False,
+                        cca=False,
+                        tncs=False,
+                        ellg=False,
+                        mmcif=False,
+                        dres=False,
+                        np=0,
+                        na=0,):
     """
     Run separate module of Phaser to get results before running full job.
     Setup so that I can read the data in once and run multiple modules.
+    Runs in the calling process, so it can be used in a Pool worker.
+    Returns empty results if the phaser module is not available.
     data_file - input dataset mtz file
     result_queue - pass results to queue
     cca - Run CCA to determine number of molecules in AU, and solvent content (Matthew's Coefficient calc)
@@ -1175,6 +1227,13 @@ def run_phaser_module_ORIG(data_file,
             return(r1)
 
     # MAIN
+    # Callers use their defaults
+    if not phaser:
+        if result_queue:
+            result_queue.put({})
+            return
+        return {}
+
     # Setup which modules are run
     # Read input MTZ file
     i = phaser.InputMR_DAT()
@@ -1471,6 +1530,93 @@ def get_target_resolution(data_file, structure_file):
     Returns the phaser target resolution
     """
 
+# Labels of the anisotropy corrected data written by MODE ANO
+PREPARED_LABELS = ("F_ISO", "SIGF_ISO")
+
+def prepare_data_module(data_file, work_dir, root="prepared"):
+    """
+    Corrects the data for anisotropy once using the phaser module, for
+    every Phaser run on it to share. Returns the prepared_data for
+    run_phaser, or False if it fails.
+    """
+
+    # Handle multiple reflection file types
+    column_labels = {
+        "rfree_mtz": ("F", "SIGF")
+        }
+    file_type = xray_importer.get_rapd_file_type(data_file)
+
+    i = phaser.InputMR_DAT()
+    i.setHKLI(convert_unicode(data_file))
+    i.setLABI_F_SIGF(*column_labels[file_type])
+    i.setMUTE(True)
+    r = phaser.runMR_DAT(i)
+    if not r.Success():
+        return False
+
+    i = phaser.InputANO()
+    i.setSPAC_HALL(r.getSpaceGroupHall())
+    i.setCELL6(r.getUnitCell())
+    i.setREFL_F_SIGF(r.getMiller(), r.getFobs(), r.getSigFobs())
+    i.setROOT(convert_unicode(os.path.join(work_dir, root)))
+    i.setHKLO(True)
+    i.setMUTE(True)
+    r = phaser.runANO(i)
+    if not r.Success() or not os.path.exists(r.getMtzFile()):
+        return False
+
+    return {"data_file": r.getMtzFile(),
+            "labels": PREPARED_LABELS}
+
+def prepare_data_shell(data_file, work_dir, root="prepared"):
+    """
+    Corrects the data for anisotropy once using the shell to call phaser,
+    for every Phaser run on it to share. Returns the prepared_data for
+    run_phaser, or False if it fails.
+    """
+
+    # Handle multiple reflection file types
+    column_labels = {
+        "rfree_mtz": "F=F SIGF=SIGF"
+        }
+    file_type = xray_importer.get_rapd_file_type(data_file)
+
+    # Assemble the command file
+    commands = [
+        "phaser << EOF",
+        "MODE ANO",
+        "HKLIn %s" % data_file,
+        "LABIn %s" % column_labels[file_type],
+        "HKLOut ON",
+        "ROOT %s" % root,
+        "EOF"
+    ]
+
+    # Write the file
+    script = os.path.join(work_dir, "phaser_ano.sh")
+    with open(script, "w") as outfile:
+        for line in commands:
+            outfile.write(line+"\n")
+    os.chmod(script, stat.S_IRWXU)
+
+    # Run
+    p = subprocess.Popen([script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True,
+                         cwd=work_dir)
+    p.communicate()
+
+    mtz_file = os.path.join(work_dir, "%s.mtz" % root)
+    if p.returncode or not os.path.exists(mtz_file):
+        return False
+
+    return {"data_file": mtz_file,
+            "labels": PREPARED_LABELS}
+
+@moduleOrShellWrapper
+def prepare_data(data_file, work_dir, root="prepared"):
+    """
+    Returns the data corrected for anisotropy for run_phaser to share
+    """
+
 if __name__ == "__main__":
 
     target_resolution = get_target_resolution("thaum1_01s-01d_1_free.mtz", "5fgx.cif")
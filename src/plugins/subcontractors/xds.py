@@ -32,12 +32,12 @@ __status__ = "Development"
 # import json
 # import logging
 # import multiprocessing
-# import os
+import os
 # import pprint
 # import pymongo
 # import re
 # import redis
-# import shutil
+import shutil
 # import subprocess
 # import sys
 # import time
@@ -56,6 +56,106 @@ VERSIONS = {
 # "eiger2cbf": ("160415",)
 }
 
+# Files from XYCORR, INIT, IDXREF and DEFPIX that INTEGRATE needs, so a wedge
+# can be integrated with the geometry of another
+INTEGRATE_FILES = ("X-CORRECTIONS.cbf",
+                   "Y-CORRECTIONS.cbf",
+                   "BKGINIT.cbf",
+                   "BLANK.cbf",
+                   "GAIN.cbf",
+                   "BKGPIX.cbf",
+                   "ABS.cbf")
+
+# Files CORRECT reads, and the files it writes. Nothing CORRECT writes may
+# be linked, or the original would be written through the link.
+CORRECT_INPUT_FILES = ("INTEGRATE.HKL",
+                       "INTEGRATE.LP",
+                       "IDXREF.LP",
+                       "XPARM.XDS") + INTEGRATE_FILES
+CORRECT_OUTPUT_FILES = ("CORRECT.LP",
+                        "XDS_ASCII.HKL",
+                        "GXPARM.XDS",
+                        "DECAY.cbf",
+                        "MODPIX.cbf",
+                        "ABSORP.cbf",
+                        "XDS.LOG")
+
+def get_wedges(first, last, wedge_size):
+    """Return [(first, last), ...] image numbers of wedges covering first to last"""
+
+    wedges = []
+    start = first
+    while start <= last:
+        wedges.append((start, min(start + wedge_size - 1, last)))
+        start += wedge_size
+    return wedges
+
+def copy_integrate_files(source_dir, target_dir):
+    """
+    Copy what INTEGRATE needs from a processed wedge to another directory
+
+    The refined GXPARM.XDS becomes the XPARM.XDS of the new directory.
+    """
+
+    if os.path.exists(os.path.join(source_dir, "GXPARM.XDS")):
+        shutil.copy(os.path.join(source_dir, "GXPARM.XDS"), os.path.join(target_dir, "XPARM.XDS"))
+    else:
+        shutil.copy(os.path.join(source_dir, "XPARM.XDS"), os.path.join(target_dir, "XPARM.XDS"))
+    for file_name in INTEGRATE_FILES:
+        shutil.copy(os.path.join(source_dir, file_name), os.path.join(target_dir, file_name))
+
+def link_correct_files(source_dir, target_dir):
+    """
+    Link what CORRECT reads from a processed directory into another, so
+    CORRECT can be run again there without touching the original files
+    """
+
+    for file_name in CORRECT_INPUT_FILES:
+        source = os.path.join(source_dir, file_name)
+        target = os.path.join(target_dir, file_name)
+        if os.path.exists(source) and not os.path.lexists(target):
+            os.symlink(os.path.abspath(source), target)
+
+def collect_correct_files(source_dir, target_dir):
+    """Copy the output of a CORRECT run back over a processed directory"""
+
+    for file_name in CORRECT_OUTPUT_FILES:
+        source = os.path.join(source_dir, file_name)
+        if os.path.exists(source):
+            target = os.path.join(target_dir, file_name)
+            if os.path.lexists(target):
+                os.remove(target)
+            shutil.copy(source, target)
+
+def merge_integrate_hkl(input_files, output_file, data_range=False):
+    """
+    Write the reflections of INTEGRATE.HKL files for consecutive wedges as one
+    INTEGRATE.HKL for CORRECT
+
+    The header is taken from the first file, with DATA_RANGE set to
+    data_range (first, last) if given.
+    """
+
+    # Opening the output would empty it before it is read
+    output_path = os.path.realpath(output_file)
+    if output_path in [os.path.realpath(input_file) for input_file in input_files]:
+        raise ValueError("%s is also an input" % output_file)
+
+    with open(output_file, "w") as output:
+        for index, input_file in enumerate(input_files):
+            with open(input_file, "r") as hkl:
+                for line in hkl:
+                    if line.startswith("!"):
+                        if line.startswith("!END_OF_DATA"):
+                            break
+                        # Only the first header
+                        if index:
+                            continue
+                        if data_range and line.startswith("!DATA_RANGE="):
+                            line = "!DATA_RANGE=%6d%6d\n" % tuple(data_range)
+                    output.write(line)
+        output.write("!END_OF_DATA\n")
+
 def get_avg_mosaicity_from_integratelp():
     """
     Parse the INTEGRATE.LP file and extract information
@@ -69,6 +69,71 @@ setInterval(function() {
   redis_client.set("R2:WSS:"+myId, myHost, 'EX', 31);
 }, 30000);
 
+// Last full result seen for each result_id, for applying patches
+let latestResults = {};
+
+// Set a dotted path in a nested object
+const setPath = function(doc, path, value) {
+  const keys = path.split(".");
+  keys.slice(0, -1).forEach((key) => {
+    if (typeof doc[key] !== "object" || doc[key] === null) {
+      doc[key] = {};
+    }
+    doc = doc[key];
+  });
+  doc[keys[keys.length-1]] = value;
+};
+
+// Remove a dotted path from a nested object
+const unsetPath = function(doc, path) {
+  const keys = path.split(".");
+  for (let key of keys.slice(0, -1)) {
+    doc = doc[key];
+    if (typeof doc !== "object" || doc === null) {
+      return;
+    }
+  }
+  delete doc[keys[keys.length-1]];
+};
+
+/*
+ * Return the full result for a RAPD_RESULTS message, applying a patch to
+ * the last full result for its result_id (see utils/result_patch.py), or
+ * false if there is nothing to apply it to
+ */
+const fullResult = function(message) {
+  let result_id;
+  try {
+    result_id = message.process.result_id;
+  } catch (e) {
+    return message;
+  }
+
+  let result = message;
+  if (message.patch) {
+    if (! latestResults[result_id] || latestResults[result_id].sequence >= message.sequence) {
+      return false;
+    }
+    // Detailed results are filled in place, so the kept copy is left alone
+    result = JSON.parse(JSON.stringify(latestResults[result_id]));
+    (message.patch.unset || []).forEach((path) => unsetPath(result, path));
+    Object.keys(message.patch.set || {}).forEach((path) => setPath(result, path, message.patch.set[path]));
+    ["command", "plugin", "process", "sequence"].forEach((key) => {
+      if (key in message) {
+        result[key] = message[key];
+      }
+    });
+  }
+
+  // Finished results get no more patches
+  if (result.process && (result.process.status >= 100 || result.process.status < 0)) {
+    delete latestResults[result_id];
+  } else {
+    latestResults[result_id] = JSON.parse(JSON.stringify(result));
+  }
+  return result;
+};
+
 // Handle new message passed from Redis
 sub.on("message", function(channel, message) {
   
@@ -89,6 +154,14 @@ sub.on("message", function(channel, message) {
     // Break out of message handling
     return false;
   }
+
+  // Patches are applied to the last full result
+  if (channel === "RAPD_RESULTS") {
+    message_object = fullResult(message_object);
+    if (! message_object) {
+      return false;
+    }
+  }
   
   // Grab out the session_id
   let session_id = false;
@@ -0,0 +1,260 @@
+"""
+Local stand-in for the drmaa module
+
+Jobs are run as subprocesses on this machine, with the parts of the drmaa
+Session API the cluster adapters use, so job tracking can be tried out and
+tested without a cluster. A number of slots can be set to keep jobs queued
+until earlier ones finish, as on a busy cluster.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+from collections import namedtuple
+import itertools
+import os
+import signal
+import subprocess
+import threading
+
+class JobState(object):
+    """Job states as drmaa.JobState"""
+    UNDETERMINED = "undetermined"
+    QUEUED_ACTIVE = "queued_active"
+    SYSTEM_ON_HOLD = "system_on_hold"
+    USER_ON_HOLD = "user_on_hold"
+    USER_SYSTEM_ON_HOLD = "user_system_on_hold"
+    RUNNING = "running"
+    SYSTEM_SUSPENDED = "system_suspended"
+    USER_SUSPENDED = "user_suspended"
+    USER_SYSTEM_SUSPENDED = "user_system_suspended"
+    DONE = "done"
+    FAILED = "failed"
+
+class JobControlAction(object):
+    """Job control actions as drmaa.JobControlAction"""
+    SUSPEND = "suspend"
+    RESUME = "resume"
+    HOLD = "hold"
+    RELEASE = "release"
+    TERMINATE = "terminate"
+
+class DrmaaException(Exception):
+    """Base of the fake drmaa errors"""
+    pass
+
+class ExitTimeoutException(DrmaaException):
+    """A wait timed out before the job ended"""
+    pass
+
+class InvalidJobException(DrmaaException):
+    """The job is not known to the session"""
+    pass
+
+class NoActiveSessionException(DrmaaException):
+    """The session has not been initialized"""
+    pass
+
+class AlreadyActiveSessionException(DrmaaException):
+    """The session has already been initialized"""
+    pass
+
+JobInfo = namedtuple("JobInfo", ("jobId",
+                                 "hasExited",
+                                 "hasSignal",
+                                 "terminatedSignal",
+                                 "hasCoreDump",
+                                 "wasAborted",
+                                 "exitStatus",
+                                 "resourceUsage"))
+
+class JobTemplate(object):
+    """The job template attributes the cluster adapters set"""
+
+    def __init__(self):
+        self.remoteCommand = None
+        self.args = []
+        self.workingDirectory = None
+        self.outputPath = None
+        self.joinFiles = False
+        self.nativeSpecification = ""
+        self.jobName = None
+
+class Session(object):
+    """
+    Runs jobs locally
+
+    Calls from two threads at once raise an AssertionError, as a real
+    session is not safe to share between threads.
+    """
+
+    TIMEOUT_WAIT_FOREVER = -1
+    TIMEOUT_NO_WAIT = 0
+    JOB_IDS_SESSION_ANY = "DRMAA_JOB_IDS_SESSION_ANY"
+
+    def __init__(self, slots=None):
+        """
+        Keyword arguments
+        slots -- number of jobs run at once, or None for no limit
+        """
+
+        self.slots = slots
+        self.active = False
+        self.status_calls = 0
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._queued = []
+        self._call_lock = threading.Lock()
+
+    def _enter(self):
+        if not self._call_lock.acquire(False):
+            raise AssertionError("drmaa session called from two threads at once")
+        if not self.active:
+            self._call_lock.release()
+            raise NoActiveSessionException()
+
+    def _exit(self):
+        self._call_lock.release()
+
+    def _get_job(self, jobId):
+        if jobId not in self._jobs:
+            raise InvalidJobException(jobId)
+        return self._jobs[jobId]
+
+    def _start_queued(self):
+        running = len([job for job in self._jobs.values()
+                       if job["process"] and job["process"].poll() is None])
+        while self._queued and (self.slots is None or running < self.slots):
+            job = self._jobs[self._queued.pop(0)]
+            template = job["template"]
+            if template.outputPath:
+                output = open(template.outputPath.lstrip(":"), "w")
+            else:
+                output = open(os.devnull, "w")
+            job["process"] = subprocess.Popen([template.remoteCommand] + list(template.args),
+                                              cwd=template.workingDirectory,
+                                              stdout=output,
+                                              stderr=subprocess.STDOUT,
+                                              preexec_fn=os.setsid)
+            output.close()
+            running += 1
+
+    def initialize(self, contactString=None):
+        if self.active:
+            raise AlreadyActiveSessionException()
+        self.active = True
+
+    def exit(self):
+        self._enter()
+        try:
+            for job in self._jobs.values():
+                if job["process"] and job["process"].poll() is None:
+                    os.killpg(job["process"].pid, signal.SIGTERM)
+                    job["process"].wait()
+            self._jobs.clear()
+            del self._queued[:]
+            self.active = False
+        finally:
+            self._exit()
+
+    def createJobTemplate(self):
+        return JobTemplate()
+
+    def deleteJobTemplate(self, jobTemplate):
+        pass
+
+    def runJob(self, jobTemplate):
+        self._enter()
+        try:
+            jobId = str(next(self._ids))
+            template = JobTemplate()
+            template.__dict__.update(jobTemplate.__dict__)
+            self._jobs[jobId] = {"template":template,
+                                 "process":None,
+                                 "terminated":False}
+            self._queued.append(jobId)
+            self._start_queued()
+            return jobId
+        finally:
+            self._exit()
+
+    def jobStatus(self, jobId):
+        self._enter()
+        try:
+            self.status_calls += 1
+            self._start_queued()
+            job = self._get_job(jobId)
+            if job["terminated"]:
+                return JobState.FAILED
+            if job["process"] is None:
+                return JobState.QUEUED_ACTIVE
+            returncode = job["process"].poll()
+            if returncode is None:
+                return JobState.RUNNING
+            if returncode == 0:
+                return JobState.DONE
+            return JobState.FAILED
+        finally:
+            self._exit()
+
+    def control(self, jobId, operation):
+        self._enter()
+        try:
+            job = self._get_job(jobId)
+            if operation == JobControlAction.TERMINATE:
+                job["terminated"] = True
+                if jobId in self._queued:
+                    self._queued.remove(jobId)
+                elif job["process"].poll() is None:
+                    os.killpg(job["process"].pid, signal.SIGTERM)
+                    job["process"].wait()
+                self._start_queued()
+        finally:
+            self._exit()
+
+    def wait(self, jobId, timeout=-1):
+        """Wait for a job to end and forget it. Only single jobs are handled."""
+
+        self._enter()
+        try:
+            job = self._get_job(jobId)
+            if not job["terminated"]:
+                # Queued jobs are only started by other calls, so never waited on
+                if job["process"] is None or \
+                   (timeout == self.TIMEOUT_NO_WAIT and job["process"].poll() is None):
+                    raise ExitTimeoutException(jobId)
+                job["process"].wait()
+            del self._jobs[jobId]
+            returncode = job["process"].returncode if job["process"] else None
+            return JobInfo(jobId=jobId,
+                           hasExited=not job["terminated"],
+                           hasSignal=job["terminated"],
+                           terminatedSignal="SIGTERM" if job["terminated"] else None,
+                           hasCoreDump=False,
+                           wasAborted=job["terminated"] and job["process"] is None,
+                           exitStatus=returncode if returncode and returncode > 0 else 0,
+                           resourceUsage={})
+        finally:
+            self._exit()
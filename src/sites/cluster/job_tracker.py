@@ -0,0 +1,407 @@
+"""
+Tracking cluster jobs from one long-lived DRMAA session
+
+Each process gets one JobTracker holding a single initialized session.
+Jobs are submitted through it and a single thread checks the status of
+every job still running once per poll interval, instead of a session and
+a polling loop for each job. submit() returns a ClusterJob that can be
+waited on, alone or with others through wait_any() and as_completed().
+
+Sessions are not safe to share between threads, so every call on the
+session is made holding the tracker lock.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import time
+
+# Seconds between checks of the jobs running
+POLL_INTERVAL = 1.0
+
+# Trackers by process id, so a forked process never uses its parent's session
+_trackers = {}
+# Holds on the trackers started by hold_tracker, by process id
+_holds = {}
+_trackers_lock = threading.Lock()
+
+def get_tracker(backend=None, poll_interval=POLL_INTERVAL):
+    """
+    Return the JobTracker for this process, starting it the first time. It
+    is kept until the process exits.
+
+    Keyword arguments
+    backend -- module with the drmaa API, drmaa if not given
+    poll_interval -- seconds between checks of the jobs running
+    """
+
+    pid = os.getpid()
+    with _trackers_lock:
+        if pid not in _trackers:
+            _trackers[pid] = JobTracker(backend=backend, poll_interval=poll_interval)
+        _holds.pop(pid, None)
+        return _trackers[pid]
+
+def hold_tracker(backend=None, poll_interval=POLL_INTERVAL):
+    """
+    Return the JobTracker for this process, starting it the first time. A
+    tracker started here is shut down by the release_tracker call that lets
+    go of the last hold on it, unless get_tracker has been called since.
+
+    Keyword arguments
+    backend -- module with the drmaa API, drmaa if not given
+    poll_interval -- seconds between checks of the jobs running
+    """
+
+    pid = os.getpid()
+    with _trackers_lock:
+        if pid not in _trackers:
+            _trackers[pid] = JobTracker(backend=backend, poll_interval=poll_interval)
+            _holds[pid] = 0
+        if pid in _holds:
+            _holds[pid] += 1
+        return _trackers[pid]
+
+def release_tracker():
+    """Let go of a hold from hold_tracker"""
+
+    pid = os.getpid()
+    with _trackers_lock:
+        if pid not in _holds:
+            return
+        _holds[pid] -= 1
+        if _holds[pid]:
+            return
+        del _holds[pid]
+        tracker = _trackers.pop(pid)
+    tracker.shutdown()
+
+def shutdown_tracker():
+    """Stop the tracker of this process, if there is one"""
+
+    with _trackers_lock:
+        _holds.pop(os.getpid(), None)
+        tracker = _trackers.pop(os.getpid(), None)
+    if tracker:
+        tracker.shutdown()
+
+# Exit the session cleanly, otherwise the master node gets event client
+# timeout errors after 600s. Children of multiprocessing leave through
+# os._exit and skip this, so jobs run there hold the tracker instead.
+atexit.register(shutdown_tracker)
+
+class ClusterJob(object):
+    """A job submitted through a JobTracker"""
+
+    def __init__(self, tracker, job_id, tag=False, logfile=False, delete_logfile=False,
+                 timeout=False, mp_event=False, logger=False):
+
+        self.tracker = tracker
+        self.job_id = job_id
+        self.tag = tag
+        self.logfile = logfile
+        self.delete_logfile = delete_logfile
+        self.timeout = timeout
+        self.mp_event = mp_event
+        self.logger = logger
+
+        self.submitted = time.time()
+        self.state = None
+        self.exit_status = None
+        self.killed = False
+        self._result = None
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return "<ClusterJob %s %s>" % (self.job_id, self.state)
+
+    def done(self):
+        """Return True once the job has ended"""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the job to end, returning True if it has"""
+
+        self._done.wait(timeout)
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the job to end and return its result, the dict the
+        launchers put on a result_queue, or None if it has not ended
+        """
+
+        self.wait(timeout)
+        return self._result
+
+    def cancel(self):
+        """Terminate the job"""
+        self.tracker.kill(self)
+
+    def _finish(self, state, exit_status):
+        """Record the end of the job, reading its output"""
+
+        self.state = state
+        self.exit_status = exit_status
+
+        stdout = ""
+        if self.logfile and os.path.isfile(self.logfile):
+            with open(self.logfile, "rb") as raw:
+                stdout = raw.read()
+            # Delete logfile if it was not asked to be saved
+            if self.delete_logfile:
+                os.unlink(self.logfile)
+
+        self._result = {"pid":self.job_id,
+                        "returncode":exit_status,
+                        "stdout":stdout,
+                        "stderr":"",
+                        "tag":self.tag}
+        self._done.set()
+
+class JobTracker(object):
+    """One DRMAA session and the jobs submitted through it"""
+
+    def __init__(self, backend=None, poll_interval=POLL_INTERVAL):
+        """
+        Keyword arguments
+        backend -- module with the drmaa API, drmaa if not given
+        poll_interval -- seconds between checks of the jobs running
+        """
+
+        if backend is None:
+            import drmaa as backend
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger("RAPDLogger")
+
+        # Job states that mean the job is not running anymore
+        self.ended_states = (backend.JobState.SYSTEM_SUSPENDED,
+                             backend.JobState.USER_SUSPENDED,
+                             backend.JobState.DONE,
+                             backend.JobState.FAILED)
+
+        self.session = backend.Session()
+        try:
+            self.session.initialize()
+        except backend.AlreadyActiveSessionException:
+            # Forked from a process with a session
+            pass
+
+        # Held for every call on the session and change to the jobs
+        self.lock = threading.Lock()
+        self.job_ended = threading.Condition(self.lock)
+        self.jobs = {}
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, command, work_dir=False, logfile=False, native_specification="",
+               name=False, timeout=False, mp_event=False, tag=False, logger=False):
+        """
+        Submit a command to the cluster and return its ClusterJob
+
+        command -- command to run
+        work_dir -- working directory, the current directory if not given
+        logfile -- stdout and stderr of the command, a temporary file read
+                   into the result and deleted if not given
+        native_specification -- cluster options for the job
+        name -- name of the job on the cluster
+        timeout -- seconds before the job is killed, False to wait forever
+        mp_event -- the job is killed once this multiprocessing.Event is cleared
+        tag -- passed back in the result
+        logger -- logger to report the job being killed to
+        """
+
+        if work_dir == False:
+            work_dir = os.getcwd()
+        delete_logfile = False
+        if logfile == False:
+            with tempfile.NamedTemporaryFile(dir=work_dir, delete=False) as temp_file:
+                logfile = temp_file.name
+            delete_logfile = True
+        elif not os.path.isabs(logfile):
+            logfile = os.path.join(work_dir, logfile)
+
+        with self.lock:
+            template = self.session.createJobTemplate()
+            template.workingDirectory = work_dir
+            template.joinFiles = True
+            template.nativeSpecification = native_specification
+            # Path to the executable command
+            template.remoteCommand = command.split()[0]
+            # Rest of command
+            if len(command.split()) > 1:
+                template.args = command.split()[1:]
+            # The ':' is required!
+            template.outputPath = ":%s" % logfile
+            if name:
+                template.jobName = name
+            job_id = self.session.runJob(template)
+            # Cleanup the input script from the RAM
+            self.session.deleteJobTemplate(template)
+
+            job = ClusterJob(self,
+                             job_id,
+                             tag=tag,
+                             logfile=logfile,
+                             delete_logfile=delete_logfile,
+                             timeout=timeout,
+                             mp_event=mp_event,
+                             logger=logger)
+            self.jobs[job_id] = job
+
+        return job
+
+    def kill(self, job):
+        """Terminate a job on the cluster"""
+
+        with self.lock:
+            self._kill(job)
+
+    def _kill(self, job):
+        if job.done() or job.killed:
+            return
+        try:
+            self.session.control(job.job_id, self.backend.JobControlAction.TERMINATE)
+        except self.backend.InvalidJobException:
+            pass
+        job.killed = True
+        if job.logger:
+            job.logger.debug("job:%s terminated on cluster" % job.job_id)
+
+    def wait_any(self, jobs, timeout=None):
+        """
+        Wait for at least one of the jobs to end
+
+        Returns (done, not_done) sets of the jobs. done is empty if none of
+        the jobs ended before timeout seconds.
+        """
+
+        jobs = set(jobs)
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        with self.lock:
+            while True:
+                done = set(job for job in jobs if job.done())
+                if done:
+                    return done, jobs - done
+                if deadline is None:
+                    # A timeout keeps the wait interruptible
+                    self.job_ended.wait(self.poll_interval)
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return done, jobs - done
+                    self.job_ended.wait(remaining)
+
+    def as_completed(self, jobs, timeout=None):
+        """Yield the jobs as they end, stopping after timeout seconds"""
+
+        pending = set(jobs)
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while pending:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            done, pending = self.wait_any(pending, remaining)
+            if not done:
+                return
+            for job in done:
+                yield job
+
+    def run(self):
+        """Check the jobs running until the tracker is shut down"""
+
+        while not self.stopped.is_set():
+            with self.lock:
+                if self.jobs:
+                    self.check_jobs()
+            self.stopped.wait(self.poll_interval)
+
+    def check_jobs(self):
+        """
+        Check the status of every job running in one pass, killing any timed
+        out or no longer wanted. Called holding the lock.
+        """
+
+        now = time.time()
+        ended = False
+        for job_id, job in self.jobs.items():
+            try:
+                state = self.session.jobStatus(job_id)
+            except self.backend.InvalidJobException:
+                state = self.backend.JobState.FAILED
+
+            if state not in self.ended_states:
+                if job.mp_event and job.mp_event.is_set() == False:
+                    self._kill(job)
+                elif job.timeout and now - job.submitted > job.timeout:
+                    self._kill(job)
+                continue
+
+            # Reap the job from the session
+            exit_status = None
+            try:
+                info = self.session.wait(job_id, self.backend.Session.TIMEOUT_NO_WAIT)
+                exit_status = info.exitStatus
+            except (self.backend.ExitTimeoutException, self.backend.InvalidJobException):
+                pass
+
+            del self.jobs[job_id]
+            job._finish(state, exit_status)
+            ended = True
+
+        if ended:
+            self.job_ended.notify_all()
+
+    def shutdown(self):
+        """Stop checking jobs and exit the session"""
+
+        self.stopped.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+        with self.lock:
+            try:
+                self.session.exit()
+            except Exception:
+                self.logger.exception("Error exiting the cluster session")
+            # Nothing will end the jobs left now
+            for job in self.jobs.values():
+                job._finish(None, None)
+            self.jobs.clear()
+            self.job_ended.notify_all()
@@ -0,0 +1,349 @@
+"""
+Cluster adapter running jobs on this machine
+
+For sites with one processing host. Jobs run as local processes, but each
+waits for its nproc slots in a ledger shared by every RAPD process on the
+machine, so an index and an integrate started separately do not run more
+jobs than there are cores. Waiting jobs start in order of the priority of
+their queue, then of submission, and a queue can be kept to part of the
+slots so long jobs do not hold up quick ones.
+
+The ledger is a JSON file locked with fcntl while it is read and written.
+Slots held by processes that have died are given back the next time the
+ledger is read.
+
+Use by setting CLUSTER_ADAPTER = "sites.cluster.local" in the site file.
+The number of slots and the ledger file can be set with RAPD_LOCAL_SLOTS
+and RAPD_SLOT_LEDGER.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+from contextlib import contextmanager
+import errno
+import fcntl
+import json
+import multiprocessing
+import os
+import shlex
+import signal
+import subprocess
+import tempfile
+import time
+import uuid
+
+# Slots on the machine
+SLOTS = int(os.environ.get("RAPD_LOCAL_SLOTS", multiprocessing.cpu_count()))
+
+# The ledger shared by every process on the machine
+LEDGER_FILE = os.environ.get("RAPD_SLOT_LEDGER",
+                             os.path.join(tempfile.gettempdir(), "rapd_slot_ledger.json"))
+
+# Queue -> priority. Jobs waiting in a higher priority queue start first.
+QUEUES = {"index.q":30,
+          "general.q":20,
+          "integrate.q":10}
+
+# Queue -> most slots its jobs may hold at once
+QUEUE_LIMITS = {"integrate.q":max(1, SLOTS * 3 // 4)}
+
+# Seconds between checks of the ledger or a job while waiting
+WAIT_INTERVAL = 0.5
+
+def check_cluster():
+    """Jobs can always be launched here"""
+    return True
+
+def check_queue(inp):
+    """
+    Returns which queue should be used with the plugin.
+    """
+    d = {"ECHO"       : "index.q",
+         "INDEX"      : "index.q",
+         "BEAMCENTER" : "general.q",
+         "XDS"        : "integrate.q",
+         "INTEGRATE"  : "integrate.q",
+         "PDBQUERY"   : "general.q",
+         "ANALYSIS"   : "general.q",
+         "MR"         : "general.q",
+        }
+    return d.get(inp, "general.q")
+
+def get_resources(command):
+    """Return the number of processors used for specific plugin."""
+    if command in ("INDEX",):
+        return min(4, SLOTS)
+    elif command in ("INTEGRATE",):
+        # Integrate gets number of processors and number of jobs
+        return (QUEUE_LIMITS.get("integrate.q", SLOTS), 1)
+    else:
+        return 1
+
+def get_nproc_njobs():
+    """Return the nproc and njobs for an XDS integrate job"""
+    return get_resources("INTEGRATE")
+
+def determine_nproc(command):
+    """Determine how many processors to reserve for a specific job type."""
+    nproc = get_resources(command)
+    if isinstance(nproc, tuple):
+        nproc = nproc[0]
+    return nproc
+
+def process_alive(pid):
+    """Return True if a process is running"""
+
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno == errno.EPERM
+    return True
+
+class SlotLedger(object):
+    """The slots of the machine held and waited for"""
+
+    def __init__(self, path=None, slots=None, queue_limits=None):
+        """
+        Keyword arguments
+        path -- ledger file, LEDGER_FILE if not given
+        slots -- slots on the machine, SLOTS if not given
+        queue_limits -- queue -> most slots held at once, QUEUE_LIMITS if not given
+        """
+
+        self.path = path or LEDGER_FILE
+        self.slots = slots or SLOTS
+        self.queue_limits = QUEUE_LIMITS if queue_limits is None else queue_limits
+
+    @contextmanager
+    def locked(self):
+        """Yield the ledger contents, writing any changes back, holding the lock"""
+
+        with open(self.path, "a+") as ledger_file:
+            fcntl.flock(ledger_file, fcntl.LOCK_EX)
+            try:
+                ledger_file.seek(0)
+                contents = ledger_file.read()
+                try:
+                    ledger = json.loads(contents)
+                except ValueError:
+                    ledger = {}
+                ledger.setdefault("running", {})
+                ledger.setdefault("waiting", {})
+
+                yield ledger
+
+                ledger_file.seek(0)
+                ledger_file.truncate()
+                ledger_file.write(json.dumps(ledger))
+                ledger_file.flush()
+            finally:
+                fcntl.flock(ledger_file, fcntl.LOCK_UN)
+        # Let every user of the machine share the ledger
+        try:
+            os.chmod(self.path, 0o666)
+        except OSError:
+            pass
+
+    def clean(self, ledger):
+        """Give back the slots of processes no longer running"""
+
+        for section in ("running", "waiting"):
+            for token, entry in ledger[section].items():
+                if not process_alive(entry["pid"]):
+                    del ledger[section][token]
+
+    def can_start(self, ledger, token):
+        """Return True if the waiting job can take its slots now"""
+
+        entry = ledger["waiting"][token]
+        used = sum(job["nproc"] for job in ledger["running"].values())
+        if used + entry["nproc"] > self.slots:
+            return False
+
+        def fits_queue(job):
+            limit = self.queue_limits.get(job["queue"])
+            if not limit:
+                return True
+            queue_used = sum(running["nproc"] for running in ledger["running"].values()
+                             if running["queue"] == job["queue"])
+            return queue_used + job["nproc"] <= limit
+
+        if not fits_queue(entry):
+            return False
+
+        # Jobs ahead in line go first, unless held back by their queue
+        place = (-entry["priority"], entry["since"])
+        for other_token, other in ledger["waiting"].items():
+            if other_token != token and (-other["priority"], other["since"]) < place \
+               and fits_queue(other):
+                return False
+
+        return True
+
+    def reserve(self, nproc=1, queue="general.q", mp_event=False):
+        """
+        Wait for nproc slots and return the token holding them, or None if
+        mp_event is cleared while waiting
+        """
+
+        token = uuid.uuid4().hex
+        nproc = max(1, min(int(nproc), self.slots))
+        entry = {"pid":os.getpid(),
+                 "nproc":nproc,
+                 "queue":queue,
+                 "priority":QUEUES.get(queue, 0),
+                 "since":time.time()}
+
+        with self.locked() as ledger:
+            ledger["waiting"][token] = entry
+
+        while True:
+            with self.locked() as ledger:
+                self.clean(ledger)
+                # Lost if the ledger file was removed
+                ledger["waiting"].setdefault(token, entry)
+                if self.can_start(ledger, token):
+                    ledger["running"][token] = ledger["waiting"].pop(token)
+                    return token
+                if mp_event and mp_event.is_set() == False:
+                    del ledger["waiting"][token]
+                    return None
+            time.sleep(WAIT_INTERVAL)
+
+    def release(self, token):
+        """Give back the slots held by token"""
+
+        with self.locked() as ledger:
+            ledger["running"].pop(token, None)
+            ledger["waiting"].pop(token, None)
+
+    def in_use(self):
+        """Return the number of slots held"""
+
+        with self.locked() as ledger:
+            self.clean(ledger)
+            return sum(job["nproc"] for job in ledger["running"].values())
+
+def get_ledger():
+    """Return the slot ledger of the machine"""
+    return SlotLedger(LEDGER_FILE, SLOTS, QUEUE_LIMITS)
+
+def process_cluster(command,
+                    work_dir=False,
+                    logfile=False,
+                    batch_queue="general.q",
+                    nproc=1,
+                    logger=False,
+                    name=False,
+                    mp_event=False,
+                    timeout=False,
+                    pid_queue=False,
+                    tag=False,
+                    result_queue=False):
+    """
+    command - command to run
+    work_dir - working directory
+    logfile - print results of command to this file
+    batch_queue - queue the job waits in (index.q, general.q, integrate.q)
+    nproc - number of slots to hold while the job runs. If they are not
+            free, it waits to launch until they are.
+    logger - logger event to pass status reports.
+    name - Name of job, for the log.
+    mp_event - Pass in the Multiprocessing.Event() that the plugin in uses to signal termination.
+               This way the job will be killed if the event() is cleared within the plugin.
+    timeout - max time (in seconds) to wait for job to complete before it is killed. (default=False waits forever)
+    pid_queue - pass back the process id through a multiprocessing.Queue()
+    tag - used by RAPD to keep track of iterations of jobs. (required for result_queue, if used)
+    result_queue - pass back the results in a multiprocessing.Queue() (requires tag)
+    """
+
+    if work_dir == False:
+        work_dir = os.getcwd()
+    delete_logfile = False
+    if logfile == False:
+        with tempfile.NamedTemporaryFile(dir=work_dir, delete=False) as temp_file:
+            logfile = temp_file.name
+        delete_logfile = True
+    elif not os.path.isabs(logfile):
+        logfile = os.path.join(work_dir, logfile)
+
+    ledger = get_ledger()
+    token = ledger.reserve(nproc, batch_queue, mp_event)
+    if token is None:
+        if logger:
+            logger.debug("job %s cancelled while waiting for slots" % (name or command))
+        if delete_logfile:
+            os.unlink(logfile)
+        return
+
+    try:
+        with open(logfile, "w") as output:
+            proc = subprocess.Popen(shlex.split(command),
+                                    cwd=work_dir,
+                                    stdout=output,
+                                    stderr=subprocess.STDOUT,
+                                    preexec_fn=os.setsid)
+
+        # Send back PID if have pid_queue
+        if pid_queue:
+            pid_queue.put(proc.pid)
+
+        started = time.time()
+        while proc.poll() is None:
+            if mp_event and mp_event.is_set() == False:
+                kill_job(proc.pid, logger)
+                break
+            if timeout and time.time() - started > timeout:
+                kill_job(proc.pid, logger)
+                break
+            time.sleep(WAIT_INTERVAL)
+        proc.wait()
+    finally:
+        ledger.release(token)
+
+    # Put results on a Queue, if given
+    if result_queue:
+        with open(logfile, "rb") as raw:
+            stdout = raw.read()
+        result_queue.put({"pid":proc.pid,
+                          "returncode":proc.returncode,
+                          "stdout":stdout,
+                          "stderr":"",
+                          "tag":tag})
+
+    # Delete logfile if it was not asked to be saved
+    if delete_logfile:
+        os.unlink(logfile)
+
+def kill_job(jobid, logger=False):
+    """Kill a job started by process_cluster, and anything it started"""
+
+    try:
+        os.killpg(int(jobid), signal.SIGTERM)
+        if logger:
+            logger.debug("job:%s terminated" % jobid)
+    except OSError:
+        pass
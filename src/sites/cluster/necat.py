@@ -27,15 +27,15 @@ Provide generic interface for cluster interactions
 """
 
 # Standard imports
-import drmaa
 import os
 import redis
 import subprocess
-import time
-import tempfile
 from multiprocessing import Process
 from functools import wraps
 
+# RAPD imports
+import sites.cluster.job_tracker as job_tracker
+
 def checkCluster():
     """
     Quick check run at beginning of pipelines to see if job was subitted to computer cluster node (returns True) or
@@ -189,6 +189,53 @@ def mp_job(func):
             return func(**kwargs)
     return wrapper
 
+def get_native_specification(batch_queue='general.q,all.q', nproc=1):
+    """Return the cluster options for a job"""
+    #'-clear' can be added to the options to eliminate the general.q
+    return '-clear -shell y -p -100 -q %s -pe smp %s'%(batch_queue, nproc)
+
+def submit(command,
+           work_dir=False,
+           logfile=False,
+           batch_queue='general.q,all.q',
+           nproc=1,
+           logger=False,
+           name=False,
+           mp_event=False,
+           timeout=False,
+           tag=False):
+    """
+    Submit a job through the cluster session of this process and return a
+    job_tracker.ClusterJob without waiting for it. Takes the arguments of
+    process_cluster. Wait on jobs with wait_any or as_completed.
+    """
+    return job_tracker.get_tracker().submit(
+        command,
+        work_dir=work_dir,
+        logfile=logfile,
+        native_specification=get_native_specification(batch_queue, nproc),
+        name=name,
+        timeout=timeout,
+        mp_event=mp_event,
+        tag=tag,
+        logger=logger)
+
+def wait_any(jobs, timeout=None):
+    """Wait for one of the submitted jobs to end. Returns (done, not_done)"""
+    return job_tracker.get_tracker().wait_any(jobs, timeout)
+
+def as_completed(jobs, timeout=None):
+    """Yield the submitted jobs as they end"""
+    return job_tracker.get_tracker().as_completed(jobs, timeout)
+
+def shutdown():
+    """
+    Exit the cluster session of this process. A child process of
+    multiprocessing that submitted jobs calls this before it ends, as it
+    skips atexit.
+    """
+    job_tracker.shutdown_tracker()
+
 @mp_job
 def process_cluster(command,
                    work_dir=False,
@@ -219,103 +266,37 @@ def process_cluster(command,
     tag - used by RAPD to keep track of iterations of jobs. (required for result_queue, if used)
     result_queue - pass back the results in a multiprocessing.Queue() (requires tag)
     """
-    def kill_job(session, job, logger=False):
-        """kill the job on the cluster."""
-        session.control(job, drmaa.JobControlAction.TERMINATE)
-        if logger:
-            logger.debug('job:%s terminated on cluster'%job)
-
-    s = False
-    jt = False
-    fd = False
-    m = False
-    if work_dir == False:
-        work_dir = os.getcwd()
-    if result_queue:
-        if logfile == False:
-            fd = tempfile.NamedTemporaryFile(dir=work_dir, delete=False)
-            logfile = fd.name
-    counter = 0
-
-    #'-clear' can be added to the options to eliminate the general.q
-    options = '-clear -shell y -p -100 -q %s -pe smp %s'%(batch_queue, nproc)
-    s = drmaa.Session()
-    s.initialize()
-    jt = s.createJobTemplate()
-    jt.workingDirectory=work_dir
-    jt.joinFiles=True
-    jt.nativeSpecification=options
-    # Path to the executable command
-    jt.remoteCommand=command.split()[0]
-    # Rest of command
-    if len(command.split()) > 1:
-        jt.args=command.split()[1:]
-    if logfile:
-        #the ':' is required!
-        jt.outputPath=':%s'%logfile
-    if name:
-        jt.jobName=name
-    #submit the job to the cluster and get the job_id returned
-    job = s.runJob(jt)
-    
-    #return job_id.
-    if pid_queue:
-        pid_queue.put(job)
-
-    #cleanup the input script from the RAM.
-    s.deleteJobTemplate(jt)
-
-    #If multiprocessing.event is set, then run loop to watch until job or script has finished.
-    #Returns True if job is still running or False if it is dead. Uses CPU to run loop!!!
-    decodestatus = {drmaa.JobState.UNDETERMINED: True,
-                    drmaa.JobState.QUEUED_ACTIVE: True,
-                    drmaa.JobState.SYSTEM_ON_HOLD: True,
-                    drmaa.JobState.USER_ON_HOLD: True,
-                    drmaa.JobState.USER_SYSTEM_ON_HOLD: True,
-                    drmaa.JobState.RUNNING: True,
-                    drmaa.JobState.SYSTEM_SUSPENDED: False,
-                    drmaa.JobState.USER_SUSPENDED: False,
-                    drmaa.JobState.DONE: False,
-                    drmaa.JobState.FAILED: False,
-                    }
+    # Held, not kept, as a child process running this skips atexit and
+    # would leave its session open
+    tracker = job_tracker.hold_tracker()
     try:
-        #Loop to keep hold process while job is running or ends when self.running event ends.
-        while decodestatus[s.jobStatus(job)]:
-            if mp_event:
-                if mp_event.is_set() == False:
-                    kill_job(s, job, logger)
-                    break
-            if timeout:
-                if counter > timeout:
-                    kill_job(s, job, logger)
-                    break
-            time.sleep(1)
-            counter += 1
-    except:
-        if logger:
-            logger.debug('qsub.py was killed, but the launched job will continue to run')
-    
-    # Used for passing back results to queue
-    if result_queue:
-        # stdout and stderr are joined
-        stdout = ""
-        if os.path.isfile(logfile):
-            with open(logfile, 'rb') as raw:
-                for line in raw:
-                    stdout += line
-            # Delete logile if it was not asked to be saved
-            if fd:
-                os.unlink(logfile)
-        # Setup the result dict to pass back
-        result = {'pid': job,
-                  #"returncode": proc.returncode,
-                  "stdout": stdout,
-                  "stderr": '',
-                  "tag": tag}
-        result_queue.put(result)
-    #Exit cleanly, otherwise master node gets event client timeout errors after 600s.
-    if s:
-        s.exit()
+        job = tracker.submit(command,
+                             work_dir=work_dir,
+                             logfile=logfile,
+                             native_specification=get_native_specification(batch_queue, nproc),
+                             name=name,
+                             timeout=timeout,
+                             mp_event=mp_event,
+                             tag=tag,
+                             logger=logger)
+
+        #return job_id.
+        if pid_queue:
+            pid_queue.put(job.job_id)
+
+        # The session of this process watches the job
+        try:
+            result = job.result()
+        except:
+            if logger:
+                logger.debug('qsub.py was killed, but the launched job will continue to run')
+            return
+
+        # Used for passing back results to queue
+        if result_queue:
+            result_queue.put(result)
+    finally:
+        job_tracker.release_tracker()
 
 def kill_job(jobid):
   """
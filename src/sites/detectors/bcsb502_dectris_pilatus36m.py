@@ -37,6 +37,7 @@ import pprint
 # Dectris Pilatus 6M
 import detectors.dectris.dectris_pilatus6m as detector
 import detectors.detector_utils as utils
+import detectors.minicbf as minicbf
 
 # Detector information
 # The RAPD detector type
@@ -133,6 +134,17 @@ def get_data_root_dir(fullname):
     # Return the determined directory
     return data_root_dir
 
+# Header label:(pattern, transform)
+HEADER_ITEMS = minicbf.header_items(exclude=("size1", "size2"), overrides={
+    "comment": ("^# Comment\:\s*(.*)\s*$", lambda x: float(x)),
+    "flat_field": ("^# Flat_field\:\s*([\(\)\w\.\-\_]+)", lambda x: str(x)),
+    "ratecor": ("^# Ratecorr_lut_directory\:\s*([\(\)\w\.\-\_]+)", lambda x: str(x)),
+    "shutter_time": ("^# Shutter_time\s*([\d\.]+) s", lambda x: float(x)),
+    "tau": ("^#\sTau\s\=\s*([\d\.]+) s", lambda x: float(x)),
+    "trim_file": ("^#\sTrim_file\:\s*([\w\.\-\_]+)", lambda x:str(x).rstrip()),
+    })
+HEADER_PARSER = minicbf.HeaderParser(HEADER_ITEMS)
+
 def base_read_header(image,
                      mode=None,
                      run_id=None,
@@ -152,60 +164,7 @@ def base_read_header(image,
     # Make sure the image is a full path image
     image = os.path.abspath(image)
 
-    def mmorm(x):
-        d = float(x)
-        if (d < 2):
-            return(d*1000)
-        else:
-            return(d)
-
-    #item:(pattern,transform)
-    header_items = {
-        "beam_x": ("^# Beam_xy\s*\(([\d\.]+)\,\s[\d\.]+\) pixels", lambda x: float(x)),
-        "beam_y": ("^# Beam_xy\s*\([\d\.]+\,\s([\d\.]+)\) pixels", lambda x: float(x)),
-        "comment": ("^# Comment\:\s*(.*)\s*$", lambda x: float(x)),
-        "count_cutoff": ("^# Count_cutoff\s*(\d+) counts", lambda x: int(x)),
-        "detector_sn": ("S\/N ([\w\d\-]*)\s*", lambda x: str(x)),
-        "date": ("^# ([\d\-]+T[\d\.\:]+)\s*", lambda x: str(x)),
-        "distance": ("^# Detector_distance\s*([\d\.]+) m",mmorm),
-        "excluded_pixels": ("^# Excluded_pixels\:\s*([\w\.]+)", lambda x: str(x)),
-        "flat_field": ("^# Flat_field\:\s*([\(\)\w\.\-\_]+)", lambda x: str(x)),
-        "gain": ("^# Gain_setting\:\s*([\s\(\)\w\.\-\=]+)", lambda x: str(x).rstrip()),
-        "n_excluded_pixels": ("^# N_excluded_pixels\s\=\s*(\d+)", lambda x: int(x)),
-        "osc_range": ("^# Angle_increment\s*([\d\.]*)\s*deg", lambda x: float(x)),
-        "osc_start": ("^# Start_angle\s*([\d\.]+)\s*deg", lambda x: float(x)),
-        "period": ("^# Exposure_period\s*([\d\.]+) s", lambda x: float(x)),
-        "pixel_size": ("^# Pixel_size\s*(\d+)e-6 m.*", lambda x: int(x)/1000),
-        "ratecor": ("^# Ratecorr_lut_directory\:\s*([\(\)\w\.\-\_]+)", lambda x: str(x)),
-        "sensor_thickness": ("^#\sSilicon\ssensor\,\sthickness\s*([\d\.]+)\sm", lambda x: float(x)*1000),
-        "shutter_time": ("^# Shutter_time\s*([\d\.]+) s", lambda x: float(x)),
-        "tau": ("^#\sTau\s\=\s*([\d\.]+) s", lambda x: float(x)),
-        "threshold": ("^#\sThreshold_setting\:\s*(\d+)\seV", lambda x: int(x)),
-        "time": ("^# Exposure_time\s*([\d\.]+) s", lambda x: float(x)),
-        "transmission": ("^# Filter_transmission\s*([\d\.]+)", lambda x: float(x)),
-        "trim_file": ("^#\sTrim_file\:\s*([\w\.\-\_]+)", lambda x:str(x).rstrip()),
-        "twotheta": ("^# Detector_2theta\s*([\d\.]*)\s*deg", lambda x: float(x)),
-        "wavelength": ("^# Wavelength\s*([\d\.]+) A", lambda x: float(x))
-        }
-
-    rawdata = open(image,"rb").read(2048)
-    headeropen = 0
-    headerclose= rawdata.index("--CIF-BINARY-FORMAT-SECTION--")
-    header = rawdata[headeropen:headerclose]
-
-    count = 0
-    while (count < 10):
-    	try:
-            rawdata = open(image,"rb").read(1024)
-            headeropen = 0
-            headerclose= rawdata.index("--CIF-BINARY-FORMAT-SECTION--")
-            header = rawdata[headeropen:headerclose]
-            break
-        except:
-            count +=1
-            if logger:
-                logger.exception('Error opening %s' % image)
-            time.sleep(0.1)
+    header = minicbf.read_header_block(image, logger)
 
     # try:
     #tease out the info from the file name
@@ -225,14 +184,7 @@ def base_read_header(image,
         "size1": 2463,
         "size2": 2527}
 
-    for label, pat in header_items.iteritems():
-        # print label
-        pattern = re.compile(pat[0], re.MULTILINE)
-        matches = pattern.findall(header)
-        if len(matches) > 0:
-            parameters[label] = pat[1](matches[-1])
-        else:
-            parameters[label] = None
+    parameters.update(HEADER_PARSER.parse(header))
 
     # Put beam center into RAPD format mm
     parameters["x_beam"] = parameters["beam_y"] * parameters["pixel_size"]
@@ -29,7 +29,6 @@ import argparse
 import os
 import pprint
 import numpy
-import re
 
 # Dectris Pilatus 6M
 import detectors.dectris.dectris_pilatus6m as detector
@@ -236,108 +235,6 @@ def get_data_root_dir(fullname):
     # return the determined directory
     return data_root_dir
 
-def base_read_header_OLD(image,
-                     logger=False):
-    """
-    Given a full file name for a Piltus image (as a string), read the header and
-    return a dict with all the header info
-    """
-    # print "determine_flux %s" % image
-    if logger:
-        logger.debug("read_header %s" % image)
-
-    # Make sure the image is a full path image
-    image = os.path.abspath(image)
-    #tease out the info from the file name
-    base = os.path.basename(image).rstrip(".cbf")
-
-    def mmorm(x):
-        d = float(x)
-        if (d < 2):
-            return (d*1000)
-        else:
-            return d
-
-    #item:(pattern,transform)
-    header_items = {
-        #"md2_aperture": ("^# MD2_aperture_size\s*(\d+) microns", lambda x: int(x)/1000),
-        "beam_x": ("^# Beam_xy\s*\(([\d\.]+)\,\s[\d\.]+\) pixels", lambda x: float(x)),
-        "beam_y": ("^# Beam_xy\s*\([\d\.]+\,\s([\d\.]+)\) pixels", lambda x: float(x)),
-        "count_cutoff": ("^# Count_cutoff\s*(\d+) counts", lambda x: int(x)),
-        "detector_sn": ("S\/N ([\w\d\-]*)\s*", lambda x: str(x)),
-        "date": ("^# ([\d\-]+T[\d\.\:]+)\s*", lambda x: str(x)),
-        "distance": ("^# Detector_distance\s*([\d\.]+) m", mmorm),
-        "excluded_pixels": ("^# Excluded_pixels\:\s*([\w\.]+)", lambda x: str(x)),
-        "flat_field": ("^# Flat_field\:\s*([\(\)\w\.]+)", lambda x: str(x)),
-        "gain": ("^# Gain_setting\:\s*([\s\(\)\w\.\-\=]+)", lambda x: str(x).rstrip()),
-        "n_excluded_pixels": ("^# N_excluded_pixels\s\=\s*(\d+)", lambda x: int(x)),
-        "osc_range": ("^# Angle_increment\s*([\d\.]*)\s*deg", lambda x: float(x)),
-        "osc_start": ("^# Start_angle\s*([\d\.]+)\s*deg", lambda x: float(x)),
-        "period": ("^# Exposure_period\s*([\d\.]+) s", lambda x: float(x)),
-        "pixel_size": ("^# Pixel_size\s*([\.\d]+)e-6 m.*", lambda x: float(x)/1000.0),
-        "sensor_thickness": ("^#\sSilicon\ssensor\,\sthickness\s*([\d\.]+)\sm", lambda x: float(x)*1000),
-        "tau": ("^#\sTau\s\=\s*([\d\.]+e\-09) s", lambda x: float(x)),
-        "threshold": ("^#\sThreshold_setting\:\s*([\d\.]+)\seV", lambda x: float(x)),
-        "time": ("^# Exposure_time\s*([\d\.]+) s", lambda x: float(x)),
-        "transmission": ("^# Filter_transmission\s*([\d\.]+)", lambda x: float(x)),
-        "trim_file": ("^#\sTrim_file\:\s*([\w\.]+)", lambda x:str(x).rstrip()),
-        "twotheta": ("^# Detector_2theta\s*([\d\.]*)\s*deg", lambda x: float(x)),
-        "wavelength": ("^# Wavelength\s*([\d\.]+) A", lambda x: float(x)),
-        #"ring_current": ("^# Ring_current\s*([\d\.]*)\s*mA", lambda x: float(x)),
-        #"sample_mounter_position": ("^#\sSample_mounter_position\s*([\w\.]+)", lambda x:str(x).rstrip()),
-        "size1": ("X-Binary-Size-Fastest-Dimension:\s*([\d\.]+)", lambda x: int(x)),
-        "size2": ("X-Binary-Size-Second-Dimension:\s*([\d\.]+)", lambda x: int(x)),
-        }
-
-    count = 0
-    while (count < 10):
-        try:
-            # Use 'with' to make sure file closes properly. Only read header.
-            header = ""
-            with open(image, "rb") as raw:
-                for line in raw:
-                    header += line
-                    if line.count("X-Binary-Size-Padding"):
-                        break
-            break
-        except:
-            count +=1
-            if logger:
-                logger.exception('Error opening %s' % image)
-            time.sleep(0.1)
-
-    parameters = {
-        "fullname": image,
-        "detector": "PILATUS",
-        "directory": os.path.dirname(image),
-        "image_prefix": "_".join(base.split("_")[0:-2]),
-        # "run_number": int(base.split("_")[-2]),
-        "image_number": int(base.split("_")[-1]),
-        "axis": "omega",
-        "collect_mode": False,
-        # "run_id": run_id,
-        # "place_in_run": place_in_run,
-        # "size1": 2463,
-        # "size2": 2527}
-        }
-
-    for label, pat in header_items.iteritems():
-        # print label
-        pattern = re.compile(pat[0], re.MULTILINE)
-        matches = pattern.findall(header)
-        if len(matches) > 0:
-            parameters[label] = pat[1](matches[-1])
-        else:
-            parameters[label] = None
-
-    #pprint(parameters)
-
-    # Put beam center into RAPD format mm
-    parameters["x_beam"] = parameters["beam_y"] * parameters["pixel_size"]
-    parameters["y_beam"] = parameters["beam_x"] * parameters["pixel_size"]
-
-    return parameters
-
 def read_header(fullname, beam_settings=False, extra_header=False):
     """
     Read header from image file and return dict
@@ -249,6 +249,9 @@ CLUSTER_ADAPTER = "sites.cluster.necat"
 # the same file in launch/launcher_adapters
 RAPD_LAUNCHER_ADAPTER_DIRECTORIES = ("launch.launcher_adapters",
                                      "sites.launcher_adapters")
+# The "shell_pool" adapter runs jobs in warm plugin workers instead of a new
+# rapd.launch per job. Its LAUNCHER_SPECIFICATIONS entry can also set
+# "pool_size", "max_jobs_per_worker" and "preload" (commands to import up front)
 # Directories to look for rapd plugins
 # Queried in order, so a rapd_agent_echo.py in src/sites/agents will override
 # the same file in src/agents
@@ -258,6 +261,10 @@ RAPD_PLUGIN_DIRECTORIES = ("sites.plugins",
 # rapd.python path
 RAPD_PYTHON_PATH = '/gpfs6/users/necat/Jon/Programs/RAPD2/RAPD/bin/rapd2.python'
 
+# XDS plugin library for reading HDF5 frames (LIB=)
+# Set to False to convert HDF5 data to CBF before integrating
+XDS_HDF5_LIB = False
+
 # Method RAPD uses to track groups
 #   uid -- the uid of data root directory corresponds to session.group_id
 #GROUP_ID = "uid"
@@ -387,6 +394,9 @@ RUN_MONITOR_REDIS_CLUSTER = REDIS_CLUSTER
 # Expected time limit for a run to be collected in minutes (0 = forever)
 RUN_WINDOW = 60
 
+# Threads saving plugin results to the database in the background
+RESULT_WRITER_THREADS = 4
+
 # Cloud Settings
 # The cloud monitor module
 CLOUD_MONITOR = "cloud.rapd_cloud"
@@ -440,10 +450,28 @@ CONTROL_DATABASE_SETTINGS = {
     "REDIS_MASTER_NAME":    REDIS_MASTER_NAME,
 }
 
+# Priority lanes for RAPD_JOBS and the launcher job lists
+# Commands not listed go in DEFAULT_LANE. "strict" always takes from the first
+# lane with jobs waiting, "weighted" shares jobs out by WEIGHTS
+JOB_LANES = {
+    "LANES":("interactive", "collection", "reprocess"),
+    "DEFAULT_LANE":"collection",
+    "COMMANDS":{"ECHO":"interactive",
+                "INDEX":"interactive",
+                "INTEGRATE":"collection",
+                "ANALYSIS":"collection",
+                "PDBQUERY":"collection",
+                "HCMERGE":"reprocess",
+                "MR":"reprocess"},
+    "POLICY":"strict",
+    "WEIGHTS":{"interactive":6, "collection":3, "reprocess":1},
+}
+
 LAUNCHER_SETTINGS = {
     "LAUNCHER_SPECIFICATIONS":LAUNCHER_SPECIFICATIONS,
     "LOCK_FILE":LAUNCHER_LOCK_FILE,
-    "RAPD_LAUNCHER_ADAPTER_DIRECTORIES":RAPD_LAUNCHER_ADAPTER_DIRECTORIES
+    "RAPD_LAUNCHER_ADAPTER_DIRECTORIES":RAPD_LAUNCHER_ADAPTER_DIRECTORIES,
+    "JOB_LANES":JOB_LANES
 }
 
 LAUNCH_SETTINGS = {
@@ -458,6 +486,10 @@ IMAGE_MONITOR_SETTINGS = {
     "REDIS_HOST":           REDIS_HOST,
     "REDIS_PORT":           REDIS_PORT,
     "REDIS_DB":             REDIS_DB,
+    # "blocking" waits on all images_collected lists and drains in batches,
+    # "polling" is the old rpop loop
+    "INTAKE_MODE":          "blocking",
+    "BATCH_SIZE":           100,
 }
 
 RUN_MONITOR_SETTINGS = {
@@ -195,6 +195,10 @@ RAPD_LAUNCHER_ADAPTER_DIRECTORIES = ("launch.launcher_adapters",
 CLUSTER_ADAPTER = "sites.cluster.sercat"
 # Set to False if there is no cluster adapter
 
+# XDS plugin library for reading HDF5 frames (LIB=)
+# Set to False to convert HDF5 data to CBF before integrating
+XDS_HDF5_LIB = False
+
 # Data gatherer settings
 # The data gatherer for this site, in the src/sites/gatherers directory
 #GATHERER = "sercat_id.py"
@@ -0,0 +1,125 @@
+"""Tests for control.result_writer"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import threading
+import time
+import unittest
+
+# RAPD imports
+from control.result_writer import ResultWriter
+
+def result(result_id, step):
+    """A plugin result message"""
+    return {"process":{"result_id":result_id, "type":"plugin", "step":step},
+            "results":{}}
+
+class SlowSave(object):
+    """Records saves, holding each one until released"""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.saved = []
+        self.active = set()
+        self.overlap = False
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, message):
+        result_id = message["process"]["result_id"]
+        with self.lock:
+            if result_id in self.active:
+                self.overlap = True
+            self.active.add(result_id)
+        self.release.wait()
+        time.sleep(self.delay)
+        with self.lock:
+            self.active.discard(result_id)
+            self.saved.append((result_id, message["process"]["step"]))
+
+class TestResultWriter(unittest.TestCase):
+    """Background, coalescing result writes"""
+
+    def setUp(self):
+        self.writer = None
+
+    def tearDown(self):
+        if self.writer:
+            self.writer.stop(timeout=5)
+
+    def test_coalesce(self):
+        """Updates waiting behind a write are replaced by the newest"""
+
+        save = SlowSave()
+        save.release.clear()
+        self.writer = ResultWriter(save, threads=2)
+
+        # First update is taken straight away and held in save
+        self.writer.submit(result("a", 0))
+        time.sleep(0.1)
+        for step in range(1, 10):
+            self.writer.submit(result("a", step))
+        save.release.set()
+
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(save.saved, [("a", 0), ("a", 9)])
+        self.assertEqual(self.writer.coalesced, 8)
+        self.assertFalse(save.overlap)
+
+    def test_submit_does_not_wait(self):
+        """Submitting returns at once while writes are slow"""
+
+        save = SlowSave(delay=0.2)
+        self.writer = ResultWriter(save, threads=2)
+
+        start = time.time()
+        for number in range(20):
+            self.writer.submit(result("r%d" % number, 0))
+        self.assertTrue(time.time() - start < 0.1)
+
+        self.assertTrue(self.writer.flush(timeout=10))
+        self.assertEqual(len(save.saved), 20)
+        self.assertFalse(save.overlap)
+
+    def test_errors(self):
+        """A failed save does not stop the writer"""
+
+        calls = []
+        def save(message):
+            calls.append(message["process"]["result_id"])
+            if message["process"]["result_id"] == "bad":
+                raise ValueError("bad result")
+
+        self.writer = ResultWriter(save, threads=1)
+        self.writer.submit(result("bad", 0))
+        self.writer.submit(result("good", 0))
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(calls, ["bad", "good"])
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,218 @@
+"""Tests and benchmark for control.run_registry"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import argparse
+import collections
+import logging
+import random
+import time
+import unittest
+
+# RAPD imports
+from control.run_registry import RunRegistry
+from control.model import Model
+
+def make_run(number, site_tag="NECAT_E", start=1, number_images=360):
+    """Return a run dict like those stored in the runs collection"""
+    return {"_id":"run%06d" % number,
+            "site_tag":site_tag,
+            "directory":"/data/user%d/sample%d" % (number % 50, number),
+            "image_prefix":"xtal_%d" % number,
+            "run_number":1,
+            "start_image_number":start,
+            "number_images":number_images}
+
+def linear_lookup(recent_runs, site_tag, directory, image_prefix, run_number, image_number):
+    """The scan over an OrderedDict that Model.query_in_run used to do"""
+    for run_id, run in recent_runs.iteritems():
+        if run.get("site_tag", None) == site_tag and \
+           run.get("directory", None) == directory and \
+           run.get("image_prefix", None) == image_prefix and \
+           run.get("run_number", None) == run_number:
+            run_start = run.get("start_image_number")
+            run_end = run.get("number_images") + run_start - 1
+            if image_number >= run_start and image_number <= run_end:
+                return run
+    return None
+
+class LocalDatabase(object):
+    """Stand-in for the query_in_run of the database adapter"""
+
+    def __init__(self, runs):
+        self.runs = runs
+        self.calls = 0
+
+    def query_in_run(self, site_tag, directory, image_prefix, run_number,
+                     image_number, minutes=0, return_type="boolean"):
+        self.calls += 1
+        found = [dict(run) for run in self.runs
+                 if linear_lookup({0:run}, site_tag, directory, image_prefix,
+                                  run_number, image_number)]
+        return found or False
+
+def local_model(database):
+    """A Model with just enough set up to look up runs"""
+    model = Model.__new__(Model)
+    model.logger = logging.getLogger("RAPDLogger")
+    model.database = database
+    model.recent_runs = RunRegistry()
+    return model
+
+class TestRunRegistry(unittest.TestCase):
+    """In-memory run lookups"""
+
+    def test_find(self):
+        """Images are matched on key and image number range"""
+
+        registry = RunRegistry()
+        run = make_run(1, start=10, number_images=5)
+        registry[run["_id"]] = run
+
+        self.assertEqual(registry.find("NECAT_E", run["directory"], "xtal_1", 1, 12),
+                         ("run000001", run))
+        self.assertEqual(registry.find("NECAT_E", run["directory"], "xtal_1", 1, 14)[0],
+                         "run000001")
+        self.assertEqual(registry.find("NECAT_E", run["directory"], "xtal_1", 1, 15),
+                         (None, None))
+        self.assertEqual(registry.find("NECAT_E", run["directory"], "xtal_1", 1, 9),
+                         (None, None))
+        self.assertEqual(registry.find("NECAT_C", run["directory"], "xtal_1", 1, 12),
+                         (None, None))
+
+    def test_wedges(self):
+        """Runs sharing a key are told apart by image number, newest first"""
+
+        registry = RunRegistry()
+        for number, start in ((1, 1), (2, 101), (3, 1)):
+            run = make_run(0, start=start, number_images=100)
+            run["_id"] = "run%d" % number
+            registry[run["_id"]] = run
+
+        directory = make_run(0)["directory"]
+        self.assertEqual(registry.find("NECAT_E", directory, "xtal_0", 1, 150)[0], "run2")
+        self.assertEqual(registry.find("NECAT_E", directory, "xtal_0", 1, 50)[0], "run3")
+
+    def test_find_run(self):
+        """Runs already recorded are recognized without a run_id"""
+
+        registry = RunRegistry()
+        run = make_run(1)
+        registry[run["_id"]] = run
+
+        run_data = dict(run)
+        del run_data["_id"]
+        self.assertEqual(registry.find_run(run_data)[0], "run000001")
+        run_data["number_images"] = 10
+        self.assertEqual(registry.find_run(run_data), (None, None))
+
+    def test_lru(self):
+        """The least recently used run is dropped first"""
+
+        registry = RunRegistry(max_runs=2)
+        runs = [make_run(number) for number in range(3)]
+        registry[runs[0]["_id"]] = runs[0]
+        registry[runs[1]["_id"]] = runs[1]
+        # Use run 0 so run 1 is the oldest
+        registry.find("NECAT_E", runs[0]["directory"], "xtal_0", 1, 1)
+        registry[runs[2]["_id"]] = runs[2]
+
+        self.assertEqual(len(registry), 2)
+        self.assertTrue("run000000" in registry)
+        self.assertFalse("run000001" in registry)
+        self.assertEqual(registry.find("NECAT_E", runs[1]["directory"], "xtal_1", 1, 1),
+                         (None, None))
+
+    def test_age(self):
+        """Runs not used within max_age are dropped"""
+
+        registry = RunRegistry(max_age=0.05)
+        run = make_run(1)
+        registry[run["_id"]] = run
+        time.sleep(0.1)
+        self.assertEqual(registry.find("NECAT_E", run["directory"], "xtal_1", 1, 1),
+                         (None, None))
+        self.assertEqual(len(registry), 0)
+
+    def test_backfill(self):
+        """A database hit is stored so the rest of the run needs no queries"""
+
+        run = make_run(1)
+        database = LocalDatabase([run])
+        model = local_model(database)
+
+        for image_number in range(1, 361):
+            found = model.query_in_run("NECAT_E", run["directory"], "xtal_1", 1,
+                                       image_number, return_type="dict")
+            self.assertEqual(found[0]["_id"], "run000001")
+        self.assertEqual(database.calls, 1)
+
+        self.assertFalse(model.query_in_run("NECAT_E", run["directory"], "xtal_1", 1, 361))
+        self.assertEqual(database.calls, 2)
+
+def benchmark(number_runs=10000, number_lookups=20000):
+    """Time image lookups against number_runs historical runs"""
+
+    runs = [make_run(number) for number in range(number_runs)]
+    recent_runs = collections.OrderedDict((run["_id"], run) for run in runs)
+    registry = RunRegistry(max_runs=number_runs)
+    for run in runs:
+        registry[run["_id"]] = run
+
+    # Images from the most recent runs, as during collection
+    lookups = []
+    for __ in range(number_lookups):
+        run = runs[-random.randint(1, 10)]
+        lookups.append((run["site_tag"], run["directory"], run["image_prefix"],
+                        run["run_number"], random.randint(1, 360)))
+
+    results = {}
+    for name, lookup in (("linear scan", lambda args: linear_lookup(recent_runs, *args)),
+                         ("run registry", lambda args: registry.find(*args))):
+        # Fewer linear scans, they are slow
+        count = number_lookups if name == "run registry" else number_lookups // 20
+        start = time.time()
+        for args in lookups[:count]:
+            lookup(args)
+        results[name] = count / (time.time() - start)
+
+    return results
+
+def main():
+    """Run the microbenchmark"""
+
+    parser = argparse.ArgumentParser(description="Benchmark run lookups")
+    parser.add_argument("--runs", type=int, default=10000, help="Historical runs held")
+    args = parser.parse_args()
+
+    results = benchmark(number_runs=args.runs)
+    print "%d runs held" % args.runs
+    for name, rate in sorted(results.iteritems()):
+        print "  %-14s %12.0f lookups/s" % (name, rate)
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,160 @@
+"""
+Tests for the MongoDB indexes in database.mongodb_adapter
+
+Needs a mongod to talk to, by default on localhost. Set RAPD_TEST_MONGOURI to
+use another. The tests are skipped if no server answers.
+"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import datetime
+import os
+import unittest
+
+import pymongo
+
+# RAPD imports
+import database.mongodb_adapter as mongodb_adapter
+
+MONGOURI = os.environ.get("RAPD_TEST_MONGOURI", "mongodb://localhost:27017")
+TEST_DB = "rapd_test_indexes"
+
+class LocalDatabase(mongodb_adapter.Database):
+    """The adapter, pointed at the test database"""
+
+    def __init__(self, client):
+        mongodb_adapter.Database.__init__(self, string=MONGOURI)
+        self.client = client
+
+    def get_db_connection(self, read_only=False):
+        return self.client[TEST_DB]
+
+def index_names(plan):
+    """Return the names of the indexes scanned in an explain plan"""
+
+    names = []
+    if plan.get("stage") == "IXSCAN":
+        names.append(plan["indexName"])
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            names.extend(index_names(plan[key]))
+    for stage in plan.get("inputStages", []):
+        names.extend(index_names(stage))
+    return names
+
+class TestIndexes(unittest.TestCase):
+    """Indexes and index use for the control queries"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = pymongo.MongoClient(MONGOURI, serverSelectionTimeoutMS=500)
+        try:
+            cls.client.server_info()
+        except pymongo.errors.PyMongoError:
+            raise unittest.SkipTest("No mongod at %s" % MONGOURI)
+
+    def setUp(self):
+        self.client.drop_database(TEST_DB)
+        self.db = self.client[TEST_DB]
+        self.database = LocalDatabase(self.client)
+
+    def tearDown(self):
+        self.client.drop_database(TEST_DB)
+
+    def add_runs(self, number, age_minutes=0):
+        """Insert runs, all in one directory"""
+        timestamp = datetime.datetime.utcnow() - datetime.timedelta(minutes=age_minutes)
+        self.db.runs.insert_many([{"site_tag":"NECAT_E",
+                                   "directory":"/data/user/sample",
+                                   "image_prefix":"xtal_%d" % index,
+                                   "run_number":1,
+                                   "start_image_number":1,
+                                   "number_images":360,
+                                   "file_ctime":timestamp,
+                                   "timestamp":timestamp} for index in range(number)])
+
+    def test_idempotent(self):
+        """Creating the indexes again changes nothing"""
+
+        self.db.create_collection("mx_index_results")
+        first = self.database.create_indexes()
+        second = self.database.create_indexes()
+
+        self.assertEqual(first, second)
+        self.assertTrue("runs.runs_lookup" in first)
+        self.assertTrue("mx_index_results.process_result_id" in first)
+        self.assertTrue("runs_lookup" in self.db.runs.index_information())
+
+    def test_run_query_plan(self):
+        """The run lookup is an index scan"""
+
+        self.add_runs(200)
+        self.database.create_indexes()
+
+        query = {"site_tag":"NECAT_E",
+                 "directory":"/data/user/sample",
+                 "image_prefix":"xtal_10",
+                 "run_number":1,
+                 "start_image_number":{"$lte":5}}
+        plan = self.db.runs.find(query).sort("file_ctime", -1).explain()
+
+        self.assertEqual(index_names(plan["queryPlanner"]["winningPlan"]), ["runs_lookup"])
+        if "executionStats" in plan:
+            self.assertEqual(plan["executionStats"]["totalDocsExamined"], 1)
+
+    def test_file_query_plan(self):
+        """GridFS lookups by hash are index scans"""
+
+        self.database.create_indexes()
+        plan = self.db.fs.files.find({"metadata.hash":"abc"}).explain()
+        self.assertEqual(index_names(plan["queryPlanner"]["winningPlan"]), ["files_hash"])
+
+    def test_minutes_window(self):
+        """Only runs added within minutes are matched"""
+
+        self.add_runs(1, age_minutes=120)
+
+        self.assertFalse(self.database.query_in_run(site_tag="NECAT_E",
+                                                    directory="/data/user/sample",
+                                                    image_prefix="xtal_0",
+                                                    run_number=1,
+                                                    image_number=5,
+                                                    minutes=60))
+        self.assertTrue(self.database.query_in_run(site_tag="NECAT_E",
+                                                   directory="/data/user/sample",
+                                                   image_prefix="xtal_0",
+                                                   run_number=1,
+                                                   image_number=5,
+                                                   minutes=180))
+        self.assertTrue(self.database.query_in_run(site_tag="NECAT_E",
+                                                   directory="/data/user/sample",
+                                                   image_prefix="xtal_0",
+                                                   run_number=1,
+                                                   image_number=5))
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,133 @@
+"""Tests for the HDF5 master file header reader in detectors.hdf5_header"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import h5py
+    import detectors.hdf5_header as hdf5_header
+except ImportError:
+    h5py = None
+
+def write_master(path, data_files=3):
+    """Write a small Dectris-like master file with external data links"""
+
+    with h5py.File(path, "w") as h5_file:
+        detector = h5_file.create_group("/entry/instrument/detector")
+        detector["description"] = "Dectris EIGER 16M"
+        detector["beam_center_x"] = 2091.0
+        detector["beam_center_y"] = 2130.0
+        detector["detector_distance"] = 0.3
+        detector["x_pixel_size"] = 7.5e-05
+        specific = detector.create_group("detectorSpecific")
+        specific["x_pixels_in_detector"] = 4150
+        specific["y_pixels_in_detector"] = 4371
+        specific["data_collection_date"] = "2018-03-23T14:04:38.384"
+        detector.create_group("goniometer")["two_theta"] = [0.0] * 10
+        h5_file.create_group("/entry/instrument/beam")["incident_wavelength"] = 0.97918
+        goniometer = h5_file.create_group("/entry/sample/goniometer")
+        goniometer["omega"] = [float(frame) * 0.2 for frame in range(10)]
+        goniometer["omega_range_average"] = 0.2
+        data = h5_file.create_group("/entry/data")
+        for number in range(1, data_files + 1):
+            # The data files are never written
+            data["data_%06d" % number] = h5py.ExternalLink("missing_data_%06d.h5" % number,
+                                                           "/entry/data/data")
+
+@unittest.skipIf(h5py is None, "h5py not available")
+class TestHdf5Header(unittest.TestCase):
+    """Reading master file headers"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.master = os.path.join(self.directory, "thaum_1_master.h5")
+        write_master(self.master)
+        hdf5_header._resolved_paths.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_header(self):
+        """Values come from their NeXus paths"""
+
+        header = hdf5_header.read_header(self.master)
+        self.assertEqual(header["incident_wavelength"], 0.97918)
+        self.assertEqual(header["beam_center_x"], 2091.0)
+        self.assertEqual(header["x_pixels_in_detector"], 4150)
+        self.assertEqual(header["data_collection_date"], "2018-03-23T14:04:38.384")
+        self.assertEqual(len(header["omega"]), 10)
+        self.assertEqual(len(header["two_theta"]), 10)
+        self.assertFalse("chi" in header)
+
+    def test_external_links(self):
+        """External links are not followed"""
+
+        with h5py.File(self.master, "r") as h5_file:
+            self.assertEqual(hdf5_header.get_dataset(h5_file, "/entry/data/data_000001/data"), None)
+            self.assertEqual(hdf5_header.get_dataset(h5_file, "/entry/data/data_000001"), None)
+
+    def test_model_cache(self):
+        """Paths found are kept for the detector model"""
+
+        hdf5_header.read_header(self.master)
+        paths = hdf5_header._resolved_paths["Dectris EIGER 16M"]
+        self.assertEqual(paths["x_pixels_in_detector"],
+                         "/entry/instrument/detector/detectorSpecific/x_pixels_in_detector")
+        self.assertEqual(paths["chi"], None)
+
+        # A file from the same model with a value moved is still read
+        other = os.path.join(self.directory, "thaum_2_master.h5")
+        write_master(other)
+        with h5py.File(other, "a") as h5_file:
+            del h5_file["/entry/instrument/detector/detectorSpecific/x_pixels_in_detector"]
+            h5_file["/entry/instrument/detector/x_pixels_in_detector"] = 4150
+        self.assertEqual(hdf5_header.read_header(other)["x_pixels_in_detector"], 4150)
+
+    def test_frame_range(self):
+        """Frames are counted up to the first data file missing"""
+
+        self.assertEqual(hdf5_header.get_frame_range(self.master), (0, 0))
+
+        for number in (1, 2):
+            with h5py.File(os.path.join(self.directory, "missing_data_%06d.h5" % number), "w") as h5_file:
+                dataset = h5_file.create_dataset("/entry/data/data", (10, 4, 4), dtype="uint32")
+                if number == 1:
+                    dataset.attrs["image_nr_low"] = 1
+                    dataset.attrs["image_nr_high"] = 10
+        self.assertEqual(hdf5_header.get_frame_range(self.master), (1, 20))
+
+        # A data file still being written is not counted
+        with open(os.path.join(self.directory, "missing_data_000003.h5"), "w") as partial:
+            partial.write("\x89HDF")
+        self.assertEqual(hdf5_header.get_frame_range(self.master), (1, 20))
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
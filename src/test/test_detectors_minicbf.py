@@ -0,0 +1,227 @@
+"""Tests for the shared miniCBF header reader in detectors.minicbf"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Run directly to benchmark header reads before and after:
+python test_detectors_minicbf.py [directory of CBFs]
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import glob
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# RAPD imports
+import detectors.dectris.dectris_eiger16m as dectris_eiger16m
+import detectors.dectris.dectris_eiger2_16m as dectris_eiger2_16m
+import detectors.dectris.dectris_eiger9m as dectris_eiger9m
+import detectors.dectris.dectris_pilatus6m as dectris_pilatus6m
+import detectors.minicbf as minicbf
+
+HEADER = "\r\n".join((
+    "###CBF: VERSION 1.5, CBFlib v0.7.8 - SLS/DECTRIS PILATUS detectors",
+    "",
+    "data_thaum_1_000001",
+    "",
+    "_array_data.header_convention \"PILATUS_1.2\"",
+    "_array_data.header_contents",
+    ";",
+    "# Detector: Dectris Eiger 16M, S/N E-32-0108",
+    "# 2018-03-23T14:04:38.384",
+    "# Pixel_size 75e-6 m x 75e-6 m",
+    "# Silicon sensor, thickness 0.000450 m",
+    "# Exposure_time 0.1999950 s",
+    "# Exposure_period 0.2000000 s",
+    "# Tau = 0.0000001e-09 s",
+    "# Count_cutoff 2129754 counts",
+    "# Threshold_setting: 6329 eV",
+    "# Gain_setting: mid gain (vrf = -0.200)",
+    "# N_excluded_pixels = 1180",
+    "# Excluded_pixels: badpix_mask.tif",
+    "# Flat_field: (nil)",
+    "# Trim_file: p6m0108_E12661_T6330_vrf_m0p20.bin",
+    "# Image_path: /ramdisk/",
+    "# Wavelength 0.97918 A",
+    "# Detector_distance 0.30000 m",
+    "# Beam_xy (2091.00, 2130.00) pixels",
+    "# Filter_transmission 10.0000",
+    "# Start_angle 10.0000 deg.",
+    "# Angle_increment 0.2000 deg.",
+    "# Detector_2theta 0.0000 deg.",
+    "# MD2_aperture_size 50 microns",
+    "# Ring_current 102.0 mA",
+    "# Sample_mounter_position F5",
+    ";",
+    "",
+    "_array_data.data",
+    ";",
+    "--CIF-BINARY-FORMAT-SECTION--",
+    "Content-Type: application/octet-stream;",
+    "     conversions=\"x-CBF_BYTE_OFFSET\"",
+    "Content-Transfer-Encoding: BINARY",
+    "X-Binary-Size: 6443836",
+    "X-Binary-ID: 1",
+    "X-Binary-Element-Type: \"signed 32-bit integer\"",
+    "X-Binary-Element-Byte-Order: LITTLE_ENDIAN",
+    "X-Binary-Number-of-Elements: 18139650",
+    "X-Binary-Size-Fastest-Dimension: 4150",
+    "X-Binary-Size-Second-Dimension: 4371",
+    "X-Binary-Size-Padding: 4095",
+    ""))
+
+MODULES = (dectris_eiger16m, dectris_eiger2_16m, dectris_eiger9m, dectris_pilatus6m)
+
+def legacy_read_header(image, header_items):
+    """The header read and parse the detector modules used to do"""
+
+    header = ""
+    with open(image, "rb") as raw:
+        for line in raw:
+            header += line
+            if line.count("X-Binary-Size-Padding"):
+                break
+
+    parameters = {}
+    for label, pat in header_items.iteritems():
+        pattern = re.compile(pat[0], re.MULTILINE)
+        matches = pattern.findall(header)
+        if len(matches) > 0:
+            parameters[label] = pat[1](matches[-1])
+        else:
+            parameters[label] = None
+    return parameters
+
+def write_cbf(path, header=HEADER, data_size=200000):
+    """Write a CBF-like file with a header and binary data"""
+
+    with open(path, "wb") as output_object:
+        output_object.write(header)
+        output_object.write("\r\n\x0c\x1a\x04\xd5")
+        output_object.write(os.urandom(data_size))
+
+class TestMinicbf(unittest.TestCase):
+    """Reading and parsing miniCBF headers"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.image = os.path.join(self.directory, "thaum_1_000001.cbf")
+        write_cbf(self.image)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_header_block(self):
+        """Only the header is read"""
+
+        self.assertEqual(minicbf.read_header_block(self.image), HEADER)
+
+    def test_header_block_boundary(self):
+        """The end of the header is found across read boundaries"""
+
+        for padding in range(minicbf.READ_SIZE - len(HEADER) - 30, minicbf.READ_SIZE - len(HEADER) + 30):
+            header = HEADER.replace("# Image_path: /ramdisk/", "# Image_path: /" + "r" * padding)
+            write_cbf(self.image, header, 1000)
+            self.assertEqual(minicbf.read_header_block(self.image), header)
+
+    def test_missing_file(self):
+        """Errors opening the file are raised after the attempts"""
+
+        self.assertRaises(IOError,
+                          minicbf.read_header_block,
+                          os.path.join(self.directory, "missing.cbf"),
+                          attempts=2,
+                          delay=0)
+
+    def test_same_as_legacy(self):
+        """Every detector module parses the same values as before"""
+
+        header = minicbf.read_header_block(self.image)
+        for module in MODULES:
+            # The header has a value for every item
+            self.assertFalse(None in module.HEADER_PARSER.parse(header).values(), module)
+            self.assertEqual(module.HEADER_PARSER.parse(header),
+                             legacy_read_header(self.image, module.HEADER_ITEMS))
+
+    def test_header_items(self):
+        """Detectors take the shared items, overriding only what differs"""
+
+        self.assertEqual(minicbf.header_items(), minicbf.HEADER_ITEMS)
+        self.assertFalse(minicbf.header_items() is minicbf.HEADER_ITEMS)
+        self.assertEqual(sorted(minicbf.header_items(labels=("time", "size1"), exclude=("size1",))),
+                         ["time"])
+        pixel_size = ("^# Pixel_size\s*([\.\d]+)e-6 m.*", lambda x: float(x)/1000.0)
+        items = minicbf.header_items(overrides={"pixel_size":pixel_size})
+        self.assertTrue(items["pixel_size"] is pixel_size)
+        self.assertTrue(items["wavelength"] is minicbf.HEADER_ITEMS["wavelength"])
+        self.assertEqual(minicbf.mmorm("0.3"), 300.0)
+        self.assertEqual(minicbf.mmorm("300"), 300.0)
+
+    def test_read_header(self):
+        """Detector module read_header gives the full header dict"""
+
+        header = dectris_eiger16m.read_header(self.image)
+        self.assertEqual(header["wavelength"], 0.97918)
+        self.assertEqual(header["distance"], 300.0)
+        self.assertEqual(header["detector_sn"], "E-32-0108")
+        self.assertEqual(header["detector"], "Dectris Eiger 16M")
+        self.assertEqual(header["beam_y"], 2130.0)
+        self.assertEqual(header["image_number"], 1)
+
+def benchmark(images, module=dectris_eiger16m, repeat=3):
+    """Print headers/s for the old and new header reads"""
+
+    for label, read in (("before", lambda image: legacy_read_header(image, module.HEADER_ITEMS)),
+                        ("after", lambda image: module.HEADER_PARSER.parse(
+                            minicbf.read_header_block(image)))):
+        best = None
+        for __ in range(repeat):
+            start = time.time()
+            for image in images:
+                read(image)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print "%-6s %8.0f headers/s" % (label, len(images) / best)
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        benchmark(sorted(glob.glob(os.path.join(sys.argv[1], "*.cbf"))))
+    else:
+        unittest.main(verbosity=2, exit=False)
+
+        directory = tempfile.mkdtemp()
+        try:
+            images = []
+            for number in range(500):
+                images.append(os.path.join(directory, "thaum_1_%06d.cbf" % (number + 1)))
+                write_cbf(images[-1])
+            print "\n%d CBFs" % len(images)
+            benchmark(images)
+        finally:
+            shutil.rmtree(directory)
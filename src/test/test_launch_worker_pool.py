@@ -0,0 +1,142 @@
+"""Tests for launch.worker_pool"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# RAPD imports
+import launch.worker_pool as worker_pool
+
+# A plugin that records which process ran it, or exits hard on request
+PLUGIN = '''
+import os
+import time
+
+class RapdPlugin(object):
+    def __init__(self, site, command, tprint=False, logger=False):
+        self.command = command
+    def start(self):
+        if self.command.get("crash"):
+            os._exit(3)
+        time.sleep(self.command.get("sleep", 0))
+        marker = os.path.join(self.command["directories"]["work"], "ran")
+        with open(marker, "w") as out_file:
+            out_file.write("%d %f" % (os.getpid(), time.time()))
+    def join(self):
+        pass
+'''
+
+class Site(object):
+    """Minimal site description for the pool"""
+    RAPD_PLUGIN_DIRECTORIES = ("rapd_pool_test_plugins",)
+    def __init__(self, log_dir):
+        self.LOGFILE_DIR = log_dir
+
+class TestPluginWorkerPool(unittest.TestCase):
+    """Warm plugin worker pool"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        package = os.path.join(self.tmp_dir, "rapd_pool_test_plugins")
+        os.makedirs(os.path.join(package, "work"))
+        open(os.path.join(package, "__init__.py"), "w").close()
+        open(os.path.join(package, "work", "__init__.py"), "w").close()
+        with open(os.path.join(package, "work", "plugin.py"), "w") as out_file:
+            out_file.write(PLUGIN)
+        sys.path.insert(0, self.tmp_dir)
+        self.site = Site(os.path.join(self.tmp_dir, "logs"))
+        self.pool = None
+
+    def tearDown(self):
+        if self.pool:
+            self.pool.stop(timeout=5)
+        sys.path.remove(self.tmp_dir)
+        shutil.rmtree(self.tmp_dir)
+        for module in sys.modules.keys():
+            if module.startswith("rapd_pool_test_plugins"):
+                del sys.modules[module]
+
+    def command(self, number, **kwargs):
+        command = {"command":"WORK",
+                   "process":{"result_id":"job%d" % number},
+                   "directories":{"launch_dir":self.tmp_dir,
+                                  "work":"jobs/job%d" % number}}
+        command.update(kwargs)
+        return command
+
+    def wait_for(self, number, timeout=20):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            markers = glob.glob(os.path.join(self.tmp_dir, "jobs", "job*", "ran"))
+            if len(markers) >= number:
+                return [open(marker).read().split() for marker in markers]
+            time.sleep(0.05)
+        self.fail("Only %d of %d jobs ran" % (len(markers), number))
+
+    def test_discover(self):
+        """Plugins are found in the site plugin directories"""
+        self.assertEqual(worker_pool.discover_plugins(self.site), ["WORK"])
+
+    def test_bounded_concurrency(self):
+        """No more than size jobs run at once"""
+
+        self.pool = worker_pool.PluginWorkerPool(self.site, size=2, max_jobs=0)
+        for number in range(4):
+            self.pool.submit(self.command(number, sleep=0.5))
+        markers = self.wait_for(4)
+        finish_times = sorted(float(marker[1]) for marker in markers)
+        # Two rounds of two jobs
+        self.assertTrue(finish_times[2] - finish_times[0] > 0.4)
+        self.assertEqual(len(set(marker[0] for marker in markers)), 2)
+
+    def test_crash_isolation(self):
+        """A job that kills its worker does not stop later jobs"""
+
+        self.pool = worker_pool.PluginWorkerPool(self.site, size=1, max_jobs=0)
+        self.pool.submit(self.command(0, crash=True))
+        self.pool.submit(self.command(1))
+        markers = self.wait_for(1)
+        self.assertEqual(len(markers), 1)
+        self.assertEqual(len(self.pool.workers), 1)
+
+    def test_recycle(self):
+        """Workers are replaced after max_jobs jobs"""
+
+        self.pool = worker_pool.PluginWorkerPool(self.site, size=1, max_jobs=2)
+        for number in range(5):
+            self.pool.submit(self.command(number))
+        markers = self.wait_for(5)
+        self.assertEqual(len(set(marker[0] for marker in markers)), 3)
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
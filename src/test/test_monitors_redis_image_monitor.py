@@ -0,0 +1,242 @@
+"""Tests and intake benchmark for monitors.image_monitors.redis_image_monitor"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import argparse
+import collections
+import os
+import threading
+import time
+import unittest
+
+# RAPD imports
+import monitors.image_monitors.redis_image_monitor as redis_image_monitor
+
+class LocalRedis(object):
+    """
+    In-process stand-in for database.redis_adapter.Database covering the list
+    calls the image monitor makes. latency is added to every call to mimic a
+    network round trip.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lists = collections.defaultdict(collections.deque)
+        self.condition = threading.Condition()
+        self.calls = 0
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def lpush(self, key, value):
+        with self.condition:
+            self.lists[key].appendleft(value)
+            self.condition.notify_all()
+
+    def delete(self, key):
+        self._round_trip()
+        with self.condition:
+            self.lists.pop(key, None)
+
+    def rpop(self, key):
+        self._round_trip()
+        with self.condition:
+            if self.lists[key]:
+                return self.lists[key].pop()
+            return None
+
+    def rpop_batch(self, key, count):
+        self._round_trip()
+        with self.condition:
+            values = []
+            while self.lists[key] and len(values) < count:
+                values.append(self.lists[key].pop())
+            return values
+
+    def brpop(self, keys, timeout=0):
+        self._round_trip()
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                for key in keys:
+                    if self.lists[key]:
+                        return key, self.lists[key].pop()
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+class Site(object):
+    """Minimal site description for the monitor"""
+    def __init__(self, mode):
+        self.ID = ("TEST_A", "TEST_B")
+        self.IMAGE_MONITOR_SETTINGS = {"INTAKE_MODE":mode}
+
+class LocalMonitor(redis_image_monitor.Monitor):
+    """Monitor wired to a LocalRedis"""
+    local_redis = None
+    def connect_to_redis(self):
+        self.redis = self.local_redis
+
+class Collector(object):
+    """Notify target counting the images received"""
+
+    def __init__(self):
+        self.messages = []
+        self.count = 0
+        self.done = threading.Event()
+        self.expected = None
+
+    def __call__(self, message):
+        self.messages.append(message)
+        if message["message_type"] == "NEWIMAGES":
+            self.count += len(message["fullnames"])
+        else:
+            self.count += 1
+        if self.expected and self.count >= self.expected:
+            self.done.set()
+
+    def fullnames(self, tag):
+        names = []
+        for message in self.messages:
+            if message["site_tag"] == tag:
+                names.extend(message.get("fullnames", [message.get("fullname")]))
+        return names
+
+def start_monitor(local_redis, collector, mode):
+    """Start a monitor on local_redis and return it"""
+    LocalMonitor.local_redis = local_redis
+    monitor = LocalMonitor(site=Site(mode), notify=collector)
+    return monitor
+
+def stop_monitor(monitor):
+    monitor.stop()
+    monitor.join(redis_image_monitor.BLOCKING_TIMEOUT + 1)
+
+class TestBlockingIntake(unittest.TestCase):
+    """Blocking, batched intake"""
+
+    def setUp(self):
+        self.local_redis = LocalRedis()
+        self.collector = Collector()
+
+    def tearDown(self):
+        stop_monitor(self.monitor)
+
+    def test_order_and_batching(self):
+        """Backlog arrives in batches, oldest first, for each tag"""
+
+        for i in range(250):
+            self.local_redis.lpush("images_collected:TEST_A", "a_%04d.cbf" % i)
+        for i in range(5):
+            self.local_redis.lpush("images_collected:TEST_B", "b_%04d.cbf" % i)
+
+        self.collector.expected = 255
+        self.monitor = start_monitor(self.local_redis, self.collector, "blocking")
+        self.assertTrue(self.collector.done.wait(5))
+
+        self.assertEqual(self.collector.fullnames("TEST_A"),
+                         ["a_%04d.cbf" % i for i in range(250)])
+        self.assertEqual(self.collector.fullnames("TEST_B"),
+                         ["b_%04d.cbf" % i for i in range(5)])
+        self.assertTrue(any(m["message_type"] == "NEWIMAGES" for m in self.collector.messages))
+
+    def test_single_image(self):
+        """A lone image still goes out as NEWIMAGE"""
+
+        self.monitor = start_monitor(self.local_redis, self.collector, "blocking")
+        self.collector.expected = 1
+        self.local_redis.lpush("images_collected:TEST_B", "b_0001.cbf")
+        self.assertTrue(self.collector.done.wait(5))
+        self.assertEqual(self.collector.messages,
+                         [{"message_type":"NEWIMAGE",
+                           "fullname":"b_0001.cbf",
+                           "site_tag":"TEST_B"}])
+
+    def test_idle_round_trips(self):
+        """An idle monitor only touches redis once per BLOCKING_TIMEOUT"""
+
+        self.monitor = start_monitor(self.local_redis, self.collector, "blocking")
+        time.sleep(1.5)
+        self.assertTrue(self.local_redis.calls <= 3)
+
+def benchmark(mode, number_images=500, latency=0.0002, idle_time=5):
+    """Return images/s for a backlog and CPU fraction while idle"""
+
+    local_redis = LocalRedis(latency=latency)
+    collector = Collector()
+    collector.expected = number_images
+    for i in range(number_images):
+        local_redis.lpush("images_collected:TEST_A", "a_%06d.cbf" % i)
+
+    start = time.time()
+    monitor = start_monitor(local_redis, collector, mode)
+    collector.done.wait(600)
+    rate = number_images / (time.time() - start)
+
+    calls = local_redis.calls
+    cpu_start = sum(os.times()[:2])
+    time.sleep(idle_time)
+    idle_cpu = (sum(os.times()[:2]) - cpu_start) / idle_time
+    idle_calls = (local_redis.calls - calls) / float(idle_time)
+
+    stop_monitor(monitor)
+
+    return rate, idle_cpu, idle_calls
+
+def get_commandline():
+    """Grabs the commandline"""
+
+    parser = argparse.ArgumentParser(description="Image intake benchmark")
+    parser.add_argument("-n", "--number",
+                        action="store",
+                        dest="number",
+                        type=int,
+                        default=500,
+                        help="Number of images in the backlog")
+    parser.add_argument("-l", "--latency",
+                        action="store",
+                        dest="latency",
+                        type=float,
+                        default=0.0002,
+                        help="Simulated redis round trip in seconds")
+    return parser.parse_args()
+
+def main(args):
+    """Run the intake benchmark for both modes"""
+
+    print "%-10s %12s %10s %14s" % ("mode", "images/s", "idle CPU", "idle calls/s")
+    for mode in ("polling", "blocking"):
+        rate, idle_cpu, idle_calls = benchmark(mode, args.number, args.latency)
+        print "%-10s %12.1f %9.2f%% %14.1f" % (mode, rate, idle_cpu * 100, idle_calls)
+
+if __name__ == "__main__":
+
+    commandline_args = get_commandline()
+
+    main(args=commandline_args)
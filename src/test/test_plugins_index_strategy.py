@@ -0,0 +1,236 @@
+"""Tests for handling strategy jobs as they end in plugins.index.plugin"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import logging
+import multiprocessing
+from multiprocessing import Process
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+# RAPD imports
+import sites.cluster.fake_drmaa as fake_drmaa
+import sites.cluster.job_tracker as job_tracker
+
+# The plugin needs CCP4 set up to import
+try:
+    import plugins.index.plugin as index_plugin
+    import utils.global_vars as global_vars
+except (ImportError, SystemExit):
+    index_plugin = None
+# The NECAT adapter needs redis to import
+try:
+    import sites.cluster.necat as necat
+except ImportError:
+    necat = None
+
+def make_plugin(run_times, best_ok):
+    """
+    Return an index plugin with strategy jobs sleeping for run_times, whose
+    BEST results are OK for the iterations in best_ok
+    """
+
+    plugin = index_plugin.RapdPlugin.__new__(index_plugin.RapdPlugin)
+    plugin.logger = logging.getLogger("RAPDLogger")
+    plugin.tprint = lambda *args, **kwargs: None
+    plugin.verbose = False
+    plugin.test = False
+    plugin.multiproc = True
+    plugin.cluster_use = False
+    plugin.strategy = "best"
+    plugin.labelit_dir = "/labelit"
+    plugin.looked_at = []
+
+    def postprocess_best(log):
+        plugin.looked_at.append(log)
+        if int(log.split("/")[2]) in best_ok:
+            return "OK"
+        return "FAILED"
+    plugin.postprocess_best = postprocess_best
+    plugin.postprocess_mosflm = plugin.looked_at.append
+    plugin.mosflm_strat_results = {}
+    plugin.mosflm_strat_anom_results = {}
+
+    plugin.jobs = {}
+    for iteration, run_time in enumerate(run_times):
+        plugin.jobs[str(iteration)] = Process(target=time.sleep, args=(run_time,))
+        plugin.jobs[str(iteration)].start()
+    return plugin
+
+@unittest.skipIf(index_plugin is None, "index plugin not available")
+class TestStrategyQueue(unittest.TestCase):
+    """Strategy results taken as the jobs end"""
+
+    def setUp(self):
+        self.strategy_timeout = global_vars.STRATEGY_TIMEOUT
+
+    def tearDown(self):
+        global_vars.STRATEGY_TIMEOUT = self.strategy_timeout
+
+    def test_first_success(self):
+        """The first iteration to work in order is taken and the rest cancelled"""
+
+        plugin = make_plugin((0.1, 0.2, 30, 30, 30), best_ok=(1, 2))
+        start = time.time()
+        plugin.run_queue()
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(plugin.looked_at, ["/labelit/0/best.log",
+                                            "/labelit/0/best_anom.log",
+                                            "/labelit/1/best.log",
+                                            "/labelit/1/best_anom.log"])
+        time.sleep(0.1)
+        self.assertFalse([job for job in plugin.jobs.values() if job.is_alive()])
+
+    def test_order(self):
+        """A later iteration ending first waits for those before it"""
+
+        plugin = make_plugin((0.5, 0.1, 0.1, 30, 30), best_ok=(0, 1))
+        plugin.run_queue()
+        self.assertEqual(plugin.looked_at, ["/labelit/0/best.log", "/labelit/0/best_anom.log"])
+
+    def test_mosflm(self):
+        """Mosflm is used once every BEST iteration has failed or timed out"""
+
+        global_vars.STRATEGY_TIMEOUT = 1
+        plugin = make_plugin((0.1, 0.1, 0.1, 30, 0.1), best_ok=())
+        start = time.time()
+        plugin.run_queue()
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(plugin.looked_at[-2:], ["/labelit/mosflm_strat.out",
+                                                 "/labelit/mosflm_strat_anom.out"])
+        self.assertEqual(plugin.best_results, {"best_results_norm":"FAILED"})
+        self.assertEqual(plugin.best_anom_results, {"best_results_anom":"FAILED"})
+
+    def test_mosflm_timeout(self):
+        """A Mosflm job killed for running too long has no log to read"""
+
+        global_vars.STRATEGY_TIMEOUT = 1
+        plugin = make_plugin((0.1, 0.1, 0.1, 0.1, 30), best_ok=())
+        start = time.time()
+        plugin.run_queue()
+        self.assertTrue(time.time() - start < 5)
+        self.assertFalse([log for log in plugin.looked_at if "mosflm" in log])
+        self.assertEqual(plugin.mosflm_strat_results, {"mosflm_results_norm":"FAILED"})
+        self.assertEqual(plugin.mosflm_strat_anom_results, {"mosflm_results_anom":"FAILED"})
+        time.sleep(0.1)
+        self.assertFalse(plugin.jobs["4"].is_alive())
+
+def is_running(pid):
+    """Return True if a process is running, and not left for its parent to reap"""
+    try:
+        with open("/proc/%d/stat" % pid) as stat_file:
+            return stat_file.read().split(")")[-1].split()[0] != "Z"
+    except IOError:
+        return False
+
+@unittest.skipIf(index_plugin is None or necat is None, "index plugin or NECAT adapter not available")
+class TestStrategyRuns(unittest.TestCase):
+    """BEST and Mosflm runs of a strategy job submitted to a cluster"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sessions = []
+        self.plugin = index_plugin.RapdPlugin.__new__(index_plugin.RapdPlugin)
+        self.plugin.cluster_adapter = necat
+        self.plugin.running = multiprocessing.Event()
+        self.plugin.running.set()
+
+    def tearDown(self):
+        job_tracker.shutdown_tracker()
+        shutil.rmtree(self.directory)
+
+    def start_tracker(self):
+        """Start the tracker of this process on the fake drmaa"""
+
+        sessions = self.sessions
+        class Backend(object):
+            JobState = fake_drmaa.JobState
+            JobControlAction = fake_drmaa.JobControlAction
+            ExitTimeoutException = fake_drmaa.ExitTimeoutException
+            InvalidJobException = fake_drmaa.InvalidJobException
+            AlreadyActiveSessionException = fake_drmaa.AlreadyActiveSessionException
+            class Session(fake_drmaa.Session):
+                def __init__(self):
+                    fake_drmaa.Session.__init__(self)
+                    sessions.append(self)
+        job_tracker.get_tracker(backend=Backend, poll_interval=0.05)
+
+    def test_one_session(self):
+        """The runs share one session, exited once they have all ended"""
+
+        logs = [os.path.join(self.directory, name) for name in ("best.log", "best_anom.log")]
+        def strategy_job():
+            self.start_tracker()
+            self.plugin.launch_strategy_run({"command":"echo best", "logfile":logs[0]})
+            self.plugin.launch_strategy_run({"command":"sleep 0.3", "logfile":logs[1]})
+
+        start = time.time()
+        self.plugin.run_strategy_job(strategy_job)
+        self.assertTrue(time.time() - start >= 0.3)
+        self.assertEqual(len(self.sessions), 1)
+        self.assertFalse(self.sessions[0].active)
+        self.assertTrue(all(job.done() for job in self.plugin.strategy_runs))
+        with open(logs[0]) as log:
+            self.assertEqual(log.read(), "best\n")
+
+    def test_terminate(self):
+        """Runs of a terminated strategy job are cancelled"""
+
+        script = os.path.join(self.directory, "best.sh")
+        pid_file = os.path.join(self.directory, "pid")
+        with open(script, "w") as out_file:
+            out_file.write("#!/bin/sh\necho $$ > %s\nexec sleep 30\n" % pid_file)
+        os.chmod(script, stat.S_IRWXU)
+        def strategy_job():
+            self.start_tracker()
+            self.plugin.launch_strategy_run({"command":script,
+                                             "work_dir":self.directory,
+                                             "logfile":os.path.join(self.directory, "best.log")})
+
+        job = Process(target=self.plugin.run_strategy_job, args=(strategy_job,))
+        job.start()
+        for _ in range(100):
+            if os.path.exists(pid_file) and os.path.getsize(pid_file):
+                break
+            time.sleep(0.05)
+        with open(pid_file) as in_file:
+            pid = int(in_file.read())
+        job.terminate()
+        job.join(10)
+        self.assertFalse(job.is_alive())
+        for _ in range(50):
+            if not is_running(pid):
+                break
+            time.sleep(0.1)
+        self.assertFalse(is_running(pid))
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
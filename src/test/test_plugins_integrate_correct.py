@@ -0,0 +1,229 @@
+"""Tests for CORRECT-only rescaling in plugins.integrate.plugin"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# The plugin needs CCP4 set up to import
+try:
+    import plugins.integrate.plugin as integrate_plugin
+except (ImportError, SystemExit):
+    integrate_plugin = None
+
+XDS_TIME = 0.5
+
+def fake_xds(command, logfile=False, **kwargs):
+    """Stand in for running xds_par, writing CORRECT.LP from XDS.INP"""
+
+    with open("XDS.TIME", "w") as times:
+        times.write("%f " % time.time())
+        time.sleep(XDS_TIME)
+        times.write("%f" % time.time())
+    xds_input = open("XDS.INP").read()
+    with open("CORRECT.LP", "w") as correct_lp:
+        correct_lp.write(xds_input)
+    with open("XDS_ASCII.HKL", "w") as xds_ascii:
+        xds_ascii.write(os.path.basename(os.getcwd()))
+    with open(logfile, "w") as log:
+        log.write(command)
+
+@unittest.skipIf(integrate_plugin is None, "integrate plugin not available")
+class TestCorrectOnly(unittest.TestCase):
+    """Rescaling without integrating again"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.xdsdir = os.path.join(self.directory, "wedge_1_100")
+        os.mkdir(self.xdsdir)
+        with open(os.path.join(self.xdsdir, "INTEGRATE.HKL"), "w") as hkl:
+            hkl.write("integrated once")
+
+        self.plugin = integrate_plugin.RapdPlugin.__new__(integrate_plugin.RapdPlugin)
+        self.plugin.logger = logging.getLogger("RAPDLogger")
+        self.plugin.tprint = lambda *args, **kwargs: None
+        self.plugin.launcher = fake_xds
+        self.plugin.batch_queue = {}
+        self.plugin.dirs = {"work":self.directory}
+        self.plugin.image_data = {"detector":"ADSC"}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cutoff_and_nocutoff(self):
+        """Both CORRECT runs go at once, leaving INTEGRATE.HKL alone"""
+
+        xdsinp = ["JOB=DEFPIX INTEGRATE CORRECT\n", "SPACE_GROUP_NUMBER=19\n"]
+        cutoffinp = self.plugin.change_xds_inp(xdsinp, "INCLUDE_RESOLUTION_RANGE=200.00 1.80\n")
+
+        self.plugin.xds_correct(self.xdsdir, cutoffinp, xdsinp)
+        cutoff_start, cutoff_end = map(float, open(os.path.join(
+            self.xdsdir, "correct_cutoff", "XDS.TIME")).read().split())
+        nocutoff_start, nocutoff_end = map(float, open(os.path.join(
+            self.xdsdir, "correct_nocutoff", "XDS.TIME")).read().split())
+        self.assertTrue(nocutoff_start < cutoff_end and cutoff_start < nocutoff_end)
+
+        correct_lp = open(os.path.join(self.xdsdir, "CORRECT.LP")).read()
+        self.assertTrue("JOB=CORRECT\n" in correct_lp)
+        self.assertTrue("INCLUDE_RESOLUTION_RANGE=200.00 1.80\n" in correct_lp)
+        nocutoff_lp = open(os.path.join(self.xdsdir, "CORRECT.LP.nocutoff")).read()
+        self.assertTrue("JOB=CORRECT\n" in nocutoff_lp)
+        self.assertFalse("INCLUDE_RESOLUTION_RANGE" in nocutoff_lp)
+        self.assertEqual(open(os.path.join(self.xdsdir, "XDS_ASCII.HKL")).read(),
+                         "correct_cutoff")
+        self.assertEqual(open(os.path.join(self.xdsdir, "INTEGRATE.HKL")).read(),
+                         "integrated once")
+        self.assertEqual(os.getcwd(), self.directory)
+
+    def test_same_lattice(self):
+        """Only a change of lattice needs integrating again"""
+
+        self.assertTrue(integrate_plugin.same_lattice(16, 19))
+        self.assertTrue(integrate_plugin.same_lattice(75, 96))
+        self.assertFalse(integrate_plugin.same_lattice(5, 3))
+        self.assertFalse(integrate_plugin.same_lattice(1, 3))
+
+def write_wedge(xdsdir, first, last):
+    """Write the files XDS leaves for an integrated wedge"""
+
+    if not os.path.isdir(xdsdir):
+        os.mkdir(xdsdir)
+    with open(os.path.join(xdsdir, "INTEGRATE.HKL"), "w") as hkl:
+        hkl.write("!DATA_RANGE=%6d%6d\n" % (first, last))
+        hkl.write("!END_OF_HEADER\n")
+        for frame in range(first, last + 1):
+            hkl.write("%5d%5d%5d\n" % (frame, 0, 1))
+        hkl.write("!END_OF_DATA\n")
+    for log in ("IDXREF.LP", "INTEGRATE.LP"):
+        with open(os.path.join(xdsdir, log), "w") as lp:
+            lp.write(os.path.basename(xdsdir))
+
+class LocalSpacegroup(object):
+    """Stand in for utils.spacegroup"""
+    ccp4_to_number = {"P1":1}
+
+@unittest.skipIf(integrate_plugin is None, "integrate plugin not available")
+class TestStreamingWedges(unittest.TestCase):
+    """Scaling the wedges when the first is all there is"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.collected = 0
+        self.correct_dirs = []
+
+        self.plugin = integrate_plugin.RapdPlugin.__new__(integrate_plugin.RapdPlugin)
+        self.plugin.logger = logging.getLogger("RAPDLogger")
+        self.plugin.tprint = lambda *args, **kwargs: None
+        self.plugin.dirs = {"work":self.directory}
+        self.plugin.preferences = {"spacegroup_decider":"auto", "hi_res":2.0}
+        self.plugin.results = {"results":{}}
+        self.plugin.low_res = 200.0
+        self.plugin.hi_res = 2.0
+        self.plugin.procs = 4
+        self.plugin.jobs = 1
+        self.plugin.send_results = lambda results: None
+        self.plugin.print_results = lambda results: None
+        self.plugin.print_plots = lambda results: None
+        self.plugin.wait_for_image = lambda image_number: image_number <= self.collected
+        self.plugin.get_current_images = lambda: (1, self.collected)
+        self.plugin.xds_total = self.fail_total
+        self.plugin.xds_index_wedge = self.index_wedge
+        self.plugin.xds_integrate_wedge = self.integrate_wedge
+        self.plugin.xds_run = self.correct_dirs.append
+        self.plugin.run_results = lambda xdsdir: {"summary":{"scaling_spacegroup":"P1"},
+                                                  "xparm":{"sg_num":1},
+                                                  "dir":xdsdir}
+
+        self.spacegroup = integrate_plugin.spacegroup
+        integrate_plugin.spacegroup = LocalSpacegroup
+
+    def tearDown(self):
+        integrate_plugin.spacegroup = self.spacegroup
+        shutil.rmtree(self.directory)
+
+    def fail_total(self, xdsinput, last=False):
+        self.fail("xds_total run to frame %s" % last)
+
+    def index_wedge(self, xdsdir, last, xdsinput):
+        write_wedge(xdsdir, 1, last)
+        return {"summary":{}}
+
+    def integrate_wedge(self, geometry_dir, first, last, xdsinput):
+        xdsdir = os.path.join(self.directory, "wedge_%d_%d" % (first, last))
+        write_wedge(xdsdir, first, last)
+        return os.path.join(xdsdir, "INTEGRATE.HKL")
+
+    def check_correct(self, last):
+        """CORRECT ran on its own copy and the first wedge is untouched"""
+
+        correct_dir = os.path.join(self.directory, "correct_1_%d" % last)
+        self.assertEqual(self.correct_dirs, [correct_dir])
+        wedge_hkl = open(os.path.join(self.directory, "wedge_1_10", "INTEGRATE.HKL")).readlines()
+        self.assertEqual(len(wedge_hkl), 2 + 10 + 1)
+        merged_hkl = open(os.path.join(correct_dir, "INTEGRATE.HKL")).readlines()
+        self.assertEqual([int(line.split()[0]) for line in merged_hkl[2:-1]],
+                         range(1, last + 1))
+        xds_inp = open(os.path.join(correct_dir, "XDS.INP")).read()
+        self.assertTrue("DATA_RANGE=1 %d\n" % last in xds_inp)
+        self.assertEqual(open(os.path.join(correct_dir, "IDXREF.LP")).read(), "wedge_1_10")
+
+    def test_single_wedge(self):
+        """A run no longer than a wedge"""
+
+        self.plugin.image_data = {"start":1, "end":10, "osc_range":1.0}
+        self.collected = 10
+
+        results = self.plugin.xds_streaming(["JOB=XYCORR INIT COLSPOT IDXREF DEFPIX INTEGRATE CORRECT\n"])
+        self.assertEqual(results["dir"], os.path.join(self.directory, "correct_1_10"))
+        self.check_correct(10)
+
+    def test_stalled_after_first_wedge(self):
+        """Collection stops once the first wedge is in"""
+
+        self.plugin.image_data = {"start":1, "end":100, "osc_range":1.0}
+        self.collected = 10
+
+        results = self.plugin.xds_streaming(["JOB=XYCORR INIT COLSPOT IDXREF DEFPIX INTEGRATE CORRECT\n"])
+        self.assertEqual(results["dir"], os.path.join(self.directory, "correct_1_10"))
+        self.check_correct(10)
+
+    def test_stalled_in_second_wedge(self):
+        """Collection stops part way through the second wedge"""
+
+        self.plugin.image_data = {"start":1, "end":100, "osc_range":1.0}
+        self.collected = 15
+
+        results = self.plugin.xds_streaming(["JOB=XYCORR INIT COLSPOT IDXREF DEFPIX INTEGRATE CORRECT\n"])
+        self.assertEqual(results["dir"], os.path.join(self.directory, "correct_1_15"))
+        self.check_correct(15)
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,128 @@
+"""Tests for integrating HDF5 data directly in plugins.integrate.plugin"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+# The plugin needs CCP4 set up to import
+try:
+    import plugins.integrate.plugin as integrate_plugin
+except (ImportError, SystemExit):
+    integrate_plugin = None
+
+XDSINP = [("NX", "4150"), ("NY", "4371"), ("UNTRUSTED_RECTANGLE1", "0 4151 513 552")]
+
+def make_plugin(directory, hdf5_master=False):
+    """Return an integrate plugin with just what XDS.INP generation uses"""
+
+    plugin = integrate_plugin.RapdPlugin.__new__(integrate_plugin.RapdPlugin)
+    plugin.logger = logging.getLogger("RAPDLogger")
+    plugin.tprint = lambda *args, **kwargs: None
+    plugin.preferences = {"run_mode":"interactive"}
+    plugin.run_data = {"directory":directory,
+                       "image_template":"thaum_1_??????.cbf"}
+    plugin.image_data = {"start":1,
+                         "end":20,
+                         "x_beam":156.825,
+                         "y_beam":159.75,
+                         "pixel_size":0.075,
+                         "distance":300.0,
+                         "osc_range":0.2,
+                         "wavelength":0.97918,
+                         "time":0.0,
+                         "directory":directory,
+                         "image_template":"thaum_1_??????.cbf"}
+    if hdf5_master:
+        plugin.hdf5_master = hdf5_master
+        plugin.xds_hdf5_lib = "/usr/local/lib/dectris-neggia.so"
+    return plugin
+
+@unittest.skipIf(integrate_plugin is None or h5py is None, "integrate plugin or h5py not available")
+class TestHdf5Integration(unittest.TestCase):
+    """XDS input and frame accounting for HDF5 data"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.master = os.path.join(self.directory, "thaum_1_master.h5")
+        with h5py.File(self.master, "w") as h5_file:
+            data = h5_file.create_group("/entry/data")
+            for number in (1, 2):
+                data["data_%06d" % number] = h5py.ExternalLink("thaum_1_data_%06d.h5" % number,
+                                                               "/entry/data/data")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_data_file(self, number, frames=10):
+        with h5py.File(os.path.join(self.directory, "thaum_1_data_%06d.h5" % number), "w") as h5_file:
+            dataset = h5_file.create_dataset("/entry/data/data", (frames, 4, 4), dtype="uint32")
+            dataset.attrs["image_nr_low"] = (number - 1) * frames + 1
+            dataset.attrs["image_nr_high"] = number * frames
+
+    def test_xds_input(self):
+        """XDS.INP reads the frames through the master file and library"""
+
+        xds_input = make_plugin(self.directory, self.master).create_xds_input(XDSINP)
+        self.assertTrue("NAME_TEMPLATE_OF_DATA_FRAMES=%s\n\n" %
+                        os.path.join(self.directory, "thaum_1_??????.h5") in xds_input)
+        self.assertTrue("LIB=/usr/local/lib/dectris-neggia.so\n" in xds_input)
+        self.assertTrue("UNTRUSTED_RECTANGLE=0 4151 513 552\n" in xds_input)
+
+    def test_xds_input_cbf(self):
+        """CBF data is read as before"""
+
+        xds_input = make_plugin(self.directory).create_xds_input(XDSINP)
+        self.assertTrue("NAME_TEMPLATE_OF_DATA_FRAMES=%s\n\n" %
+                        os.path.join(self.directory, "thaum_1_??????.cbf") in xds_input)
+        self.assertFalse([line for line in xds_input if line.startswith("LIB=")])
+
+    def test_frame_accounting(self):
+        """Frames present come from the data files, not CBFs"""
+
+        plugin = make_plugin(self.directory, self.master)
+        self.assertEqual(plugin.get_current_images(), (0, 0))
+
+        self.write_data_file(1)
+        self.assertEqual(plugin.get_current_images(), (1, 10))
+        self.assertTrue(plugin.wait_for_image(10))
+        self.assertFalse(plugin.wait_for_image(11))
+
+        self.write_data_file(2)
+        self.assertEqual(plugin.get_current_images(), (1, 20))
+        self.assertTrue(plugin.wait_for_image(20))
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,329 @@
+"""Tests for scheduling Phaser jobs in plugins.pdbquery.plugin"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import json
+import logging
+import multiprocessing
+from multiprocessing import Process
+import os
+import Queue
+import shutil
+import tempfile
+import time
+import unittest
+
+# RAPD imports
+import sites.cluster.fake_drmaa as fake_drmaa
+import sites.cluster.job_tracker as job_tracker
+# The plugin needs cctbx and phaser to import
+try:
+    import plugins.pdbquery.plugin as pdbquery_plugin
+    from utils.phaser_schedule import PhaserSchedule
+    from utils.processes import local_subprocess
+except (ImportError, SystemExit):
+    pdbquery_plugin = None
+# The NECAT adapter needs redis to import
+try:
+    import sites.cluster.necat as necat
+except ImportError:
+    necat = None
+
+class Manager(object):
+    """Stand-in for the multiprocessing manager"""
+
+    def Queue(self):
+        return Queue.Queue()
+
+def is_running(pid):
+    """Return True if a process is running, and not left for its parent to reap"""
+    try:
+        with open("/proc/%d/stat" % pid) as stat_file:
+            return stat_file.read().split(")")[-1].split()[0] != "Z"
+    except IOError:
+        return False
+
+class PoolRun(object):
+    """Stand-in for the AsyncResult of a run in a Pool"""
+
+    def __init__(self, pool, name, run_time):
+        # Waits for the worker of the pool to be free
+        self.started = max(time.time(), pool.free_at)
+        self.ended = self.started + run_time
+        pool.free_at = self.ended
+        pool.runs[name] = self
+
+    def ready(self):
+        return time.time() >= self.ended
+
+class Pool(object):
+    """Stand-in for a multiprocessing Pool with one worker"""
+
+    def __init__(self):
+        self.free_at = 0
+        self.runs = {}
+
+    def terminate(self):
+        pass
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+def make_plugin(runs, slots, pool=False):
+    """
+    Return a pdbquery plugin with Phaser runs {name: (run_time, results)}
+    scheduled in order of name, with slots jobs at once
+    """
+
+    plugin = pdbquery_plugin.RapdPlugin.__new__(pdbquery_plugin.RapdPlugin)
+    plugin.logger = logging.getLogger("RAPDLogger")
+    plugin.tprint = lambda *args, **kwargs: None
+    plugin.verbose = False
+    plugin.computer_cluster = False
+    plugin.pool = pool
+    plugin.manager = Manager()
+    plugin.preferences = {"stop_on_solution":True, "solution_tfz":8.0, "solution_llg":120.0}
+    plugin.phaser_timer = 30
+    plugin.phaser_slots = slots
+    plugin.solved = False
+    plugin.jobs = {}
+    plugin.schedule = PhaserSchedule()
+    plugin.abandoned = []
+    plugin.launched = []
+    plugin.finished = {}
+
+    def run_phaser(**inp):
+        plugin.launched.append(inp["name"])
+        run_time, results = runs[inp["name"]]
+        inp["result_queue"].put({"stdout":json.dumps(results)})
+        if pool:
+            job = PoolRun(pool, inp["name"], run_time)
+            return job, None, inp["name"]
+        job = Process(target=time.sleep, args=(run_time,))
+        job.start()
+        return job, job.pid, inp["name"]
+    pdbquery_plugin.run_phaser = run_phaser
+
+    def postprocess_phaser(job_name, results):
+        plugin.finished[job_name] = results
+    plugin.postprocess_phaser = postprocess_phaser
+
+    for name in sorted(runs):
+        plugin.schedule.add({"name":name, "spacegroup":"P212121"}, name)
+    return plugin
+
+@unittest.skipIf(pdbquery_plugin is None, "pdbquery plugin not available")
+class TestPhaserSchedule(unittest.TestCase):
+    """Phaser jobs launched as slots free up"""
+
+    def setUp(self):
+        self.run_phaser = pdbquery_plugin.run_phaser
+
+    def tearDown(self):
+        pdbquery_plugin.run_phaser = self.run_phaser
+
+    def test_slots(self):
+        """No more jobs run at once than there are slots"""
+
+        no_solution = {"solution":False, "message":"No solution"}
+        plugin = make_plugin(dict(("%dAAA" % run, (0.2, no_solution)) for run in range(5)),
+                             slots=2)
+        plugin.launch_scheduled()
+        self.assertEqual(plugin.launched, ["0AAA", "1AAA"])
+        plugin.jobs_monitor()
+        self.assertEqual(plugin.launched, ["0AAA", "1AAA", "2AAA", "3AAA", "4AAA"])
+        self.assertEqual(len(plugin.finished), 5)
+
+    def test_stop_on_solution(self):
+        """The rest of the screen is cancelled once a job is solved"""
+
+        plugin = make_plugin({"1AAA":(0.1, {"solution":True, "tfz":"15.2", "gain":420.0}),
+                              "2BBB":(30, {"solution":False}),
+                              "3CCC":(30, {"solution":False})},
+                             slots=2)
+        plugin.launch_scheduled()
+        start = time.time()
+        plugin.jobs_monitor()
+        self.assertTrue(time.time() - start < 10)
+        self.assertEqual(plugin.solved, "1AAA")
+        self.assertEqual(plugin.launched, ["1AAA", "2BBB"])
+        self.assertTrue(plugin.finished["1AAA"]["solution"])
+        for name in ("2BBB", "3CCC"):
+            self.assertEqual(plugin.finished[name]["message"],
+                             "Cancelled, solution found with 1AAA")
+
+    def test_timeout(self):
+        """Each job times out on its own clock"""
+
+        plugin = make_plugin({"1AAA":(30, {"solution":False}),
+                              "2BBB":(0.1, {"solution":False, "message":"No solution"})},
+                             slots=1)
+        plugin.phaser_timer = 1
+        plugin.launch_scheduled()
+        plugin.jobs_monitor()
+        self.assertEqual(plugin.finished["1AAA"]["message"], "Timed out")
+        self.assertEqual(plugin.finished["2BBB"]["message"], "No solution")
+
+    def test_timeout_pool(self):
+        """A timed out pool run holds its slot until it ends"""
+
+        pool = Pool()
+        plugin = make_plugin({"1AAA":(2.5, {"solution":False}),
+                              "2BBB":(0.1, {"solution":False, "message":"No solution"})},
+                             slots=1,
+                             pool=pool)
+        plugin.phaser_timer = 1
+        plugin.launch_scheduled()
+        plugin.jobs_monitor()
+        self.assertEqual(plugin.finished["1AAA"]["message"], "Timed out")
+        self.assertEqual(plugin.finished["2BBB"]["message"], "No solution")
+        self.assertTrue(pool.runs["2BBB"].started >= pool.runs["1AAA"].ended)
+        self.assertEqual(plugin.abandoned, [])
+
+    def test_timeout_pool_kill(self):
+        """The Phaser process of a timed out pool run is killed"""
+
+        directory = tempfile.mkdtemp()
+        pool = multiprocessing.Pool(1)
+        try:
+            plugin = make_plugin({"1AAA":(30, {"solution":False})}, slots=1, pool=pool)
+            plugin.manager = multiprocessing.Manager()
+            plugin.phaser_timer = 1
+            pid_file = os.path.join(directory, "pid")
+
+            def run_phaser(**inp):
+                command = "sh -c 'echo $$ > %s; exec sleep 30'" % pid_file
+                job = inp["pool"].apply_async(local_subprocess,
+                                              kwds={"command":command,
+                                                    "pid_queue":inp["pid_queue"],
+                                                    "result_queue":inp["result_queue"]})
+                return job, "junk", inp["name"]
+            pdbquery_plugin.run_phaser = run_phaser
+
+            start = time.time()
+            plugin.launch_scheduled()
+            plugin.jobs_monitor()
+            self.assertTrue(time.time() - start < 10)
+            self.assertEqual(plugin.finished["1AAA"]["message"], "Timed out")
+            with open(pid_file) as in_file:
+                pid = int(in_file.read())
+            for _ in range(50):
+                if not is_running(pid):
+                    break
+                time.sleep(0.1)
+            self.assertFalse(is_running(pid))
+        finally:
+            pool.terminate()
+            shutil.rmtree(directory)
+
+class Redis(object):
+    """Stand-in for the Redis results of cluster runs"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+class Backend(object):
+    """The fake drmaa module, keeping the sessions started"""
+
+    sessions = []
+    JobState = fake_drmaa.JobState
+    JobControlAction = fake_drmaa.JobControlAction
+    ExitTimeoutException = fake_drmaa.ExitTimeoutException
+    InvalidJobException = fake_drmaa.InvalidJobException
+    AlreadyActiveSessionException = fake_drmaa.AlreadyActiveSessionException
+
+    class Session(fake_drmaa.Session):
+        def __init__(self):
+            fake_drmaa.Session.__init__(self)
+            Backend.sessions.append(self)
+
+@unittest.skipIf(pdbquery_plugin is None or necat is None,
+                 "pdbquery plugin or NECAT adapter not available")
+class TestPhaserCluster(unittest.TestCase):
+    """Phaser jobs submitted through the cluster session of the plugin"""
+
+    def setUp(self):
+        self.run_phaser = pdbquery_plugin.run_phaser
+        Backend.sessions = []
+        job_tracker.get_tracker(backend=Backend, poll_interval=0.05)
+
+    def tearDown(self):
+        pdbquery_plugin.run_phaser = self.run_phaser
+        job_tracker.shutdown_tracker()
+
+    def test_submit(self):
+        """Jobs share one session and the rest are cancelled once solved"""
+
+        plugin = make_plugin({"1AAA":(0.2, {"solution":True, "tfz":"15.2", "gain":420.0}),
+                              "2BBB":(30, {"solution":False}),
+                              "3CCC":(30, {"solution":False})},
+                             slots=2)
+        plugin.computer_cluster = necat
+        plugin.cluster_submit = True
+        plugin.batch_queue = "phase1.q"
+        plugin.redis = Redis()
+        runs = {"1AAA":0.2, "2BBB":30, "3CCC":30}
+        submitted = []
+
+        def run_phaser(**inp):
+            plugin.launched.append(inp["name"])
+            job = inp["submit"](command="sleep %s" % runs[inp["name"]],
+                                batch_queue=inp["batch_queue"])
+            plugin.redis.values[inp["name"]] = json.dumps({"solution":inp["name"] == "1AAA",
+                                                           "tfz":"15.2",
+                                                           "gain":420.0})
+            submitted.append(job)
+            return job, job.job_id, inp["name"]
+        pdbquery_plugin.run_phaser = run_phaser
+        plugin.schedule = PhaserSchedule()
+        for name in sorted(runs):
+            plugin.schedule.add({"name":name, "spacegroup":"P212121", "batch_queue":"phase1.q"},
+                                name)
+
+        start = time.time()
+        plugin.launch_scheduled()
+        plugin.jobs_monitor()
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(plugin.solved, "1AAA")
+        self.assertEqual(plugin.launched, ["1AAA", "2BBB"])
+        self.assertEqual(len(Backend.sessions), 1)
+        self.assertTrue(submitted[1].killed)
+        self.assertEqual(plugin.finished["2BBB"]["message"], "Cancelled, solution found with 1AAA")
+        # The session is exited once the jobs are done
+        self.assertFalse(Backend.sessions[0].active)
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
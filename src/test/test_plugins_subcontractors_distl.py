@@ -0,0 +1,206 @@
+"""Tests for the DISTL client and cache in plugins.subcontractors.distl"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import os
+from Queue import Queue
+import shutil
+import tempfile
+import time
+import unittest
+
+# RAPD imports
+from plugins.subcontractors.fake_distl_server import FakeDistlServer
+# utils.processes needs the future package to import
+try:
+    import plugins.subcontractors.distl as distl
+except ImportError:
+    distl = None
+
+@unittest.skipIf(distl is None, "distl subcontractor not available")
+class TestDistlServer(unittest.TestCase):
+    """Running DISTL on a server"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = FakeDistlServer(delay=0.3)
+        self.server.start()
+        self.cache = distl.DistlCache(os.path.join(self.directory, "cache"))
+        self.images = []
+        for name in ("thaum_1_000001.cbf", "thaum_1_000090.cbf"):
+            image = os.path.join(self.directory, name)
+            open(image, "w").close()
+            self.images.append(image)
+
+    def tearDown(self):
+        distl.get_client("127.0.0.1", self.server.port).close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_keep_alive(self):
+        """Requests to a server share one connection"""
+
+        self.server.delay = 0
+        client = distl.get_client("127.0.0.1", self.server.port)
+        for image in self.images * 2:
+            raw = client.signal_strength(image, 50.0, 2.5)
+            self.assertTrue("File : %s" % image in raw)
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.requests[0]["distl.res.outer"], "2.5")
+
+    def test_reconnect(self):
+        """A connection closed while idle is replaced"""
+
+        self.server.delay = 0
+        client = distl.get_client("127.0.0.1", self.server.port)
+        client.signal_strength(self.images[0])
+        client.idle[0].sock.close()
+        raw = client.signal_strength(self.images[1])
+        self.assertTrue("File : %s" % self.images[1] in raw)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_pair(self):
+        """Both images are sent at once and come back in order"""
+
+        queue = Queue()
+        logfiles = [os.path.join(self.directory, "distl%d.log" % i) for i in range(2)]
+        start = time.time()
+        results = distl.process_distl_server_images("127.0.0.1",
+                                                    self.server.port,
+                                                    self.images,
+                                                    queue=queue,
+                                                    logfiles=logfiles,
+                                                    cache=self.cache)
+        self.assertTrue(time.time() - start < 0.55)
+        for image, raw, logfile in zip(self.images, results, logfiles):
+            self.assertTrue("File : %s" % image in raw)
+            self.assertEqual(queue.get()["stdout"], raw)
+            with open(logfile) as log:
+                self.assertEqual(log.read(), raw)
+
+    def test_cache(self):
+        """Images run again are not sent to the server unless changed"""
+
+        self.server.delay = 0
+        first = distl.process_distl_server_images("127.0.0.1",
+                                                  self.server.port,
+                                                  self.images,
+                                                  cache=self.cache)
+        again = distl.process_distl_server_images("127.0.0.1",
+                                                  self.server.port,
+                                                  self.images,
+                                                  cache=self.cache)
+        self.assertEqual(first, again)
+        self.assertEqual(len(self.server.requests), 2)
+
+        # Other resolution limits
+        distl.process_distl_server("127.0.0.1",
+                                   self.server.port,
+                                   self.images[0],
+                                   res_outer=2.0,
+                                   cache=self.cache)
+        self.assertEqual(len(self.server.requests), 3)
+
+        # Image written again
+        stat = os.stat(self.images[1])
+        os.utime(self.images[1], (stat.st_atime, stat.st_mtime + 10))
+        distl.process_distl_server("127.0.0.1",
+                                   self.server.port,
+                                   self.images[1],
+                                   cache=self.cache)
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_local_cached(self):
+        """A local run is not started for an image in the cache"""
+
+        raw = distl.process_distl_server("127.0.0.1",
+                                         self.server.port,
+                                         self.images[0],
+                                         cache=self.cache)
+        queue = Queue()
+        job = distl.process_distl_local(self.images[0],
+                                        queue=queue,
+                                        cache=self.cache)
+        self.assertEqual(job, None)
+        self.assertEqual(queue.get(timeout=1)["stdout"], raw)
+
+@unittest.skipIf(distl is None, "distl subcontractor not available")
+class TestDistlCache(unittest.TestCase):
+    """Keeping the DISTL cache to its limits"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def age(self, cache, key, seconds):
+        """Make the output for a key look last used seconds ago"""
+        used = time.time() - seconds
+        os.utime(cache.get_path(key), (used, used))
+
+    def test_evict_size(self):
+        """The output used longest ago goes once the cache is too big"""
+
+        cache = distl.DistlCache(self.directory, max_bytes=250)
+        for index, key in enumerate(("aa01", "bb02", "cc03")):
+            cache.put(key, "x" * 100)
+            self.age(cache, key, 300 - index * 100)
+        # Reading marks it used
+        self.assertEqual(cache.get("aa01"), "x" * 100)
+        cache.evict(force=True)
+        self.assertEqual(cache.get("bb02"), None)
+        self.assertEqual(cache.get("aa01"), "x" * 100)
+        self.assertEqual(cache.get("cc03"), "x" * 100)
+
+    def test_evict_age(self):
+        """Output not used for max_age goes, as do stale partial writes"""
+
+        cache = distl.DistlCache(self.directory, max_age=3600)
+        cache.put("aa01", "old")
+        cache.put("bb02", "new")
+        self.age(cache, "aa01", 7200)
+        partial = os.path.join(self.directory, "bb", "left.tmp")
+        open(partial, "w").close()
+        os.utime(partial, (0, 0))
+        cache.evict(force=True)
+        self.assertEqual(cache.get("aa01"), None)
+        self.assertEqual(cache.get("bb02"), "new")
+        self.assertFalse(os.path.exists(partial))
+
+    def test_evict_interval(self):
+        """The cache is checked on put only once per interval"""
+
+        cache = distl.DistlCache(self.directory, max_bytes=0)
+        cache.put("aa01", "first")
+        self.assertEqual(cache.get("aa01"), None)
+        cache.put("bb02", "second")
+        self.assertEqual(cache.get("bb02"), "second")
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,93 @@
+"""Tests for preparing data once for Phaser in plugins.subcontractors.rapd_phaser"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+# The subcontractor needs cctbx to import
+try:
+    import plugins.subcontractors.rapd_phaser as rapd_phaser
+except (ImportError, SystemExit):
+    rapd_phaser = None
+
+# Stand-in for phaser, writing ROOT.mtz unless told to fail
+FAKE_PHASER = """#!/bin/sh
+cat > phaser.in
+if [ -z "$FAKE_PHASER_FAIL" ]; then
+    root=`grep ROOT phaser.in | cut -d' ' -f2`
+    touch $root.mtz
+fi
+"""
+
+@unittest.skipIf(rapd_phaser is None, "rapd_phaser not available")
+class TestPrepareData(unittest.TestCase):
+    """Correcting the data for anisotropy with the phaser executable"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        bin_dir = os.path.join(self.directory, "bin")
+        os.mkdir(bin_dir)
+        with open(os.path.join(bin_dir, "phaser"), "w") as fake_phaser:
+            fake_phaser.write(FAKE_PHASER)
+        os.chmod(os.path.join(bin_dir, "phaser"), stat.S_IRWXU)
+        self.path = os.environ["PATH"]
+        os.environ["PATH"] = bin_dir + os.pathsep + self.path
+
+        self.get_rapd_file_type = rapd_phaser.xray_importer.get_rapd_file_type
+        rapd_phaser.xray_importer.get_rapd_file_type = lambda data_file: "rfree_mtz"
+
+    def tearDown(self):
+        os.environ["PATH"] = self.path
+        os.environ.pop("FAKE_PHASER_FAIL", None)
+        rapd_phaser.xray_importer.get_rapd_file_type = self.get_rapd_file_type
+        shutil.rmtree(self.directory)
+
+    def test_prepare(self):
+        """The corrected data are written to the work directory"""
+
+        prepared_data = rapd_phaser.prepare_data_shell("/data/thaum_free.mtz", self.directory)
+        self.assertEqual(prepared_data,
+                         {"data_file":os.path.join(self.directory, "prepared.mtz"),
+                          "labels":("F_ISO", "SIGF_ISO")})
+        with open(os.path.join(self.directory, "phaser.in")) as commands:
+            commands = commands.read().splitlines()
+        self.assertEqual(commands[:3], ["MODE ANO",
+                                        "HKLIn /data/thaum_free.mtz",
+                                        "LABIn F=F SIGF=SIGF"])
+
+    def test_failed(self):
+        """Nothing is returned when phaser writes no data"""
+
+        os.environ["FAKE_PHASER_FAIL"] = "1"
+        self.assertFalse(rapd_phaser.prepare_data_shell("/data/thaum_free.mtz", self.directory))
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
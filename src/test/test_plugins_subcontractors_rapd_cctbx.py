@@ -0,0 +1,204 @@
+"""Tests for preparing models with plugins.subcontractors.rapd_cctbx"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# RAPD imports
+import utils.model_cache as model_cache
+# The subcontractor needs cctbx to import
+try:
+    import plugins.subcontractors.rapd_cctbx as rapd_cctbx
+    import plugins.subcontractors.rapd_phaser as rapd_phaser
+except (ImportError, SystemExit):
+    rapd_cctbx = None
+
+class Settings(object):
+    """Takes any Phaser input setting"""
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+class Result(object):
+    """A successful Phaser run"""
+
+    def __init__(self, **values):
+        self.values = values
+
+    def Success(self):
+        return True
+
+    def __getattr__(self, name):
+        value = self.values.get(name)
+        return lambda *args: value
+
+class FakePhaser(object):
+    """Stand-in for the phaser module, counting the runs of each mode"""
+
+    def __init__(self):
+        self.runs = []
+
+    def __getattr__(self, name):
+        if name.startswith("Input"):
+            return Settings
+        raise AttributeError(name)
+
+    def runMR_DAT(self, settings):
+        self.runs.append("DAT")
+        return Result(getSpaceGroupHall="P 4abw 2nw", getUnitCell=(57.8, 57.8, 150.0, 90, 90, 90))
+
+    def runMR_ELLG(self, settings):
+        self.runs.append("ELLG")
+        return Result(get_target_resolution=2.34)
+
+    def runCCA(self, settings):
+        self.runs.append("CCA")
+        return Result(getBestZ=2, getBestVM=2.46)
+
+class Residues(object):
+    """A residue group of a chain"""
+
+    def __init__(self, resname):
+        self.resname = resname
+
+    def atoms(self):
+        return [self]
+
+    def parent(self):
+        return self
+
+class Chain(object):
+    """A chain of a hierarchy"""
+
+    def __init__(self, chain_id, resnames):
+        self.id = chain_id
+        self.resnames = resnames
+
+    def residue_groups(self):
+        return [Residues(resname) for resname in self.resnames]
+
+    def write_mmcif_file(self, file_name):
+        with open(file_name, "w") as out_file:
+            out_file.write("data_%s\n" % self.id)
+
+class Hierarchy(object):
+    """Stand-in for iotbx, reading a structure of two chains"""
+
+    common_residue_names_amino_acid = ("ALA", "GLY")
+    common_residue_names_rna_dna = ("DA",)
+    common_residue_names_ccp4_mon_lib_rna_dna = ()
+
+    def __init__(self):
+        self.reads = 0
+        self.hierarchy = self
+
+    def cif_input(self, file_name):
+        self.reads += 1
+        return self
+
+    def construct_hierarchy(self):
+        return self
+
+    def models(self):
+        return [self]
+
+    def chains(self):
+        return [Chain("A", ["ALA", "GLY", "HOH"]), Chain("B", ["DA", "DA"])]
+
+    def new_hierarchy_from_chain(self, chain):
+        return chain
+
+@unittest.skipIf(rapd_cctbx is None, "rapd_cctbx not available")
+class TestGetPdbInfo(unittest.TestCase):
+    """Preparing a model for molecular replacement"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.work_dir = os.path.join(self.directory, "work")
+        os.mkdir(self.work_dir)
+        cache = model_cache.ModelCache(os.path.join(self.directory, "cache"), shared=False)
+        self.struct_file = cache.fetch("1THW",
+                                       os.path.join(self.work_dir, "1thw.cif"),
+                                       self.download_cif)
+
+        self.hierarchy = Hierarchy()
+        self.phaser = FakePhaser()
+        self.saved = (rapd_cctbx.get_model_cache,
+                      rapd_cctbx.get_mtz_info_cached,
+                      rapd_cctbx.iotbx_mmcif,
+                      rapd_cctbx.iotbx_pdb,
+                      rapd_phaser.phaser)
+        rapd_cctbx.get_model_cache = lambda: cache
+        rapd_cctbx.get_mtz_info_cached = lambda data_file: ("P41212",
+                                                            (57.8, 57.8, 150.0, 90, 90, 90),
+                                                            501000.0)
+        rapd_cctbx.iotbx_mmcif = self.hierarchy
+        rapd_cctbx.iotbx_pdb = self.hierarchy
+        rapd_phaser.phaser = self.phaser
+
+    def tearDown(self):
+        (rapd_cctbx.get_model_cache,
+         rapd_cctbx.get_mtz_info_cached,
+         rapd_cctbx.iotbx_mmcif,
+         rapd_cctbx.iotbx_pdb,
+         rapd_phaser.phaser) = self.saved
+        shutil.rmtree(self.directory)
+
+    def download_cif(self, pdb_code, fname):
+        with open(fname, "w") as cif_file:
+            cif_file.write("data_%s\n" % pdb_code)
+        return fname
+
+    def test_get_pdb_info(self):
+        """eLLG and CCA are run for each chain and the whole model, once"""
+
+        info = rapd_cctbx.get_pdb_info(self.struct_file, "/data/thaum_free.mtz", 2.0)
+        self.assertEqual(sorted(info), ["A", "B", "all"])
+        self.assertEqual(self.phaser.runs, ["DAT", "ELLG", "CCA"] * 3)
+        self.assertEqual(info["A"]["NRes"], 2)
+        self.assertEqual(info["B"]["MWna"], 660)
+        for chain_id in ("A", "B", "all"):
+            self.assertEqual(info[chain_id]["NMol"], 2)
+            self.assertEqual(info[chain_id]["SC"], 0.5)
+            self.assertEqual(info[chain_id]["res"], 2.3)
+        chain_file = os.path.join(self.work_dir, "1thw_A.cif")
+        self.assertEqual(info["A"]["file"], chain_file)
+
+        # Another job preparing the same model takes it from the cache
+        os.unlink(chain_file)
+        again = rapd_cctbx.get_pdb_info(self.struct_file, "/data/thaum_free.mtz", 2.0)
+        self.assertEqual(again, info)
+        self.assertEqual(len(self.phaser.runs), 9)
+        self.assertEqual(self.hierarchy.reads, 1)
+        with open(chain_file) as in_file:
+            self.assertEqual(in_file.read(), "data_A\n")
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,135 @@
+"""Tests for the wedge helpers in plugins.subcontractors.xds"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# RAPD imports
+import plugins.subcontractors.xds as xds
+
+def write_integrate_hkl(path, first, last):
+    """Write a short INTEGRATE.HKL with one reflection per frame"""
+
+    with open(path, "w") as hkl:
+        hkl.write("!OUTPUT_FILE=INTEGRATE.HKL\n")
+        hkl.write("!DATA_RANGE=%6d%6d\n" % (first, last))
+        hkl.write("!END_OF_HEADER\n")
+        for frame in range(first, last + 1):
+            hkl.write("%5d%5d%5d 1.0E+03 3.0E+01 %8.1f\n" % (frame, 0, 1, frame - 0.5))
+        hkl.write("!END_OF_DATA\n")
+
+class TestXdsWedges(unittest.TestCase):
+    """Splitting a run into wedges and putting them back together"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_wedges(self):
+        """Wedges cover the run with the last one short"""
+
+        self.assertEqual(xds.get_wedges(1, 25, 10), [(1, 10), (11, 20), (21, 25)])
+        self.assertEqual(xds.get_wedges(5, 14, 10), [(5, 14)])
+
+    def test_merge_integrate_hkl(self):
+        """One header, the full data range and every reflection"""
+
+        inputs = []
+        for first, last in xds.get_wedges(1, 25, 10):
+            inputs.append(os.path.join(self.directory, "INTEGRATE_%d.HKL" % first))
+            write_integrate_hkl(inputs[-1], first, last)
+        output = os.path.join(self.directory, "INTEGRATE.HKL")
+        xds.merge_integrate_hkl(inputs, output, (1, 25))
+
+        lines = open(output).readlines()
+        self.assertEqual(lines[:3], ["!OUTPUT_FILE=INTEGRATE.HKL\n",
+                                     "!DATA_RANGE=     1    25\n",
+                                     "!END_OF_HEADER\n"])
+        self.assertEqual(len(lines), 3 + 25 + 1)
+        self.assertEqual([int(line.split()[0]) for line in lines[3:-1]], range(1, 26))
+        self.assertEqual(lines[-1], "!END_OF_DATA\n")
+
+    def test_merge_integrate_hkl_into_input(self):
+        """Writing over an input is refused before it is emptied"""
+
+        input_file = os.path.join(self.directory, "INTEGRATE.HKL")
+        write_integrate_hkl(input_file, 1, 10)
+        before = open(input_file).read()
+        self.assertRaises(ValueError, xds.merge_integrate_hkl,
+                          [input_file], input_file, (1, 10))
+        self.assertEqual(open(input_file).read(), before)
+
+    def test_copy_integrate_files(self):
+        """The refined geometry is taken over as XPARM.XDS"""
+
+        source = os.path.join(self.directory, "wedge_1_10")
+        target = os.path.join(self.directory, "integrate_11_20")
+        os.mkdir(source)
+        os.mkdir(target)
+        for file_name in xds.INTEGRATE_FILES + ("XPARM.XDS", "GXPARM.XDS"):
+            with open(os.path.join(source, file_name), "w") as output:
+                output.write(file_name)
+
+        xds.copy_integrate_files(source, target)
+        self.assertEqual(open(os.path.join(target, "XPARM.XDS")).read(), "GXPARM.XDS")
+        for file_name in xds.INTEGRATE_FILES:
+            self.assertTrue(os.path.exists(os.path.join(target, file_name)))
+        self.assertFalse(os.path.exists(os.path.join(target, "GXPARM.XDS")))
+
+    def test_link_correct_files(self):
+        """CORRECT runs on links, and only its output is copied back"""
+
+        source = os.path.join(self.directory, "wedge_1_25")
+        target = os.path.join(source, "correct_cutoff")
+        os.mkdir(source)
+        os.mkdir(target)
+        write_integrate_hkl(os.path.join(source, "INTEGRATE.HKL"), 1, 25)
+        for file_name in ("XPARM.XDS", "GXPARM.XDS", "CORRECT.LP"):
+            with open(os.path.join(source, file_name), "w") as output:
+                output.write("first pass")
+
+        xds.link_correct_files(source, target)
+        self.assertTrue(os.path.islink(os.path.join(target, "INTEGRATE.HKL")))
+        self.assertFalse(os.path.exists(os.path.join(target, "GXPARM.XDS")))
+        self.assertFalse(os.path.exists(os.path.join(target, "CORRECT.LP")))
+
+        for file_name in ("GXPARM.XDS", "CORRECT.LP", "XDS_ASCII.HKL"):
+            with open(os.path.join(target, file_name), "w") as output:
+                output.write("rescaled")
+        xds.collect_correct_files(target, source)
+        for file_name in ("GXPARM.XDS", "CORRECT.LP", "XDS_ASCII.HKL"):
+            self.assertEqual(open(os.path.join(source, file_name)).read(), "rescaled")
+        self.assertEqual(open(os.path.join(source, "XPARM.XDS")).read(), "first pass")
+        self.assertEqual(len(open(os.path.join(source, "INTEGRATE.HKL")).readlines()), 29)
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,213 @@
+"""Tests for the cluster job tracker in sites.cluster.job_tracker"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# RAPD imports
+import sites.cluster.fake_drmaa as fake_drmaa
+import sites.cluster.job_tracker as job_tracker
+
+# The NECAT adapter needs redis to import
+try:
+    import sites.cluster.necat as necat
+except ImportError:
+    necat = None
+
+class FakeBackend(object):
+    """The fake drmaa module, with the session kept to look at"""
+
+    def __init__(self, slots=None):
+        self.sessions = []
+        for name in ("JobState", "JobControlAction", "ExitTimeoutException",
+                     "InvalidJobException", "AlreadyActiveSessionException"):
+            setattr(self, name, getattr(fake_drmaa, name))
+
+        sessions = self.sessions
+        class Session(fake_drmaa.Session):
+            def __init__(self):
+                fake_drmaa.Session.__init__(self, slots=slots)
+                sessions.append(self)
+        self.Session = Session
+
+class TestJobTracker(unittest.TestCase):
+    """Submitting and waiting on jobs through one session"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = FakeBackend()
+        self.tracker = job_tracker.JobTracker(backend=self.backend, poll_interval=0.05)
+
+    def tearDown(self):
+        self.tracker.shutdown()
+        shutil.rmtree(self.directory)
+
+    def test_result(self):
+        """Output and tag come back, and the temporary log is removed"""
+
+        job = self.tracker.submit("echo indexed", work_dir=self.directory, tag=3)
+        result = job.result(10)
+        self.assertEqual(result["stdout"], "indexed\n")
+        self.assertEqual(result["tag"], 3)
+        self.assertEqual(result["returncode"], 0)
+        self.assertEqual(job.state, fake_drmaa.JobState.DONE)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(len(self.backend.sessions), 1)
+
+    def test_logfile(self):
+        """A log asked for is kept"""
+
+        job = self.tracker.submit("echo indexed", work_dir=self.directory, logfile="best.log")
+        job.result(10)
+        self.assertEqual(open(os.path.join(self.directory, "best.log")).read(), "indexed\n")
+
+    def test_wait_any(self):
+        """The first job to end is returned, and the rest can be cancelled"""
+
+        slow = self.tracker.submit("sleep 30", work_dir=self.directory)
+        fast = self.tracker.submit("sleep 0.1", work_dir=self.directory)
+        start = time.time()
+        done, not_done = self.tracker.wait_any([slow, fast], timeout=10)
+        self.assertEqual(done, set([fast]))
+        self.assertEqual(not_done, set([slow]))
+        self.assertTrue(time.time() - start < 5)
+
+        self.assertEqual(self.tracker.wait_any([slow], timeout=0.1), (set(), set([slow])))
+        slow.cancel()
+        self.assertTrue(slow.wait(10))
+        self.assertEqual(slow.state, fake_drmaa.JobState.FAILED)
+
+    def test_as_completed(self):
+        """Jobs queued on a busy cluster come back in the order they end"""
+
+        self.tracker.shutdown()
+        self.backend = FakeBackend(slots=1)
+        self.tracker = job_tracker.JobTracker(backend=self.backend, poll_interval=0.05)
+
+        jobs = [self.tracker.submit("echo %d" % number, work_dir=self.directory, tag=number)
+                for number in range(4)]
+        tags = [job.tag for job in self.tracker.as_completed(jobs, timeout=10)]
+        self.assertEqual(sorted(tags), range(4))
+
+    def test_threads(self):
+        """Jobs submitted from many threads share the session safely"""
+
+        jobs = []
+        def submit():
+            for _ in range(3):
+                jobs.append(self.tracker.submit("true", work_dir=self.directory))
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(list(self.tracker.as_completed(jobs, timeout=10))), 12)
+        self.assertEqual(len(self.backend.sessions), 1)
+
+    def test_timeout(self):
+        """A job running too long is killed"""
+
+        job = self.tracker.submit("sleep 30", work_dir=self.directory, timeout=0.2)
+        self.assertTrue(job.wait(10))
+        self.assertTrue(job.killed)
+
+    def test_get_tracker(self):
+        """Each process has one tracker"""
+
+        tracker = job_tracker.get_tracker(backend=self.backend)
+        try:
+            self.assertTrue(job_tracker.get_tracker() is tracker)
+        finally:
+            job_tracker.shutdown_tracker()
+
+    def test_hold_tracker(self):
+        """A held tracker is shut down with the last hold, unless kept"""
+
+        tracker = job_tracker.hold_tracker(backend=self.backend)
+        self.assertTrue(job_tracker.hold_tracker() is tracker)
+        job_tracker.release_tracker()
+        self.assertFalse(tracker.stopped.is_set())
+        job_tracker.release_tracker()
+        self.assertTrue(tracker.stopped.is_set())
+        self.assertEqual(self.backend.sessions[-1].active, False)
+
+        tracker = job_tracker.hold_tracker(backend=self.backend)
+        try:
+            self.assertTrue(job_tracker.get_tracker() is tracker)
+            job_tracker.release_tracker()
+            self.assertFalse(tracker.stopped.is_set())
+        finally:
+            job_tracker.shutdown_tracker()
+
+@unittest.skipIf(necat is None, "NECAT cluster adapter not available")
+class TestProcessCluster(unittest.TestCase):
+    """Jobs run by the NECAT adapter in a process of their own"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.hold_tracker = job_tracker.hold_tracker
+
+        # Sessions of the child leave a file behind when they exit
+        exited = os.path.join(self.directory, "exited")
+        class Session(fake_drmaa.Session):
+            def exit(self):
+                fake_drmaa.Session.exit(self)
+                open(exited, "a").write("exit\n")
+        backend = FakeBackend()
+        backend.Session = Session
+        job_tracker.hold_tracker = lambda: self.hold_tracker(backend=backend, poll_interval=0.05)
+
+    def tearDown(self):
+        job_tracker.hold_tracker = self.hold_tracker
+        shutil.rmtree(self.directory)
+
+    def test_child_exits_session(self):
+        """The session a child process started is exited before it ends"""
+
+        result_queue = multiprocessing.Queue()
+        job = multiprocessing.Process(target=necat.process_cluster,
+                                      kwargs={"command":"echo phased",
+                                              "work_dir":self.directory,
+                                              "tag":1,
+                                              "result_queue":result_queue})
+        job.start()
+        result = result_queue.get(timeout=10)
+        job.join(10)
+
+        self.assertEqual(result["stdout"], "phased\n")
+        self.assertEqual(open(os.path.join(self.directory, "exited")).read(), "exit\n")
+        self.assertEqual(job.exitcode, 0)
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,203 @@
+"""Tests for the local cluster adapter in sites.cluster.local"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import json
+import multiprocessing
+import os
+import Queue
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# RAPD imports
+import sites.cluster.local as local
+
+def hold_slots(path, nproc, held, release):
+    """Hold slots of the ledger from another process until release is set"""
+
+    ledger = local.SlotLedger(path, 4, {})
+    token = ledger.reserve(nproc)
+    held.set()
+    release.wait(10)
+    ledger.release(token)
+
+class TestSlotLedger(unittest.TestCase):
+    """Sharing the slots of the machine"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "ledger.json")
+        self.ledger = local.SlotLedger(self.path, 4, {"integrate.q":3})
+        self.wait_interval = local.WAIT_INTERVAL
+        local.WAIT_INTERVAL = 0.02
+
+    def tearDown(self):
+        local.WAIT_INTERVAL = self.wait_interval
+        shutil.rmtree(self.directory)
+
+    def reserve_later(self, order, nproc, queue):
+        def reserve():
+            token = self.ledger.reserve(nproc, queue)
+            order.append(queue)
+            self.ledger.release(token)
+        thread = threading.Thread(target=reserve)
+        thread.start()
+        return thread
+
+    def test_reserve(self):
+        """Slots held are counted until given back, never past the machine"""
+
+        token = self.ledger.reserve(2)
+        self.assertEqual(self.ledger.in_use(), 2)
+        self.ledger.release(token)
+        self.assertEqual(self.ledger.in_use(), 0)
+        token = self.ledger.reserve(16)
+        self.assertEqual(self.ledger.in_use(), 4)
+        self.ledger.release(token)
+
+    def test_priority(self):
+        """Waiting jobs in a higher priority queue start first"""
+
+        token = self.ledger.reserve(4)
+        order = []
+        threads = [self.reserve_later(order, 4, "general.q")]
+        time.sleep(0.1)
+        threads.append(self.reserve_later(order, 4, "index.q"))
+        time.sleep(0.1)
+        self.ledger.release(token)
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(order, ["index.q", "general.q"])
+
+    def test_queue_limit(self):
+        """A queue at its limit does not hold up the others"""
+
+        token = self.ledger.reserve(3, "integrate.q")
+        order = []
+        threads = [self.reserve_later(order, 1, "integrate.q")]
+        time.sleep(0.1)
+        threads.append(self.reserve_later(order, 1, "general.q"))
+        threads[1].join(10)
+        self.assertEqual(order, ["general.q"])
+        self.ledger.release(token)
+        threads[0].join(10)
+        self.assertEqual(order, ["general.q", "integrate.q"])
+
+    def test_dead_process(self):
+        """Slots held by a process that died are given back"""
+
+        process = multiprocessing.Process(target=time.sleep, args=(0,))
+        process.start()
+        process.join()
+        with open(self.path, "w") as ledger_file:
+            json.dump({"running":{"lost":{"pid":process.pid,
+                                          "nproc":4,
+                                          "queue":"general.q"}},
+                       "waiting":{}}, ledger_file)
+        self.assertEqual(self.ledger.in_use(), 0)
+
+    def test_processes(self):
+        """Separate processes share the ledger"""
+
+        held = multiprocessing.Event()
+        release = multiprocessing.Event()
+        other = multiprocessing.Process(target=hold_slots, args=(self.path, 3, held, release))
+        other.start()
+        try:
+            self.assertTrue(held.wait(10))
+            self.assertEqual(self.ledger.in_use(), 3)
+
+            event = multiprocessing.Event()
+            event.set()
+            threading.Timer(0.2, event.clear).start()
+            self.assertEqual(self.ledger.reserve(2, mp_event=event), None)
+        finally:
+            release.set()
+            other.join(10)
+        self.assertEqual(self.ledger.in_use(), 0)
+
+class TestProcessCluster(unittest.TestCase):
+    """Running jobs through the adapter"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = (local.LEDGER_FILE, local.SLOTS, local.QUEUE_LIMITS, local.WAIT_INTERVAL)
+        local.LEDGER_FILE = os.path.join(self.directory, "ledger.json")
+        local.SLOTS = 2
+        local.QUEUE_LIMITS = {}
+        local.WAIT_INTERVAL = 0.02
+
+    def tearDown(self):
+        local.LEDGER_FILE, local.SLOTS, local.QUEUE_LIMITS, local.WAIT_INTERVAL = self.settings
+        shutil.rmtree(self.directory)
+
+    def test_result(self):
+        """Output comes back on the result queue"""
+
+        result_queue = Queue.Queue()
+        local.process_cluster(command="echo strategy",
+                              work_dir=self.directory,
+                              tag=2,
+                              result_queue=result_queue)
+        result = result_queue.get(False)
+        self.assertEqual(result["stdout"], "strategy\n")
+        self.assertEqual(result["returncode"], 0)
+        self.assertEqual(result["tag"], 2)
+        self.assertEqual(os.listdir(self.directory), ["ledger.json"])
+
+    def test_nproc(self):
+        """Jobs wanting every slot run one after another"""
+
+        def run():
+            local.process_cluster(command="sleep 0.3", work_dir=self.directory, nproc=2)
+        start = time.time()
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertTrue(time.time() - start >= 0.6)
+
+    def test_kill(self):
+        """Jobs are killed with what they started"""
+
+        pid_queue = Queue.Queue()
+        thread = threading.Thread(target=local.process_cluster,
+                                  kwargs={"command":"sh -c 'sleep 30; true'",
+                                          "work_dir":self.directory,
+                                          "pid_queue":pid_queue})
+        thread.start()
+        local.kill_job(pid_queue.get(timeout=10))
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(local.get_ledger().in_use(), 0)
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,90 @@
+"""Tests for the chunked hashing and encoding in utils.archive"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import base64
+import hashlib
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+# RAPD imports
+import utils.archive as archive
+
+class ShortReads(object):
+    """File returning fewer bytes than asked for"""
+
+    def __init__(self, data, most):
+        self.data = StringIO.StringIO(data)
+        self.most = most
+
+    def read(self, size=-1):
+        return self.data.read(min(size, self.most))
+
+class TestChunks(unittest.TestCase):
+    """Hashing and base64 encoding a chunk at a time"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = os.urandom(100000)
+        self.path = os.path.join(self.directory, "archive.tar.bz2")
+        with open(self.path, "wb") as output_object:
+            output_object.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hash(self):
+        """Chunked hash is the hash of the whole file"""
+
+        expected = hashlib.sha1(self.data).hexdigest()
+        for chunk_size in (1, 1000, 65536, 1000000):
+            self.assertEqual(archive.get_hash(self.path, chunk_size), expected)
+
+    def test_base64(self):
+        """Chunked encoding is the encoding of the whole file"""
+
+        expected = base64.b64encode(self.data)
+        for chunk_size in (1, 1000, 1001, 65536):
+            for read_size in (1, 7, 261120, -1):
+                with open(self.path, "rb") as input_object:
+                    reader = archive.Base64Reader(input_object, chunk_size)
+                    pieces = []
+                    for piece in iter(lambda: reader.read(read_size), ""):
+                        pieces.append(piece)
+                self.assertEqual("".join(pieces), expected)
+
+    def test_short_reads(self):
+        """Source reads that split 3 byte groups still encode correctly"""
+
+        reader = archive.Base64Reader(ShortReads(self.data, 1000), 3000)
+        self.assertEqual(reader.read(), base64.b64encode(self.data))
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
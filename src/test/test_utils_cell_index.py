@@ -0,0 +1,142 @@
+"""Tests for the local unit cell search in utils.cell_index"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# RAPD imports
+import utils.cell_index as cell_index
+
+# Lines in the form of crystal.idx
+CELL_DUMP = """CRYSTAL.IDX
+IDCODE  A       B       C       ALPHA  BETA   GAMMA  SPACEGROUP   Z
+------- ------- ------- ------- ------ ------ ------ -----------  --
+1THW     58.60   58.60  151.60  90.00  90.00  90.00 P 41 21 2     8
+2YAA     58.90   58.40  152.00  90.00  90.00  90.00 P 21 21 21    4
+1E1O     78.90   78.90   37.10  90.00  90.00 120.00 P 61         12
+3ABC     40.00   55.00   90.00  90.00 104.00  90.00 P 1 21 1      2
+4BAD     bad
+"""
+
+class TestNiggli(unittest.TestCase):
+    """Reducing cells"""
+
+    def assertCellEqual(self, first, second):
+        for value_1, value_2 in zip(first, second):
+            self.assertAlmostEqual(value_1, value_2, places=3)
+
+    def test_permuted(self):
+        """Cells with the axes in another order reduce the same"""
+
+        self.assertCellEqual(cell_index.niggli_reduce((20, 10, 15, 90, 90, 90)),
+                             (10, 15, 20, 90, 90, 90))
+        self.assertCellEqual(cell_index.niggli_reduce((78.9, 37.1, 78.9, 90, 120, 90)),
+                             cell_index.niggli_reduce((78.9, 78.9, 37.1, 90, 90, 120)))
+
+    def test_other_basis(self):
+        """A cell on other lattice vectors reduces to the same cell"""
+
+        # b' = a + b of a tetragonal cell
+        self.assertCellEqual(cell_index.niggli_reduce((10, 200 ** 0.5, 20, 90, 90, 45)),
+                             (10, 10, 20, 90, 90, 90))
+
+class TestCellIndex(unittest.TestCase):
+    """Searching and updating the index"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dump_file = os.path.join(self.directory, "crystal.idx")
+        with open(self.dump_file, "w") as dump:
+            dump.write(CELL_DUMP)
+        self.index_file = os.path.join(self.directory, "cell_index.npz")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_dump(self):
+        """Header and broken lines are left out"""
+
+        cells = cell_index.read_cell_dump(self.dump_file)
+        self.assertEqual(sorted(cells), ["1E1O", "1THW", "2YAA", "3ABC"])
+        self.assertEqual(cells["3ABC"], (40.0, 55.0, 90.0, 90.0, 104.0, 90.0))
+
+    def test_search(self):
+        """Nearest cells come first, whatever the order of the axes"""
+
+        index, reduced_count = cell_index.update_cell_index(self.dump_file, self.index_file)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(reduced_count, 4)
+
+        hits = index.search((152.0, 58.85, 58.45, 90, 90, 90), tolerance=0.02)
+        self.assertEqual([pdb_code for pdb_code, deviation in hits], ["2YAA", "1THW"])
+        self.assertTrue(hits[0][1] <= hits[1][1] <= 0.02)
+
+        self.assertEqual(index.search((152.0, 58.85, 58.45, 90, 90, 90), limit=1, tolerance=0.02),
+                         hits[:1])
+        self.assertEqual(index.search((78.9, 37.1, 78.9, 90, 120, 90), tolerance=0.001)[0][0],
+                         "1E1O")
+        self.assertEqual(index.search((100, 100, 100, 90, 90, 90)), [])
+
+    def test_update(self):
+        """Only new and changed cells are reduced again"""
+
+        cell_index.update_cell_index(self.dump_file, self.index_file)
+        with open(self.dump_file, "a") as dump:
+            dump.write("5NEW     30.00   40.00   50.00  90.00  90.00  90.00 P 21 21 21    4\n")
+        with open(self.dump_file) as dump:
+            lines = dump.read().replace("1THW     58.60", "1THW     59.60")
+        with open(self.dump_file, "w") as dump:
+            dump.write(lines)
+
+        index, reduced_count = cell_index.update_cell_index(self.dump_file, self.index_file)
+        self.assertEqual(len(index), 5)
+        self.assertEqual(reduced_count, 2)
+        self.assertEqual(index.search((30, 40, 50, 90, 90, 90), tolerance=0.001)[0][0], "5NEW")
+
+    def test_get_cell_index(self):
+        """The saved index is used once there is one, and read again once changed"""
+
+        self.assertEqual(cell_index.get_cell_index(self.index_file), None)
+
+        cell_index.update_cell_index(self.dump_file, self.index_file)
+        index = cell_index.get_cell_index(self.index_file)
+        self.assertEqual(len(index), 4)
+        self.assertTrue(cell_index.get_cell_index(self.index_file) is index)
+
+        with open(self.dump_file, "a") as dump:
+            dump.write("5NEW     30.00   40.00   50.00  90.00  90.00  90.00 P 21 21 21    4\n")
+        cell_index.update_cell_index(self.dump_file, self.index_file)
+        stat = os.stat(self.index_file)
+        os.utime(self.index_file, (stat.st_atime, time.time() + 10))
+        self.assertEqual(len(cell_index.get_cell_index(self.index_file)), 5)
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
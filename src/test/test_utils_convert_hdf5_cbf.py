@@ -26,27 +26,38 @@ __status__ = "Development"
 
 # Standard imports
 import argparse
+from distutils.spawn import find_executable
 # import datetime
 # import glob
 # import json
 # import logging
-# import multiprocessing
-# import os
+import multiprocessing
+import os
 # import pprint
 # import pymongo
 # import re
 # import redis
-# import shutil
+import shutil
+import struct
 import subprocess
-# import sys
-# import time
+import sys
+import tempfile
+import time
 import unittest
 
+try:
+    import h5py
+    import numpy
+except ImportError:
+    h5py = None
+
 # RAPD imports
 # import commandline_utils
 # import detectors.detector_utils as detector_utils
 # import utils
 import utils.convert_hdf5_cbf as convert_hdf5_cbf
+import detectors.minicbf as minicbf
+import detectors.dectris.dectris_eiger16m as dectris_eiger16m
 
 # class ExampleTestCase(unittest.TestCase):
 #     """Example test fixture with setUp and tearDown"""
@@ -96,6 +107,199 @@ class TestDependencies(unittest.TestCase):
 
         assert found == True
 
+def write_dataset(directory, frames_per_file=(4, 4, 2), shape=(64, 48)):
+    """Write a small Eiger-like master file with external data files"""
+
+    master_file = os.path.join(directory, "thaum_1_master.h5")
+    compression = {"compression":"gzip"}
+    if convert_hdf5_cbf.hdf5plugin is not None:
+        compression = dict(convert_hdf5_cbf.hdf5plugin.Bitshuffle())
+    number_of_images = sum(frames_per_file)
+    random = numpy.random.RandomState(0)
+    images = []
+
+    with h5py.File(master_file, "w") as h5_file:
+        detector = h5_file.create_group("/entry/instrument/detector")
+        detector["description"] = "Dectris Eiger 16M"
+        detector["detector_number"] = "E-32-0108"
+        detector["beam_center_x"] = 2091.0
+        detector["beam_center_y"] = 2130.0
+        detector["detector_distance"] = 0.3
+        detector["x_pixel_size"] = 7.5e-05
+        detector["y_pixel_size"] = 7.5e-05
+        detector["sensor_thickness"] = 0.00045
+        detector["count_time"] = 0.199995
+        detector["frame_time"] = 0.2
+        specific = detector.create_group("detectorSpecific")
+        specific["nimages"] = number_of_images
+        specific["ntrigger"] = 1
+        specific["countrate_correction_count_cutoff"] = 2129754
+        specific["data_collection_date"] = "2018-03-23T14:04:38.384"
+        h5_file.create_group("/entry/instrument/beam")["incident_wavelength"] = 0.97918
+        goniometer = h5_file.create_group("/entry/sample/goniometer")
+        goniometer["omega"] = [10.0 + 0.2 * frame for frame in range(number_of_images)]
+        goniometer["omega_range_average"] = 0.2
+        data = h5_file.create_group("/entry/data")
+
+        first = 1
+        for number, frames in enumerate(frames_per_file, 1):
+            name = "thaum_1_data_%06d.h5" % number
+            counts = random.poisson(3, (frames,) + shape).astype(numpy.uint32)
+            # Hot, empty and flagged pixels
+            counts[:, 0, 0] = 1000000
+            counts[:, 0, 1] = 0
+            counts[:, 0, 2] = numpy.iinfo(numpy.uint32).max
+            images.extend(counts)
+            with h5py.File(os.path.join(directory, name), "w") as data_file:
+                dataset = data_file.create_dataset("/entry/data/data",
+                                                   data=counts,
+                                                   chunks=(1,) + shape,
+                                                   **compression)
+                dataset.attrs["image_nr_low"] = first
+                dataset.attrs["image_nr_high"] = first + frames - 1
+            data["data_%06d" % number] = h5py.ExternalLink(name, "/entry/data/data")
+            first += frames
+
+    return master_file, images
+
+def read_cbf_data(image):
+    """Return the header text and decoded pixel values of a miniCBF file"""
+
+    with open(image, "rb") as raw:
+        contents = raw.read()
+    header, binary = contents.split("\x0c\x1a\x04\xd5", 1)
+    size = int(header.split("X-Binary-Size: ")[1].split()[0])
+    binary = binary[:size]
+
+    values = []
+    value = 0
+    position = 0
+    while position < len(binary):
+        delta = struct.unpack("<b", binary[position])[0]
+        position += 1
+        if delta == -128:
+            delta = struct.unpack("<h", binary[position:position+2])[0]
+            position += 2
+            if delta == -32768:
+                delta = struct.unpack("<i", binary[position:position+4])[0]
+                position += 4
+                if delta == -2**31:
+                    delta = struct.unpack("<q", binary[position:position+8])[0]
+                    position += 8
+        value += delta
+        values.append(value)
+
+    return header, values
+
+@unittest.skipIf(h5py is None, "h5py not available")
+class TestNativeConversion(unittest.TestCase):
+    """Converting with h5py"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.master_file, self.images = write_dataset(self.directory)
+        self.output_dir = os.path.join(self.directory, "cbf_files")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def convert(self, image_range, nproc=2, **kwargs):
+        converter = convert_hdf5_cbf.hdf5_to_cbf_converter(self.master_file,
+                                                           output_dir=self.output_dir,
+                                                           image_range=image_range,
+                                                           nproc=nproc,
+                                                           **kwargs)
+        converter.run()
+        return converter
+
+    def test_byte_offset(self):
+        """Differences of every width are encoded"""
+
+        data = numpy.array([[0, 1, -1, 127, -128, 200, -32768, 40000, -1, 2**31 - 1, -2**31, 5]],
+                           dtype=numpy.int32)
+        path = os.path.join(self.directory, "test_000001.cbf")
+        convert_hdf5_cbf.write_minicbf(path, data, "")
+        self.assertEqual(read_cbf_data(path)[1], data.ravel().tolist())
+
+    def test_convert_all(self):
+        """Every frame is written, readable and with the master file header"""
+
+        converter = self.convert("all")
+        self.assertEqual(converter.total_nimages, 10)
+        self.assertEqual(len(converter.output_images), 10)
+
+        for image_number, image in enumerate(converter.output_images, 1):
+            header, values = read_cbf_data(image)
+            expected = self.images[image_number-1].astype(numpy.int64)
+            expected[expected == numpy.iinfo(numpy.uint32).max] = -1
+            self.assertEqual(values, expected.ravel().tolist())
+
+        parameters = dectris_eiger16m.HEADER_PARSER.parse(
+            minicbf.read_header_block(converter.output_images[6]))
+        self.assertEqual(parameters["detector_sn"], "E-32-0108")
+        self.assertEqual(parameters["wavelength"], 0.97918)
+        self.assertEqual(parameters["distance"], 300.0)
+        self.assertEqual(parameters["beam_y"], 2130.0)
+        self.assertAlmostEqual(parameters["osc_start"], 11.2)
+        self.assertEqual(parameters["osc_range"], 0.2)
+        self.assertEqual(parameters["count_cutoff"], 2129754)
+        self.assertFalse(os.path.exists(converter.output_images[0] + ".tmp"))
+
+    def test_range_across_files(self):
+        """A range spanning data files converts only those frames"""
+
+        converter = self.convert("3-6")
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         ["thaum_1_%06d.cbf" % number for number in range(3, 7)])
+        # Image 5 is the first frame of the second data file
+        values = read_cbf_data(converter.output_images[2])[1]
+        self.assertEqual(values[3:], self.images[4].ravel().tolist()[3:])
+
+    def test_skip_present(self):
+        """Frames already converted are not written again"""
+
+        self.convert("1-4", nproc=1)
+        present = os.path.join(self.output_dir, "thaum_1_000002.cbf")
+        modified = int(os.path.getmtime(present)) - 100
+        os.utime(present, (modified, modified))
+
+        converter = self.convert("1-6")
+        self.assertEqual(os.path.getmtime(present), modified)
+        self.assertEqual(len(converter.output_images), 6)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "thaum_1_000006.cbf")))
+
+    def test_wedge(self):
+        """The second image of a pair comes from the oscillation in the header"""
+
+        converter = self.convert("1", wedge_range=1.0)
+        self.assertEqual([os.path.basename(image) for image in converter.output_images],
+                         ["thaum_1_000001.cbf", "thaum_1_000006.cbf"])
+
+def benchmark(number_of_images=100, shape=(1024, 1024), nproc=None):
+    """Print images/s converting with h5py and, where installed, eiger2cbf"""
+
+    nproc = nproc or max(1, multiprocessing.cpu_count() - 1)
+    directory = tempfile.mkdtemp()
+    try:
+        frames_per_file = [min(25, number_of_images - start)
+                           for start in range(0, number_of_images, 25)]
+        master_file = write_dataset(directory, frames_per_file, shape)[0]
+        methods = [("h5py", True)]
+        if find_executable("eiger2cbf"):
+            methods.append(("eiger2cbf", False))
+        for label, native in methods:
+            output_dir = os.path.join(directory, label)
+            start = time.time()
+            convert_hdf5_cbf.hdf5_to_cbf_converter(master_file,
+                                                   output_dir=output_dir,
+                                                   image_range="all",
+                                                   nproc=nproc,
+                                                   native=native).run()
+            elapsed = time.time() - start
+            print "%-10s %8.1f images/s" % (label, number_of_images / elapsed)
+    finally:
+        shutil.rmtree(directory)
+
 def get_commandline():
     """
     Grabs the commandline
@@ -107,6 +311,12 @@ def get_commandline():
     commandline_description = "Parse image file header"
     parser = argparse.ArgumentParser(description=commandline_description)
 
+    # Time conversion instead of testing
+    parser.add_argument("-b", "--benchmark",
+                        action="store_true",
+                        dest="benchmark",
+                        help="Time conversion of a synthetic data set")
+
     # A True/False flag
     parser.add_argument("-c", "--commandline",
                         action="store_true",
@@ -131,7 +341,10 @@ def main(args):
 
     print "main"
 
-    unittest.main(verbosity=2)
+    if args.benchmark:
+        benchmark()
+    else:
+        unittest.main(verbosity=2, argv=[sys.argv[0]])
 
 if __name__ == "__main__":
 
@@ -0,0 +1,177 @@
+"""Tests for following the frames of a run in utils.frame_progress"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import collections
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# RAPD imports
+import utils.frame_progress as frame_progress
+
+class LocalRedis(object):
+    """
+    In-process stand-in for the key and pubsub calls of
+    database.redis_adapter.Database
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.condition = threading.Condition()
+        self.subscriptions = collections.defaultdict(list)
+        self.messages = {}
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def set_publish(self, keys, value, channel, expire_time=None):
+        with self.condition:
+            for key in keys:
+                self.keys[key] = value
+            for pubsub_id in self.subscriptions[channel]:
+                self.messages[pubsub_id].append({"type":"message",
+                                                 "channel":channel,
+                                                 "data":value})
+            self.condition.notify_all()
+
+    def subscribe(self, id=None, channel=None):
+        with self.condition:
+            pubsub_id = len(self.messages) + 1
+            self.messages[pubsub_id] = collections.deque([{"type":"subscribe",
+                                                           "channel":channel,
+                                                           "data":1}])
+            self.subscriptions[channel].append(pubsub_id)
+        return pubsub_id
+
+    def get_message(self, id, timeout=0):
+        deadline = time.time() + timeout
+        with self.condition:
+            while not self.messages[id]:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            return self.messages[id].popleft()
+
+class TestFrameWaiter(unittest.TestCase):
+    """Waiting on control for frames"""
+
+    def setUp(self):
+        self.redis = LocalRedis()
+        self.check_interval = frame_progress.CHECK_INTERVAL
+
+    def tearDown(self):
+        frame_progress.CHECK_INTERVAL = self.check_interval
+
+    def publish_later(self, place_in_run, delay=0.1):
+        timer = threading.Timer(delay,
+                                frame_progress.publish_place_in_run,
+                                (self.redis, "NECAT_E", "run1", place_in_run))
+        timer.start()
+        return timer
+
+    def test_already_there(self):
+        """No waiting for a frame already recorded"""
+
+        frame_progress.publish_place_in_run(self.redis, "NECAT_E", "run1", 50)
+        waiter = frame_progress.FrameWaiter(self.redis, "NECAT_E", "run1")
+        self.assertTrue(waiter.wait(50, 0))
+
+    def test_woken(self):
+        """A published frame wakes the wait straight away"""
+
+        waiter = frame_progress.FrameWaiter(self.redis, "NECAT_E", "run1")
+        self.publish_later(10, 0.05)
+        self.publish_later(20, 0.15)
+        start = time.time()
+        self.assertTrue(waiter.wait(20, 30))
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(self.redis.keys["place_in_run:NECAT_E"], "20")
+
+    def test_other_run(self):
+        """Frames of another run do not end the wait"""
+
+        waiter = frame_progress.FrameWaiter(self.redis, "NECAT_E", "run1")
+        frame_progress.publish_place_in_run(self.redis, "NECAT_E", "run2", 100)
+        self.assertFalse(waiter.wait(20, 0.2))
+
+    def test_missed_message(self):
+        """The key is read again when no message comes"""
+
+        frame_progress.CHECK_INTERVAL = 0.05
+        waiter = frame_progress.FrameWaiter(self.redis, "NECAT_E", "run1")
+        self.redis.keys[frame_progress.run_channel("NECAT_E", "run1")] = "30"
+        self.assertTrue(waiter.wait(30, 1))
+
+class TestFrameScanner(unittest.TestCase):
+    """Following frames on disk"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scanner = frame_progress.FrameScanner(self.directory, "thaum_1_??????.cbf")
+        self.glob = frame_progress.glob.glob
+        self.globs = []
+
+        def counted_glob(pattern):
+            self.globs.append(pattern)
+            return self.glob(pattern)
+        frame_progress.glob.glob = counted_glob
+
+    def tearDown(self):
+        frame_progress.glob.glob = self.glob
+        shutil.rmtree(self.directory)
+
+    def write_frames(self, first, last):
+        for image_number in range(first, last + 1):
+            open(self.scanner.get_image_path(image_number), "w").close()
+
+    def test_scan(self):
+        """The directory is listed once, then only new frames looked for"""
+
+        self.assertEqual(self.scanner.scan(), (0, 0))
+
+        self.write_frames(1, 5)
+        self.assertEqual(self.scanner.scan(), (1, 5))
+        self.write_frames(6, 9)
+        self.assertEqual(self.scanner.scan(), (1, 9))
+        self.assertEqual(self.scanner.scan(), (1, 9))
+        self.assertEqual(len(self.globs), 2)
+
+    def test_other_files(self):
+        """Files of other runs are not counted"""
+
+        self.write_frames(3, 4)
+        open(os.path.join(self.directory, "thaum_2_000010.cbf"), "w").close()
+        open(os.path.join(self.directory, "thaum_1_000009.cbf.tmp"), "w").close()
+        self.assertEqual(self.scanner.scan(), (3, 4))
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,247 @@
+"""Tests for the job priority lanes in utils.job_lanes"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import collections
+import unittest
+
+# RAPD imports
+from utils.job_lanes import JobLanes
+from utils.text import json
+
+SETTINGS = {
+    "LANES":("interactive", "collection", "reprocess"),
+    "DEFAULT_LANE":"collection",
+    "COMMANDS":{"INDEX":"interactive", "INTEGRATE":"collection", "HCMERGE":"reprocess"},
+    "POLICY":"strict",
+    "WEIGHTS":{"interactive":6, "collection":3, "reprocess":1},
+}
+
+class LocalRedis(object):
+    """Stand-in for the database.redis_adapter.Database calls used by the lanes"""
+
+    def __init__(self):
+        self.lists = collections.defaultdict(list)
+        self.hashes = collections.defaultdict(dict)
+        self.blocking_calls = []
+
+    # Lists are stored head first, like LRANGE 0 -1
+    def lpush(self, key, value):
+        self.lists[key].insert(0, value)
+
+    def lpush_notify(self, key, value, signal_key, signal_length=1000):
+        self.lpush(key, value)
+        self.lpush(signal_key, 1)
+        del self.lists[signal_key][signal_length:]
+
+    def rpush(self, key, value):
+        self.lists[key].append(value)
+
+    def rpush_notify(self, key, value, signal_key, signal_length=1000):
+        self.rpush(key, value)
+        self.lpush(signal_key, 1)
+        del self.lists[signal_key][signal_length:]
+
+    def notify(self, signal_key, count=1, signal_length=1000):
+        for _ in range(count):
+            self.lpush(signal_key, 1)
+        del self.lists[signal_key][signal_length:]
+
+    def rpop(self, key):
+        if self.lists[key]:
+            return self.lists[key].pop()
+        return None
+
+    def rpoplpush(self, list1, list2):
+        value = self.rpop(list1)
+        if value is not None:
+            self.lpush(list2, value)
+        return value
+
+    def brpop(self, keys, timeout=0):
+        self.blocking_calls.append(("brpop", keys))
+        for key in keys:
+            value = self.rpop(key)
+            if value is not None:
+                return key, value
+        return None
+
+    def brpoplpush(self, list1, list2, timeout=0):
+        self.blocking_calls.append(("brpoplpush", list1))
+        return self.rpoplpush(list1, list2)
+
+    def llen(self, key):
+        return len(self.lists[key])
+
+    def hgetall(self, key):
+        return dict(self.hashes[key])
+
+    def record_wait(self, key, name, wait):
+        stats = self.hashes[key]
+        stats[name+":count"] = stats.get(name+":count", 0) + 1
+        stats[name+":wait_total"] = stats.get(name+":wait_total", 0) + wait
+        stats[name+":wait_last"] = wait
+
+class TestJobLanes(unittest.TestCase):
+    """Priority lanes for job lists"""
+
+    def setUp(self):
+        self.redis = LocalRedis()
+
+    def command(self, command, number):
+        return {"command":command, "process":{"result_id":number}}
+
+    def drain(self, lanes):
+        """Pop everything, returning (command, lane) in dequeue order"""
+        popped = []
+        while True:
+            raw_command, lane = lanes.pop(self.redis, "RAPD_JOBS", "DISPATCH", 0)
+            if not raw_command:
+                return popped
+            popped.append((json.loads(raw_command)["command"], lane))
+
+    def test_lane_keys(self):
+        """The default lane is the job list itself"""
+
+        lanes = JobLanes(SETTINGS)
+        self.assertEqual(lanes.key("RAPD_JOBS", "collection"), "RAPD_JOBS")
+        self.assertEqual(lanes.key("RAPD_JOBS", "interactive"), "RAPD_JOBS:interactive")
+        self.assertEqual(lanes.lane(self.command("index", 1)), "interactive")
+        self.assertEqual(lanes.lane(self.command("UNKNOWN", 1)), "collection")
+        # A lane set upstream wins
+        command = self.command("HCMERGE", 1)
+        command["process"]["lane"] = "interactive"
+        self.assertEqual(lanes.lane(command), "interactive")
+
+    def test_strict(self):
+        """A snap is dequeued before integration and reprocessing queued earlier"""
+
+        lanes = JobLanes(SETTINGS)
+        for number, command in enumerate(("HCMERGE", "INTEGRATE", "INTEGRATE", "INDEX")):
+            lanes.push(self.redis, "RAPD_JOBS", self.command(command, number))
+
+        self.assertEqual(self.drain(lanes),
+                         [("INDEX", "interactive"),
+                          ("INTEGRATE", "collection"),
+                          ("INTEGRATE", "collection"),
+                          ("HCMERGE", "reprocess")])
+        self.assertEqual(len(self.redis.lists["DISPATCH"]), 4)
+        # Signal tokens are consumed with the jobs
+        self.assertEqual(self.redis.lists["RAPD_JOBS:signal"], [])
+
+    def test_weighted(self):
+        """Dequeues are shared by weight while every lane has work"""
+
+        settings = dict(SETTINGS, POLICY="weighted")
+        lanes = JobLanes(settings)
+        for number in range(20):
+            for command in ("INDEX", "INTEGRATE", "HCMERGE"):
+                lanes.push(self.redis, "RAPD_JOBS", self.command(command, number))
+
+        first_ten = [lane for __, lane in self.drain(lanes)[:10]]
+        self.assertEqual(first_ten.count("interactive"), 6)
+        self.assertEqual(first_ten.count("collection"), 3)
+        self.assertEqual(first_ten.count("reprocess"), 1)
+
+    def test_weighted_falls_through(self):
+        """An empty lane does not hold up the others"""
+
+        lanes = JobLanes(dict(SETTINGS, POLICY="weighted"))
+        for number in range(3):
+            lanes.push(self.redis, "RAPD_JOBS", self.command("HCMERGE", number))
+        self.assertEqual([lane for __, lane in self.drain(lanes)], ["reprocess"] * 3)
+
+    def test_legacy_push(self):
+        """Jobs pushed straight onto the job list are in the default lane"""
+
+        lanes = JobLanes(SETTINGS)
+        self.redis.lpush("RAPD_JOBS", json.dumps(self.command("ANALYSIS", 1)))
+        self.assertEqual(self.drain(lanes), [("ANALYSIS", "collection")])
+
+    def test_single_lane(self):
+        """Without lanes the job list is blocked on directly"""
+
+        lanes = JobLanes()
+        lanes.push(self.redis, "RAPD_JOBS", self.command("INDEX", 1))
+        self.assertEqual(self.redis.llen("RAPD_JOBS"), 1)
+        self.assertEqual(self.redis.llen("RAPD_JOBS:signal"), 0)
+        self.assertEqual(self.drain(lanes), [("INDEX", "default")])
+        self.assertEqual(set(call[0] for call in self.redis.blocking_calls), set(["brpoplpush"]))
+
+    def test_metrics(self):
+        """Depth and wait time are reported per lane"""
+
+        lanes = JobLanes(SETTINGS)
+        for number in range(3):
+            lanes.push(self.redis, "RAPD_JOBS", self.command("INTEGRATE", number))
+        lanes.push(self.redis, "RAPD_JOBS", self.command("INDEX", 4))
+
+        raw_command, lane = lanes.pop(self.redis, "RAPD_JOBS", "DISPATCH", 0)
+        command = json.loads(raw_command)
+        wait = lanes.record(self.redis, "RAPD_JOBS", lane, command)
+        self.assertTrue(wait >= 0)
+
+        stats = lanes.stats(self.redis, "RAPD_JOBS")
+        self.assertEqual(stats["interactive"]["depth"], 0)
+        self.assertEqual(stats["interactive"]["count"], 1)
+        self.assertEqual(stats["collection"]["depth"], 3)
+        self.assertEqual(stats["collection"]["count"], 0)
+        self.assertEqual(stats["reprocess"]["depth"], 0)
+
+    def test_move(self):
+        """Jobs keep their lane when moved between job lists"""
+
+        lanes = JobLanes(SETTINGS)
+        lanes.push(self.redis, "LAUNCHER_A", self.command("INDEX", 1))
+        lanes.push(self.redis, "LAUNCHER_A", self.command("HCMERGE", 2))
+        self.assertEqual(lanes.move(self.redis, "LAUNCHER_A", "RAPD_JOBS"), 2)
+        self.assertEqual(self.redis.llen("RAPD_JOBS:interactive"), 1)
+        self.assertEqual(self.redis.llen("RAPD_JOBS:reprocess"), 1)
+        # Consumers blocked on RAPD_JOBS are woken for each
+        self.assertEqual(self.redis.llen("RAPD_JOBS:signal"), 2)
+
+    def test_requeue(self):
+        """Requeued jobs go back to the front of their own lane and wake consumers"""
+
+        lanes = JobLanes(SETTINGS)
+        lanes.push(self.redis, "RAPD_JOBS", self.command("INDEX", 1))
+        lanes.push(self.redis, "RAPD_JOBS", self.command("INDEX", 2))
+        raw_command, lane = lanes.pop(self.redis, "RAPD_JOBS", "DISPATCH", 0)
+        self.assertEqual(self.redis.llen("RAPD_JOBS:signal"), 1)
+
+        self.assertEqual(lanes.requeue_list(self.redis, "DISPATCH", "RAPD_JOBS"), 1)
+        self.assertEqual(self.redis.llen("DISPATCH"), 0)
+        self.assertEqual(self.redis.llen("RAPD_JOBS:signal"), 2)
+        self.assertEqual(self.drain(lanes), [("INDEX", "interactive"), ("INDEX", "interactive")])
+        self.assertEqual(json.loads(raw_command)["process"]["result_id"], 1)
+
+        # Anything not a command goes on the default lane
+        self.assertEqual(lanes.requeue(self.redis, "RAPD_JOBS", "junk"), "collection")
+        self.assertEqual(self.redis.lists["RAPD_JOBS"], ["junk"])
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
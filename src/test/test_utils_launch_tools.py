@@ -0,0 +1,143 @@
+"""Tests for the job tracking in utils.launch_tools"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import collections
+import unittest
+
+# RAPD imports
+from utils.job_lanes import JobLanes
+import utils.launch_tools as launch_tools
+from utils.text import json
+
+class LocalRedis(object):
+    """Stand-in for database.redis_adapter.Database list and hash calls"""
+
+    def __init__(self):
+        self.lists = collections.defaultdict(list)
+        self.hashes = collections.defaultdict(dict)
+
+    # Lists are stored head first, like LRANGE 0 -1
+    def lpush(self, key, value):
+        self.lists[key].insert(0, value)
+
+    def rpush(self, key, value):
+        self.lists[key].append(value)
+
+    def rpush_notify(self, key, value, signal_key, signal_length=1000):
+        self.rpush(key, value)
+        self.lpush(signal_key, 1)
+
+    def rpop(self, key):
+        if self.lists[key]:
+            return self.lists[key].pop()
+        return None
+
+    def rpoplpush(self, list1, list2):
+        value = self.rpop(list1)
+        if value is not None:
+            self.lpush(list2, value)
+        return value
+
+    def brpoplpush(self, list1, list2, timeout=0):
+        return self.rpoplpush(list1, list2)
+
+    def lrem(self, key, count, value):
+        self.lists[key].remove(value)
+
+    def hgetall(self, key):
+        return dict(self.hashes[key])
+
+    def hdel(self, key, field):
+        return self.hashes[key].pop(field, None) is not None
+
+    def track_in_flight(self, list_key, hash_key, field, value):
+        self.hashes[hash_key][field] = value
+        self.lrem(list_key, 1, value)
+
+class TestInFlight(unittest.TestCase):
+    """In-flight tracking between launcher and plugin"""
+
+    def setUp(self):
+        self.redis = LocalRedis()
+        self.in_flight_list, self.in_flight_jobs = launch_tools.in_flight_keys("JOBS_A")
+
+    def take(self, job_id):
+        """Pop a job as the launcher does"""
+        raw = self.redis.brpoplpush("JOBS_A", self.in_flight_list)
+        self.redis.track_in_flight(self.in_flight_list, self.in_flight_jobs, job_id, raw)
+        return {"command":raw,
+                "process":{"launcher_ack":{"key":self.in_flight_jobs, "id":job_id}}}
+
+    def test_acknowledge(self):
+        """An acknowledged job is no longer in flight"""
+
+        self.redis.lpush("JOBS_A", "job1")
+        command = self.take("1")
+        self.assertEqual(self.redis.hgetall(self.in_flight_jobs), {"1":"job1"})
+
+        self.assertTrue(launch_tools.acknowledge_command(command, self.redis))
+        self.assertEqual(self.redis.hgetall(self.in_flight_jobs), {})
+        self.assertEqual(launch_tools.requeue_in_flight(self.redis, "JOBS_A"), 0)
+
+    def test_acknowledge_untracked(self):
+        """Commands without a launcher_ack are left alone"""
+        self.assertFalse(launch_tools.acknowledge_command({"process":{}}, self.redis))
+
+    def test_requeue(self):
+        """Jobs never acknowledged go back on RAPD_JOBS"""
+
+        for job in ("job1", "job2", "job3"):
+            self.redis.lpush("JOBS_A", job)
+        command = self.take("1")
+        self.take("2")
+        # Launcher died between BRPOPLPUSH and moving to the hash
+        self.redis.brpoplpush("JOBS_A", self.in_flight_list)
+
+        launch_tools.acknowledge_command(command, self.redis)
+
+        self.assertEqual(launch_tools.requeue_in_flight(self.redis, "JOBS_A"), 2)
+        self.assertEqual(sorted(self.redis.lists["RAPD_JOBS"]), ["job2", "job3"])
+        self.assertEqual(self.redis.lists[self.in_flight_list], [])
+        self.assertEqual(self.redis.hgetall(self.in_flight_jobs), {})
+
+    def test_requeue_lanes(self):
+        """Requeued jobs keep their lane"""
+
+        job_lanes = JobLanes({"LANES":("interactive", "collection"),
+                              "DEFAULT_LANE":"collection"})
+        command = json.dumps({"command":"INDEX", "process":{"lane":"interactive"}})
+        self.redis.lpush("JOBS_A", command)
+        self.take("1")
+
+        self.assertEqual(launch_tools.requeue_in_flight(self.redis, "JOBS_A", "RAPD_JOBS", job_lanes),
+                         1)
+        self.assertEqual(self.redis.lists["RAPD_JOBS:interactive"], [command])
+        self.assertEqual(self.redis.lists["RAPD_JOBS:signal"], [1])
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
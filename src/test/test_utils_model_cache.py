@@ -0,0 +1,207 @@
+"""Tests for the shared structure file cache in utils.model_cache"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# RAPD imports
+import utils.model_cache as model_cache
+
+class Repository(object):
+    """Stand-in for the download_cif of the get_cif repositories"""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.downloads = []
+        self.lock = threading.Lock()
+
+    def download_cif(self, pdb_code, fname):
+        with self.lock:
+            self.downloads.append(pdb_code)
+        time.sleep(self.delay)
+        if pdb_code == "XXXX":
+            return False
+        with open(fname, "w") as cif_file:
+            cif_file.write("data_%s\n%s\n" % (pdb_code, "#" * 1000))
+        return fname
+
+class TestModelCache(unittest.TestCase):
+    """Fetching through the cache"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.work_dir = os.path.join(self.directory, "work")
+        os.mkdir(self.work_dir)
+        self.cache = model_cache.ModelCache(os.path.join(self.directory, "cache"))
+        self.repository = Repository()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fetch(self):
+        """A structure is downloaded once and linked after"""
+
+        self.cache.shared = True
+        for job in range(3):
+            dest = os.path.join(self.work_dir, "job%d_1thw.cif" % job)
+            self.assertEqual(model_cache.fetch_model(self.repository, "1thw", dest, self.cache),
+                             dest)
+            self.assertTrue(os.path.islink(dest))
+            with open(dest) as cif_file:
+                self.assertTrue(cif_file.read().startswith("data_1thw"))
+        self.assertEqual(self.repository.downloads, ["1thw"])
+        self.assertEqual(os.listdir(self.cache.codes_dir), ["1THW"])
+
+    def test_fetch_unshared(self):
+        """Files from a cache other nodes cannot see are there without it"""
+
+        self.assertFalse(self.cache.shared)
+        struct_file = os.path.join(self.work_dir, "1thw.cif")
+        self.cache.fetch("1thw", struct_file, self.repository.download_cif)
+        self.assertFalse(os.path.islink(struct_file))
+
+        chain_file = os.path.join(self.work_dir, "1thw_A.cif")
+        with open(chain_file, "w") as out_file:
+            out_file.write("data_A\n")
+        self.cache.put_chains(struct_file, {"A":chain_file})
+        other_chain = os.path.join(self.work_dir, "other_A.cif")
+        self.assertEqual(self.cache.link_chains(struct_file, {"A":other_chain}), ["A"])
+
+        shutil.move(self.cache.directory, os.path.join(self.directory, "moved"))
+        with open(struct_file) as cif_file:
+            self.assertTrue(cif_file.read().startswith("data_1thw"))
+        with open(other_chain) as in_file:
+            self.assertEqual(in_file.read(), "data_A\n")
+
+    def test_fetch_together(self):
+        """Jobs wanting a structure at once wait for one download"""
+
+        self.repository.delay = 0.2
+        threads = [threading.Thread(target=self.cache.fetch,
+                                    args=("1thw",
+                                          os.path.join(self.work_dir, "job%d_1thw.cif" % job),
+                                          self.repository.download_cif))
+                   for job in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.repository.downloads, ["1thw"])
+        self.assertEqual(len(os.listdir(self.work_dir)), 4)
+
+    def test_failed(self):
+        """Nothing is kept for a structure that cannot be downloaded"""
+
+        dest = os.path.join(self.work_dir, "xxxx.cif")
+        self.assertFalse(self.cache.fetch("XXXX", dest, self.repository.download_cif))
+        self.assertFalse(os.path.lexists(dest))
+        self.assertEqual(os.listdir(self.cache.codes_dir), [])
+        self.assertEqual(sorted(os.listdir(self.cache.directory)),
+                         ["chains", "codes", "locks", "objects", "prep"])
+
+    def test_chains(self):
+        """Chains split from a cached structure are kept and linked"""
+
+        struct_file = os.path.join(self.work_dir, "1thw.cif")
+        self.cache.fetch("1thw", struct_file, self.repository.download_cif)
+        self.assertEqual(self.cache.get_chains(struct_file), {})
+
+        chain_file = os.path.join(self.work_dir, "1thw_A.cif")
+        with open(chain_file, "w") as out_file:
+            out_file.write("data_A\n")
+        self.cache.put_chains(struct_file, {"A":chain_file})
+
+        other_dir = os.path.join(self.directory, "other")
+        os.mkdir(other_dir)
+        other_file = self.cache.fetch("1thw",
+                                      os.path.join(other_dir, "1thw.cif"),
+                                      self.repository.download_cif)
+        other_chain = os.path.join(other_dir, "1thw_A.cif")
+        self.assertEqual(self.cache.link_chains(other_file, {"A":other_chain, "B":"nowhere"}),
+                         ["A"])
+        with open(other_chain) as in_file:
+            self.assertEqual(in_file.read(), "data_A\n")
+
+        # Structures outside the cache have no chains kept
+        self.cache.put_chains(chain_file, {"A":chain_file})
+        self.assertEqual(self.cache.get_chains(chain_file), {})
+
+    def test_prep(self):
+        """Preparation results are kept for the same model, data and options"""
+
+        struct_file = os.path.join(self.work_dir, "1thw.cif")
+        self.cache.fetch("1thw", struct_file, self.repository.download_cif)
+        cell = (58.61, 58.6, 151.6, 90, 90, 90)
+        key = self.cache.prep_key(struct_file, "P 41 21 2", cell, 2.01, matthews=True)
+        self.assertEqual(self.cache.get_prep(key), None)
+
+        self.cache.put_prep(key, {"all":{"NMol":2, "SC":0.5, "res":2.0}})
+        self.assertEqual(self.cache.get_prep(key), {"all":{"NMol":2, "SC":0.5, "res":2.0}})
+
+        # Same within rounding
+        self.assertEqual(self.cache.prep_key(struct_file, "P41212", (58.6, 58.6, 151.6, 90, 90, 90),
+                                             2.04, matthews=True),
+                         key)
+        # Different data or options
+        self.assertNotEqual(self.cache.prep_key(struct_file, "P41212", cell, 2.2, matthews=True),
+                            key)
+        self.assertNotEqual(self.cache.prep_key(struct_file, "P43212", cell, 2.01, matthews=True),
+                            key)
+        self.assertNotEqual(self.cache.prep_key(struct_file, "P41212", cell, 2.01, matthews=False),
+                            key)
+
+    def test_evict(self):
+        """The structures used longest ago are dropped once the cache is full"""
+
+        self.cache.min_age = 0
+        for pdb_code in ("1AAA", "2BBB", "3CCC"):
+            self.cache.fetch(pdb_code,
+                             os.path.join(self.work_dir, "%s.cif" % pdb_code),
+                             self.repository.download_cif)
+            code_file = os.path.join(self.cache.codes_dir, pdb_code)
+            os.utime(code_file, (time.time(), time.time() - 100))
+        # Used again
+        self.cache.lookup("1AAA")
+
+        self.cache.max_bytes = 2 * 1020
+        self.cache.evict()
+        self.assertEqual(sorted(os.listdir(self.cache.codes_dir)), ["1AAA", "3CCC"])
+        self.assertTrue(self.cache.size() <= self.cache.max_bytes)
+
+        # Nothing used recently is dropped
+        self.cache.min_age = 3600
+        self.cache.max_bytes = 0
+        self.cache.evict()
+        self.assertEqual(sorted(os.listdir(self.cache.codes_dir)), ["1AAA", "3CCC"])
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
@@ -0,0 +1,77 @@
+"""Tests for ordering Phaser jobs in utils.phaser_schedule"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import unittest
+
+# RAPD imports
+import utils.phaser_schedule as phaser_schedule
+
+class TestPhaserCost(unittest.TestCase):
+    """Costs of Phaser runs"""
+
+    def test_cost(self):
+        """Bigger searches, higher resolution and cells further off cost more"""
+
+        cost = phaser_schedule.phaser_cost(200, 1, 3.0)
+        self.assertTrue(phaser_schedule.phaser_cost(400, 1, 3.0) > cost)
+        self.assertTrue(phaser_schedule.phaser_cost(200, 2, 3.0) > cost)
+        self.assertTrue(phaser_schedule.phaser_cost(200, 1, 2.0) > cost)
+        self.assertAlmostEqual(phaser_schedule.phaser_cost(200, 1, 3.0, 0.05), 2 * cost)
+        # Nothing known about the cell
+        self.assertEqual(phaser_schedule.phaser_cost(200, 0, 3.0, None), cost)
+
+    def test_confident(self):
+        """Only solutions above both thresholds are confident"""
+
+        self.assertTrue(phaser_schedule.is_confident({"solution":True, "tfz":"12.5", "gain":340.0}))
+        self.assertFalse(phaser_schedule.is_confident({"solution":True, "tfz":"6.1", "gain":340.0}))
+        self.assertFalse(phaser_schedule.is_confident({"solution":True, "tfz":"12.5", "gain":40.0}))
+        self.assertFalse(phaser_schedule.is_confident({"solution":True, "tfz":"NC", "gain":340.0}))
+        self.assertFalse(phaser_schedule.is_confident({"solution":False, "message":"No solution"}))
+        self.assertFalse(phaser_schedule.is_confident(False))
+        self.assertTrue(phaser_schedule.is_confident({"solution":True, "tfz":6.1, "gain":50},
+                                                     tfz=6, llg=50))
+
+class TestPhaserSchedule(unittest.TestCase):
+    """Taking jobs off the schedule"""
+
+    def test_order(self):
+        """Jobs come off lowest priority first, in the order added when equal"""
+
+        schedule = phaser_schedule.PhaserSchedule()
+        schedule.add({"name":"1AAA"}, (1, 5.0))
+        schedule.add({"name":"2BBB"}, (1, 1.0))
+        schedule.add({"name":"3CCC"}, (0, 9.0))
+        schedule.add({"name":"4DDD"}, (1, 1.0))
+        self.assertEqual(len(schedule), 4)
+        self.assertEqual(schedule.pop()["name"], "3CCC")
+        self.assertEqual([job["name"] for job in schedule.drain()], ["2BBB", "4DDD", "1AAA"])
+        self.assertEqual(len(schedule), 0)
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
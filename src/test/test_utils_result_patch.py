@@ -0,0 +1,233 @@
+"""Tests for the plugin result patches in utils.result_patch"""
+
+"""
+This file is part of RAPD
+
+Copyright (C) 2017, Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import collections
+import copy
+import logging
+import unittest
+
+# RAPD imports
+from control.model import Model
+import utils.result_patch as result_patch
+from utils.text import json
+
+def plugin_results(status=1, **results):
+    """A plugin result like integrate sends"""
+    return {"command":"INTEGRATE",
+            "plugin":{"data_type":"MX", "type":"INTEGRATE", "id":"bd11", "version":"2.0.0"},
+            "process":{"result_id":"5b3a97f1b77af848335f6ccd", "status":status, "type":"plugin"},
+            "results":results}
+
+class LocalRedis(object):
+    """Stand-in for the key calls used for resync requests"""
+
+    def __init__(self):
+        self.keys = {}
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def setex(self, key, expire_time, value):
+        self.keys[key] = value
+
+    def delete(self, key):
+        self.keys.pop(key, None)
+
+    def lpush(self, key, value):
+        self.keys.setdefault(key, []).insert(0, value)
+
+    def publish(self, channel, message):
+        self.keys.setdefault("published:"+channel, []).append(message)
+
+class LocalWriter(object):
+    """Collects what would be written"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, message):
+        self.submitted.append(message)
+
+class TestPatches(unittest.TestCase):
+    """Building, merging and applying patches"""
+
+    def test_diff_apply(self):
+        """Applying the diff of two results turns one into the other"""
+
+        previous = {"results":{"summary":{"res":2.0, "isig":10.0}, "plots":{"a":[1, 2]},
+                               "old":1}}
+        current = {"results":{"summary":{"res":1.8, "isig":10.0}, "plots":{"a":[1, 2, 3]},
+                              "logs":{"xds":"done"}}}
+
+        to_set, to_unset = result_patch.diff(previous, current)
+        self.assertEqual(to_set, {"results.summary.res":1.8,
+                                  "results.plots.a":[1, 2, 3],
+                                  "results.logs":{"xds":"done"}})
+        self.assertEqual(to_unset, ["results.old"])
+
+        patched = result_patch.apply_patch(copy.deepcopy(previous),
+                                           {"set":to_set, "unset":to_unset})
+        self.assertEqual(patched, current)
+
+    def test_dotted_keys(self):
+        """Keys that cannot be in a path are replaced with their parent"""
+
+        to_set, __ = result_patch.diff({"files":{"a.mtz":1}}, {"files":{"a.mtz":2}})
+        self.assertEqual(to_set, {"files":{"a.mtz":2}})
+
+    def test_merge(self):
+        """Merged patches do the same as applying both"""
+
+        document = {"results":{"a":{"b":1, "c":2}, "d":3, "e":{"f":4}}}
+        first = {"set":{"results.a":{"b":5, "c":6}, "results.d":7}, "unset":["results.e.f"]}
+        second = {"set":{"results.a.b":8, "results.e":{"g":9}}, "unset":["results.d"]}
+
+        expected = result_patch.apply_patch(
+            result_patch.apply_patch(copy.deepcopy(document), first), second)
+        merged = result_patch.merge_patches(first, second)
+        self.assertEqual(result_patch.apply_patch(copy.deepcopy(document), merged), expected)
+
+        # No path is inside another, so MongoDB accepts the $set
+        paths = merged["set"].keys() + merged["unset"]
+        for path in paths:
+            for other in paths:
+                self.assertFalse(other.startswith(path+"."))
+
+    def test_combine_on_snapshot(self):
+        """A patch waiting behind a snapshot is folded into it"""
+
+        snapshot = plugin_results(summary={"res":2.0})
+        patch = {"process":dict(snapshot["process"], status=50),
+                 "plugin":snapshot["plugin"],
+                 "sequence":2,
+                 "patch":{"set":{"results.summary.res":1.9}, "unset":[]}}
+
+        combined = result_patch.combine_messages(copy.deepcopy(snapshot), patch)
+        self.assertFalse("patch" in combined)
+        self.assertEqual(combined["results"]["summary"]["res"], 1.9)
+        self.assertEqual(combined["process"]["status"], 50)
+
+class TestResultPatcher(unittest.TestCase):
+    """What a plugin sends"""
+
+    def setUp(self):
+        self.redis = LocalRedis()
+        self.patcher = result_patch.ResultPatcher()
+
+    def test_sequence(self):
+        """Snapshot first, then patches, then a final snapshot"""
+
+        first = json.loads(self.patcher.prepare(plugin_results(summary={"res":2.0}), self.redis))
+        self.assertTrue("results" in first)
+        self.assertEqual(first["sequence"], 1)
+
+        second = json.loads(self.patcher.prepare(plugin_results(summary={"res":1.9}), self.redis))
+        self.assertFalse("results" in second)
+        self.assertEqual(second["sequence"], 2)
+        self.assertEqual(second["patch"]["set"], {"results.summary.res":1.9})
+        self.assertEqual(second["plugin"]["type"], "INTEGRATE")
+
+        last = json.loads(self.patcher.prepare(plugin_results(status=100, summary={"res":1.9}),
+                                               self.redis))
+        self.assertTrue("results" in last)
+        self.assertEqual(last["sequence"], 3)
+
+    def test_files(self):
+        """Changes to files send a snapshot"""
+
+        self.patcher.prepare(plugin_results(summary={}), self.redis)
+        message = json.loads(self.patcher.prepare(
+            plugin_results(summary={}, archive_files=[{"path":"/tmp/a.tar.bz2"}]), self.redis))
+        self.assertTrue("results" in message)
+
+    def test_resync(self):
+        """Control can ask for a snapshot"""
+
+        results = plugin_results(summary={"res":2.0})
+        self.patcher.prepare(results, self.redis)
+        self.redis.setex(result_patch.resync_key(results["process"]["result_id"]), 60, 1)
+        message = json.loads(self.patcher.prepare(plugin_results(summary={"res":1.9}), self.redis))
+        self.assertTrue("results" in message)
+        self.assertEqual(self.redis.keys, {})
+
+    def test_send_results(self):
+        """The patch is both pushed for control and published"""
+
+        patcher = result_patch.send_results(self.redis, None, plugin_results(summary={"res":2.0}))
+        self.assertTrue(patcher)
+        self.assertTrue(result_patch.send_results(self.redis,
+                                                  patcher,
+                                                  plugin_results(summary={"res":1.9})) is patcher)
+        pushed = self.redis.keys["RAPD_RESULTS"]
+        self.assertEqual(list(reversed(pushed)), self.redis.keys["published:RAPD_RESULTS"])
+        self.assertEqual(json.loads(pushed[0])["patch"]["set"], {"results.summary.res":1.9})
+
+class TestModelSequence(unittest.TestCase):
+    """Control tracking of the patch sequence"""
+
+    def setUp(self):
+        self.model = Model.__new__(Model)
+        self.model.logger = logging.getLogger("RAPDLogger")
+        self.model.redis = LocalRedis()
+        self.model.result_writer = LocalWriter()
+        self.model.result_sequences = collections.OrderedDict()
+        self.patcher = result_patch.ResultPatcher()
+
+    def send(self, results):
+        message = json.loads(self.patcher.prepare(results))
+        self.model.handle_plugin_communication(message)
+        return message
+
+    def test_in_order(self):
+        """Patches in sequence are written"""
+
+        for res in (2.0, 1.9, 1.8):
+            self.send(plugin_results(summary={"res":res}))
+        self.assertEqual(len(self.model.result_writer.submitted), 3)
+        self.assertEqual(self.model.redis.keys, {})
+
+    def test_gap(self):
+        """A patch after a gap is dropped and a snapshot requested"""
+
+        self.send(plugin_results(summary={"res":2.0}))
+        # Lost on the way
+        self.patcher.prepare(plugin_results(summary={"res":1.9}))
+        self.send(plugin_results(summary={"res":1.8}))
+
+        self.assertEqual(len(self.model.result_writer.submitted), 1)
+        self.assertEqual(self.model.redis.keys.keys(),
+                         [result_patch.resync_key("5b3a97f1b77af848335f6ccd")])
+
+        # The plugin sees the request and sends everything
+        message = json.loads(self.patcher.prepare(plugin_results(summary={"res":1.7}),
+                                                  self.model.redis))
+        self.model.handle_plugin_communication(message)
+        self.assertTrue("results" in self.model.result_writer.submitted[-1])
+
+if __name__ == "__main__":
+
+    unittest.main(verbosity=2)
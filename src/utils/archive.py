@@ -26,6 +26,7 @@ __status__ = "Development"
 
 # Standard imports
 # import argparse
+import base64
 from collections import OrderedDict
 # import datetime
 import glob
@@ -50,6 +51,9 @@ import tarfile
 # import detectors.detector_utils as detector_utils
 # import utils
 
+# Bytes read at a time when hashing or encoding files
+CHUNK_SIZE = 1024 * 1024
+
 def compress_dir(target):
     """Compress a target and return the result file name"""
 
@@ -169,7 +173,7 @@ def create_manifest(directory, write=True):
         # It's a file
         if os.path.isfile(globfile):
             # Compute hash
-            file_hash = hashlib.sha1(open(globfile, "r").read()).hexdigest()
+            file_hash = get_hash(globfile)
             # Store hash
             records[trunc_file] = file_hash
 
@@ -181,9 +185,53 @@ def create_manifest(directory, write=True):
     # Return the dict
     return records
 
-def get_hash(filename):
-    """Returns a hash for a file"""
-    return hashlib.sha1(open(filename, "r").read()).hexdigest()
+def get_hash(filename, chunk_size=CHUNK_SIZE):
+    """Returns a hash for a file, reading it a chunk at a time"""
+
+    file_hash = hashlib.sha1()
+    with open(filename, "rb") as input_object:
+        for chunk in iter(lambda: input_object.read(chunk_size), ""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+class Base64Reader(object):
+    """
+    File-like object returning the base64 encoding of another file a chunk
+    at a time, so large files can be streamed without a full encoded copy
+    """
+
+    def __init__(self, source, chunk_size=CHUNK_SIZE):
+        """
+        Keyword arguments
+        source -- file object opened for reading bytes
+        chunk_size -- bytes read from source at a time (default = CHUNK_SIZE)
+        """
+
+        self.source = source
+        # Whole 3 byte groups encode without padding, so chunks join up
+        self.chunk_size = max(3, chunk_size - (chunk_size % 3))
+        self.buffer = ""
+        # Bytes from a short read waiting for the rest of their group
+        self.remainder = ""
+
+    def read(self, size=-1):
+        """Return up to size bytes of encoded data, all of it if size < 0"""
+
+        while size < 0 or len(self.buffer) < size:
+            chunk = self.source.read(self.chunk_size)
+            if not chunk:
+                self.buffer += base64.b64encode(self.remainder)
+                self.remainder = ""
+                break
+            chunk = self.remainder + chunk
+            cut = len(chunk) - (len(chunk) % 3)
+            self.buffer += base64.b64encode(chunk[:cut])
+            self.remainder = chunk[cut:]
+
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
 
 
 if __name__ == "__main__":
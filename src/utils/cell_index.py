@@ -0,0 +1,371 @@
+"""
+Searching the unit cells of the PDB on this machine
+
+The cells of a PDB cell dump, such as crystal.idx from the PDB's derived
+data, are Niggli reduced and kept in arrays sorted by the sum of the cell
+edges, which does not change when the axes are permuted. A search takes
+the entries whose edge sum is close enough and compares their cells to the
+reduced query cell under each permutation of the axes, returning the
+nearest entries in one call instead of a widening series of PDBQ queries.
+
+The index is rebuilt from a new dump with
+    rapd.cell_index crystal.idx
+which only reduces the cells that are new or have changed.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import argparse
+import bisect
+import itertools
+import math
+import os
+import tempfile
+import threading
+
+import numpy
+
+# RAPD imports
+import utils.global_vars as rglobals
+
+# Axis orders a cell is compared in
+PERMUTATIONS = list(itertools.permutations(range(3)))
+
+# Relative tolerance for comparisons made during reduction
+REDUCTION_EPSILON = 1e-5
+
+def cell_to_g6(cell):
+    """Return the G6 vector of a cell (a, b, c, alpha, beta, gamma)"""
+
+    a, b, c = [float(edge) for edge in cell[:3]]
+    alpha, beta, gamma = [math.radians(float(angle)) for angle in cell[3:6]]
+    return [a * a,
+            b * b,
+            c * c,
+            2 * b * c * math.cos(alpha),
+            2 * a * c * math.cos(beta),
+            2 * a * b * math.cos(gamma)]
+
+def g6_to_cell(g6):
+    """Return the cell (a, b, c, alpha, beta, gamma) of a G6 vector"""
+
+    A, B, C, xi, eta, zeta = g6
+    a, b, c = math.sqrt(A), math.sqrt(B), math.sqrt(C)
+
+    def angle(value, edge_1, edge_2):
+        return math.degrees(math.acos(max(-1.0, min(1.0, value / (2 * edge_1 * edge_2)))))
+
+    return (a, b, c, angle(xi, b, c), angle(eta, a, c), angle(zeta, a, b))
+
+def niggli_reduce(cell, max_cycles=1000):
+    """
+    Return the Niggli reduced form of a cell (a, b, c, alpha, beta, gamma)
+    by the algorithm of Krivy and Gruber (1976) with the tolerances of
+    Grosse-Kunstleve, Sauter and Adams (2004)
+    """
+
+    A, B, C, xi, eta, zeta = cell_to_g6(cell)
+    eps = REDUCTION_EPSILON * (A + B + C) / 3
+
+    def sign(value):
+        if value > eps:
+            return 1
+        if value < -eps:
+            return -1
+        return 0
+
+    for _ in range(max_cycles):
+        # N1
+        if A > B + eps or (abs(A - B) <= eps and abs(xi) > abs(eta) + eps):
+            A, B, xi, eta = B, A, eta, xi
+        # N2
+        if B > C + eps or (abs(B - C) <= eps and abs(eta) > abs(zeta) + eps):
+            B, C, eta, zeta = C, B, zeta, eta
+            continue
+        # N3, N4
+        if sign(xi) * sign(eta) * sign(zeta) == 1:
+            xi, eta, zeta = abs(xi), abs(eta), abs(zeta)
+        else:
+            xi, eta, zeta = -abs(xi), -abs(eta), -abs(zeta)
+        # N5
+        if abs(xi) > B + eps or (abs(xi - B) <= eps and 2 * eta < zeta - eps) or \
+           (abs(xi + B) <= eps and zeta < -eps):
+            direction = 1 if xi > 0 else -1
+            C = B + C - xi * direction
+            eta = eta - zeta * direction
+            xi = xi - 2 * B * direction
+            continue
+        # N6
+        if abs(eta) > A + eps or (abs(eta - A) <= eps and 2 * xi < zeta - eps) or \
+           (abs(eta + A) <= eps and zeta < -eps):
+            direction = 1 if eta > 0 else -1
+            C = A + C - eta * direction
+            xi = xi - zeta * direction
+            eta = eta - 2 * A * direction
+            continue
+        # N7
+        if abs(zeta) > A + eps or (abs(zeta - A) <= eps and 2 * xi < eta - eps) or \
+           (abs(zeta + A) <= eps and eta < -eps):
+            direction = 1 if zeta > 0 else -1
+            B = A + B - zeta * direction
+            xi = xi - eta * direction
+            zeta = zeta - 2 * A * direction
+            continue
+        # N8
+        total = xi + eta + zeta + A + B
+        if total < -eps or (abs(total) <= eps and 2 * (A + eta) + zeta > eps):
+            C = A + B + C + xi + eta + zeta
+            xi = 2 * B + xi + zeta
+            eta = 2 * A + eta + zeta
+            continue
+        break
+
+    return g6_to_cell((A, B, C, xi, eta, zeta))
+
+def read_cell_dump(dump_file):
+    """
+    Return {pdb_code: cell} from a PDB cell dump
+
+    Each line holds a PDB code and the six cell parameters, as in crystal.idx.
+    Anything after them, such as the spacegroup, is ignored, as are lines
+    that do not parse.
+    """
+
+    cells = {}
+    with open(dump_file, "r") as dump:
+        for line in dump:
+            fields = line.split()
+            if len(fields) < 7 or len(fields[0]) != 4:
+                continue
+            try:
+                cell = tuple(float(field) for field in fields[1:7])
+            except ValueError:
+                continue
+            if min(cell) <= 0 or max(cell[3:]) >= 180:
+                continue
+            cells[fields[0].upper()] = cell
+    return cells
+
+class CellIndex(object):
+    """Niggli reduced cells of PDB entries, sorted for searching"""
+
+    def __init__(self, codes=(), cells=(), reduced=None):
+        """
+        Keyword arguments
+        codes -- PDB codes
+        cells -- cell of each code as deposited
+        reduced -- Niggli reduced cell of each code, calculated if not given
+        """
+
+        self.codes = numpy.array(codes, dtype="S4")
+        self.cells = numpy.array(cells, dtype=float).reshape(-1, 6)
+        if reduced is None:
+            reduced = [niggli_reduce(cell) for cell in self.cells]
+        self.reduced = numpy.array(reduced, dtype=float).reshape(-1, 6)
+
+        # Sort by the edge sum
+        sums = self.reduced[:, :3].sum(axis=1)
+        order = numpy.argsort(sums, kind="mergesort")
+        self.codes = self.codes[order]
+        self.cells = self.cells[order]
+        self.reduced = self.reduced[order]
+        self.sums = sums[order]
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def load(cls, index_file):
+        """Read an index saved by save"""
+
+        with numpy.load(index_file) as saved:
+            return cls(saved["codes"], saved["cells"], saved["reduced"])
+
+    def save(self, index_file):
+        """Write the index to a file, replacing it all at once"""
+
+        directory = os.path.dirname(os.path.abspath(index_file))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".npz", delete=False) as temp_file:
+            numpy.savez(temp_file, codes=self.codes, cells=self.cells, reduced=self.reduced)
+        os.rename(temp_file.name, index_file)
+
+    def update(self, cells):
+        """
+        Return a new index for {pdb_code: cell}, reusing the reduced cells of
+        entries whose cell has not changed, and the number of cells reduced
+        """
+
+        known = {}
+        for code, cell, reduced in zip(self.codes, self.cells, self.reduced):
+            known[str(code)] = (tuple(cell), reduced)
+
+        codes, new_cells, reduced_cells = [], [], []
+        reduced_count = 0
+        for code in sorted(cells):
+            cell = tuple(float(value) for value in cells[code])
+            if code in known and known[code][0] == cell:
+                reduced = known[code][1]
+            else:
+                reduced = niggli_reduce(cell)
+                reduced_count += 1
+            codes.append(code)
+            new_cells.append(cell)
+            reduced_cells.append(reduced)
+
+        return CellIndex(codes, new_cells, reduced_cells), reduced_count
+
+    def search(self, cell, limit=None, tolerance=0.125):
+        """
+        Return [(pdb_code, deviation), ...] for the entries nearest to a cell,
+        nearest first
+
+        The deviation of an entry is the largest relative difference between
+        one of its reduced cell parameters and that of the query, taking the
+        axis permutation that makes it smallest.
+
+        cell -- (a, b, c, alpha, beta, gamma)
+        limit -- most entries returned, all within tolerance if None
+        tolerance -- largest deviation returned
+        """
+
+        if not len(self):
+            return []
+
+        query = numpy.array(niggli_reduce(cell))
+
+        # Each edge within tolerance bounds the edge sum
+        query_sum = query[:3].sum()
+        first = bisect.bisect_left(self.sums, query_sum * (1 - tolerance))
+        last = bisect.bisect_right(self.sums, query_sum * (1 + tolerance))
+        if first >= last:
+            return []
+        candidates = self.reduced[first:last]
+
+        deviations = None
+        for permutation in PERMUTATIONS:
+            order = list(permutation) + [axis + 3 for axis in permutation]
+            permuted = query[order]
+            deviation = (numpy.abs(candidates - permuted) / permuted).max(axis=1)
+            if deviations is None:
+                deviations = deviation
+            else:
+                deviations = numpy.minimum(deviations, deviation)
+
+        within = numpy.nonzero(deviations <= tolerance)[0]
+        within = within[numpy.argsort(deviations[within], kind="mergesort")]
+        if limit is not None:
+            within = within[:limit]
+
+        return [(str(self.codes[first + place]), float(deviations[place])) for place in within]
+
+# Indexes by file, with the modification time they were read at
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_cell_index(index_file=None):
+    """
+    Return the CellIndex saved in index_file, rglobals.CELL_INDEX if not
+    given, or None if there is none. It is only read again once changed.
+    """
+
+    index_file = index_file or rglobals.CELL_INDEX
+    try:
+        mtime = os.stat(index_file).st_mtime
+    except OSError:
+        return None
+
+    with _indexes_lock:
+        if index_file not in _indexes or _indexes[index_file][0] != mtime:
+            _indexes[index_file] = (mtime, CellIndex.load(index_file))
+        return _indexes[index_file][1]
+
+def update_cell_index(dump_file, index_file=None):
+    """
+    Rebuild the index from a PDB cell dump, only reducing the cells that are
+    new or changed. Returns the new index and the number of cells reduced.
+    """
+
+    index_file = index_file or rglobals.CELL_INDEX
+    if os.path.isfile(index_file):
+        index = CellIndex.load(index_file)
+    else:
+        index = CellIndex()
+
+    index, reduced_count = index.update(read_cell_dump(dump_file))
+    index.save(index_file)
+    return index, reduced_count
+
+def main(args):
+    """
+    The main process docstring
+    This function is called when this module is invoked from
+    the commandline
+    """
+
+    index, reduced_count = update_cell_index(args.dump_file, args.index_file)
+    if args.verbose:
+        print "%d cells in %s, %d reduced" % (len(index),
+                                              args.index_file or rglobals.CELL_INDEX,
+                                              reduced_count)
+
+def get_commandline():
+    """
+    Grabs the commandline
+    """
+
+    # Parse the commandline arguments
+    commandline_description = "Build or update the local PDB unit cell index"
+    parser = argparse.ArgumentParser(description=commandline_description)
+
+    # Verbose
+    parser.add_argument("-q", "--quiet",
+                        action="store_false",
+                        dest="verbose",
+                        help="Reduce output")
+
+    # Index file
+    parser.add_argument("-i", "--index",
+                        action="store",
+                        dest="index_file",
+                        default=None,
+                        help="Index file to update, default %s" % rglobals.CELL_INDEX)
+
+    # PDB cell dump
+    parser.add_argument(action="store",
+                        dest="dump_file",
+                        help="PDB cell dump, such as crystal.idx")
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+
+    # Get the commandline args
+    commandline_args = get_commandline()
+
+    # Execute code
+    main(args=commandline_args)
@@ -354,9 +354,13 @@ def analyze_data_sources(sources,
                          end_image=False,
                          hdf5_image_range=False,
                          hdf5_wedge_range=False,
+                         convert_all=True,
                          timeout=1):
     """
     Return information on files or directory from input
+
+    For integrate, convert_all=False converts only the first and last frames
+    of HDF5 data, for reading the headers.
     """
     # print "analyze_data_sources", sources
 
@@ -460,6 +464,10 @@ def analyze_data_sources(sources,
             else:
                 image_range = 'all'
 
+            # Just the ends
+            if not convert_all:
+                image_range = '%s,%s' % (start_image or 1, end_image or 'end')
+
             converter = convert_hdf5_cbf.hdf5_to_cbf_converter(
                 master_file=source_abspath,
                 output_dir="cbf_files",
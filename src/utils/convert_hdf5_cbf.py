@@ -26,6 +26,8 @@ __status__ = "Development"
 
 # Standard imports
 import argparse
+import base64
+import hashlib
 from itertools import groupby
 import multiprocessing
 from operator import itemgetter
@@ -35,12 +37,28 @@ import sys
 import shlex
 # import time
 
+# Converting without eiger2cbf needs h5py
+try:
+    import h5py
+    import numpy
+    import detectors.hdf5_header as hdf5_header
+except ImportError:
+    h5py = None
+# Registers the filters for the bitshuffle/LZ4 compressed Eiger data
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
 # RAPD imports
 
 
 VERSIONS = {
     "eiger2cbf": ("160415",)
 }
+
+# Frames each process converts at a time
+FRAMES_PER_TASK = 10
 # Create function for running
 def run_process(input_args, output=False):
     """Run the command in a subprocess.Popen call"""
@@ -61,6 +79,188 @@ def run_process(input_args, output=False):
         job = subprocess.Popen(shlex.split(command))
         job.wait()
 
+#
+# Native conversion - frames are read with h5py and written as miniCBF
+#
+def compress_byte_offset(data):
+    """Return the CBF byte_offset compressed string for an array of integers"""
+
+    values = data.astype(numpy.int64).ravel()
+    delta = numpy.empty_like(values)
+    delta[0] = values[0]
+    delta[1:] = values[1:] - values[:-1]
+
+    # Bytes each difference takes
+    magnitude = numpy.abs(delta)
+    sizes = numpy.full(delta.shape, 15, dtype=numpy.int64)
+    sizes[magnitude < 2**31] = 7
+    sizes[magnitude < 2**15] = 3
+    sizes[magnitude < 2**7] = 1
+    offsets = numpy.cumsum(sizes) - sizes
+
+    output = numpy.zeros(int(sizes.sum()), dtype=numpy.uint8)
+    for size, escapes in ((1, ()), (3, (0,)), (7, (0, 1, 2)), (15, (0, 1, 2, 3, 4, 5, 6))):
+        where = sizes == size
+        if not where.any():
+            continue
+        positions = offsets[where]
+        values = delta[where]
+        # Escape bytes 0x80, 0x00 0x80, 0x00 0x00 0x00 0x80 before wider values
+        for escape in escapes:
+            output[positions + escape] = 0x80 if escape in (0, 2, 6) else 0x00
+        width = {1:1, 3:2, 7:4, 15:8}[size]
+        start = size - width
+        for byte in range(width):
+            output[positions + start + byte] = (values >> (8 * byte)) & 0xff
+
+    return output.tostring()
+
+def get_start_angle(header, image_number):
+    """Return the omega start angle for an image number"""
+
+    omega = header.get("omega")
+    if omega is not None and numpy.ndim(omega) and len(omega) >= image_number:
+        return float(omega[image_number - 1])
+    start = float(header.get("omega_start", 0.0))
+    increment = float(header.get("omega_increment", header.get("omega_range_average", 0.0)))
+    return start + (image_number - 1) * increment
+
+def format_minicbf_header(header, image_number):
+    """Return the miniCBF header contents for an image from the master file header"""
+
+    lines = []
+    if header.get("description"):
+        line = "# Detector: %s" % header["description"]
+        if header.get("detector_number") is not None:
+            line += ", S/N %s" % header["detector_number"]
+        lines.append(line)
+    if header.get("data_collection_date") is not None:
+        lines.append("# %s" % header["data_collection_date"])
+    if header.get("x_pixel_size") is not None:
+        lines.append("# Pixel_size %.0fe-6 m x %.0fe-6 m" % (float(header["x_pixel_size"]) * 1e6,
+                                                              float(header.get("y_pixel_size", header["x_pixel_size"])) * 1e6))
+    if header.get("sensor_thickness") is not None:
+        lines.append("# Silicon sensor, thickness %.6f m" % float(header["sensor_thickness"]))
+    if header.get("count_time") is not None:
+        lines.append("# Exposure_time %.7f s" % float(header["count_time"]))
+    if header.get("frame_time") is not None:
+        lines.append("# Exposure_period %.7f s" % float(header["frame_time"]))
+    if header.get("countrate_correction_count_cutoff") is not None:
+        lines.append("# Count_cutoff %d counts" % int(header["countrate_correction_count_cutoff"]))
+    if header.get("incident_wavelength") is not None:
+        lines.append("# Wavelength %.5f A" % float(header["incident_wavelength"]))
+    if header.get("detector_distance") is not None:
+        lines.append("# Detector_distance %.5f m" % float(header["detector_distance"]))
+    if header.get("beam_center_x") is not None:
+        lines.append("# Beam_xy (%.2f, %.2f) pixels" % (float(header["beam_center_x"]),
+                                                       float(header["beam_center_y"])))
+    lines.append("# Start_angle %.4f deg." % get_start_angle(header, image_number))
+    lines.append("# Angle_increment %.4f deg." % float(header.get("omega_increment",
+                                                                  header.get("omega_range_average", 0.0))))
+    two_theta = header.get("two_theta_start", header.get("two_theta"))
+    if two_theta is not None:
+        if numpy.ndim(two_theta):
+            two_theta = two_theta[0] if len(two_theta) else 0.0
+        lines.append("# Detector_2theta %.4f deg." % float(two_theta))
+
+    return "\r\n".join(lines)
+
+def write_minicbf(path, data, header_contents):
+    """Write a 2D array of counts to a miniCBF file"""
+
+    # Pixels flagged with the largest unsigned value are -1 in the CBF
+    if data.dtype.kind == "u":
+        flagged = data == numpy.iinfo(data.dtype).max
+        data = data.astype(numpy.int32)
+        data[flagged] = -1
+    else:
+        data = data.astype(numpy.int32)
+
+    binary = compress_byte_offset(data)
+    name = os.path.basename(path).replace(".cbf", "")
+
+    text = "\r\n".join((
+        "###CBF: VERSION 1.5, CBFlib v0.7.8 - SLS/DECTRIS PILATUS detectors",
+        "",
+        "data_%s" % name,
+        "",
+        "_array_data.header_convention \"PILATUS_1.2\"",
+        "_array_data.header_contents",
+        ";",
+        header_contents,
+        ";",
+        "",
+        "_array_data.data",
+        ";",
+        "--CIF-BINARY-FORMAT-SECTION--",
+        "Content-Type: application/octet-stream;",
+        "     conversions=\"x-CBF_BYTE_OFFSET\"",
+        "Content-Transfer-Encoding: BINARY",
+        "X-Binary-Size: %d" % len(binary),
+        "X-Binary-ID: 1",
+        "X-Binary-Element-Type: \"signed 32-bit integer\"",
+        "X-Binary-Element-Byte-Order: LITTLE_ENDIAN",
+        "Content-MD5: %s" % base64.b64encode(hashlib.md5(binary).digest()),
+        "X-Binary-Number-of-Elements: %d" % data.size,
+        "X-Binary-Size-Fastest-Dimension: %d" % data.shape[1],
+        "X-Binary-Size-Second-Dimension: %d" % data.shape[0],
+        "X-Binary-Size-Padding: 4095",
+        "",
+        ""))
+
+    # Write to a temporary name so a partial file is never taken as converted
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as output_object:
+        output_object.write(text)
+        output_object.write("\x0c\x1a\x04\xd5")
+        output_object.write(binary)
+        output_object.write("\x00" * 4095)
+        output_object.write("\r\n--CIF-BINARY-FORMAT-SECTION----\r\n;\r\n\r\n")
+    os.rename(temporary_path, path)
+
+def read_dataset_layout(master_file):
+    """
+    Return (header, data_files) for an HDF5 master file
+
+    header -- dict of master file header values
+    data_files -- list of (first image number, last image number, file name,
+                  dataset path) in image number order
+    """
+
+    header = hdf5_header.read_header(master_file)
+
+    with h5py.File(master_file, "r") as h5_file:
+        header["description"] = hdf5_header.get_model(h5_file)
+        data_links = hdf5_header.get_data_links(h5_file)
+
+    data_files = []
+    next_image = 1
+    for file_name, dataset_path in data_links:
+        first, last = hdf5_header.get_image_numbers(file_name, dataset_path, next_image)
+        data_files.append((first, last, file_name, dataset_path))
+        next_image = last + 1
+
+    return header, data_files
+
+def convert_frames(task):
+    """
+    Convert frames from one data file, returning the files written
+
+    Keyword arguments
+    task -- (file name, dataset path, [(index in dataset, output path, header contents), ...])
+    """
+
+    file_name, dataset_path, frames = task
+
+    written = []
+    with h5py.File(file_name, "r") as h5_file:
+        dataset = h5_file[dataset_path]
+        for index, output_path, header_contents in frames:
+            write_minicbf(output_path, dataset[index], header_contents)
+            written.append(output_path)
+
+    return written
+
 class hdf5_to_cbf_converter(object):
 
     output_images = []
@@ -79,11 +279,13 @@ class hdf5_to_cbf_converter(object):
                  nproc=False,
                  overwrite=False,
                  verbose=False,
+                 native=True,
                  #logger=False
                  ):
         """
-        Run eiger2cbf on HDF5 dataset. Returns path of new CBF files.
-        Not sure I need multiprocessing.Pool, but used as saftety.
+        Convert HDF5 dataset to CBF files. Returns path of new CBF files.
+        Frames are read with h5py and written in a process pool, or
+        eiger2cbf is run if h5py is not available.
 
         master_file -- master file of data to be converted to cbf
         output_dir -- output directory
@@ -92,6 +294,7 @@ class hdf5_to_cbf_converter(object):
         wedge_range -- separation in oscillation axis between 2 images
         nproc -- number of processors to use
         overwrite -- overwrite files already present
+        native -- convert with h5py instead of eiger2cbf when possible
         returns header
         """
 
@@ -112,6 +315,7 @@ class hdf5_to_cbf_converter(object):
             self.user_overwrite = overwrite
             self.overwrite = True
         self.verbose = verbose
+        self.native = native and h5py is not None
         #self.logger = logger
 
         # Clear out output images on init
@@ -146,6 +350,8 @@ class hdf5_to_cbf_converter(object):
             self.nproc = multiprocessing.cpu_count() - 1
 
         # Calculate total number of images in dataset
+        if self.native:
+            self.header, self.data_files = read_dataset_layout(self.master_file)
         self.total_nimages = self.get_number_of_images()
 
         # Check image range for string parsing
@@ -182,6 +388,9 @@ class hdf5_to_cbf_converter(object):
         if self.verbose:
             print "Converting images %d - %d" % (start_image, end_image)
 
+        if self.native:
+            return self.convert_images_native(start_image, end_image)
+
         # The base eiger2cbf command
         command0 = "eiger2cbf %s" % self.master_file
 
@@ -249,6 +458,54 @@ class hdf5_to_cbf_converter(object):
             self.output_images.extend(self.make_image_list(start_image, end_image))
         self.output_images.sort()
 
+    def convert_images_native(self, start_image, end_image):
+        """Convert the images with h5py, spreading frames over a process pool"""
+
+        # Renumber image in pair so root name is same for Labelit.
+        if start_image == end_image and self.renumber_image:
+            output_images = ["%s_%06d.cbf" % (os.path.join(self.output_dir, self.prefix), self.renumber_image)]
+        else:
+            output_images = self.make_image_list(start_image, end_image)
+
+        # First of a pair - find the second image from the oscillation
+        if start_image == end_image and self.wedge_range and len(self.output_images) == 0:
+            self.second_image_number = self.second_image_from_delta(start_image,
+                                                                    self.get_delta_omega())
+
+        # Split the frames into tasks that each read one data file
+        tasks = []
+        for first, last, file_name, dataset_path in self.data_files:
+            frames = []
+            for image_number, output_path in zip(range(start_image, end_image+1), output_images):
+                if first <= image_number <= last:
+                    frames.append((image_number - first,
+                                   output_path,
+                                   format_minicbf_header(self.header, image_number)))
+            for index in range(0, len(frames), FRAMES_PER_TASK):
+                tasks.append((file_name, dataset_path, frames[index:index+FRAMES_PER_TASK]))
+
+        if self.nproc == 1 or len(tasks) < 2:
+            for task in tasks:
+                convert_frames(task)
+        else:
+            pool = multiprocessing.Pool(processes=min(self.nproc, len(tasks)))
+            try:
+                pool.map(convert_frames, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+        self.output_images.extend(output_images)
+        self.output_images.sort()
+
+    def get_delta_omega(self):
+        """Return the oscillation per image from the master file header"""
+
+        for key in ("omega_range_average", "omega_increment"):
+            if self.header.get(key) is not None:
+                return float(self.header[key])
+        return False
+
     def make_image_list(self, start, end):
         """Passback list with image file names"""
         l = []
@@ -267,6 +524,10 @@ class hdf5_to_cbf_converter(object):
         for line in stderr.split("\n"):
             if line.count('omega_range_average'):
                 delta_omega = float(line.split()[-2])
+        return self.second_image_from_delta(first_image_number, delta_omega)
+
+    def second_image_from_delta(self, first_image_number, delta_omega):
+        """Return the second image number wedge_range from the first, or False"""
         if delta_omega:
             # Calculate second image number 
             second_image_number = int(round(first_image_number + float(self.wedge_range) / delta_omega))
@@ -298,6 +559,14 @@ class hdf5_to_cbf_converter(object):
 
     def get_number_of_images(self):
         """Query the master file for the number of images in the data set"""
+        if self.native:
+            if self.header.get("nimages") is not None:
+                number_of_images = int(self.header["nimages"]) * int(self.header.get("ntrigger", 1))
+            else:
+                number_of_images = self.data_files[-1][1] if self.data_files else 0
+            if self.verbose:
+                print "Number of images: %d" % number_of_images
+            return number_of_images
         stdout, stderr = run_process(("eiger2cbf %s" % self.master_file, self.verbose), output=True)
         #number_of_images = int(stdout.split("\n")[-2])
         number_of_images = int(stdout.split("\n")[-2])
@@ -400,6 +669,12 @@ def get_commandline():
                         help="""Overwrite -- default to overwriting cbf files that already exist.
                         Default bahavior is to only convert files which do not already exist""")
 
+    # Use eiger2cbf
+    parser.add_argument("--eiger2cbf",
+                        action="store_false",
+                        dest="native",
+                        help="Convert with eiger2cbf instead of reading the HDF5 files directly")
+
     # Multiprocessing capabilities
     parser.add_argument("--nproc",
                         action="store",
@@ -0,0 +1,173 @@
+"""
+Waiting for frames of a run to be collected
+
+Control keeps place_in_run:<site_tag> up to date as images come in. It also
+keeps place_in_run:<site_tag>:<run_id> for each run and publishes each new
+place in run on a channel of the same name, so a plugin waiting for a frame
+blocks on the channel instead of polling. The key is read when waiting
+starts and at intervals after, in case a message is missed.
+
+Without control, FrameScanner follows the files of a run on disk, only
+looking at the frames after the last one it has seen.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import glob
+import os
+import re
+import time
+
+# Seconds before the place in run key is read again while waiting
+CHECK_INTERVAL = 10.0
+# Seconds the place in run key for a run is kept
+RUN_KEY_EXPIRE = 86400
+
+def site_key(site_tag):
+    """Return the key holding the place in run of the latest image for a site"""
+    return "place_in_run:%s" % site_tag
+
+def run_channel(site_tag, run_id):
+    """Return the key and channel for the place in run of a run"""
+    return "place_in_run:%s:%s" % (site_tag, run_id)
+
+def publish_place_in_run(redis, site_tag, run_id, place_in_run):
+    """
+    Record a new place in run for the site and run, and publish it to anyone
+    waiting on the run
+
+    Keyword arguments
+    redis -- database.redis_adapter.Database instance
+    site_tag -- site tag of the image
+    run_id -- run the image is in
+    place_in_run -- image number in the run
+    """
+
+    channel = run_channel(site_tag, run_id)
+    redis.set_publish(keys=(site_key(site_tag), channel),
+                      value=str(place_in_run),
+                      channel=channel,
+                      expire_time={channel:RUN_KEY_EXPIRE})
+
+class FrameWaiter(object):
+    """Blocks until a run gets to a place, woken by control publishing it"""
+
+    def __init__(self, redis, site_tag, run_id):
+        """
+        Keyword arguments
+        redis -- database.redis_adapter.Database instance
+        site_tag -- site tag of the run
+        run_id -- run to follow
+        """
+
+        self.redis = redis
+        self.key = run_channel(site_tag, run_id)
+        self.last = 0
+
+        # Subscribe before reading the key so nothing published between is lost
+        self.pubsub_id = redis.subscribe(channel=self.key)
+
+    def current(self):
+        """Return the latest place in run recorded"""
+
+        value = self.redis.get(self.key)
+        if value is not None:
+            self.last = max(self.last, int(value))
+        return self.last
+
+    def wait(self, place_in_run, max_time, tick=None):
+        """
+        Return True once the run gets to place_in_run, or False if it has not
+        after max_time seconds
+
+        tick is called each time a message or check interval passes
+        """
+
+        deadline = time.time() + max_time
+        if self.current() >= place_in_run:
+            return True
+
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+
+            message = self.redis.get_message(self.pubsub_id,
+                                             timeout=min(remaining, CHECK_INTERVAL))
+            if message and message.get("type") == "message":
+                self.last = max(self.last, int(message["data"]))
+            elif not message:
+                self.current()
+
+            if tick:
+                tick()
+
+            if self.last >= place_in_run:
+                return True
+
+class FrameScanner(object):
+    """The frames of a run on disk, looking only past the last frame seen"""
+
+    def __init__(self, directory, image_template):
+        """
+        Keyword arguments
+        directory -- directory of the images
+        image_template -- image file name with ? in place of the image number
+        """
+
+        self.template = os.path.join(directory, image_template)
+        self.pattern = re.compile(".*" + re.sub(r"\?+", "([0-9]+)", re.escape(image_template)
+                                                .replace("\\?", "?")))
+        self.name_format = re.sub(r"\?+",
+                                  "%%0%dd" % image_template.count("?"),
+                                  self.template.replace("%", "%%"))
+        self.first = 0
+        self.last = 0
+
+    def get_image_path(self, image_number):
+        """Return the file name for an image number"""
+        return self.name_format % image_number
+
+    def scan(self):
+        """Return (first, last) image numbers of the frames on disk, or (0, 0)"""
+
+        # Find where the run starts once
+        if not self.first:
+            numbers = []
+            for path in glob.glob(self.template.replace("?", "[0-9]")):
+                match = self.pattern.match(path)
+                if match:
+                    numbers.append(int(match.group(1)))
+            if not numbers:
+                return 0, 0
+            self.first = min(numbers)
+            self.last = max(numbers)
+
+        # Then only look for the frames after the last one seen
+        while os.path.isfile(self.get_image_path(self.last + 1)):
+            self.last += 1
+
+        return self.first, self.last
@@ -51,7 +51,14 @@ __status__ = "Development"
 
 # Caches for data
 CIF_CACHE = "/tmp/rapd_cache/cif_files"
+# True where CIF_CACHE is on a filesystem every cluster node mounts, so jobs
+# symlink to the cached files instead of taking their own copies
+CIF_CACHE_SHARED = False
 TEST_CACHE = "/tmp/rapd_cache/test_data"
+DISTL_CACHE = "/tmp/rapd_cache/distl"
+
+# Local index of the unit cells in the PDB, built by utils/cell_index.py
+CELL_INDEX = "/tmp/rapd_cache/cell_index.npz"
 
 # NE-CAT PDBQ Server
 # tries in order
@@ -64,6 +71,8 @@ PDBQ_SERVER = ["https://rapd2.nec.aps.anl.gov/pdbq",
 # Timeout for phaser MR process
 PHASER_TIMEOUT = 2000
 #PHASER_TIMEOUT = 10
+# Most Phaser jobs of a structure screen on a computer cluster at once
+PHASER_CLUSTER_JOBS = 16
 
 # Time outs for Autointdex+strategies.
 LABELIT_TIMEOUT = 120
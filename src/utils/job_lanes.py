@@ -0,0 +1,283 @@
+"""
+Priority lanes for the RAPD job lists
+
+Each lane of a job list is its own redis list. The default lane is the job
+list itself, so anything pushed onto the plain list (older clients, requeued
+jobs) is still picked up. Lanes are configured in
+site.LAUNCHER_SETTINGS["JOB_LANES"], for example:
+
+JOB_LANES = {
+    "LANES":("interactive", "collection", "reprocess"),
+    "DEFAULT_LANE":"collection",
+    "COMMANDS":{"INDEX":"interactive", "INTEGRATE":"collection"},
+    "POLICY":"strict",
+    "WEIGHTS":{"interactive":6, "collection":3, "reprocess":1},
+}
+
+With the "strict" policy a job is always taken from the first lane that has
+one. With "weighted" dequeues are shared between the lanes in proportion to
+their weights, falling through to the other lanes when the chosen one is empty.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import time
+
+from utils.text import json
+
+DEFAULT_LANE = "default"
+
+class JobLanes(object):
+    """
+    Pushes jobs onto, and takes jobs off, the lanes of a job list
+    """
+
+    def __init__(self, settings=None):
+        """
+        Set up the lanes
+
+        Keyword arguments
+        settings -- the JOB_LANES dict from the site LAUNCHER_SETTINGS, None
+                    for a single lane (default = None)
+        """
+
+        if not settings:
+            settings = {}
+
+        self.lanes = tuple(settings.get("LANES", (DEFAULT_LANE,)))
+        self.default_lane = settings.get("DEFAULT_LANE", self.lanes[-1])
+        self.commands = dict((command.upper(), lane) for command, lane
+                             in settings.get("COMMANDS", {}).iteritems())
+        self.policy = settings.get("POLICY", "strict")
+        weights = settings.get("WEIGHTS", {})
+        self.weights = dict((lane, max(1, int(weights.get(lane, 1)))) for lane in self.lanes)
+
+        # Credits for the smooth weighted round robin
+        self.credits = dict((lane, 0) for lane in self.lanes)
+
+        if self.default_lane not in self.lanes:
+            raise ValueError("DEFAULT_LANE %s is not in LANES" % self.default_lane)
+        if self.policy not in ("strict", "weighted"):
+            raise ValueError("Unknown job lane POLICY %s" % self.policy)
+
+    def lane(self, command):
+        """Return the lane for a command dict"""
+
+        # A lane chosen upstream is kept
+        lane = command.get("process", {}).get("lane")
+        if lane in self.lanes:
+            return lane
+
+        return self.commands.get(command.get("command", "").upper(), self.default_lane)
+
+    def key(self, job_list, lane):
+        """Return the redis list for a lane of job_list"""
+
+        if lane == self.default_lane:
+            return job_list
+        return "%s:%s" % (job_list, lane)
+
+    @staticmethod
+    def signal_key(job_list):
+        """Return the list that wakes consumers of job_list"""
+        return job_list+":signal"
+
+    @staticmethod
+    def stats_key(job_list):
+        """Return the hash holding wait times for job_list"""
+        return job_list+":lane_stats"
+
+    def order(self):
+        """Return the lanes in the order they should be tried for the next job"""
+
+        if self.policy == "weighted":
+            return sorted(self.lanes,
+                          key=lambda lane: (-(self.credits[lane] + self.weights[lane]),
+                                            self.lanes.index(lane)))
+        return self.lanes
+
+    def served(self, lane):
+        """Update the weighted round robin after a job is taken from lane"""
+
+        if self.policy == "weighted":
+            total = sum(self.weights.values())
+            for name in self.lanes:
+                # Bounded so a long-empty lane cannot save up a burst
+                self.credits[name] = min(total, self.credits[name] + self.weights[name])
+            self.credits[lane] -= total
+
+    def push(self, redis, job_list, command):
+        """
+        Stamp a command with its lane and queue time and push it
+
+        Keyword arguments
+        redis -- database.redis_adapter.Database instance
+        job_list -- the job list, such as RAPD_JOBS
+        command -- command dict, modified in place
+        """
+
+        lane = self.lane(command)
+
+        if not command.get("process"):
+            command["process"] = {}
+        command["process"]["lane"] = lane
+        command["process"]["queued_time"] = time.time()
+
+        if len(self.lanes) > 1:
+            redis.lpush_notify(self.key(job_list, lane),
+                               json.dumps(command),
+                               self.signal_key(job_list))
+        else:
+            redis.lpush(self.key(job_list, lane), json.dumps(command))
+
+        return lane
+
+    def requeue(self, redis, job_list, raw_command):
+        """
+        Put a job that was taken but never run back at the front of its
+        lane of job_list, keeping its lane and queue time, and return the lane
+
+        Keyword arguments
+        redis -- database.redis_adapter.Database instance
+        job_list -- the job list, such as RAPD_JOBS
+        raw_command -- the job as it was taken off the list
+        """
+
+        try:
+            lane = self.lane(json.loads(raw_command))
+        except (TypeError, ValueError, AttributeError):
+            lane = self.default_lane
+
+        if len(self.lanes) > 1:
+            redis.rpush_notify(self.key(job_list, lane),
+                               raw_command,
+                               self.signal_key(job_list))
+        else:
+            redis.rpush(self.key(job_list, lane), raw_command)
+
+        return lane
+
+    def requeue_list(self, redis, source, job_list):
+        """
+        Requeue every job held on the plain list source onto the lanes of
+        job_list, returning the number of jobs requeued
+        """
+
+        count = 0
+        while True:
+            raw_command = redis.rpop(source)
+            if raw_command is None:
+                return count
+            self.requeue(redis, job_list, raw_command)
+            count += 1
+
+    def pop(self, redis, job_list, target, timeout):
+        """
+        Move the next job from the lanes of job_list onto target and return
+        (raw_command, lane), or (None, None) if nothing arrives within timeout
+
+        Keyword arguments
+        redis -- database.redis_adapter.Database instance
+        job_list -- the job list, such as RAPD_JOBS
+        target -- list holding the job until it has been dealt with
+        timeout -- seconds to block waiting for a job
+        """
+
+        # One lane, so redis can block on it directly
+        if len(self.lanes) == 1:
+            raw_command = redis.brpoplpush(job_list, target, timeout)
+            if raw_command:
+                return raw_command, self.lanes[0]
+            return None, None
+
+        # Check the lanes, and if all are empty wait for a push and look again
+        for attempt in (0, 1):
+            for lane in self.order():
+                raw_command = redis.rpoplpush(self.key(job_list, lane), target)
+                if raw_command:
+                    self.served(lane)
+                    # Keep the signal list about as long as the queue
+                    redis.rpop(self.signal_key(job_list))
+                    return raw_command, lane
+            if attempt == 0 and not redis.brpop([self.signal_key(job_list)], timeout):
+                break
+
+        return None, None
+
+    def record(self, redis, job_list, lane, command):
+        """
+        Record how long a command waited in its lane, returning the wait
+
+        Keyword arguments
+        redis -- database.redis_adapter.Database instance
+        job_list -- the job list the command was taken from
+        lane -- the lane the command was taken from
+        command -- decoded command
+        """
+
+        queued_time = command.get("process", {}).get("queued_time")
+        if not queued_time:
+            return None
+
+        wait = max(0.0, time.time() - queued_time)
+        redis.record_wait(self.stats_key(job_list), lane, wait)
+        return wait
+
+    def move(self, redis, source, target):
+        """
+        Move every job from the lanes of source onto the same lanes of
+        target, returning the number of jobs moved
+        """
+
+        count = 0
+        for lane in self.lanes:
+            while redis.rpoplpush(self.key(source, lane), self.key(target, lane)):
+                count += 1
+
+        # Wake the consumers of target for the jobs moved
+        if count and len(self.lanes) > 1:
+            redis.notify(self.signal_key(target), count)
+        return count
+
+    def stats(self, redis, job_list):
+        """
+        Return the depth and wait times of each lane of job_list
+
+        {lane:{"depth":jobs waiting, "count":jobs taken,
+               "wait_mean":mean seconds waited, "wait_last":seconds the last job waited}}
+        """
+
+        recorded = redis.hgetall(self.stats_key(job_list)) or {}
+
+        stats = {}
+        for lane in self.lanes:
+            count = int(recorded.get(lane+":count", 0))
+            total = float(recorded.get(lane+":wait_total", 0))
+            stats[lane] = {"depth":redis.llen(self.key(job_list, lane)),
+                           "count":count,
+                           "wait_mean":(total / count if count else 0.0),
+                           "wait_last":float(recorded.get(lane+":wait_last", 0))}
+        return stats
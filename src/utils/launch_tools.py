@@ -31,6 +31,7 @@ import os
 import stat
 import tempfile
 
+from utils.job_lanes import JobLanes
 from utils.text import json
 from bson.objectid import ObjectId
 
@@ -88,7 +89,7 @@ def write_command_script(target_file, command_line, shell="/bin/tcsh"):
 
     return target_file
 
-def get_site_tag(message, default_site):
+def get_site_tag(message, default_site=False):
     """Find and return the site_tag from the image header"""
     # Find site_tag from SNAP
     site_tag = False
@@ -129,3 +130,55 @@ def fix_command(message):
     message["directories"]["work"] = work_dir_candidate
 
     return message
+
+def in_flight_keys(job_list):
+    """
+    Return the redis keys tracking jobs a launcher has taken but whose plugin
+    has not started yet
+
+    The list receives jobs atomically from BRPOPLPUSH and the hash holds them,
+    keyed by dispatch id, until the plugin acknowledges them.
+    """
+    return job_list+":in_flight", job_list+":in_flight_jobs"
+
+def acknowledge_command(command, redis):
+    """
+    Tell the launcher that the plugin for command has started so the job is
+    no longer requeued if the launcher goes offline
+
+    Keyword arguments
+    command -- command dict as passed to the plugin
+    redis -- database.redis_adapter.Database instance
+    """
+    ack = command.get("process", {}).get("launcher_ack")
+    if ack:
+        redis.hdel(ack["key"], ack["id"])
+        return True
+    return False
+
+def requeue_in_flight(redis, job_list, target="RAPD_JOBS", job_lanes=None):
+    """
+    Push jobs taken by a launcher but never acknowledged back onto the lanes
+    of target they came from. Returns the number of jobs requeued.
+
+    Keyword arguments
+    redis -- database.redis_adapter.Database instance
+    job_list -- the launcher job list
+    target -- list to requeue onto (default = "RAPD_JOBS")
+    job_lanes -- utils.job_lanes.JobLanes of target, a single lane if None
+    """
+    if not job_lanes:
+        job_lanes = JobLanes()
+
+    in_flight_list, in_flight_jobs = in_flight_keys(job_list)
+
+    # Popped but never moved into the hash
+    count = job_lanes.requeue_list(redis, in_flight_list, target)
+
+    # Waiting on the plugin to start
+    for job_id, raw_command in redis.hgetall(in_flight_jobs).iteritems():
+        job_lanes.requeue(redis, target, raw_command)
+        redis.hdel(in_flight_jobs, job_id)
+        count += 1
+
+    return count
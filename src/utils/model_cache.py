@@ -0,0 +1,411 @@
+"""
+A cache of structure files shared by the jobs on a site
+
+Search models such as lysozyme, thaumatin and trypsin are wanted by many
+pdbquery, mr and analysis jobs. The first job to want one downloads it into
+the cache and the rest link to it from their working directory. The files
+of each chain written out by get_pdb_info are kept too, so they are linked
+in instead of being split out again.
+
+Links are symlinks only where the cache is shared by every node, as set by
+rglobals.CIF_CACHE_SHARED. Otherwise the default cache in /tmp is local to
+the node, so jobs get a hard link or a copy that Phaser runs on other nodes
+can read.
+
+Layout of the cache directory
+    objects/ab/<sha1>.cif   structure files, named by the hash of their contents
+    chains/<sha1>/<id>.cif  files of the chains of a structure
+    codes/<PDB code>        hash of the file for a PDB code, touched on each use
+    prep/ab/<key>.json      model preparation results, see prep_key
+    locks/                  fcntl locks held while a file is fetched
+
+Files are written beside their final name and renamed into place, so a
+partly written file is never seen. Once the cache is bigger than its limit,
+the PDB codes used longest ago are dropped, except those used recently
+enough that a job may still be reading them.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+from contextlib import contextmanager
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# RAPD imports
+import utils.global_vars as rglobals
+
+# Bytes the cache may hold before the least recently used files are dropped
+MAX_BYTES = 2 * 1024 ** 3
+
+# Seconds since last use before a file may be dropped, so jobs still
+# reading through their links are not left without it
+MIN_AGE = 6 * 3600
+
+# Bytes read at a time when hashing files
+CHUNK_SIZE = 1024 * 1024
+
+# Angstroms data resolution is binned to for model preparation results
+RESOLUTION_BIN = 0.1
+
+def makedirs(directory):
+    """Make a directory, if it is not there already"""
+    try:
+        os.makedirs(directory)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+def hash_file(path):
+    """Return the sha1 of the contents of a file"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link(source, dest, shared=True):
+    """
+    Link dest to source, replacing whatever is at dest. A source not shared
+    with other nodes is hard linked, or copied if on another filesystem.
+    """
+    if os.path.lexists(dest):
+        os.unlink(dest)
+    if shared:
+        os.symlink(source, dest)
+        return
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+class ModelCache(object):
+    """Structure files and their chains, shared through a directory"""
+
+    def __init__(self, directory=None, max_bytes=None, min_age=None, shared=None):
+        """
+        Keyword arguments
+        directory -- the cache directory, rglobals.CIF_CACHE if not given
+        max_bytes -- size the cache is kept to, MAX_BYTES if not given
+        min_age -- seconds since last use before a file may be dropped, MIN_AGE if not given
+        shared -- the directory is seen by every node, rglobals.CIF_CACHE_SHARED if not given
+        """
+
+        self.directory = os.path.abspath(directory or rglobals.CIF_CACHE)
+        self.shared = rglobals.CIF_CACHE_SHARED if shared is None else shared
+        self.max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+        self.min_age = MIN_AGE if min_age is None else min_age
+
+        self.objects_dir = os.path.join(self.directory, "objects")
+        self.chains_dir = os.path.join(self.directory, "chains")
+        self.codes_dir = os.path.join(self.directory, "codes")
+        self.prep_dir = os.path.join(self.directory, "prep")
+        self.locks_dir = os.path.join(self.directory, "locks")
+        for directory in (self.objects_dir,
+                          self.chains_dir,
+                          self.codes_dir,
+                          self.prep_dir,
+                          self.locks_dir):
+            makedirs(directory)
+
+    @contextmanager
+    def locked(self, name):
+        """Hold the lock of a name while in the block"""
+
+        with open(os.path.join(self.locks_dir, "%s.lock" % name), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write_atomic(self, path, contents):
+        """Write a small file all at once"""
+
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as temp_file:
+            temp_file.write(contents)
+        os.rename(temp_file.name, path)
+
+    def get_object_path(self, digest):
+        """Return the path of the structure file with a hash"""
+        return os.path.join(self.objects_dir, digest[:2], "%s.cif" % digest)
+
+    def get_digest(self, path):
+        """Return the hash of a file in the cache, linked to from path, or None"""
+
+        real_path = os.path.realpath(path)
+        if os.path.dirname(os.path.dirname(real_path)) == self.objects_dir:
+            return os.path.splitext(os.path.basename(real_path))[0]
+
+        # Hard linked or copied
+        try:
+            digest = hash_file(path)
+        except IOError:
+            return None
+        if os.path.isfile(self.get_object_path(digest)):
+            return digest
+        return None
+
+    def lookup(self, pdb_code):
+        """Return the cached file for a PDB code, marking it used, or None"""
+
+        code_file = os.path.join(self.codes_dir, pdb_code.upper())
+        try:
+            with open(code_file, "r") as in_file:
+                digest = in_file.read().strip()
+        except IOError:
+            return None
+
+        object_path = self.get_object_path(digest)
+        if not os.path.isfile(object_path):
+            return None
+        try:
+            os.utime(code_file, None)
+        except OSError:
+            pass
+        return object_path
+
+    def store(self, pdb_code, path):
+        """Move a structure file into the cache for a PDB code and return its new path"""
+
+        digest = hash_file(path)
+        object_path = self.get_object_path(digest)
+        makedirs(os.path.dirname(object_path))
+        if os.path.isfile(object_path):
+            os.unlink(path)
+        else:
+            os.chmod(path, 0o644)
+            os.rename(path, object_path)
+        self.write_atomic(os.path.join(self.codes_dir, pdb_code.upper()), digest)
+        return object_path
+
+    def fetch(self, pdb_code, dest, download):
+        """
+        Link dest to the structure file for a PDB code, downloading it into
+        the cache first if it is not there. Returns dest, or False if it
+        could not be downloaded.
+
+        pdb_code -- PDB code of the structure
+        dest -- where the structure file is wanted
+        download -- function(pdb_code, fname) writing the file to fname and
+                    returning fname or False, as the repositories' download_cif
+        """
+
+        object_path = self.lookup(pdb_code)
+        if not object_path:
+            # One job downloads while any others wait for it
+            with self.locked(pdb_code.upper()):
+                object_path = self.lookup(pdb_code)
+                if not object_path:
+                    temp_dir = tempfile.mkdtemp(dir=self.directory)
+                    try:
+                        fname = download(pdb_code,
+                                         os.path.join(temp_dir, os.path.basename(dest)))
+                        if not fname or not os.path.isfile(fname):
+                            return False
+                        object_path = self.store(pdb_code, fname)
+                    finally:
+                        shutil.rmtree(temp_dir, ignore_errors=True)
+            self.evict()
+
+        link(object_path, dest, self.shared)
+        return dest
+
+    def get_chains(self, struct_file):
+        """Return {chain id: file} for a structure in the cache, empty if none are kept"""
+
+        digest = self.get_digest(struct_file)
+        if not digest:
+            return {}
+        chain_dir = os.path.join(self.chains_dir, digest)
+        if not os.path.isdir(chain_dir):
+            return {}
+        return dict((os.path.splitext(name)[0], os.path.join(chain_dir, name))
+                    for name in os.listdir(chain_dir) if name.endswith(".cif"))
+
+    def put_chains(self, struct_file, chain_files):
+        """
+        Keep the chain files {chain id: file} written from a structure in
+        the cache, if the structure is in the cache and its chains are not
+        kept already
+        """
+
+        digest = self.get_digest(struct_file)
+        if not digest or not chain_files:
+            return
+        chain_dir = os.path.join(self.chains_dir, digest)
+        if os.path.isdir(chain_dir):
+            return
+
+        # Fill beside and rename so the chains appear all at once
+        temp_dir = tempfile.mkdtemp(dir=self.chains_dir)
+        try:
+            for chain_id, chain_file in chain_files.items():
+                shutil.copyfile(chain_file, os.path.join(temp_dir, "%s.cif" % chain_id))
+            os.chmod(temp_dir, 0o755)
+            os.rename(temp_dir, chain_dir)
+        except OSError:
+            # Kept by another job in the meantime
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def link_chains(self, struct_file, chain_names):
+        """
+        Link the kept chains of a structure in the cache to {chain id: path}.
+        Returns the chain ids linked.
+        """
+
+        chains = self.get_chains(struct_file)
+        linked = []
+        for chain_id, path in chain_names.items():
+            if chain_id in chains:
+                link(chains[chain_id], path, self.shared)
+                linked.append(chain_id)
+        return linked
+
+    def prep_key(self, struct_file, spacegroup, cell, dres, **options):
+        """
+        Return the key of the preparation results of a model for data with
+        a spacegroup, cell and resolution. Cells are rounded to 0.1 and
+        resolutions binned to RESOLUTION_BIN. options, such as whether
+        chains are split, are part of the key.
+        """
+
+        parts = [hash_file(struct_file),
+                 str(spacegroup).replace(" ", "").upper(),
+                 ",".join("%.1f" % float(value) for value in cell),
+                 "%.2f" % (round(float(dres) / RESOLUTION_BIN) * RESOLUTION_BIN)]
+        parts.extend("%s=%s" % (name, options[name]) for name in sorted(options))
+        return hashlib.sha1(":".join(parts)).hexdigest()
+
+    def get_prep_path(self, key):
+        """Return the file for the preparation results with a key"""
+        return os.path.join(self.prep_dir, key[:2], "%s.json" % key)
+
+    def get_prep(self, key):
+        """Return the preparation results kept for a key, or None"""
+
+        try:
+            with open(self.get_prep_path(key), "r") as in_file:
+                return json.load(in_file)
+        except (IOError, ValueError):
+            return None
+
+    def put_prep(self, key, results):
+        """Keep preparation results for a key"""
+
+        path = self.get_prep_path(key)
+        makedirs(os.path.dirname(path))
+        self.write_atomic(path, json.dumps(results))
+
+    def size(self):
+        """Return the bytes held in the cache"""
+
+        total = 0
+        for directory in (self.objects_dir, self.chains_dir):
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+        return total
+
+    def evict(self):
+        """Drop the PDB codes used longest ago until the cache fits its limit"""
+
+        with self.locked("evict"):
+            # Left by jobs that died while downloading
+            now = time.time()
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.startswith("tmp") and os.path.isdir(path) and \
+                   now - os.path.getmtime(path) > self.min_age:
+                    shutil.rmtree(path, ignore_errors=True)
+
+            total = self.size()
+            if total <= self.max_bytes:
+                return
+
+            codes = []
+            digest_codes = {}
+            for pdb_code in os.listdir(self.codes_dir):
+                code_file = os.path.join(self.codes_dir, pdb_code)
+                try:
+                    with open(code_file, "r") as in_file:
+                        digest = in_file.read().strip()
+                    used = os.path.getmtime(code_file)
+                except (IOError, OSError):
+                    continue
+                codes.append((used, pdb_code, digest))
+                digest_codes[digest] = digest_codes.get(digest, 0) + 1
+
+            for used, pdb_code, digest in sorted(codes):
+                if total <= self.max_bytes or now - used < self.min_age:
+                    break
+                with self.locked(pdb_code):
+                    os.unlink(os.path.join(self.codes_dir, pdb_code))
+                    digest_codes[digest] -= 1
+                    # Other codes may have the same file
+                    if digest_codes[digest]:
+                        continue
+                    object_path = self.get_object_path(digest)
+                    chain_dir = os.path.join(self.chains_dir, digest)
+                    for path in [object_path] + \
+                        ([os.path.join(chain_dir, name) for name in os.listdir(chain_dir)]
+                         if os.path.isdir(chain_dir) else []):
+                        try:
+                            total -= os.path.getsize(path)
+                        except OSError:
+                            pass
+                    if os.path.isfile(object_path):
+                        os.unlink(object_path)
+                    shutil.rmtree(chain_dir, ignore_errors=True)
+
+def get_model_cache(directory=None):
+    """Return the ModelCache of the site, or None if the directory cannot be used"""
+
+    try:
+        return ModelCache(directory)
+    except OSError:
+        return None
+
+def fetch_model(repository, pdb_code, dest, model_cache=None):
+    """
+    Get the mmCIF file for a PDB code to dest through the model cache,
+    falling back to downloading it straight there without one. Returns
+    dest, or False if it could not be had.
+    """
+
+    if model_cache is None:
+        model_cache = get_model_cache()
+    if model_cache:
+        return model_cache.fetch(pdb_code, dest, repository.download_cif)
+    return repository.download_cif(pdb_code, dest)
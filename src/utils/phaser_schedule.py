@@ -0,0 +1,98 @@
+"""
+Ordering the Phaser jobs of a structure screen
+
+Each candidate structure gets a cost, the residues searched for times the
+reflections used, raised the further its cell is from that of the data.
+The resolution comes from the eLLG target of the model, so models expected
+to place easily run at lower resolution and come first. Candidates wait in
+a PhaserSchedule until a slot is free and the cheapest is launched next.
+
+Once a job returns a solution above the TFZ and LLG thresholds of
+is_confident the rest of the screen can be cancelled.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import heapq
+import itertools
+
+# Solutions at or above both are taken as right
+CONFIDENT_TFZ = 8.0
+CONFIDENT_LLG = 120.0
+
+# Relative cell deviation that doubles the cost of a candidate
+CELL_DEVIATION_SCALE = 0.05
+
+def phaser_cost(n_res, ncopy=1, resolution=3.0, cell_deviation=0.0):
+    """
+    Return the relative cost of a Phaser run
+
+    n_res -- residues in the search model
+    ncopy -- copies searched for
+    resolution -- high resolution limit of the run
+    cell_deviation -- relative deviation of the cell of the model from the data
+    """
+
+    reflections = 1.0 / max(float(resolution), 0.5) ** 3
+    return max(int(n_res), 1) * max(int(ncopy), 1) * reflections * \
+        (1.0 + float(cell_deviation or 0.0) / CELL_DEVIATION_SCALE)
+
+def is_confident(results, tfz=CONFIDENT_TFZ, llg=CONFIDENT_LLG):
+    """Return True if Phaser results hold a solution at or above tfz and llg"""
+
+    if not results or not results.get("solution"):
+        return False
+    try:
+        return float(results.get("tfz")) >= tfz and float(results.get("gain")) >= llg
+    except (TypeError, ValueError):
+        # Not calculated, as with "NC" or "arbitrary"
+        return False
+
+class PhaserSchedule(object):
+    """Phaser jobs waiting for a slot, lowest priority value first"""
+
+    def __init__(self):
+        self.heap = []
+        # Keeps jobs of the same priority in the order added
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, job_description, priority):
+        """Add a job, priority being a cost or a tuple of them"""
+        heapq.heappush(self.heap, (priority, next(self.counter), job_description))
+
+    def pop(self):
+        """Return the next job to launch"""
+        return heapq.heappop(self.heap)[2]
+
+    def drain(self):
+        """Return the jobs still waiting in order, leaving none"""
+        jobs = []
+        while self.heap:
+            jobs.append(self.pop())
+        return jobs
@@ -0,0 +1,261 @@
+"""
+Patches for plugin results sent back to control
+
+A plugin that sends its results several times while running only needs to
+send what changed since the last time. Messages on RAPD_RESULTS are either a
+full snapshot, as always, or a patch:
+
+{"command":..., "plugin":{...}, "process":{...},
+ "sequence":n,
+ "patch":{"set":{"results.plots":[...], ...}, "unset":["results.old", ...]}}
+
+The set paths are dotted MongoDB paths into the plugin result document and
+never overlap. Snapshots carry the sequence too. Control tracks the sequence
+for each result_id and, when it sees a gap, sets the resync key so the
+plugin sends a snapshot next. Completed and failed results are always sent
+as snapshots.
+
+The same message is pushed for control and published for the web clients,
+which apply patches to the last snapshot they saw.
+"""
+
+__license__ = """
+This file is part of RAPD
+
+Copyright (C) 2016-2018 Cornell University
+All rights reserved.
+
+RAPD is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, version 3.
+
+RAPD is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+__created__ = "2026-10-18"
+__maintainer__ = "Frank Murphy"
+__email__ = "fmurphy@anl.gov"
+__status__ = "Development"
+
+# Standard imports
+import copy
+
+from utils.text import json
+
+# Results holding files control has to store, so always sent in full
+FILE_KEYS = ("results.archive_files", "results.data_produced", "results.for_display")
+
+# Top level keys every patch carries so control can route it
+ROUTING_KEYS = ("command", "plugin", "process")
+
+# Seconds a resync request is kept for a plugin to see
+RESYNC_EXPIRE = 3600
+
+def resync_key(result_id):
+    """Return the redis key asking the plugin for result_id to send a snapshot"""
+    return "RAPD_RESULTS_RESYNC:%s" % result_id
+
+def is_finished(results):
+    """Return True for a result that is complete or has failed"""
+    return results.get("process", {}).get("status") in (100, -1)
+
+def diff(previous, current, prefix=""):
+    """
+    Return (set, unset) turning previous into current
+
+    Dicts are compared key by key; anything else that changed is replaced
+    whole. Keys that cannot be part of a MongoDB path replace their parent.
+    """
+
+    to_set = {}
+    to_unset = []
+
+    for key, value in current.iteritems():
+        path = prefix + key
+        if key not in previous:
+            to_set[path] = value
+        elif previous[key] != value:
+            if isinstance(value, dict) and isinstance(previous[key], dict) and \
+               all(("." not in k and not k.startswith("$")) for k in value.keys() + previous[key].keys()):
+                sub_set, sub_unset = diff(previous[key], value, path+".")
+                to_set.update(sub_set)
+                to_unset.extend(sub_unset)
+            else:
+                to_set[path] = value
+
+    for key in previous:
+        if key not in current:
+            to_unset.append(prefix + key)
+
+    return to_set, to_unset
+
+def set_path(document, path, value):
+    """Set a dotted path in a nested dict"""
+
+    keys = path.split(".")
+    for key in keys[:-1]:
+        if not isinstance(document.get(key), dict):
+            document[key] = {}
+        document = document[key]
+    document[keys[-1]] = value
+
+def unset_path(document, path):
+    """Remove a dotted path from a nested dict"""
+
+    keys = path.split(".")
+    for key in keys[:-1]:
+        document = document.get(key)
+        if not isinstance(document, dict):
+            return
+    document.pop(keys[-1], None)
+
+def apply_patch(document, patch):
+    """Apply a patch to a result dict in place and return it"""
+
+    for path in patch.get("unset", []):
+        unset_path(document, path)
+    for path, value in patch.get("set", {}).iteritems():
+        set_path(document, path, value)
+    return document
+
+def merge_patches(first, second):
+    """
+    Return one patch with the effect of first followed by second, keeping
+    the set paths from overlapping
+    """
+
+    to_set = copy.deepcopy(first.get("set", {}))
+    to_unset = [path for path in first.get("unset", []) if path not in second.get("set", {})]
+
+    for path, value in second.get("set", {}).iteritems():
+        # Replaces paths below it
+        for old in [old for old in to_set if old.startswith(path+".")]:
+            del to_set[old]
+        to_unset = [old for old in to_unset if not old.startswith(path+".")]
+        # Lands inside a value already being set
+        parents = [old for old in to_set if path.startswith(old+".")]
+        if parents:
+            parent = parents[0]
+            if isinstance(to_set[parent], dict):
+                set_path(to_set[parent], path[len(parent)+1:], value)
+                continue
+        to_set[path] = value
+
+    for path in second.get("unset", []):
+        to_set.pop(path, None)
+        for old in [old for old in to_set if old.startswith(path+".")]:
+            del to_set[old]
+        parents = [old for old in to_set if path.startswith(old+".")]
+        if parents:
+            if isinstance(to_set[parents[0]], dict):
+                unset_path(to_set[parents[0]], path[len(parents[0])+1:])
+            continue
+        if path not in to_unset:
+            to_unset.append(path)
+
+    return {"set":to_set, "unset":to_unset}
+
+def combine_messages(pending, message):
+    """
+    Return a single RAPD_RESULTS message with the effect of pending followed
+    by message, for writers coalescing updates
+    """
+
+    # A snapshot supersedes anything before it
+    if "patch" not in message:
+        return message
+
+    combined = dict(pending)
+    for key in ROUTING_KEYS + ("sequence",):
+        if key in message:
+            combined[key] = message[key]
+
+    if "patch" in pending:
+        combined["patch"] = merge_patches(pending["patch"], message["patch"])
+    else:
+        apply_patch(combined, message["patch"])
+        # Routing keys come from the newer message
+        for key in ROUTING_KEYS:
+            if key in message:
+                combined[key] = message[key]
+
+    return combined
+
+class ResultPatcher(object):
+    """
+    Kept by a plugin to turn each send of its results into a snapshot or a
+    patch on what was sent before
+    """
+
+    def __init__(self):
+        self.previous = None
+        self.sequence = 0
+
+    def prepare(self, results, redis=None):
+        """
+        Return the JSON to push on RAPD_RESULTS for results
+
+        Keyword arguments
+        results -- the full plugin results dict
+        redis -- database.redis_adapter.Database instance, to see if control
+                 has asked for a snapshot (default = None)
+        """
+
+        # Normalize through JSON so comparisons match what control receives
+        json_results = json.dumps(results)
+        current = json.loads(json_results)
+
+        self.sequence += 1
+        previous, self.previous = self.previous, current
+
+        snapshot = previous is None or is_finished(current)
+
+        # Control missed something and wants the whole result
+        result_id = current.get("process", {}).get("result_id")
+        if not snapshot and redis and result_id:
+            if redis.get(resync_key(result_id)):
+                redis.delete(resync_key(result_id))
+                snapshot = True
+
+        if not snapshot:
+            to_set, to_unset = diff(previous, current)
+            # Files have to go through the full save
+            for path in to_set.keys() + to_unset:
+                if any(path == key or path.startswith(key+".") or key.startswith(path+".")
+                       for key in FILE_KEYS):
+                    snapshot = True
+                    break
+
+        if snapshot:
+            current["sequence"] = self.sequence
+            return json.dumps(current)
+
+        message = dict((key, current[key]) for key in ROUTING_KEYS if key in current)
+        message["sequence"] = self.sequence
+        message["patch"] = {"set":to_set, "unset":to_unset}
+        return json.dumps(message)
+
+def send_results(redis, patcher, results):
+    """
+    Push results on RAPD_RESULTS for control and publish them for the web
+    clients, as a patch on the last send where possible. Returns the
+    patcher, made on the first send, to pass in the next time.
+
+    Keyword arguments
+    redis -- database.redis_adapter.Database instance
+    patcher -- ResultPatcher of the plugin, or None before the first send
+    results -- the full plugin results dict
+    """
+
+    if not patcher:
+        patcher = ResultPatcher()
+    message = patcher.prepare(results, redis)
+    redis.lpush("RAPD_RESULTS", message)
+    redis.publish("RAPD_RESULTS", message)
+    return patcher